@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Conditional GETs of the cacheable read endpoints.
+
+Integrators poll the model, performance, stats, style and team listings every
+few seconds, although their data only changes when the quorum or pg_cron jobs
+regenerate it. ``etag_cached`` takes the place of ``cache.cached`` on those
+endpoints. It stores the serialized response body together with its content hash,
+computed once per cache fill, and sends the hash as the ``ETag`` of every response
+served from the cache. A client sending it back gets a 304 without the endpoint
+querying the database, marshalling, or sending the body again.
+
+The hash only depends on the body, so every node serving the same data sends the
+same ``ETag``, whichever of them filled its cache. No ``Last-Modified`` is sent: a
+node only knows when it filled its cache, not when the data changed, so
+``If-Modified-Since`` could get a 304 for data which changed since.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+from collections.abc import Callable
+
+from flask import Response, current_app, request
+from flask_restx.utils import unpack
+
+from horde.flask import cache
+
+
+def content_etag(body: str) -> str:
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+def conditional_json_response(body: str | bytes, etag: str) -> Response:
+    """Returns a JSON response of the stored ``body``, or a 304 if the client's copy is still current"""
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def etag_cached(timeout: int, query_string: bool = False) -> Callable:
+    """Caches the marshalled response of a GET for ``timeout`` seconds, serving it conditionally
+
+    Goes above ``api.marshal_with``. Responses other than 200 are not cached, and
+    requests with a field mask bypass the cache, as their body differs.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.headers.get(current_app.config["RESTX_MASK_HEADER"]):
+                return view(*args, **kwargs)
+            cache_key = f"etag_view/{request.full_path if query_string else request.path}"
+            cached_response = cache.get(cache_key)
+            if cached_response is None:
+                data, code, headers = unpack(view(*args, **kwargs))
+                if code != 200:
+                    return data, code, headers
+                body = json.dumps(data)
+                cached_response = (body, content_etag(body))
+                cache.set(cache_key, cached_response, timeout=timeout)
+            return conditional_json_response(*cached_response)
+
+        return wrapper
+
+    return decorator
@@ -268,6 +268,11 @@ class TextModels(v2.Models):
                 "model": fields.String(description="Which of the available models to use for this request."),
             },
         )
+        # Jobs claimed from further requests by a pop sending max_jobs above 1.
+        self.response_model_job_pop["extra_jobs"] = fields.List(
+            fields.Nested(self.response_model_job_pop, skip_none=True),
+            description="Further jobs claimed for this worker in the same pop, each shaped like the top-level job.",
+        )
         self.input_model_job_pop = api.inherit(
             "PopInputKobold",
             self.input_model_job_pop,
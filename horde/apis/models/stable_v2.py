@@ -535,6 +535,11 @@ class ImageModels(v2.Models):
                 ),
             },
         )
+        # Jobs claimed from further requests by a pop sending max_jobs above 1.
+        self.response_model_job_pop["extra_jobs"] = fields.List(
+            fields.Nested(self.response_model_job_pop, skip_none=True),
+            description="Further jobs claimed for this worker in the same pop, each shaped like the top-level job.",
+        )
         self.input_model_job_pop = api.inherit(
             "PopInputStable",
             self.input_model_job_pop,
@@ -862,6 +867,16 @@ class ImageModels(v2.Models):
                     min=1,
                     max=256,
                 ),
+                "wait_seconds": fields.Integer(
+                    default=0,
+                    required=False,
+                    description=(
+                        "When no form is queued, hold this pop open for up to this many seconds and return as soon as "
+                        "a matching form arrives. Ignored by hordes which do not support long-polling pops."
+                    ),
+                    min=0,
+                    max=20,
+                ),
             },
         )
         self.response_model_interrogation_pop_payload = api.model(
@@ -249,6 +249,22 @@ class Parsers:
             help="How many jobvs to pop at the same time",
             location="json",
         )
+        self.job_pop_parser.add_argument(
+            "max_jobs",
+            type=int,
+            required=False,
+            default=1,
+            help="The maximum amount of separate requests this worker will accept jobs from in this pop.",
+            location="json",
+        )
+        self.job_pop_parser.add_argument(
+            "wait_seconds",
+            type=int,
+            required=False,
+            default=0,
+            help="How long to hold this pop open waiting for a job when none is queued, where the horde supports it.",
+            location="json",
+        )
         self.job_pop_parser.add_argument(
             "extra_slow_worker",
             type=bool,
@@ -546,6 +562,26 @@ class Models:
                 "generations": fields.List(fields.Nested(self.response_model_generation_result)),
             },
         )
+        self.response_model_wp_status_lite_entry = api.inherit(
+            "RequestStatusCheckEntry",
+            self.response_model_wp_status_lite,
+            {
+                "id": fields.String(description="The UUID of this request."),
+            },
+        )
+        self.response_model_wp_status_lite_batch = api.model(
+            "RequestStatusCheckBatch",
+            {
+                "statuses": fields.List(
+                    fields.Nested(self.response_model_wp_status_lite_entry),
+                    description="The status of each request found, in the order they were asked for.",
+                ),
+                "not_found": fields.List(
+                    fields.String(description="The UUID of a request which could not be found."),
+                    description="The requested IDs which did not match any request.",
+                ),
+            },
+        )
         self.response_model_warning = api.model(
             "RequestSingleWarning",
             {
@@ -752,6 +788,26 @@ class Models:
                     min=1,
                     max=20,
                 ),
+                "max_jobs": fields.Integer(
+                    default=1,
+                    required=False,
+                    description=(
+                        "The maximum amount of separate requests this worker will accept jobs from in this pop. "
+                        "Jobs beyond the first are returned in extra_jobs, each shaped like the top-level job."
+                    ),
+                    min=1,
+                    max=20,
+                ),
+                "wait_seconds": fields.Integer(
+                    default=0,
+                    required=False,
+                    description=(
+                        "When no job is queued, hold this pop open for up to this many seconds and return as soon as "
+                        "a matching job arrives. Ignored by hordes which do not support long-polling pops."
+                    ),
+                    min=0,
+                    max=20,
+                ),
                 "extra_slow_worker": fields.Boolean(
                     default=True,
                     description=(
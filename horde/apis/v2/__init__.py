@@ -13,6 +13,8 @@ from horde.apis.v2.base import api
 api.add_resource(stable.ImageAsyncGenerate, "/generate/async")
 api.add_resource(stable.ImageAsyncStatus, "/generate/status/<string:id>")
 api.add_resource(stable.ImageAsyncCheck, "/generate/check/<string:id>")
+api.add_resource(stable.ImageAsyncCheckBatch, "/generate/check")
+api.add_resource(stable.ImageAsyncStatusStream, "/generate/check/stream", "/generate/check/<string:id>/stream")
 api.add_resource(stable.Aesthetics, "/generate/rate/<string:id>")
 api.add_resource(stable.ImageJobPop, "/generate/pop")
 api.add_resource(stable.ImageJobSubmit, "/generate/submit")
@@ -23,6 +25,7 @@ api.add_resource(stable_styles.ImageStyleExample, "/styles/image/<string:style_i
 api.add_resource(stable_styles.SingleImageStyleExample, "/styles/image/<string:style_id>/example/<string:example_id>")
 api.add_resource(kobold.TextAsyncGenerate, "/generate/text/async")
 api.add_resource(kobold.TextAsyncStatus, "/generate/text/status/<string:id>")
+api.add_resource(kobold.TextAsyncStatusStream, "/generate/text/status/stream", "/generate/text/status/<string:id>/stream")
 api.add_resource(kobold.TextJobPop, "/generate/text/pop")
 api.add_resource(kobold.TextJobSubmit, "/generate/text/submit")
 api.add_resource(kobold_styles.TextStyle, "/styles/text")
@@ -9,8 +9,8 @@ from datetime import datetime, timedelta
 
 import logfire
 import regex as re
-from flask import render_template, request
-from flask_restx import Namespace, Resource, reqparse
+from flask import Response, render_template, request, stream_with_context
+from flask_restx import Namespace, Resource, marshal, reqparse
 from flask_restx.reqparse import ParseResult
 from markdownify import markdownify
 from sqlalchemy import or_, text
@@ -19,6 +19,7 @@ from sqlalchemy.exc import IntegrityError, InvalidRequestError
 import horde.apis.limiter_api as lim
 import horde.classes.base.stats as stats
 from horde import exceptions as e
+from horde.apis.conditional import conditional_json_response, etag_cached
 from horde.apis.models.v2 import Models, Parsers
 from horde.apis.request_utils import get_current_passkey_owner, get_remoteaddr
 from horde.argparser import args
@@ -52,6 +53,7 @@ from horde.metrics import (
     pop_check_in_duration,
     pop_duration,
     pop_eval_duration,
+    pop_long_poll_wait_duration,
     pop_pre_eval_duration,
     pop_returned_jobs,
     pop_skipped,
@@ -67,11 +69,13 @@ from horde.metrics import (
     waitress_metrics,
 )
 from horde.patreon import patrons
+from horde.pop_notifier import POP_MAX_WAIT_SECONDS, long_poll_enabled, pop_notifier, pop_slots
 from horde.r2 import upload_prompt
 from horde.suspicions import Suspicions
 from horde.telemetry import pyroscope_tag
 from horde.utils import datetime_parser, hash_api_key, hash_dictionary, is_profane, sanitize_string
 from horde.vars import horde_contact_email, horde_title, horde_url
+from horde.wp_status_stream import STATUS_STREAM_MAX_IDS, stream_slots, stream_wp_statuses
 
 # Not used yet
 authorizations = {"apikey": {"type": "apiKey", "in": "header", "name": "apikey"}}
@@ -553,6 +557,88 @@ class SyncGenerate(GenerateTemplate):
         super().activate_waiting_prompt()
 
 
+# The most requests a single batched pop (``max_jobs``) may claim jobs from, and the
+# most further candidate pages it reads past the first match while doing so.
+POP_MAX_JOBS = 20
+POP_BATCH_MAX_EXTRA_PAGES = 2
+
+
+# The most requests a single batched status check may ask for
+STATUS_BATCH_MAX_IDS = 50
+
+
+class WPStatusStreamTemplate(Resource):
+    """Streams the lite status of one or several requests as server-sent events
+    Extending classes define how their requests are retrieved
+    """
+
+    gentype = None
+    wp_request_type = "Waiting Prompt (Stream)"
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument(
+        "Client-Agent",
+        default="unknown:0:unknown",
+        type=str,
+        required=False,
+        help="The client name and version",
+        location="headers",
+    )
+    get_parser.add_argument(
+        "ids",
+        type=str,
+        required=False,
+        help=f"Comma-separated IDs of up to {STATUS_STREAM_MAX_IDS} requests to stream together.",
+        location="args",
+    )
+
+    def get(self, id=None):
+        self.args = self.get_parser.parse_args()
+        if id is not None:
+            wp_ids = [id]
+        else:
+            wp_ids = list(dict.fromkeys(wp_id.strip() for wp_id in (self.args.ids or "").split(",") if wp_id.strip()))
+        if len(wp_ids) == 0:
+            raise e.BadRequest("Please provide the IDs of the requests to stream in 'ids'.")
+        if len(wp_ids) > STATUS_STREAM_MAX_IDS:
+            raise e.BadRequest(f"A status stream can watch at most {STATUS_STREAM_MAX_IDS} requests.")
+        if id is not None and not self.get_wp(id):
+            raise e.RequestNotFound(
+                id,
+                request_type=self.wp_request_type,
+                client_agent=self.args["Client-Agent"],
+                ipaddr=request.remote_addr,
+            )
+        db.session.remove()
+        if not stream_slots.acquire():
+            raise e.TooManyStatusStreams(request.remote_addr)
+        response = Response(
+            stream_with_context(stream_wp_statuses(wp_ids, self.get_wp_stream_status)),
+            mimetype="text/event-stream",
+            # Proxies must neither cache the stream nor buffer its events
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        # Runs however the response ends, including a client which disconnected
+        # before the first event
+        response.call_on_close(stream_slots.release)
+        return response
+
+    def get_wp(self, wp_id):
+        """Extending classes retrieve the waiting prompt of their type"""
+        raise NotImplementedError
+
+    def get_wp_stream_status(self, wp_id):
+        wp = self.get_wp(wp_id)
+        if not wp:
+            return None
+        return wp.get_lite_status(
+            request_avg=database.get_request_avg(self.gentype),
+            has_valid_workers=database.wp_has_valid_workers(wp),
+            wp_queue_stats=database.get_wp_queue_stats(wp),
+            active_worker_count=database.count_active_workers(self.gentype),
+        )
+
+
 class JobPopTemplate(Resource):
     worker_class = Worker
     args: ParseResult
@@ -599,7 +685,6 @@ class JobPopTemplate(Resource):
             db.session.commit()
         pop_check_in_duration.record(time.monotonic() - check_in_t0, {"horde.gentype": self.gentype})
         # This ensures that the priority requested by the bridge is respected
-        self.prioritized_wp = []
         # self.priority_users = [self.user]
         ## Start prioritize by bridge request ##
         pre_priority_user_ids = [x.split("#")[-1] for x in self.priority_usernames]
@@ -618,6 +703,29 @@ class JobPopTemplate(Resource):
         #     priority_user = database.find_user_by_username(priority_username)
         #     if priority_user:
         #        self.priority_users.append(priority_user)
+        pop_pre_eval_duration.record(time.monotonic() - pre_eval_t0, {"horde.gentype": self.gentype})
+        watch_snapshot = self.watch_for_jobs()
+        try:
+            worker_ret = self.find_job()
+            while worker_ret is None and self.wait_for_jobs(watch_snapshot):
+                watch_snapshot = self.watch_for_jobs()
+                worker_ret = self.find_job()
+        finally:
+            self.release_pop_slot()
+        if worker_ret is not None:
+            return worker_ret, 200
+        # We report maintenance exception only if we couldn't find any jobs
+        if self.worker.maintenance:
+            raise e.WorkerMaintenance(self.worker.maintenance_msg)
+        # logger.debug(self.skipped)
+        return {"id": None, "ids": [], "skipped": self.skipped, "messages": database.get_all_active_worker_messages(self.worker.id)}, 200
+
+    def find_job(self):
+        """Search the queue for a job this worker can take and claim it.
+
+        Returns the pop payload, or None when no candidate could be claimed.
+        """
+        self.prioritized_wp = []
         self.wp_page = 0
         with logfire.span("horde.pop.get_sorted_wp", priority=True, page=0):
             wp_list = self.get_sorted_wp(self.priority_user_ids)
@@ -630,7 +738,6 @@ class JobPopTemplate(Resource):
                     self.prioritized_wp.append(wp)
         # logger.warning(datetime.utcnow())
         candidates_evaluated = 0
-        pop_pre_eval_duration.record(time.monotonic() - pre_eval_t0, {"horde.gentype": self.gentype})
         eval_t0 = time.monotonic()
         with logfire.span("horde.pop.evaluate_candidates") as eval_span:
             while len(self.prioritized_wp) > 0:
@@ -666,14 +773,19 @@ class JobPopTemplate(Resource):
                     # logger.debug(worker_ret)
                     if worker_ret is None:
                         continue
+                    returned_jobs = len(worker_ret.get("ids", []) or [worker_ret.get("id")]) if isinstance(worker_ret, dict) else 0
+                    extra_jobs = self.claim_extra_jobs(wp)
+                    if extra_jobs:
+                        worker_ret["extra_jobs"] = extra_jobs
+                        returned_jobs += sum(len(job.get("ids", []) or [job.get("id")]) for job in extra_jobs)
                     # logger.debug(worker_ret)
                     eval_span.set_attribute("horde.candidates_evaluated", candidates_evaluated)
                     pop_candidates.record(candidates_evaluated, {"horde.gentype": self.gentype})
                     pop_returned_jobs.record(
-                        len(worker_ret.get("ids", []) or [worker_ret.get("id")]) if isinstance(worker_ret, dict) else 0,
+                        returned_jobs,
                         {"horde.outcome": "match", "horde.gentype": self.gentype},
                     )
-                    return worker_ret, 200
+                    return worker_ret
                 db.session.commit()  # Unlock all locked wp rows before picking up new ones
                 self.wp_page += 1
                 with logfire.span("horde.pop.get_sorted_wp", priority=False, page=self.wp_page):
@@ -683,11 +795,59 @@ class JobPopTemplate(Resource):
             pop_candidates.record(candidates_evaluated, {"horde.gentype": self.gentype})
             pop_eval_duration.record(time.monotonic() - eval_t0, {"horde.outcome": "no_match", "horde.gentype": self.gentype})
             pop_returned_jobs.record(0, {"horde.outcome": "no_match", "horde.gentype": self.gentype})
-        # We report maintenance exception only if we couldn't find any jobs
-        if self.worker.maintenance:
-            raise e.WorkerMaintenance(self.worker.maintenance_msg)
-        # logger.debug(self.skipped)
-        return {"id": None, "ids": [], "skipped": self.skipped, "messages": database.get_all_active_worker_messages(self.worker.id)}, 200
+        return None
+
+    def watched_models(self):
+        """Extendable function returning the models whose new requests wake this pop"""
+        return self.models
+
+    def watch_for_jobs(self):
+        """Start watching for new work if this pop asked to long-poll.
+
+        Called before each candidate search, so that work queued between the search
+        and the wait is not missed. Returns None when this pop does not long-poll, or
+        when this node already holds as many long-polling pops as it allows.
+        """
+        wait_seconds = min(self.args.get("wait_seconds") or 0, POP_MAX_WAIT_SECONDS)
+        if wait_seconds <= 0 or not long_poll_enabled():
+            return None
+        if not getattr(self, "pop_slot_held", False):
+            if not pop_slots.acquire():
+                return None
+            self.pop_slot_held = True
+        if getattr(self, "pop_deadline", None) is None:
+            self.pop_deadline = time.monotonic() + wait_seconds
+        return pop_notifier.watch(self.gentype, self.watched_models())
+
+    def release_pop_slot(self):
+        """Give back the long-poll slot taken by watch_for_jobs(), if any"""
+        if getattr(self, "pop_slot_held", False):
+            self.pop_slot_held = False
+            pop_slots.release()
+
+    def wait_for_jobs(self, watch_snapshot):
+        """Park an empty long-poll pop until matching work is queued.
+
+        Returns whether the pop should search the queue again.
+        """
+        if watch_snapshot is None or self.worker.maintenance:
+            return False
+        remaining = self.pop_deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        # Release the DB connection while parked
+        db.session.commit()
+        wait_t0 = time.monotonic()
+        with logfire.span("horde.pop.long_poll_wait"):
+            woken = pop_notifier.wait(watch_snapshot, remaining)
+        pop_long_poll_wait_duration.record(
+            time.monotonic() - wait_t0,
+            {"horde.outcome": "woken" if woken else "timeout", "horde.gentype": self.gentype},
+        )
+        if woken:
+            # The skipped counts reported back describe the last search only
+            self.skipped = {}
+        return woken
 
     def get_sorted_wp(self, priority_user_ids=None):
         """Extendable class to retrieve the sorted WP list for this worker"""
@@ -697,6 +857,48 @@ class JobPopTemplate(Resource):
             page=self.wp_page,
         )
 
+    def claim_extra_jobs(self, claimed_wp):
+        """Claim jobs from further waiting prompts for a pop sending ``max_jobs`` above 1.
+
+        The candidates already fetched for this pop are walked in queue order after
+        ``claimed_wp``, followed by up to ``POP_BATCH_MAX_EXTRA_PAGES`` further pages,
+        until ``max_jobs`` requests have been claimed in total. Every claim commits,
+        releasing the candidate locks taken by the page query, so each further
+        candidate is re-locked (skipping rows another pop holds) before it is claimed.
+        Paused workers never batch, as they are only ever handed a fake generation.
+        """
+        max_jobs = min(self.args.get("max_jobs") or 1, POP_MAX_JOBS)
+        if max_jobs <= 1 or self.worker.paused:
+            return []
+        extra_jobs = []
+        claimed_ids = {claimed_wp.id}
+        candidates = list(self.prioritized_wp)
+        extra_pages = 0
+        while len(extra_jobs) < max_jobs - 1:
+            for wp in candidates:
+                if wp.id in claimed_ids:
+                    continue
+                claimed_ids.add(wp.id)
+                if not self.worker.can_generate(wp)[0]:
+                    continue
+                if database.lock_wp_for_claim(wp) is None:
+                    continue
+                worker_ret = self.start_worker(wp)
+                if worker_ret:
+                    extra_jobs.append(worker_ret)
+                if len(extra_jobs) >= max_jobs - 1:
+                    break
+            else:
+                if extra_pages >= POP_BATCH_MAX_EXTRA_PAGES:
+                    break
+                extra_pages += 1
+                db.session.commit()
+                self.wp_page += 1
+                candidates = self.get_sorted_wp()
+                if not candidates:
+                    break
+        return extra_jobs
+
     # Making it into its own function to allow extension
     def start_worker(self, wp):
         # Paused worker gives a fake prompt
@@ -1060,25 +1262,27 @@ class Workers(Resource):
 
     @api.expect(get_parser)
     @logger.catch(reraise=True)
-    @api.marshal_with(
-        models.response_model_worker_details,
-        code=200,
-        description="Workers List",
-        as_list=True,
-        skip_none=True,
-    )
+    @api.response(200, "Workers List", [models.response_model_worker_details])
     def get(self):
         """A List with the details of all registered and active workers"""
         self.args = self.get_parser.parse_args()
-        return (self.retrieve_workers_details(), 200)
-
-    @logger.catch(reraise=True)
-    def retrieve_workers_details(self):
         details_privilege = 0
         if self.args.apikey:
             admin = database.find_user_by_api_key(self.args["apikey"])
             if admin and admin.moderator:
                 details_privilege = 2
+        # The quorum publishes the marshalled responses, so unless the client asked
+        # for a field mask, the stored body is sent as is.
+        mask = request.headers.get(get_app().config["RESTX_MASK_HEADER"])
+        if not mask:
+            cached_response = database.get_worker_list_response(details_privilege, worker_type=self.args.type, name=self.args.name)
+            if cached_response is not None:
+                return conditional_json_response(*cached_response)
+        workers = self.retrieve_workers_details(details_privilege)
+        return marshal(workers, models.response_model_worker_details, skip_none=True, mask=mask), 200
+
+    @logger.catch(reraise=True)
+    def retrieve_workers_details(self, details_privilege):
         if not hr.horde_r:
             return self.parse_worker_by_query(self.get_worker_info_list(details_privilege))
         if details_privilege == 2:
@@ -1096,10 +1300,7 @@ class Workers(Resource):
         return self.parse_worker_by_query(json.loads(cached_workers, object_hook=datetime_parser))
 
     def get_worker_info_list(self, details_privilege):
-        workers_ret = []
-        for worker in database.get_active_workers():
-            workers_ret.append(worker.get_details(details_privilege))
-        return workers_ret
+        return database.get_active_workers_details((details_privilege,))[details_privilege]
 
     def parse_worker_by_query(self, workers_list):
         if self.args.name:
@@ -2006,7 +2207,8 @@ class Models(Resource):
         location="args",
     )
 
-    @cache.cached(timeout=2, query_string=True)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=2, query_string=True)
     @api.expect(get_parser)
     @api.response(400, "Validation Error", models.response_model_error)
     @api.marshal_with(
@@ -2068,6 +2270,7 @@ class HordeLoad(Resource):
     )
 
     @logger.catch(reraise=True)
+    @etag_cached(timeout=2)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_horde_performance,
@@ -2253,7 +2456,7 @@ class Teams(Resource):
 
     # decorators = [limiter.limit("20/minute")]
     @logger.catch(reraise=True)
-    @cache.cached(timeout=10)
+    @etag_cached(timeout=10)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_team_details,
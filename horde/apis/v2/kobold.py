@@ -11,11 +11,13 @@ from flask_restx import Resource, reqparse
 
 import horde.apis.limiter_api as lim
 from horde import exceptions as e
+from horde.apis.conditional import etag_cached
 from horde.apis.models.kobold_v2 import TextModels, TextParsers
 from horde.apis.v2.base import (
     GenerateTemplate,
     JobPopTemplate,
     JobSubmitTemplate,
+    WPStatusStreamTemplate,
     api,
 )
 from horde.classes.base import settings
@@ -247,6 +249,12 @@ class TextAsyncStatus(Resource):
         This request will include all already generated texts.
         """
         self.args = self.get_parser.parse_args()
+        # While nothing has finished, the full status is the lite status without generations,
+        # so the quorum's snapshot can answer it without touching the DB
+        cached_status = database.get_cached_wp_lite_status("text", id)
+        if cached_status is not None and cached_status["finished"] == 0:
+            cached_status["generations"] = []
+            return (cached_status, 200)
         wp = text_database.get_text_wp_by_id(id)
         if not wp:
             raise e.RequestNotFound(
@@ -311,6 +319,32 @@ class TextAsyncStatus(Resource):
         return (wp_status, 200)
 
 
+class TextAsyncStatusStream(WPStatusStreamTemplate):
+    gentype = "text"
+    wp_request_type = "Text Waiting Prompt (Stream)"
+
+    decorators = [limiter.limit("30/minute")]
+
+    @api.expect(WPStatusStreamTemplate.get_parser)
+    @api.response(200, "Async Request Status Stream")
+    @api.response(400, "Validation Error", models.response_model_error)
+    @api.response(404, "Request Not found", models.response_model_error)
+    @api.response(429, "Too Many Status Streams", models.response_model_error)
+    def get(self, id=None):
+        """Stream the status of Asynchronous generation requests as server-sent events.
+        Instead of polling a request's status, keep this connection open to receive a 'status' event
+        whenever the request's progress, queue position or estimated wait time changes noticeably.
+        Use the path ID to stream a single request, or the 'ids' query argument to stream several at once.
+        Each request stops being streamed once it is done or faulted. The stream ends with an 'end' event,
+        at the latest after 5 minutes, after which you can reconnect if still waiting.
+        If the server cannot open more streams, it returns 429 and you should fall back to polling.
+        """
+        return super().get(id)
+
+    def get_wp(self, wp_id):
+        return text_database.get_text_wp_by_id(wp_id)
+
+
 class TextJobPop(JobPopTemplate):
     worker_class = TextWorker
     gentype = "text"
@@ -393,7 +427,7 @@ class TextHordeStatsTotals(Resource):
     )
 
     @logger.catch(reraise=True)
-    @cache.cached(timeout=50)
+    @etag_cached(timeout=50)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_stats_img_totals,
@@ -7,6 +7,7 @@ from flask_restx import reqparse
 
 import horde.apis.limiter_api as lim
 from horde import exceptions as e
+from horde.apis.conditional import etag_cached
 from horde.apis.v2.kobold import models, parsers
 from horde.apis.v2.styles import (
     SingleStyleTemplate,
@@ -16,7 +17,6 @@ from horde.apis.v2.styles import (
 )
 from horde.classes.base.style import Style
 from horde.database import functions as database
-from horde.flask import cache
 from horde.limiter import limiter
 from horde.logger import logger
 from horde.utils import ensure_clean
@@ -68,7 +68,7 @@ class TextStyle(StyleTemplate):
     )
 
     @logger.catch(reraise=True)
-    @cache.cached(timeout=1, query_string=True)
+    @etag_cached(timeout=1, query_string=True)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_style,
@@ -172,7 +172,8 @@ class TextStyle(StyleTemplate):
 class SingleTextStyle(SingleStyleTemplate):
     gentype = "text"
 
-    @cache.cached(timeout=30)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=30)
     @api.expect(parsers.basic_parser)
     @api.marshal_with(
         models.response_model_style,
@@ -243,7 +244,8 @@ class SingleTextStyle(SingleStyleTemplate):
 class SingleImageStyleByName(SingleStyleTemplateGet):
     gentype = "text"
 
-    @cache.cached(timeout=30)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=30)
     @api.expect(parsers.basic_parser)
     @api.marshal_with(
         models.response_model_style,
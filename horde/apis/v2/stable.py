@@ -17,11 +17,14 @@ from loguru import logger
 import horde.apis.limiter_api as lim
 import horde.classes.base.stats as stats
 from horde import exceptions as e
+from horde.apis.conditional import etag_cached
 from horde.apis.models.stable_v2 import ImageModels, ImageParsers
 from horde.apis.v2.base import (
+    STATUS_BATCH_MAX_IDS,
     GenerateTemplate,
     JobPopTemplate,
     JobSubmitTemplate,
+    WPStatusStreamTemplate,
     api,
 )
 from horde.classes.base import settings
@@ -54,6 +57,7 @@ from horde.metrics import (
 )
 from horde.model_reference import model_reference
 from horde.patreon import patrons
+from horde.pop_notifier import pop_notifier
 from horde.telemetry import (
     get_traceparent,
     pyroscope_tag,
@@ -615,6 +619,11 @@ class ImageAsyncCheck(Resource):
                         "which is sending too many garbage requests. Please contact us on discord.",
                         log=f"Check request via IP {request.remote_addr} on unknown client blocked.",
                     )
+                # Requests active in the quorum's last snapshot are answered without touching the DB
+                cached_status = database.get_cached_wp_lite_status("image", id)
+                if cached_status is not None:
+                    outcome = "snapshot"
+                    return (cached_status, 200)
                 wp = database.get_wp_by_id(id)
                 if not wp:
                     outcome = "not_found"
@@ -652,6 +661,102 @@ class ImageAsyncCheck(Resource):
                 check_outcomes.add(1, {"horde.gentype": "image", "horde.outcome": outcome})
 
 
+class ImageAsyncCheckBatch(Resource):
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument(
+        "Client-Agent",
+        default="unknown:0:unknown",
+        type=str,
+        required=False,
+        help="The client name and version",
+        location="headers",
+    )
+    get_parser.add_argument(
+        "ids",
+        type=str,
+        required=True,
+        help=f"Comma-separated IDs of up to {STATUS_BATCH_MAX_IDS} requests to check.",
+        location="args",
+    )
+
+    decorators = [limiter.limit("2/second")]
+
+    @api.expect(get_parser)
+    @api.marshal_with(
+        models.response_model_wp_status_lite_batch,
+        code=200,
+        description="Async Request Status Check for many requests",
+    )
+    @api.response(400, "Validation Error", models.response_model_error)
+    def get(self):
+        """Retrieve the status of many Asynchronous generation requests at once, without images.
+        Use this request instead of checking each of your requests on its own when you have several of them in flight.
+        """
+        t0 = time.monotonic()
+        outcome = "found"
+        with pyroscope_tag(endpoint="check_batch", gentype="image"), logfire.span("horde.generate.check_batch", gentype="image"):
+            try:
+                self.args = self.get_parser.parse_args()
+                ip_timeout = CounterMeasures.retrieve_timeout(request.remote_addr)
+                if ip_timeout and self.args["Client-Agent"] == "unknown:0:unknown":
+                    outcome = "blocked"
+                    raise e.Forbidden(
+                        message="Your IP address has been blocked due to using an unknown client "
+                        "which is sending too many garbage requests. Please contact us on discord.",
+                        log=f"Check request via IP {request.remote_addr} on unknown client blocked.",
+                    )
+                wp_ids = list(dict.fromkeys(wp_id.strip() for wp_id in self.args.ids.split(",") if wp_id.strip()))
+                if len(wp_ids) == 0 or len(wp_ids) > STATUS_BATCH_MAX_IDS:
+                    outcome = "invalid"
+                    raise e.BadRequest(f"Please provide between 1 and {STATUS_BATCH_MAX_IDS} request IDs in 'ids'.")
+                lite_statuses = database.get_wp_lite_statuses("image", wp_ids)
+                # The statuses are plain dicts; release the pooled connection before marshalling
+                db.session.remove()
+                return (
+                    {
+                        "statuses": [{"id": wp_id, **lite_statuses[wp_id]} for wp_id in wp_ids if wp_id in lite_statuses],
+                        "not_found": [wp_id for wp_id in wp_ids if wp_id not in lite_statuses],
+                    },
+                    200,
+                )
+            except Exception:
+                if outcome == "found":
+                    outcome = "error"
+                raise
+            finally:
+                check_duration.record(
+                    time.monotonic() - t0,
+                    {"horde.gentype": "image", "horde.outcome": outcome, "horde.batch": True},
+                )
+                check_outcomes.add(1, {"horde.gentype": "image", "horde.outcome": outcome, "horde.batch": True})
+
+
+class ImageAsyncStatusStream(WPStatusStreamTemplate):
+    gentype = "image"
+    wp_request_type = "Image Waiting Prompt (Stream)"
+
+    decorators = [limiter.limit("30/minute")]
+
+    @api.expect(WPStatusStreamTemplate.get_parser)
+    @api.response(200, "Async Request Status Stream")
+    @api.response(400, "Validation Error", models.response_model_error)
+    @api.response(404, "Request Not found", models.response_model_error)
+    @api.response(429, "Too Many Status Streams", models.response_model_error)
+    def get(self, id=None):
+        """Stream the status of Asynchronous generation requests as server-sent events.
+        Instead of polling a request's status, keep this connection open to receive a 'status' event
+        whenever the request's progress, queue position or estimated wait time changes noticeably.
+        Use the path ID to stream a single request, or the 'ids' query argument to stream several at once.
+        Each request stops being streamed once it is done or faulted. The stream ends with an 'end' event,
+        at the latest after 5 minutes, after which you can reconnect if still waiting.
+        If the server cannot open more streams, it returns 429 and you should fall back to polling.
+        """
+        return super().get(id)
+
+    def get_wp(self, wp_id):
+        return database.get_wp_by_id(wp_id)
+
+
 class ImageJobPop(JobPopTemplate):
     worker_class = ImageWorker
     gentype = "image"
@@ -1021,6 +1126,7 @@ class Interrogate(Resource):
             raise err
         self.interrogation.set_source_image(self.source_image, self.r2stored, self.image_tiles)
         self.interrogation.set_forms(self.forms)
+        pop_notifier.notify("interrogation", [form["name"] for form in self.forms])
         ret_dict = {"id": self.interrogation.id}
         return (ret_dict, 202)
 
@@ -1189,6 +1295,14 @@ class InterrogatePop(JobPopTemplate):
         help="The maximum amount of 512x512 tiles this worker can post-process",
         location="json",
     )
+    post_parser.add_argument(
+        "wait_seconds",
+        type=int,
+        required=False,
+        default=0,
+        help="How long to hold this pop open waiting for a form when none is queued, where the horde supports it.",
+        location="json",
+    )
 
     decorators = [limiter.limit("60/second")]
 
@@ -1230,7 +1344,6 @@ class InterrogatePop(JobPopTemplate):
         # form evaluation instead of holding it for the rest of the pop.
         db.session.commit()
         # This ensures that the priority requested by the bridge is respected
-        self.prioritized_forms = []
         # self.priority_users = [self.user]
         ## Start prioritize by bridge request ##
 
@@ -1241,6 +1354,31 @@ class InterrogatePop(JobPopTemplate):
         if p_users_id_from_db:
             self.priority_user_ids.extend([x.id for x in p_users_id_from_db])
 
+        watch_snapshot = self.watch_for_jobs()
+        try:
+            worker_ret = self.find_forms()
+            while worker_ret is None and self.wait_for_jobs(watch_snapshot):
+                watch_snapshot = self.watch_for_jobs()
+                worker_ret = self.find_forms()
+        finally:
+            self.release_pop_slot()
+        if worker_ret is not None:
+            return (worker_ret, 200)
+        # We report maintenance exception only if we couldn't find any jobs
+        if self.worker.maintenance:
+            raise e.WorkerMaintenance(self.worker.maintenance_msg)
+        # logger.warning(datetime.utcnow())
+        return ({"skipped": self.skipped}, 200)
+
+    def watched_models(self):
+        return self.forms
+
+    def find_forms(self):
+        """Search the queue for forms this worker can take and claim up to ``amount`` of them.
+
+        Returns the pop payload, or None when no form could be claimed.
+        """
+        self.prioritized_forms = []
         priority_list = database.get_sorted_forms_filtered_to_worker(
             worker=self.worker,
             forms_list=self.forms,
@@ -1289,15 +1427,11 @@ class InterrogatePop(JobPopTemplate):
             worker_ret["forms"].append(form_ret)
             if len(worker_ret["forms"]) >= self.args.amount:
                 # logger.debug(worker_ret)
-                return (worker_ret, 200)
+                return worker_ret
         if len(worker_ret["forms"]) >= 1:
             # logger.debug(worker_ret)
-            return (worker_ret, 200)
-        # We report maintenance exception only if we couldn't find any jobs
-        if self.worker.maintenance:
-            raise e.WorkerMaintenance(self.worker.maintenance_msg)
-        # logger.warning(datetime.utcnow())
-        return ({"skipped": self.skipped}, 200)
+            return worker_ret
+        return None
 
     def check_in(self):
         self.worker.check_in(
@@ -1403,7 +1537,7 @@ class ImageHordeStatsTotals(Resource):
     )
 
     @logger.catch(reraise=True)
-    @cache.cached(timeout=50)
+    @etag_cached(timeout=50)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_stats_img_totals,
@@ -6,6 +6,7 @@ from flask_restx import Resource, reqparse
 
 import horde.apis.limiter_api as lim
 from horde import exceptions as e
+from horde.apis.conditional import etag_cached
 from horde.apis.v2.stable import models, parsers
 from horde.apis.v2.styles import (
     SingleStyleTemplate,
@@ -15,7 +16,7 @@ from horde.apis.v2.styles import (
 )
 from horde.classes.base.style import Style, StyleExample
 from horde.database import functions as database
-from horde.flask import cache, db
+from horde.flask import db
 from horde.limiter import limiter
 from horde.logger import logger
 from horde.utils import ensure_clean
@@ -66,7 +67,8 @@ class ImageStyle(StyleTemplate):
         location="args",
     )
 
-    @cache.cached(timeout=30, query_string=True)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=30, query_string=True)
     @api.expect(get_parser)
     @api.marshal_with(
         models.response_model_style,
@@ -170,7 +172,8 @@ class ImageStyle(StyleTemplate):
 class SingleImageStyle(SingleStyleTemplate):
     gentype = "image"
 
-    @cache.cached(timeout=30)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=30)
     @api.expect(parsers.basic_parser)
     @api.marshal_with(
         models.response_model_style,
@@ -242,7 +245,8 @@ class SingleImageStyle(SingleStyleTemplate):
 class SingleImageStyleByName(SingleStyleTemplateGet):
     gentype = "image"
 
-    @cache.cached(timeout=30)
+    @logger.catch(reraise=True)
+    @etag_cached(timeout=30)
     @api.expect(parsers.basic_parser)
     @api.marshal_with(
         models.response_model_style,
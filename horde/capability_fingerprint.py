@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Bitset fingerprints of image worker capabilities and image request requirements.
+
+``ImageWorker.can_generate`` used to walk a long chain of bridge-capability,
+sampler, post-processor and model-baseline lookups for every candidate request on
+every pop, although everything on the worker side of that chain is fixed for a
+given bridge agent, model list and set of ``allow_*`` flags. The chain is folded
+into two integers instead:
+
+- a worker fingerprint, holding one bit per capability the worker has, built once
+  per distinct worker configuration (memoized per process and warmed at
+  ``check_in``);
+- a request requirement mask, holding one bit per capability the request needs,
+  computed at activation and stored on the request.
+
+A worker can serve a request's capability needs exactly when the requirement mask
+is a subset of the fingerprint. When it is not, ``can_generate`` falls back to the
+full chain to report which check failed, so skipped-reason reporting is unchanged.
+
+The bit layout is derived from the known feature, post-processor and sampler
+names. A stored mask carries the layout version in its low byte, so a mask written
+under another layout is recomputed rather than misread.
+"""
+
+from __future__ import annotations
+
+import functools
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from horde.bridge_reference import BRIDGE_SAMPLERS, check_bridge_capability, get_supported_samplers
+from horde.consts import KNOWN_POST_PROCESSORS, KNOWN_SAMPLERS
+from horde.model_reference import model_reference
+
+# Capabilities gating a request feature, each folding every bridge and worker
+# flag check the capability chain in ImageWorker.can_generate performs for it.
+CAPABILITY_FEATURES = (
+    "img2img",
+    "painting",
+    "txt2img",
+    "baseline",
+    "post-processing",
+    "tiling",
+    "return_control_map",
+    "controlnet",
+    "qr_code",
+    "hires_fix",
+    "clip_skip",
+    "lora_versions",
+)
+_KNOWN_SAMPLER_NAMES = sorted(
+    set(KNOWN_SAMPLERS)
+    | {
+        sampler
+        for versions in BRIDGE_SAMPLERS.values()
+        for samplers in versions.values()
+        for kind in ("karras", "no karras")
+        for sampler in samplers[kind]
+    },
+)
+CAPABILITY_LAYOUT = (
+    tuple(CAPABILITY_FEATURES)
+    + tuple(f"pp:{pp}" for pp in sorted(KNOWN_POST_PROCESSORS))
+    + tuple(f"karras:{sampler}" for sampler in _KNOWN_SAMPLER_NAMES)
+    + tuple(f"sampler:{sampler}" for sampler in _KNOWN_SAMPLER_NAMES)
+)
+_CAPABILITY_BITS = {name: 1 << position for position, name in enumerate(CAPABILITY_LAYOUT)}
+# Low byte of every stored requirement mask. A 1 in 256 chance that an edited
+# layout keeps the same version is accepted: stored masks only live as long as
+# their request, at most a few hours.
+CAPABILITY_LAYOUT_VERSION = zlib.crc32("\n".join(CAPABILITY_LAYOUT).encode()) & 0xFF
+_VERSION_BITS = 8
+
+
+def _bits(names: set[str] | list[str]) -> int:
+    mask = 0
+    for name in names:
+        mask |= _CAPABILITY_BITS[name]
+    return mask
+
+
+@dataclass(frozen=True)
+class ImageCapabilityFingerprint:
+    """The capabilities of one worker configuration, as a bitset."""
+
+    mask: int
+    # The lowest average step count across the worker's models; requests above it
+    # are skipped by workers that set ``limit_max_steps``.
+    step_ceiling: float | None
+
+    def satisfies(self, requirements: int) -> bool:
+        return requirements & ~self.mask == 0
+
+
+def _average_steps(model_name: str) -> float:
+    requirements = model_reference.get_model_requirements(model_name)
+    return int(requirements.get("min_steps", 20) + requirements.get("max_steps", 40)) / 2
+
+
+@functools.lru_cache(maxsize=1024)
+def _build_image_fingerprint(
+    bridge_agent: str,
+    model_names: frozenset[str],
+    allow_img2img: bool,
+    allow_painting: bool,
+    allow_controlnet: bool,
+    allow_sdxl_controlnet: bool,
+    reference_id: int,
+) -> ImageCapabilityFingerprint:
+    # reference_id only keys the cache: the model reference is replaced, never
+    # mutated, when it reloads, so a reload starts a fresh set of entries.
+    baselines = model_reference.get_all_model_baselines(model_names)
+    features = set()
+    if allow_img2img and check_bridge_capability("img2img", bridge_agent):
+        features.add("img2img")
+    if allow_painting and check_bridge_capability("inpainting", bridge_agent) and model_reference.has_inpainting_models(model_names):
+        features.add("painting")
+    if not model_reference.has_only_inpainting_models(model_names):
+        features.add("txt2img")
+    if "flux_1" not in baselines or check_bridge_capability("flux", bridge_agent):
+        features.add("baseline")
+    for capability in ("post-processing", "tiling", "return_control_map", "clip_skip", "lora_versions"):
+        if check_bridge_capability(capability, bridge_agent):
+            features.add(capability)
+    if (
+        allow_controlnet
+        and check_bridge_capability("controlnet", bridge_agent)
+        and check_bridge_capability("image_is_control", bridge_agent)
+    ):
+        features.add("controlnet")
+    if (
+        check_bridge_capability("controlnet", bridge_agent)
+        and check_bridge_capability("qr_code", bridge_agent)
+        and ("stable_diffusion_xl" not in baselines or allow_sdxl_controlnet)
+    ):
+        features.add("qr_code")
+    if check_bridge_capability("hires_fix", bridge_agent) and (
+        "stable_cascade" not in baselines or check_bridge_capability("stable_cascade_2pass", bridge_agent)
+    ):
+        features.add("hires_fix")
+    features.update(f"pp:{pp}" for pp in KNOWN_POST_PROCESSORS if check_bridge_capability(pp, bridge_agent))
+    for prefix, karras in (("karras", True), ("sampler", False)):
+        features.update(
+            f"{prefix}:{sampler}" for sampler in get_supported_samplers(bridge_agent, karras) if f"{prefix}:{sampler}" in _CAPABILITY_BITS
+        )
+    step_ceiling = min((_average_steps(model_name) for model_name in model_names), default=None)
+    return ImageCapabilityFingerprint(mask=_bits(features), step_ceiling=step_ceiling)
+
+
+def get_image_worker_fingerprint(worker: Any, model_names: list[str] | set[str]) -> ImageCapabilityFingerprint:
+    """Return the fingerprint of ``worker`` serving ``model_names``."""
+    return _build_image_fingerprint(
+        worker.bridge_agent,
+        frozenset(model_names),
+        bool(worker.allow_img2img),
+        bool(worker.allow_painting),
+        bool(worker.allow_controlnet),
+        bool(worker.allow_sdxl_controlnet),
+        id(model_reference.reference),
+    )
+
+
+def compute_image_requirements(waiting_prompt: Any) -> int | None:
+    """Return the versioned requirement mask of an image request.
+
+    Returns None when the request asks for a sampler outside the layout, leaving
+    the decision to the full capability chain.
+    """
+    params = waiting_prompt.params or {}
+    gen_payload = waiting_prompt.gen_payload or {}
+    features = {"baseline"}
+    if waiting_prompt.source_image:
+        features.add("img2img")
+    if waiting_prompt.source_processing in ["inpainting", "outpainting"]:
+        features.add("painting")
+    else:
+        features.add("txt2img")
+    sampler_name = gen_payload.get("sampler_name", "k_euler_a")
+    sampler_bit = f"karras:{sampler_name}" if gen_payload.get("karras", False) else f"sampler:{sampler_name}"
+    if sampler_bit not in _CAPABILITY_BITS:
+        return None
+    features.add(sampler_bit)
+    post_processing = gen_payload.get("post_processing", [])
+    if len(post_processing) >= 1:
+        features.add("post-processing")
+    features.update(f"pp:{pp}" for pp in post_processing if pp in KNOWN_POST_PROCESSORS)
+    if params.get("tiling"):
+        features.add("tiling")
+    if params.get("return_control_map"):
+        features.add("return_control_map")
+    if params.get("control_type"):
+        features.add("controlnet")
+    if params.get("workflow") == "qr_code":
+        features.add("qr_code")
+    if params.get("hires_fix"):
+        features.add("hires_fix")
+    if params.get("clip_skip", 1) > 1:
+        features.add("clip_skip")
+    if any(lora.get("is_version") for lora in params.get("loras", [])):
+        features.add("lora_versions")
+    return (_bits(features) << _VERSION_BITS) | CAPABILITY_LAYOUT_VERSION
+
+
+def decode_image_requirements(stored: int | None) -> int | None:
+    """Strip the layout version from a stored mask, or return None if it was written under another layout."""
+    if stored is None:
+        return None
+    stored = int(stored)
+    if stored & 0xFF != CAPABILITY_LAYOUT_VERSION:
+        return None
+    return stored >> _VERSION_BITS
@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Durable queue of the side effects of a submit.
+
+A submit used to record the worker performance sample, the fulfilment buckets and
+the generation statistics, each in its own commit, and build its webhook, all
+within the worker's submit request. Only the claim of the generation and its kudos
+postings need to happen there.
+
+``queue_post_submit_job`` adds the rest as rows of ``post_submit_jobs`` to the
+transaction recording the generation, as an outbox: a submit which commits always
+leaves its jobs behind, and one which rolls back leaves none.
+:mod:`horde.database.post_submit` runs them once committed.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON, BigInteger, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from horde.flask import db
+
+_json_type = JSON().with_variant(JSONB(), "postgresql")
+# The session info key listing the jobs queued by its current transaction
+QUEUED_JOBS_KEY = "post_submit_jobs"
+# The session info key listing what the jobs being run leave for after their batch commits
+AFTER_COMMIT_KEY = "post_submit_after_commit"
+
+
+class PostSubmitJob(db.Model):  # type: ignore[name-defined,misc]
+    """A side effect of a submit, run after the submit commits."""
+
+    __tablename__ = "post_submit_jobs"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # Selects the handler of the job, in horde.database.post_submit
+    kind: Mapped[str] = mapped_column(String(30), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(_json_type, nullable=False)
+    created: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # A failed job is retried once past this time
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+def queue_post_submit_job(kind: str, payload: dict[str, Any]) -> PostSubmitJob:
+    """Adds a job to the current transaction. It runs once the transaction commits.
+    The payload is stored as JSON, so it has to hold plain data
+    """
+    job = PostSubmitJob(kind=kind, payload=payload)
+    db.session.add(job)
+    db.session.info.setdefault(QUEUED_JOBS_KEY, []).append(job)
+    return job
+
+
+def after_post_submit_commit(callback: Callable[[], None]) -> None:
+    """Called by a job handler for what can't be rolled back, such as a network call.
+    The callback runs once the batch running the job commits, and is dropped if the job fails
+    """
+    db.session.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
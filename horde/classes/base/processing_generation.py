@@ -2,103 +2,26 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
-import queue
 import random
-import threading
 import time
 from datetime import datetime
-from typing import Any
+from functools import partial
 
-import logfire
-import requests
 from sqlalchemy import JSON
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import expression
 
 from horde.classes.base.kudos import kudos_event
+from horde.classes.base.post_submit import after_post_submit_commit, queue_post_submit_job
 from horde.flask import SQLITE_MODE, db
 from horde.logger import logger
 from horde.utils import get_db_uuid
+from horde.webhook_delivery import WebhookDelivery, webhook_engine
+from horde.wp_status_stream import wp_status_notifier
 
 uuid_column_type = lambda: UUID(as_uuid=True) if not SQLITE_MODE else db.String(36)  # FIXME # noqa E731
 json_column_type = JSONB if not SQLITE_MODE else JSON
 
-# Generation webhooks deliver through this bounded queue instead of on the
-# submit request path: a slow subscriber endpoint (up to three 3-second
-# attempts) would otherwise hold the worker's submit response open for
-# seconds. Delivery is best-effort either way (a failed delivery only logs
-# after the final attempt), so a subscriber observes the same guarantees.
-# The bound keeps one unreachable endpoint from accumulating deliveries
-# without limit; overflow drops the delivery and counts it as an outcome.
-WEBHOOK_QUEUE_MAXSIZE = 256
-_webhook_queue: queue.Queue[tuple[str, dict[str, Any], str, str]] = queue.Queue(maxsize=WEBHOOK_QUEUE_MAXSIZE)
-_webhook_sender_lock = threading.Lock()
-_webhook_sender: threading.Thread | None = None
-
-
-def _ensure_webhook_sender() -> None:
-    # Started lazily on first use so every serving process owns a live thread;
-    # a thread started at import time would not survive a post-import fork.
-    global _webhook_sender
-    if _webhook_sender is not None and _webhook_sender.is_alive():
-        return
-    with _webhook_sender_lock:
-        if _webhook_sender is None or not _webhook_sender.is_alive():
-            _webhook_sender = threading.Thread(target=_webhook_sender_loop, name="webhook-sender", daemon=True)
-            _webhook_sender.start()
-
-
-def _webhook_sender_loop() -> None:
-    while True:
-        url, data, wp_id, procgen_id = _webhook_queue.get()
-        try:
-            _deliver_webhook(url, data, wp_id, procgen_id)
-        except Exception as err:
-            logger.warning(f"Unexpected error delivering generation webhook for procgen {procgen_id}: {err}")
-
-
-def _deliver_webhook(url: str, data: dict[str, Any], wp_id: str, procgen_id: str) -> None:
-    with logfire.span("horde.webhook.send", wp_id=wp_id, procgen_id=procgen_id) as span:
-        from horde.metrics import webhook_duration, webhook_outcomes
-
-        outcome = "giveup"
-        attempts = 0
-        for riter in range(3):
-            attempts += 1
-            t0 = time.monotonic()
-            status_code = None
-            attempt_outcome = "exception"
-            try:
-                req = requests.post(url, json=data, timeout=3)
-                status_code = req.status_code
-                if not req.ok:
-                    attempt_outcome = "http_error"
-                    webhook_duration.record(
-                        time.monotonic() - t0,
-                        {"attempt": riter, "outcome": attempt_outcome, "status_code": status_code},
-                    )
-                    logger.debug(
-                        f"Something went wrong when sending generation webhook: {req.status_code} - {req.text}. "
-                        f"Will retry {3 - riter - 1} more times...",
-                    )
-                    continue
-                attempt_outcome = "ok"
-                outcome = "ok"
-                webhook_duration.record(
-                    time.monotonic() - t0,
-                    {"attempt": riter, "outcome": attempt_outcome, "status_code": status_code},
-                )
-                break
-            except Exception as err:
-                webhook_duration.record(
-                    time.monotonic() - t0,
-                    {"attempt": riter, "outcome": attempt_outcome},
-                )
-                logger.debug(f"Exception when sending generation webhook: {err}. Will retry {3 - riter - 1} more times...")
-        webhook_outcomes.add(1, {"outcome": outcome})
-        span.set_attribute("horde.webhook.outcome", outcome)
-        span.set_attribute("horde.webhook.attempts", attempts)
-
 
 class ProcessingGeneration(db.Model):
     """For storing processing generations in the DB"""
@@ -181,9 +104,8 @@ class ProcessingGeneration(db.Model):
             submit_claim_duration,
             submit_commit_duration,
             submit_gen_kudos_duration,
+            submit_post_submit_queue_duration,
             submit_record_duration,
-            submit_record_performance_duration,
-            submit_webhook_call_duration,
             submit_wp_completion_duration,
         )
 
@@ -237,17 +159,17 @@ class ProcessingGeneration(db.Model):
         _t = time.monotonic()
         self.record(things_per_sec, kudos)
         submit_record_duration.record(time.monotonic() - _t)
+        # The side effects which move no kudos are queued in the transaction recording
+        # the generation, and run off the request once it commits.
+        _t = time.monotonic()
+        self.queue_post_submit_jobs(things_per_sec, kudos)
+        submit_post_submit_queue_duration.record(time.monotonic() - _t, gentype_label)
         _t = time.monotonic()
         db.session.commit()
         submit_commit_duration.record(time.monotonic() - _t)
-        # Persist the worker performance sample AFTER the main commit so its INSERT
-        # on worker_performances does not extend the time the hot `users` row locks
-        # are held above. Performance samples are telemetry, so a separate follow-up
-        # transaction is safe. Retention and the workers.speed average are folded
-        # off the request path by threads.refresh_worker_speeds.
-        _t = time.monotonic()
-        self.worker.record_performance(things_per_sec)
-        submit_record_performance_duration.record(time.monotonic() - _t, gentype_label)
+        from horde.database.post_submit import post_submit_committed
+
+        post_submit_committed()
         _t = time.monotonic()
         if self.wp.is_completed():
             from horde.database.kudos_reservations import release_reservation
@@ -255,13 +177,17 @@ class ProcessingGeneration(db.Model):
             release_reservation(f"upfront:{self.wp.id}")
             db.session.commit()
         submit_wp_completion_duration.record(time.monotonic() - _t, gentype_label)
-        # Queue the webhook after commit; delivery runs on the background
-        # sender thread, so this only measures payload build and enqueue.
-        _t = time.monotonic()
-        self.send_webhook(kudos)
-        submit_webhook_call_duration.record(time.monotonic() - _t)
+        wp_status_notifier.notify(self.wp_id)
         return kudos
 
+    def queue_post_submit_jobs(self, things_per_sec: float, kudos: float) -> None:
+        """Queues the side effects of this submission which move no kudos: the worker
+        performance sample and the webhook. Extended by every horde type with its statistics
+        """
+        self.worker.queue_performance(things_per_sec)
+        if self.wp.webhook:
+            queue_post_submit_job("webhook", {"procgen_id": str(self.id), "kudos": kudos})
+
     def cancel(self) -> float | None:
         """Cancelling requests in progress still rewards/burns the relevant amount of kudos"""
         if self.is_completed() or self.is_faulted():
@@ -280,6 +206,7 @@ class ProcessingGeneration(db.Model):
 
             release_reservation(f"upfront:{self.wp.id}")
             db.session.commit()
+        wp_status_notifier.notify(self.wp_id)
         return kudos * self.worker.get_bridge_kudos_multiplier()
 
     def record(self, things_per_sec, kudos):
@@ -328,6 +255,7 @@ class ProcessingGeneration(db.Model):
         self.worker.log_aborted_job()
         self.log_aborted_generation()
         db.session.commit()
+        wp_status_notifier.notify(self.wp_id)
 
     def log_aborted_generation(self):
         logger.info(f"Aborted Stale Generation {self.id} from by worker: {self.worker.name} ({self.worker.id})")
@@ -387,26 +315,25 @@ class ProcessingGeneration(db.Model):
         return self.wp.things
 
     def send_webhook(self, kudos: float) -> None:
-        """Hand the generation webhook to the background sender.
+        """Hand the generation webhook to the webhook engine."""
+        delivery = self.webhook_delivery(kudos)
+        if delivery is not None:
+            webhook_engine.submit(delivery)
+
+    def webhook_delivery(self, kudos: float) -> WebhookDelivery | None:
+        """Build the generation webhook, or None if the request has none.
 
         The payload is materialized here because it reads session-bound ORM
-        state; the sender thread performs only HTTP I/O on plain data.
+        state; the engine's threads perform only HTTP I/O on plain data.
         """
         if not self.wp.webhook:
-            return
-        from horde.metrics import webhook_outcomes
-
+            return None
         data = self.get_details()
         data["request"] = str(self.wp.id)
         data["id"] = str(self.id)
         data["kudos"] = kudos
         data["worker_id"] = str(data["worker_id"])
-        _ensure_webhook_sender()
-        try:
-            _webhook_queue.put_nowait((self.wp.webhook, data, str(self.wp.id), str(self.id)))
-        except queue.Full:
-            webhook_outcomes.add(1, {"outcome": "dropped"})
-            logger.warning(f"Webhook queue full; dropping delivery for procgen {self.id}")
+        return WebhookDelivery(self.wp.webhook, data, "generation", {"wp_id": str(self.wp.id), "procgen_id": str(self.id)})
 
     def set_job_ttl(self):
         """Returns how many seconds each job request should stay waiting before considering it stale and cancelling it
@@ -414,3 +341,15 @@ class ProcessingGeneration(db.Model):
         """
         self.job_ttl = 150
         db.session.commit()
+
+
+def send_webhooks(webhooks):
+    """Hands the webhooks queued by submits to the webhook engine once their batch commits,
+    so that a batch retried job by job does not send them twice
+    Generations deleted since are skipped
+    """
+    kudos = {webhook["procgen_id"]: webhook["kudos"] for webhook in webhooks}
+    for procgen in db.session.query(ProcessingGeneration).filter(ProcessingGeneration.id.in_(list(kudos))):
+        delivery = procgen.webhook_delivery(kudos[str(procgen.id)])
+        if delivery is not None:
+            after_post_submit_commit(partial(webhook_engine.submit, delivery))
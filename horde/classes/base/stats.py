@@ -2,14 +2,21 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from horde import vars as hv
-from horde.flask import db
+from horde.classes.base.post_submit import queue_post_submit_job
+from horde.flask import SQLITE_MODE, db
 from horde.logger import logger
 
+# The model performance average spans this many minutes of fulfilments
+MODEL_PERFORMANCE_WINDOW = timedelta(hours=1)
+
 
 class ModelPerformance(db.Model):
     __tablename__ = "model_performances"
@@ -31,7 +38,48 @@ class FulfillmentPerformance(db.Model):
     created = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class ModelPerformanceBucket(db.Model):
+    """The fulfilment speeds of one model during one minute.
+    Replaces the one model_performances row per fulfilment, so averaging a model reads at most
+    one row per minute of MODEL_PERFORMANCE_WINDOW, however busy it is
+    """
+
+    __tablename__ = "model_performance_buckets"
+    model = db.Column(db.String(255), primary_key=True)
+    minute = db.Column(db.DateTime(timezone=False), primary_key=True)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    performance_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class FulfillmentBucket(db.Model):
+    """The things fulfilled of one type during one minute. Replaces the one horde_fulfillments row per fulfilment"""
+
+    __tablename__ = "fulfillment_buckets"
+    thing_type = db.Column(db.String(20), primary_key=True)
+    minute = db.Column(db.DateTime(timezone=False), primary_key=True)
+    things = db.Column(db.Float, nullable=False, default=0)
+
+
+def current_minute(now=None):
+    if now is None:
+        now = datetime.utcnow()
+    return now.replace(second=0, microsecond=0)
+
+
+def increment_bucket(bucket_class, dimensions, increments):
+    """Atomically inserts or adds to the columns of one bucket row"""
+    table = bucket_class.__table__
+    insert = sqlite_insert(table) if SQLITE_MODE else postgresql_insert(table)
+    statement = insert.values(dimensions | increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c[name] for name in dimensions],
+        set_={name: table.c[name] + statement.excluded[name] for name in increments},
+    )
+    db.session.execute(statement)
+
+
 def record_fulfilment(procgen, things=None):
+    """Returns the speed of the fulfilment, and queues adding it to its buckets once the submit commits"""
     # TODO: Refactor this so that I don't need to calulcate it in advance for LLMs
     # This will require changing how set_generation() works
     if things is None:
@@ -44,34 +92,88 @@ def record_fulfilment(procgen, things=None):
         things_per_sec = 1
     else:
         things_per_sec = round(things / seconds_taken, 1)
-    new_performance = ModelPerformance(model=model, performance=things_per_sec)
-    new_fulfillment = FulfillmentPerformance(things=things, thing_type=thing_type)
-    db.session.add(new_performance)
-    db.session.add(new_fulfillment)
-    db.session.commit()
+    queue_post_submit_job(
+        "fulfilment",
+        {
+            "model": model,
+            "thing_type": thing_type,
+            "things": things,
+            "things_per_sec": things_per_sec,
+            "minute": current_minute().isoformat(),
+        },
+    )
     logger.debug(things_per_sec)
     return things_per_sec
 
 
+def add_fulfilments(fulfilments):
+    """Adds queued fulfilments to the buckets of the minute they were submitted in, with one increment per bucket
+    The buckets are incremented in a fixed order, so that concurrent runners do not deadlock on them
+    """
+    performances = defaultdict(lambda: [0, 0.0])
+    things = defaultdict(float)
+    for fulfilment in fulfilments:
+        minute = datetime.fromisoformat(fulfilment["minute"])
+        performance = performances[(fulfilment["model"], minute)]
+        performance[0] += 1
+        performance[1] += fulfilment["things_per_sec"]
+        things[(fulfilment["thing_type"], minute)] += fulfilment["things"]
+    for (model, minute), (samples, performance_sum) in sorted(performances.items()):
+        increment_bucket(
+            ModelPerformanceBucket,
+            {"model": model, "minute": minute},
+            {"samples": samples, "performance_sum": performance_sum},
+        )
+    for (thing_type, minute), bucket_things in sorted(things.items()):
+        increment_bucket(FulfillmentBucket, {"thing_type": thing_type, "minute": minute}, {"things": bucket_things})
+
+
 def get_things_per_min(thing_type="image"):
+    """Returns the things fulfilled in the past 60 seconds
+    The bucket of the previous minute is weighted by how much of it is still within those 60 seconds
+    """
+    now = datetime.utcnow()
+    this_minute = current_minute(now)
     total_things = 0
-    last_minute_fulfillments = (
-        db.session.query(FulfillmentPerformance)
-        .filter(
-            FulfillmentPerformance.created >= datetime.utcnow() - timedelta(seconds=60),
-            FulfillmentPerformance.thing_type == thing_type,
-        )
-        .all()
+    buckets = db.session.query(FulfillmentBucket.minute, FulfillmentBucket.things).filter(
+        FulfillmentBucket.thing_type == thing_type,
+        FulfillmentBucket.minute >= this_minute - timedelta(minutes=1),
     )
-    for fulfillment in last_minute_fulfillments:
-        total_things += fulfillment.things
+    for minute, things in buckets:
+        if minute >= this_minute:
+            total_things += things
+        else:
+            total_things += things * (1 - (now - this_minute).total_seconds() / 60)
     things_per_min = round(total_things / hv.thing_divisors[thing_type], 2)
     return things_per_min
 
 
 def get_model_avg(model_name):
-    model_performances_count = db.session.query(ModelPerformance).filter_by(model=model_name).count()
-    if model_performances_count == 0:
-        return 0
-    avg = db.session.query(func.avg(ModelPerformance.performance)).filter_by(model=model_name).scalar()
-    return round(avg, 1)
+    return get_model_avgs([model_name])[model_name]
+
+
+def get_model_avgs(model_names):
+    """Returns the average performance of each of the models over MODEL_PERFORMANCE_WINDOW with a single grouped query
+    Models without any recorded performance average 0
+    """
+    model_avgs = {model_name: 0 for model_name in model_names}
+    if not model_avgs:
+        return model_avgs
+    rows = (
+        db.session.query(
+            ModelPerformanceBucket.model,
+            func.sum(ModelPerformanceBucket.performance_sum),
+            func.sum(ModelPerformanceBucket.samples),
+        )
+        .filter(
+            ModelPerformanceBucket.model.in_(list(model_avgs)),
+            # Exactly the 60 minute buckets of the window, the current one included
+            ModelPerformanceBucket.minute > current_minute() - MODEL_PERFORMANCE_WINDOW,
+        )
+        .group_by(ModelPerformanceBucket.model)
+        .all()
+    )
+    for model_name, performance_sum, samples in rows:
+        if samples:
+            model_avgs[model_name] = round(performance_sum / samples, 1)
+    return model_avgs
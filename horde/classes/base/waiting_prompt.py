@@ -9,10 +9,13 @@ import uuid
 from datetime import datetime, timedelta
 
 import logfire
-from sqlalchemy import JSON, or_
+from sqlalchemy import JSON, and_, case, func, literal_column, or_
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import expression
 
 from horde import vars as hv
@@ -21,6 +24,7 @@ from horde.classes.base.kudos import kudos_event
 from horde.classes.base.processing_generation import ProcessingGeneration
 from horde.classes.kobold.processing_generation import TextProcessingGeneration
 from horde.classes.stable.processing_generation import ImageProcessingGeneration
+from horde.consts import WP_PRIORITY_AGING_PER_SECOND
 from horde.exceptions import is_deadlock_error
 from horde.flask import SQLITE_MODE, db
 from horde.horde_redis import horde_redis as hr
@@ -31,7 +35,10 @@ from horde.metrics import (
     wp_activate_duration,
     wp_activation_age,
 )
+from horde.pop_notifier import pop_notifier
 from horde.utils import get_db_uuid, get_expiry_date, get_extra_slow_expiry_date
+from horde.wp_priority_queue import redis_priority_queue_enabled, wp_priority_queue
+from horde.wp_status_stream import wp_status_notifier
 
 procgen_classes = {
     "template": ProcessingGeneration,
@@ -40,11 +47,52 @@ procgen_classes = {
 }
 
 WP_ACTIVATION_MAX_ATTEMPTS = 4
+EMPTY_PROCGEN_COUNTS = {"finished": 0, "processing": 0, "restarted": 0}
+UNIX_EPOCH = datetime(1970, 1, 1)
 
 json_column_type = JSONB if not SQLITE_MODE else JSON
 uuid_column_type = lambda: UUID(as_uuid=True) if not SQLITE_MODE else db.String(36)  # FIXME # noqa E731
 
 
+def get_queue_priority(extra_priority, created):
+    """The queue sort key of a request with this activation priority, created at ``created``
+
+    A request's effective priority is its extra_priority, plus WP_PRIORITY_AGING_PER_SECOND
+    for every second since it was created. Comparing that of two requests at any moment
+    is the same as comparing this key, which never changes, so the queue order needs no
+    writes as the requests age.
+    """
+    return extra_priority - WP_PRIORITY_AGING_PER_SECOND * (created - UNIX_EPOCH).total_seconds()
+
+
+def count_procgens_per_wp(wp_type, wp_ids):
+    """Counts the finished, processing and restarted generations of many requests with one aggregate query
+    Fake generations are not counted. Requests without any generation are left out of the returned dict
+    """
+    if not wp_ids:
+        return {}
+    procgen_class = procgen_classes[wp_type]
+    completed = procgen_class.generation.isnot(None)
+    rows = (
+        db.session.query(
+            procgen_class.wp_id,
+            func.sum(case((completed, 1), else_=0)),
+            func.sum(case((and_(~completed, procgen_class.faulted.is_(False)), 1), else_=0)),
+            func.sum(case((and_(~completed, procgen_class.faulted.is_(True)), 1), else_=0)),
+        )
+        .filter(
+            procgen_class.wp_id.in_(wp_ids),
+            procgen_class.fake.is_(False),
+        )
+        .group_by(procgen_class.wp_id)
+        .all()
+    )
+    return {
+        wp_id: {"finished": int(finished), "processing": int(processing), "restarted": int(restarted)}
+        for wp_id, finished, processing, restarted in rows
+    }
+
+
 class WPAllowedWorkers(db.Model):
     __tablename__ = "wp_allowed_workers"
     # The pop candidate query and the skipped-count query probe this table with
@@ -94,20 +142,6 @@ class WaitingPrompt(db.Model):
     """For storing waiting prompts in the DB"""
 
     __tablename__ = "waiting_prompts"
-    # The pop candidate queries filter to the active unfilled queue and read it
-    # in priority order; without this partial index they walk the full
-    # extra_priority index and discard the expired majority row by row. The
-    # index orders match the queries' ORDER BY exactly so the scan streams
-    # presorted. The predicate is PostgreSQL-only and ignored on SQLite.
-    __table_args__ = (
-        db.Index(
-            "ix_waiting_prompts_active_queue",
-            "wp_type",
-            db.text("extra_priority DESC"),
-            db.text("created ASC"),
-            postgresql_where=db.text("active AND NOT faulted AND n > 0"),
-        ),
-    )
     __mapper_args__ = {
         "polymorphic_identity": "template",
         "polymorphic_on": "wp_type",
@@ -284,6 +318,14 @@ class WaitingPrompt(db.Model):
             finally:
                 wp_activate_base_commit_duration.record(time.monotonic() - _t_c, {})
 
+    def announce_to_workers(self):
+        """Wakes the long-polling pops which may serve this request, and adds it to the redis priority queue
+        Extending classes call this once their activation has fully completed
+        """
+        pop_notifier.notify(self.wp_type, self.get_model_names())
+        if self.wp_type == "image" and redis_priority_queue_enabled():
+            wp_priority_queue.enqueue(self.wp_type, [(self.id, self.queue_priority, self.get_model_names())])
+
     def get_model_names(self):
         return [m.model for m in self.models]
 
@@ -401,6 +443,7 @@ class WaitingPrompt(db.Model):
                 break
         if gen_span is not None:
             gen_span.set_attribute("horde.procgens_created", len(gens_list))
+        wp_status_notifier.notify(self.id)
         pop_payload = self.get_pop_payload(gens_list, payload)
         return pop_payload
 
@@ -463,31 +506,42 @@ class WaitingPrompt(db.Model):
             .count()
         )
 
-    def is_completed(self):
+    def is_completed(self, procgen_counts=None):
+        """procgen_counts can pass the counts of count_processing_gens() when they are at hand already"""
         if self.faulted:
             return True
         if self.needs_gen():
             return False
-        if self.count_finished_jobs() - self.count_processing_jobs() < self.jobs:
+        if procgen_counts is None:
+            finished_jobs = self.count_finished_jobs()
+            processing_jobs = self.count_processing_jobs()
+        else:
+            # count_finished_jobs() counts restarted generations as finished as well
+            finished_jobs = procgen_counts["finished"] + procgen_counts["restarted"]
+            processing_jobs = procgen_counts["processing"]
+        if finished_jobs - processing_jobs < self.jobs:
             return False
         return True
 
     def count_processing_gens(self):
-        ret_dict = {
-            "finished": 0,
-            "processing": 0,
-            "restarted": 0,
-        }
-        for procgen in self.processing_gens:
-            if procgen.fake:
-                continue
-            if procgen.is_completed():
-                ret_dict["finished"] += 1
-            elif procgen.is_faulted():
-                ret_dict["restarted"] += 1
-            else:
-                ret_dict["processing"] += 1
-        return ret_dict
+        return dict(count_procgens_per_wp(self.wp_type, [self.id]).get(self.id, EMPTY_PROCGEN_COUNTS))
+
+    def get_unfinished_procgens(self):
+        """The generations of this request which have not delivered a result yet
+        Unless processing_gens is loaded already, only these are loaded, sparing the rows of the finished results
+        """
+        if "processing_gens" not in sa_inspect(self).unloaded:
+            return [procgen for procgen in self.processing_gens if not procgen.is_completed()]
+        procgen_class = procgen_classes[self.wp_type]
+        return (
+            db.session.query(procgen_class)
+            .options(joinedload(procgen_class.worker))
+            .filter(
+                procgen_class.wp_id == self.id,
+                procgen_class.generation.is_(None),
+            )
+            .all()
+        )
 
     # FIXME: Looks like this is not used anywhere
     # def get_queued_things(self):
@@ -510,9 +564,18 @@ class WaitingPrompt(db.Model):
         has_valid_workers,
         wp_queue_stats,
         lite=False,
+        procgen_counts=None,
+        unfinished_procgens=None,
     ):
+        """procgen_counts can pass this request's counts from count_procgens_per_wp(),
+        and unfinished_procgens its generations from get_unfinished_procgens_per_wp(),
+        when they were loaded for many requests at once
+        """
         active_worker_thread_count = active_worker_count[1]
-        ret_dict = self.count_processing_gens()
+        if procgen_counts is None:
+            ret_dict = self.count_processing_gens()
+        else:
+            ret_dict = dict(procgen_counts)
         # `self.n` holds the value read when this instance was loaded, which is
         # earlier than the generation counts above: a generation started in
         # between is counted here while `n` still includes the slot it consumed,
@@ -529,7 +592,7 @@ class WaitingPrompt(db.Model):
         if self.n < 0:
             logger.error("Request was popped more times than requested!")
 
-        ret_dict["done"] = self.is_completed()
+        ret_dict["done"] = self.is_completed(procgen_counts=ret_dict)
         ret_dict["faulted"] = self.faulted
         # Lite mode does not include the generations, to spare me download size
         if not lite:
@@ -554,7 +617,9 @@ class WaitingPrompt(db.Model):
         wait_time = queued_things / avg_things_per_sec
         # We add the expected running time of our processing gens
         highest_expected_time_left = 0
-        for procgen in self.processing_gens:
+        if unfinished_procgens is None:
+            unfinished_procgens = self.get_unfinished_procgens()
+        for procgen in unfinished_procgens:
             expected_time_left = procgen.get_expected_time_left()
             if expected_time_left > highest_expected_time_left:
                 highest_expected_time_left = expected_time_left
@@ -666,7 +731,17 @@ class WaitingPrompt(db.Model):
         return False
 
     def get_priority(self):
-        return self.extra_priority
+        """The effective priority of the request, including what it gained while waiting"""
+        return round(self.extra_priority + WP_PRIORITY_AGING_PER_SECOND * (datetime.utcnow() - self.created).total_seconds())
+
+    @hybrid_property
+    def queue_priority(self):
+        return get_queue_priority(self.extra_priority, self.created)
+
+    @queue_priority.expression
+    def queue_priority(cls):
+        # Rendered inline, so that the planner can match it against ix_waiting_prompts_aged_queue
+        return cls.extra_priority - literal_column(str(WP_PRIORITY_AGING_PER_SECOND)) * func.extract("epoch", cls.created)
 
     def refresh_worker_cache(self):
         worker_ids = [worker.worker_id for worker in self.workers]
@@ -699,3 +774,17 @@ class WaitingPrompt(db.Model):
     # To override
     def get_amount_calculation_things(self):
         return self.things
+
+
+# The pop candidate queries filter to the active unfilled queue and read it in
+# queue order; without this partial index they walk the full extra_priority index
+# and discard the expired majority row by row. The index orders match the queries'
+# ORDER BY exactly so the scan streams presorted. The predicate is PostgreSQL-only
+# and ignored on SQLite.
+db.Index(
+    "ix_waiting_prompts_aged_queue",
+    WaitingPrompt.wp_type,
+    expression.Grouping(WaitingPrompt.queue_priority).desc(),
+    WaitingPrompt.created.asc(),
+    postgresql_where=db.text("active AND NOT faulted AND n > 0"),
+)
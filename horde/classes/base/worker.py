@@ -2,9 +2,8 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
-import json
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Any
 
 import logfire
@@ -13,6 +12,7 @@ from sqlalchemy.dialects.postgresql import UUID
 from horde import vars as hv
 from horde.classes.base import settings
 from horde.classes.base.kudos import emit_kudos_stat_event, kudos_event
+from horde.classes.base.post_submit import queue_post_submit_job
 from horde.database.kudos_legacy_projection import (
     project_worker_contribution,
     project_worker_fulfilment,
@@ -21,6 +21,7 @@ from horde.database.kudos_legacy_projection import (
 from horde.discord import send_pause_notification
 from horde.enums import KudosAggregate, KudosEntryType, KudosStatRecord, KudosUnit
 from horde.flask import SQLITE_MODE, db
+from horde.horde_cache import WORKER_MODELS, horde_cache
 from horde.horde_redis import horde_redis as hr
 from horde.logger import logger
 from horde.suspicions import SUSPICION_LOGS, Suspicions
@@ -71,6 +72,23 @@ class WorkerPerformance(db.Model):
     )  # TODO maybe index here, but I'm not sure how big this table is
 
 
+def add_worker_performances(samples):
+    """Appends the performance samples queued by submits
+    Samples of workers deleted since are skipped
+    """
+    worker_ids = {sample["worker_id"] for sample in samples}
+    existing_ids = {str(worker_id) for (worker_id,) in db.session.query(WorkerTemplate.id).filter(WorkerTemplate.id.in_(worker_ids))}
+    db.session.add_all(
+        WorkerPerformance(
+            worker_id=sample["worker_id"],
+            performance=sample["performance"],
+            created=datetime.fromisoformat(sample["created"]),
+        )
+        for sample in samples
+        if sample["worker_id"] in existing_ids
+    )
+
+
 class WorkerBlackList(db.Model):
     __tablename__ = "worker_blacklists"
     id = db.Column(db.Integer, primary_key=True)
@@ -182,6 +200,9 @@ class WorkerTemplate(db.Model):
 
     require_upfront_kudos = False
     prioritized_users = []
+    # Set by ``get_active_workers_details`` on the workers it loaded along with their
+    # stats, models and forms, so that get_details reads those instead of querying them.
+    details_preloaded = False
     # Because I didn't use worker_type correctly. I should have called them "text" and "image"
     # TODO: Normalize this to the standard
     wtype = "image"
@@ -466,9 +487,8 @@ class WorkerTemplate(db.Model):
         )
         project_worker_fulfilment(self, team_id=team_id, raw_things=raw_things, kudos=kudos)
         # Note: deferred commit; caller (procgen.set_generation) commits once at the end.
-        # The worker_performances insert is intentionally NOT done here; it is persisted
-        # separately via record_performance() after the main commit so it does not
-        # lengthen the hot `users` row lock hold. See record_performance().
+        # The worker_performances insert is intentionally NOT done here; the caller
+        # queues it with queue_performance(), so it runs after the submission commits.
         if things_per_sec / hv.thing_divisors[self.wtype] > hv.suspicion_thresholds[self.wtype]:
             self.report_suspicion(
                 reason=Suspicions.UNREASONABLY_FAST,
@@ -495,6 +515,18 @@ class WorkerTemplate(db.Model):
         if commit:
             db.session.commit()
 
+    def queue_performance(self, things_per_sec: float) -> None:
+        """Queue a worker performance sample, appended once the submission commits.
+
+        The submit path records its sample this way, so the insert is done by the
+        post-submit runner (``horde.database.post_submit``) rather than in the
+        worker's request.
+        """
+        queue_post_submit_job(
+            "worker_performance",
+            {"worker_id": str(self.id), "performance": things_per_sec, "created": datetime.utcnow().isoformat()},
+        )
+
     def modify_kudos(
         self,
         kudos: float,
@@ -582,7 +614,10 @@ class WorkerTemplate(db.Model):
         db.session.commit()
 
     def get_kudos_details(self):
-        kudos_details = db.session.query(WorkerStats).filter_by(worker_id=self.id).all()
+        if self.details_preloaded:
+            kudos_details = self.stats
+        else:
+            kudos_details = db.session.query(WorkerStats).filter_by(worker_id=self.id).all()
         ret_dict = {}
         for kd in kudos_details:
             ret_dict[kd.action] = kd.value
@@ -714,26 +749,15 @@ class Worker(WorkerTemplate):
         # would republish a stale list. A direct query always reflects what was written.
         models_list = [row.model for row in db.session.query(WorkerModel.model).filter_by(worker_id=self.id).all()]
         try:
-            hr.horde_r_setex(
-                f"worker_{self.id}_model_cache",
-                timedelta(seconds=600),
-                json.dumps(models_list),
-            )
+            horde_cache.set(WORKER_MODELS, models_list, self.id)
         except Exception as err:
             logger.debug(f"Error when trying to set models cache: {err}. Retrieving from DB.")
         return models_list
 
     def get_model_names(self):
-        if hr.horde_r is None:
+        if hr.horde_r is None or self.details_preloaded:
             return [m.model for m in self.models]
-        model_cache = hr.horde_r_get(f"worker_{self.id}_model_cache")
-        if not model_cache:
-            return self.refresh_model_cache()
-        try:
-            models_ret = json.loads(model_cache)
-        except TypeError:
-            logger.error(f"Model cache could not be loaded: {model_cache}")
-            return self.refresh_model_cache()
+        models_ret = horde_cache.get(WORKER_MODELS, self.id)
         if models_ret is None:
             return self.refresh_model_cache()
         return models_ret
@@ -751,6 +775,9 @@ class Worker(WorkerTemplate):
             db.session.add(model)
         db.session.commit()
         self.refresh_model_cache()
+        from horde.database.model_aggregates import available_models_aggregate
+
+        available_models_aggregate.worker_models_changed(self.id)
 
     def parse_models(self, models):
         """Parses the models provided by the worker into a set
@@ -12,25 +12,42 @@ from horde.logger import logger
 
 
 def record_text_statistic(procgen):
+    add_text_statistics([text_statistic_payload(procgen)])
+    db.session.commit()
+
+
+def text_statistic_payload(procgen):
+    """Returns the statistic of a generation as plain data. The submit path queues it as a post-submit job"""
     state = ImageGenState.OK
     # Currently there's no way to record cancelled images, but maybe there will be in the future
     if procgen.cancelled:
         state = ImageGenState.CANCELLED
     elif procgen.faulted:
         state = ImageGenState.FAULTED
-    statistic = TextGenerationStatistic(
-        created=procgen.start_time,
-        model=procgen.model,
-        max_length=procgen.wp.max_length,
-        max_context_length=procgen.wp.max_context_length,
-        softprompt=procgen.wp.softprompt,
-        prompt_length=len(procgen.wp.prompt),
-        bridge_agent=procgen.worker.bridge_agent,
-        client_agent=procgen.wp.client_agent,
-        state=state,
-    )
-    db.session.add(statistic)
-    db.session.commit()
+    return {
+        "finished": datetime.utcnow().isoformat(),
+        "created": procgen.start_time.isoformat(),
+        "model": procgen.model,
+        "max_length": procgen.wp.max_length,
+        "max_context_length": procgen.wp.max_context_length,
+        "softprompt": procgen.wp.softprompt,
+        "prompt_length": len(procgen.wp.prompt),
+        "bridge_agent": procgen.worker.bridge_agent,
+        "client_agent": procgen.wp.client_agent,
+        "state": state.name,
+    }
+
+
+def add_text_statistics(statistics):
+    """Adds the rows of statistics returned by text_statistic_payload()"""
+    for statistic in statistics:
+        columns = dict(
+            statistic,
+            finished=datetime.fromisoformat(statistic["finished"]),
+            created=datetime.fromisoformat(statistic["created"]),
+            state=ImageGenState[statistic["state"]],
+        )
+        db.session.add(TextGenerationStatistic(**columns))
 
 
 class TextGenerationStatistic(db.Model):
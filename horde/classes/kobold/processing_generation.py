@@ -10,11 +10,12 @@ from horde import vars as hv
 from horde.bridge_reference import (
     is_backed_validated,
 )
+from horde.classes.base.post_submit import queue_post_submit_job
 from horde.classes.base.processing_generation import ProcessingGeneration
-from horde.classes.kobold.genstats import record_text_statistic
+from horde.classes.kobold.genstats import record_text_statistic, text_statistic_payload
 from horde.flask import db
 from horde.logger import logger
-from horde.metrics import submit_genstats_record_duration, submit_state_handling_duration
+from horde.metrics import submit_state_handling_duration
 from horde.model_reference import model_reference
 from horde.suspicions import Suspicions
 
@@ -111,11 +112,11 @@ class TextProcessingGeneration(ProcessingGeneration):
             db.session.commit()
         submit_state_handling_duration.record(time.monotonic() - state_t0, {"horde.gentype": "text"})
 
-        kudos = super().set_generation(generation, things_per_sec, **kwargs)
-        genstats_t0 = time.monotonic()
-        record_text_statistic(self)
-        submit_genstats_record_duration.record(time.monotonic() - genstats_t0, {"horde.gentype": "text"})
-        return kudos
+        return super().set_generation(generation, things_per_sec, **kwargs)
+
+    def queue_post_submit_jobs(self, things_per_sec, kudos):
+        super().queue_post_submit_jobs(things_per_sec, kudos)
+        queue_post_submit_job("text_statistic", text_statistic_payload(self))
 
     def get_things_count(self, generation=None):
         if generation is None:
@@ -73,6 +73,7 @@ class TextWaitingPrompt(WaitingPrompt):
             f"New text2text prompt with ID {self.id} by {self.user.get_unique_alias()}{proxied_account}: "
             f"max_length:{self.max_length} * n:{self.n} == {self.total_usage} Total Tokens",
         )
+        self.announce_to_workers()
 
     def calculate_extra_kudos_burn(self, kudos):
         # This represents the cost of using the resources of the horde
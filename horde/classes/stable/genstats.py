@@ -103,9 +103,20 @@ class ImageGenerationStatistic(db.Model):
 
 
 def record_image_statistic(procgen):
+    statistic = image_statistic_payload(procgen)
+    if statistic is None:
+        return
+    add_image_statistics([statistic])
+    db.session.commit()
+
+
+def image_statistic_payload(procgen):
+    """Returns the statistic of a generation as plain data, or None if it is not recorded
+    The submit path queues it as a post-submit job
+    """
     # We don't record stats for special models
     if "horde_special" in procgen.model:
-        return
+        return None
     state = ImageGenState.OK
     if procgen.censored:
         state = ImageGenState.CENSORED
@@ -114,55 +125,61 @@ def record_image_statistic(procgen):
         state = ImageGenState.CANCELLED
     elif procgen.faulted:
         state = ImageGenState.FAULTED
-    statistic = ImageGenerationStatistic(
-        created=procgen.start_time,
-        model=procgen.model,
-        width=procgen.wp.width,
-        height=procgen.wp.height,
-        steps=procgen.wp.params["steps"],
-        cfg=procgen.wp.params["cfg_scale"],
-        sampler=procgen.wp.params["sampler_name"],
-        prompt_length=len(procgen.wp.prompt),
-        negprompt="###" in procgen.wp.prompt,
-        hires_fix=procgen.wp.params.get("hires_fix", False),
-        tiling=procgen.wp.params.get("tiling", False),
-        img2img=procgen.wp.source_image != None,  # noqa E711
-        nsfw=procgen.wp.nsfw,
-        bridge_agent=procgen.worker.bridge_agent,
-        client_agent=procgen.wp.client_agent,
-        state=state,
-    )
-    db.session.add(statistic)
-    db.session.commit()
-    # face_fixers = ["GFPGAN", "CodeFormers"]
-    # upscalers = ["RealESRGAN_x4plus"]
-    post_processors = procgen.wp.params.get("post_processing", [])
-    if len(post_processors) > 0:
-        for pp in post_processors:
-            new_pp_entry = ImageGenerationStatisticPP(imgstat_id=statistic.id, pp=pp)
-            db.session.add(new_pp_entry)
-        db.session.commit()
-    # For now we support only one control_type per request, but in the future we might allow more
-    # So I set it up on an external table to be able to expand
-    if procgen.wp.params.get("control_type", None):
-        new_cn_entry = ImageGenerationStatisticCN(
-            imgstat_id=statistic.id,
-            control_type=procgen.wp.params["control_type"],
+    return {
+        "finished": datetime.utcnow().isoformat(),
+        "created": procgen.start_time.isoformat(),
+        "model": procgen.model,
+        "width": procgen.wp.width,
+        "height": procgen.wp.height,
+        "steps": procgen.wp.params["steps"],
+        "cfg": procgen.wp.params["cfg_scale"],
+        "sampler": procgen.wp.params["sampler_name"],
+        "prompt_length": len(procgen.wp.prompt),
+        "negprompt": "###" in procgen.wp.prompt,
+        "hires_fix": procgen.wp.params.get("hires_fix", False),
+        "tiling": procgen.wp.params.get("tiling", False),
+        "img2img": procgen.wp.source_image != None,  # noqa E711
+        "nsfw": procgen.wp.nsfw,
+        "bridge_agent": procgen.worker.bridge_agent,
+        "client_agent": procgen.wp.client_agent,
+        "state": state.name,
+        "post_processors": procgen.wp.params.get("post_processing", []),
+        # For now we support only one control_type per request, but in the future we might allow more
+        # So I set it up on an external table to be able to expand
+        "control_type": procgen.wp.params.get("control_type", None),
+        "loras": [lora["name"] for lora in procgen.wp.params.get("loras", [])],
+        "tis": [ti["name"] for ti in procgen.wp.params.get("tis", [])],
+    }
+
+
+def add_image_statistics(statistics):
+    """Adds the rows of statistics returned by image_statistic_payload()"""
+    for statistic in statistics:
+        db.session.add(
+            ImageGenerationStatistic(
+                finished=datetime.fromisoformat(statistic["finished"]),
+                created=datetime.fromisoformat(statistic["created"]),
+                model=statistic["model"],
+                width=statistic["width"],
+                height=statistic["height"],
+                steps=statistic["steps"],
+                cfg=statistic["cfg"],
+                sampler=statistic["sampler"],
+                prompt_length=statistic["prompt_length"],
+                negprompt=statistic["negprompt"],
+                hires_fix=statistic["hires_fix"],
+                tiling=statistic["tiling"],
+                img2img=statistic["img2img"],
+                nsfw=statistic["nsfw"],
+                bridge_agent=statistic["bridge_agent"],
+                client_agent=statistic["client_agent"],
+                state=ImageGenState[statistic["state"]],
+                post_processors=[ImageGenerationStatisticPP(pp=pp) for pp in statistic["post_processors"]],
+                controlnet=[ImageGenerationStatisticCN(control_type=statistic["control_type"])] if statistic["control_type"] else [],
+                loras=[ImageGenerationStatisticLora(lora=lora) for lora in statistic["loras"]],
+                tis=[ImageGenerationStatisticTI(ti=ti) for ti in statistic["tis"]],
+            ),
         )
-        db.session.add(new_cn_entry)
-        db.session.commit()
-    loras = procgen.wp.params.get("loras", [])
-    if len(loras) > 0:
-        for lora in loras:
-            new_lora_entry = ImageGenerationStatisticLora(imgstat_id=statistic.id, lora=lora["name"])
-            db.session.add(new_lora_entry)
-        db.session.commit()
-    tis = procgen.wp.params.get("tis", [])
-    if len(tis) > 0:
-        for ti in tis:
-            new_ti_entry = ImageGenerationStatisticTI(imgstat_id=statistic.id, ti=ti["name"])
-            db.session.add(new_ti_entry)
-        db.session.commit()
 
 
 class CompiledImageGenStatsTotals(db.Model):
@@ -8,7 +8,6 @@ import json
 from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 
-import requests
 from sqlalchemy import JSON, Enum
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 
@@ -21,6 +20,7 @@ from horde.horde_redis import horde_redis as hr
 from horde.logger import logger
 from horde.r2 import generate_procgen_download_url, generate_procgen_upload_url
 from horde.utils import get_db_uuid, get_expiry_date, get_interrogation_form_expiry_date
+from horde.webhook_delivery import WebhookDelivery, webhook_engine
 
 if TYPE_CHECKING:
     from horde.classes.stable.interrogation_worker import InterrogationWorker
@@ -225,18 +225,8 @@ class InterrogationForms(db.Model):
         data["id"] = str(self.id)
         data["kudos"] = kudos
         data["worker_id"] = str(data["worker_id"])
-        for riter in range(3):
-            try:
-                req = requests.post(self.interrogation.webhook, json=data, timeout=3)
-                if not req.ok:
-                    logger.debug(
-                        f"Something went wrong when sending alchemy webhook: {req.status_code} - {req.text}. "
-                        f"Will retry {3 - riter - 1} more times...",
-                    )
-                    continue
-                break
-            except Exception as err:
-                logger.debug(f"Exception when sending alchemy webhook: {err}. Will retry {3 - riter - 1} more times...")
+        span_attributes = {"interrogation_id": str(self.interrogation.id), "form_id": str(self.id)}
+        webhook_engine.submit(WebhookDelivery(self.interrogation.webhook, data, "alchemy", span_attributes))
 
 
 class Interrogation(db.Model):
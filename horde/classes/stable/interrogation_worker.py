@@ -120,6 +120,8 @@ class InterrogationWorker(WorkerTemplate):
         #     self.report_suspicion(reason = Suspicions.UNREASONABLY_FAST, formats=[round(things_per_sec / thing_divisor,2)])
 
     def get_form_names(self):
+        if self.details_preloaded:
+            return list(dict.fromkeys(f.form for f in self.forms))
         form_names = (
             db.session.query(func.distinct(WorkerInterrogationForm.form).label("name"))
             .filter(WorkerInterrogationForm.worker_id == self.id)
@@ -4,6 +4,8 @@
 
 import pathlib
 import sys
+import threading
+from collections import OrderedDict
 
 import numpy as np
 from loguru import logger
@@ -20,6 +22,9 @@ class KudosModel:
         # If our job JSON is in "payload":
         kudos = kudos_model.calculate_kudos(payload)
 
+        # Or the predicted times of many payloads at once:
+        times = kudos_model.predict_batch(payloads)
+
     """
 
     # "The general idea is for a 50 step 512x512 image to cost 10 Kudos"
@@ -104,6 +109,10 @@ class KudosModel:
     _instance = None
     """Process-wide singleton; KudosModel() returns this after the first call."""
 
+    MEMO_ENTRIES = 4096
+    """How many predicted times are remembered, keyed by their feature vector.
+    Requests repeat a handful of parameter sets, so most predictions are lookups."""
+
     def __new__(cls, model_filename=None):
         if cls._instance is not None:
             return cls._instance
@@ -132,6 +141,8 @@ class KudosModel:
             return
         # Share the singleton weights; inference is read-only.
         self.model = KudosModel._model
+        self.memo = OrderedDict()
+        self.memo_lock = threading.Lock()
         self.calculate_basis_time()
         self._initialized = True
 
@@ -269,12 +280,39 @@ class KudosModel:
 
     # Pass in a horde payload, get back a predicted time in seconds
     def payload_to_time(self, payload):
-        inputs = self.payload_to_vector(payload).squeeze()
+        return self.predict_batch([payload])[0]
+
+    def forward(self, inputs):
+        """Runs the model on a matrix of feature vectors, one per row, and returns a column of times"""
         for weight, bias in self.model[:-1]:
             inputs = np.maximum(inputs @ weight.T + bias, 0)
         weight, bias = self.model[-1]
-        output = inputs @ weight.T + bias
-        return round(float(output.item()), 2)
+        return inputs @ weight.T + bias
+
+    def predict_batch(self, payloads):
+        """Pass in horde payloads, get back their predicted times in seconds, in order.
+        The payloads whose feature vector was not seen recently are run through the model in one pass.
+        """
+        vectors = [self.payload_to_vector(payload) for payload in payloads]
+        keys = [vector.tobytes() for vector in vectors]
+        times = [None] * len(keys)
+        with self.memo_lock:
+            for idx, key in enumerate(keys):
+                if key in self.memo:
+                    self.memo.move_to_end(key)
+                    times[idx] = self.memo[key]
+        missing = [idx for idx, job_time in enumerate(times) if job_time is None]
+        if not missing:
+            return times
+        outputs = self.forward(np.concatenate([vectors[idx] for idx in missing], axis=0))
+        with self.memo_lock:
+            for idx, output in zip(missing, outputs[:, 0], strict=True):
+                times[idx] = round(float(output), 2)
+                self.memo[keys[idx]] = times[idx]
+                self.memo.move_to_end(keys[idx])
+            while len(self.memo) > self.MEMO_ENTRIES:
+                self.memo.popitem(last=False)
+        return times
 
     # Determine how long the basic job that costs KUDOS_BASIS kudos takes to run
     def calculate_basis_time(self):
@@ -2,30 +2,28 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
-import json
-import os
 import time
 
 import logfire
 
+from horde.classes.base.post_submit import queue_post_submit_job
 from horde.classes.base.processing_generation import ProcessingGeneration
-from horde.classes.stable.genstats import record_image_statistic
+from horde.classes.stable.genstats import image_statistic_payload, record_image_statistic
 from horde.flask import db
 from horde.image import convert_b64_to_pil, convert_pil_to_b64
 from horde.logger import logger
 from horde.metrics import (
-    submit_genstats_record_duration,
     submit_server_upload_duration,
     submit_state_handling_duration,
 )
 from horde.model_reference import model_reference
 from horde.r2 import (
-    check_shared_image,
     download_procgen_image,
     generate_procgen_download_url,
+    r2_uploader,
     upload_generated_image,
     upload_shared_generated_image,
-    upload_shared_metadata,
+    upload_shared_generation_metadata,
 )
 
 
@@ -36,8 +34,10 @@ class ImageProcessingGeneration(ProcessingGeneration):
     wp = db.relationship("ImageWaitingPrompt", back_populates="processing_gens")
     worker = db.relationship("ImageWorker", back_populates="processing_gens")
 
-    def get_details(self):
-        """Returns a dictionary with details about this processing generation"""
+    def get_details(self, download_url=None):
+        """Returns a dictionary with details about this processing generation
+        download_url can pass the R2 download URL of the image, when it was signed for many images at once
+        """
         generation = self.generation
         if generation == "R2":
             if not self.wp.r2:
@@ -47,7 +47,7 @@ class ImageProcessingGeneration(ProcessingGeneration):
                 else:
                     generation = convert_pil_to_b64(img)
             else:
-                generation = generate_procgen_download_url(str(self.id), self.wp.shared)
+                generation = download_url or generate_procgen_download_url(str(self.id), self.wp.shared)
         ret_dict = {
             "img": generation,
             "seed": self.seed,
@@ -138,6 +138,8 @@ class ImageProcessingGeneration(ProcessingGeneration):
             if not image:
                 logger.error("Could not convert b64 image from the worker to PIL to upload!")
             else:
+                # Not handed to the uploader pool: the generation is reported done, with its download URL,
+                # as soon as it is recorded below
                 upload_t0 = time.monotonic()
                 upload_method(image, filename)
                 submit_server_upload_duration.record(
@@ -147,9 +149,6 @@ class ImageProcessingGeneration(ProcessingGeneration):
                 # This signifies to send the download URL
                 generation = "R2"
         kudos = super().set_generation(generation, things_per_sec, **kwargs)
-        genstats_t0 = time.monotonic()
-        record_image_statistic(self)
-        submit_genstats_record_duration.record(time.monotonic() - genstats_t0, {"horde.gentype": "image"})
         if self.wp.shared and not self.fake and generation == "R2":
             metadata_t0 = time.monotonic()
             self.upload_generation_metadata()
@@ -166,21 +165,21 @@ class ImageProcessingGeneration(ProcessingGeneration):
             )
         return kudos
 
+    def queue_post_submit_jobs(self, things_per_sec, kudos):
+        super().queue_post_submit_jobs(things_per_sec, kudos)
+        statistic = image_statistic_payload(self)
+        if statistic is not None:
+            queue_post_submit_job("image_statistic", statistic)
+
     def upload_generation_metadata(self):
-        if not check_shared_image(f"{self.id}.webp"):
-            logger.warning(f"Avoiding json metadata upload because {self.id}.webp doesn't seem to exist.")
-            return
+        """Hands the shared dataset metadata to the background uploader.
+        The metadata is read here, as it reads session-bound ORM state
+        """
         metadict = self.wp.get_share_metadata()
         metadict["seed"] = self.seed
         metadict["model"] = self.model
         metadict["censored"] = self.censored
-        filename = f"{self.id}.json"
-        json_object = json.dumps(metadict, indent=4)
-        # Writing to sample.json
-        with open(filename, "w") as f:
-            f.write(json_object)
-        upload_shared_metadata(filename)
-        os.remove(filename)
+        r2_uploader.submit("metadata", upload_shared_generation_metadata, str(self.id), metadict)
 
     def set_job_ttl(self):
         # We are aiming here for a graceful min 2sec/it speed on workers for 512x512 which is well below our requested min 0.5mps/s,
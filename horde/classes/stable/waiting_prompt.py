@@ -13,8 +13,9 @@ from sqlalchemy.sql import expression
 
 from horde import vars as hv
 from horde.bridge_reference import check_bridge_capability
+from horde.capability_fingerprint import compute_image_requirements, decode_image_requirements
 from horde.classes.base.waiting_prompt import WaitingPrompt
-from horde.classes.stable.kudos import KudosModel
+from horde.classes.stable.kudos import kudos_model
 from horde.consts import (
     BASELINE_BATCHING_MULTIPLIERS,
     HEAVY_POST_PROCESSORS,
@@ -37,9 +38,11 @@ from horde.model_reference import model_reference
 from horde.r2 import (
     download_source_image,
     download_source_mask,
+    generate_procgen_download_urls,
     generate_procgen_upload_url,
 )
 from horde.utils import get_random_seed
+from horde.wp_status_stream import wp_status_notifier
 
 
 class ImageWaitingPrompt(WaitingPrompt):
@@ -79,6 +82,10 @@ class ImageWaitingPrompt(WaitingPrompt):
         passive_deletes=True,
         cascade="all, delete-orphan",
     )
+    # The worker capabilities this request needs, as a versioned bitset computed at
+    # activation (see horde.capability_fingerprint). NUMERIC because the layout is
+    # wider than a BIGINT.
+    capability_requirements = db.Column(db.Numeric(38, 0), nullable=True)
 
     @logger.catch(reraise=True)
     def extract_params(self):
@@ -236,9 +243,21 @@ class ImageWaitingPrompt(WaitingPrompt):
             prompt_payload = {}
             self.faulted = True
             db.session.commit()
+            wp_status_notifier.notify(self.id)
         # logger.debug([payload,prompt_payload])
         return prompt_payload
 
+    def get_capability_requirements(self) -> int | None:
+        """Return this request's capability requirement bitset.
+
+        Falls back to computing it when the stored mask is missing (a request
+        activated before the column existed) or was written under another layout.
+        """
+        requirements = decode_image_requirements(self.capability_requirements)
+        if requirements is None:
+            requirements = decode_image_requirements(compute_image_requirements(self))
+        return requirements
+
     def activate(self, downgrade_wp_priority=False, source_image=None, source_mask=None, extra_source_images=None, kudos_adjustment=0):
         # We separate the activation from __init__ as often we want to check if there's a valid worker for it
         # Before we add it to the queue
@@ -252,6 +271,8 @@ class ImageWaitingPrompt(WaitingPrompt):
             prompt_type = "txt2img"
             if self.source_image:
                 prompt_type = self.source_processing
+            # Persisted by the commit at the end of calculate_kudos.
+            self.capability_requirements = compute_image_requirements(self)
             with logfire.span("horde.wp.calculate_kudos", wp_id=str(self.id)):
                 _t_kudos = time.monotonic()
                 try:
@@ -313,6 +334,7 @@ class ImageWaitingPrompt(WaitingPrompt):
                 wp_activate_post_kudos_duration.record(time.monotonic() - _t_pk, {})
         finally:
             wp_activate_post_super_duration.record(time.monotonic() - _t_post, {})
+        self.announce_to_workers()
 
     def seed_to_int(self, s=None):
         if isinstance(s, int):
@@ -380,7 +402,6 @@ class ImageWaitingPrompt(WaitingPrompt):
         #
         # Model based calculation
         #
-        kudos_model = KudosModel()
         try:
             model_params = self.params.copy()
             ## IMPORTANT: When adjusting this, also adjust ImageAsyncGenerate.get_hashed_params_dict()
@@ -549,7 +570,15 @@ class ImageWaitingPrompt(WaitingPrompt):
         return ret_dict
 
     def get_generations(self):
-        generations = super().get_generations()
+        procgens = [procgen for procgen in self.processing_gens if not procgen.fake and procgen.is_completed()]
+        download_urls = {}
+        if self.r2:
+            # Sign the download URLs of all the images at once, rather than one by one in get_details()
+            download_urls = generate_procgen_download_urls(
+                [procgen.id for procgen in procgens if procgen.generation == "R2"],
+                self.shared,
+            )
+        generations = [procgen.get_details(download_url=download_urls.get(str(procgen.id))) for procgen in procgens]
         if "SDXL_beta::stability.ai#6901" in self.get_model_names():
             random.shuffle(generations)
         return generations
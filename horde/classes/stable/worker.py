@@ -10,6 +10,7 @@ from horde.bridge_reference import (
     is_latest_bridge_version,
     is_official_bridge_version,
 )
+from horde.capability_fingerprint import ImageCapabilityFingerprint, get_image_worker_fingerprint
 from horde.classes.base.worker import Worker
 from horde.consts import KNOWN_POST_PROCESSORS
 from horde.flask import db
@@ -53,6 +54,8 @@ class ImageWorker(Worker):
         if self.paused:
             paused_string = "(Paused) "
         db.session.commit()
+        # Build the capability bitset now so the pops that follow only probe the cache
+        self.get_capability_fingerprint()
         logger.trace(
             f"{paused_string}Stable Worker {self.name} checked-in, offering models {self.get_model_names()} "
             f"at {self.max_pixels} max pixels",
@@ -64,12 +67,76 @@ class ImageWorker(Worker):
             baseline += 30
         return baseline
 
+    def get_capability_fingerprint(self, model_names=None) -> ImageCapabilityFingerprint:
+        """Return the capability bitset of this worker's current configuration.
+
+        Memoized per distinct configuration, so after the first lookup (normally at
+        check_in) this costs one cache probe.
+        """
+        if model_names is None:
+            model_names = self.get_model_names()
+        return get_image_worker_fingerprint(self, model_names)
+
     def can_generate(self, waiting_prompt):
         can_generate = super().can_generate(waiting_prompt)
         if not can_generate[0]:
             return [can_generate[0], can_generate[1]]
         # Cache these to avoid repeated Redis lookups within this method
         my_model_names = self.get_model_names()
+        fingerprint = self.get_capability_fingerprint(my_model_names)
+        requirements = waiting_prompt.get_capability_requirements()
+        # The bitset subset test settles the common case. Only when it fails (or the
+        # request cannot be encoded) is the full chain walked, to name the reason.
+        if requirements is None or not fingerprint.satisfies(requirements):
+            skipped = self._capability_skip_reason(waiting_prompt, my_model_names)
+            if skipped is not None:
+                return skipped
+        if not waiting_prompt.safe_ip and not self.allow_unsafe_ipaddr:
+            return [False, "unsafe_ip"]
+        if self.limit_max_steps:
+            if len(waiting_prompt.get_model_names()) > 1:
+                for mn in waiting_prompt.get_model_names():
+                    avg_steps = (
+                        int(
+                            model_reference.get_model_requirements(mn).get("min_steps", 20)
+                            + model_reference.get_model_requirements(mn).get("max_steps", 40),
+                        )
+                        / 2
+                    )
+                    if waiting_prompt.get_accurate_steps() > avg_steps:
+                        return [False, "step_count"]
+            # If the request has an empty model list, we compare instead to the worker's model list
+            elif fingerprint.step_ceiling is not None and waiting_prompt.get_accurate_steps() > fingerprint.step_ceiling:
+                return [False, "step_count"]
+        # We do not give untrusted workers anon or VPN generations, to avoid anything slipping by and spooking them.
+        # logger.warning(datetime.utcnow())
+        if not self.user.trusted:  # FIXME #noqa SIM102
+            # if waiting_prompt.user.is_anon():
+            #    return [False, 'untrusted']
+            if not waiting_prompt.safe_ip and not waiting_prompt.user.trusted:
+                return [False, "untrusted"]
+        if not self.allow_post_processing and len(waiting_prompt.gen_payload.get("post_processing", [])) >= 1:
+            return [False, "post-processing"]
+        # When the worker requires upfront kudos, the user has to have the required kudos upfront
+        # But we allowe prioritized and trusted users to bypass this
+        if self.require_upfront_kudos:
+            user_actual_kudos = waiting_prompt.user.kudos
+            # We don't want to take into account minimum kudos
+            if user_actual_kudos > 0:
+                user_actual_kudos -= waiting_prompt.user.get_min_kudos()
+            if (
+                not waiting_prompt.user.trusted
+                and waiting_prompt.user.get_unique_alias() not in self.prioritized_users
+                and user_actual_kudos < waiting_prompt.kudos
+            ):
+                return [False, "kudos"]
+        return [True, None]
+
+    def _capability_skip_reason(self, waiting_prompt, my_model_names):
+        """Walk the bridge, sampler and model checks the capability bitset encodes.
+
+        Returns ``[False, reason]`` for the first failing check, or None when all pass.
+        """
         my_baselines = model_reference.get_all_model_baselines(my_model_names)
         # logger.warning(datetime.utcnow())
         if waiting_prompt.source_image and not check_bridge_capability("img2img", self.bridge_agent):
@@ -160,55 +227,7 @@ class ImageWorker(Worker):
             self.bridge_agent,
         ):
             return [False, "bridge_version"]
-        if not waiting_prompt.safe_ip and not self.allow_unsafe_ipaddr:
-            return [False, "unsafe_ip"]
-        if self.limit_max_steps:
-            if len(waiting_prompt.get_model_names()) > 1:
-                for mn in waiting_prompt.get_model_names():
-                    avg_steps = (
-                        int(
-                            model_reference.get_model_requirements(mn).get("min_steps", 20)
-                            + model_reference.get_model_requirements(mn).get("max_steps", 40),
-                        )
-                        / 2
-                    )
-                    if waiting_prompt.get_accurate_steps() > avg_steps:
-                        return [False, "step_count"]
-            else:
-                # If the request has an empty model list, we compare instead to the worker's model list
-                for mn in my_model_names:
-                    avg_steps = (
-                        int(
-                            model_reference.get_model_requirements(mn).get("min_steps", 20)
-                            + model_reference.get_model_requirements(mn).get("max_steps", 40),
-                        )
-                        / 2
-                    )
-                    if waiting_prompt.get_accurate_steps() > avg_steps:
-                        return [False, "step_count"]
-        # We do not give untrusted workers anon or VPN generations, to avoid anything slipping by and spooking them.
-        # logger.warning(datetime.utcnow())
-        if not self.user.trusted:  # FIXME #noqa SIM102
-            # if waiting_prompt.user.is_anon():
-            #    return [False, 'untrusted']
-            if not waiting_prompt.safe_ip and not waiting_prompt.user.trusted:
-                return [False, "untrusted"]
-        if not self.allow_post_processing and len(waiting_prompt.gen_payload.get("post_processing", [])) >= 1:
-            return [False, "post-processing"]
-        # When the worker requires upfront kudos, the user has to have the required kudos upfront
-        # But we allowe prioritized and trusted users to bypass this
-        if self.require_upfront_kudos:
-            user_actual_kudos = waiting_prompt.user.kudos
-            # We don't want to take into account minimum kudos
-            if user_actual_kudos > 0:
-                user_actual_kudos -= waiting_prompt.user.get_min_kudos()
-            if (
-                not waiting_prompt.user.trusted
-                and waiting_prompt.user.get_unique_alias() not in self.prioritized_users
-                and user_actual_kudos < waiting_prompt.kudos
-            ):
-                return [False, "kudos"]
-        return [True, None]
+        return None
 
     def get_details(self, details_privilege=0):
         ret_dict = super().get_details(details_privilege)
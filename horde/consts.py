@@ -5,6 +5,10 @@
 HORDE_VERSION = "5.1.5"
 HORDE_API_VERSION = "2.5"
 
+# The priority a queued generation request gains for every second it waits,
+# so that the requests which waited longest move up the queue
+WP_PRIORITY_AGING_PER_SECOND = 5
+
 WHITELISTED_SERVICE_IPS = {
     "212.227.227.178",  # Turing Bot
     "5.189.169.230",  # Discord Bot
@@ -29,12 +29,16 @@ def start_background_threads():
     import horde.database.threads as threads
     from horde.argparser import args
     from horde.database.classes import CachedPasskeys, Quorum
+    from horde.database.post_submit import post_submit_runner
     from horde.logger import logger
     from horde.threads import PrimaryTimedFunction
 
     quorum = Quorum(1, threads.get_quorum)
     PrimaryTimedFunction(1, threads.store_prioritized_wp_queue, quorum=quorum)
     PrimaryTimedFunction(30, threads.store_worker_list, quorum=quorum)
+    # Keeps every active request's wp_has_valid_workers verdict warm, so status polls
+    # read it from redis instead of scanning the workers themselves.
+    PrimaryTimedFunction(10, threads.store_wp_validity, quorum=quorum)
     PrimaryTimedFunction(10, threads.store_available_models, quorum=quorum)
     if not args.check_prompts:
         PrimaryTimedFunction(60, threads.check_waiting_prompts, quorum=quorum)
@@ -53,11 +57,13 @@ def start_background_threads():
     PrimaryTimedFunction(60, threads.store_totals, quorum=quorum)
     PrimaryTimedFunction(60, threads.prune_stats, quorum=quorum)
     PrimaryTimedFunction(3600, threads.prune_compiled_stats, quorum=quorum)
-    PrimaryTimedFunction(10, threads.increment_extra_priority, quorum=quorum)
     PrimaryTimedFunction(10, threads.store_compiled_filter_regex, quorum=quorum)
     PrimaryTimedFunction(10, threads.store_compiled_filter_regex_replacements, quorum=quorum)
     PrimaryTimedFunction(300, threads.store_known_image_models, quorum=quorum)
     set_cached_passkeys(CachedPasskeys(5, threads.refresh_passkeys))
+    # Not quorum-bound: every node runs the side effects of its own submits, and takes
+    # over the ones left behind by a node which went down.
+    post_submit_runner.start()
 
     if args.reload_all_caches:
         logger.info("store_prioritized_wp_queue()")
@@ -2,11 +2,13 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import hashlib
 import json
 import os
 import time
 import urllib.parse
 import uuid
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 import logfire
@@ -23,7 +25,13 @@ from horde.classes.base.detection import Filter
 from horde.classes.base.kudos import KudosLedger, kudos_event
 from horde.classes.base.style import Style, StyleCollection, StyleModel, StyleTag
 from horde.classes.base.user import KudosTransferLog, User, UserRecords, UserSharedKey
-from horde.classes.base.waiting_prompt import WaitingPrompt, WPAllowedWorkers, WPModels
+from horde.classes.base.waiting_prompt import (
+    EMPTY_PROCGEN_COUNTS,
+    WaitingPrompt,
+    WPAllowedWorkers,
+    WPModels,
+    count_procgens_per_wp,
+)
 from horde.classes.base.worker import WorkerMessage, WorkerModel, WorkerPerformance
 from horde.classes.kobold.processing_generation import TextProcessingGeneration
 from horde.classes.kobold.waiting_prompt import TextWaitingPrompt
@@ -33,16 +41,20 @@ from horde.classes.stable.interrogation_worker import InterrogationWorker
 from horde.classes.stable.processing_generation import ImageProcessingGeneration
 from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
 from horde.classes.stable.worker import ImageWorker
-from horde.database.classes import FakeWPRow
 from horde.database.kudos_legacy_projection import consume_user_reservation
 from horde.database.kudos_reservations import reserve_kudos
+from horde.database.model_aggregates import available_models_aggregate
+from horde.database.wp_candidate_index import image_wp_index, wp_candidate_index_enabled
+from horde.database.wp_queue_positions import get_published_queue_stats
 from horde.enums import KudosAuditDetail, KudosEntryType, State
 from horde.flask import SQLITE_MODE, db
+from horde.horde_cache import ACTIVE_WORKER_COUNTS, AVAILABLE_MODELS, BOOL_SERIALIZER, TOTALS, CacheSpec, horde_cache
 from horde.horde_redis import horde_redis as hr
 from horde.logger import logger
 from horde.metrics import kudos_transfers_idempotent_replays, pop_query_duration
 from horde.model_reference import model_reference
 from horde.utils import hash_api_key, validate_regex
+from horde.wp_priority_queue import redis_priority_queue_enabled, wp_priority_queue
 
 ALLOW_ANONYMOUS = True
 type KudosTransferResult = list[int | float | str | bool | None]
@@ -55,6 +67,10 @@ WP_CLASS_MAP = {
     "image": ImageWaitingPrompt,
     "text": TextWaitingPrompt,
 }
+PROCGEN_CLASS_MAP = {
+    "image": ImageProcessingGeneration,
+    "text": TextProcessingGeneration,
+}
 
 
 def get_anon():
@@ -109,29 +125,108 @@ def get_active_workers(worker_type=None):
     return active_workers
 
 
+def get_active_workers_details(details_privileges=(0,)):
+    """Returns the details of all active workers, for each of ``details_privileges``
+
+    Everything ``get_details`` reads is loaded upfront with a few grouped queries per
+    worker type, rather than lazily per worker, so the cost does not grow with the
+    number of workers in round trips.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=300)
+    details = {privilege: [] for privilege in details_privileges}
+    for worker_class in WORKER_CLASS_MAP.values():
+        options = [
+            joinedload(worker_class.user).selectinload(User.roles),
+            joinedload(worker_class.team),
+            selectinload(worker_class.stats),
+            selectinload(worker_class.suspicions),
+            selectinload(worker_class.messages),
+        ]
+        if worker_class is InterrogationWorker:
+            options += [selectinload(InterrogationWorker.forms), selectinload(InterrogationWorker.performance)]
+        else:
+            options.append(selectinload(worker_class.models))
+        workers = (
+            db.session.query(worker_class)
+            .options(*options)
+            .filter(worker_class.last_check_in > cutoff)
+            # Workers already in the session would otherwise keep their stale collections
+            .execution_options(populate_existing=True)
+            .all()
+        )
+        for worker in workers:
+            worker.details_preloaded = True
+            for privilege in details_privileges:
+                details[privilege].append(worker.get_details(privilege))
+    return details
+
+
+# The quorum republishes these every 30 seconds; this only expires them if it stops.
+WORKER_LIST_RESPONSES_TTL = timedelta(seconds=300)
+EMPTY_LIST_ETAG = hashlib.sha1(b"[]").hexdigest()
+
+
+def worker_list_responses_key(details_privilege):
+    return f"worker_list_responses_{details_privilege}"
+
+
+def store_worker_list_responses(details_privilege, marshalled_workers):
+    """Publishes the JSON bodies of the workers list endpoint at this privilege, as one redis hash
+    It holds the list of all workers, the list per worker type and per lowercase name, each with its ETag
+    """
+    groups = {"all": marshalled_workers}
+    for worker in marshalled_workers:
+        groups.setdefault(f"type:{worker['type']}", []).append(worker)
+        groups.setdefault(f"name:{worker['name'].lower()}", []).append(worker)
+    responses = {}
+    for field, workers in groups.items():
+        body = json.dumps(workers)
+        responses[field] = body
+        responses[f"etag:{field}"] = hashlib.sha1(body.encode()).hexdigest()
+    hr.horde_r_replace_hash(worker_list_responses_key(details_privilege), responses, WORKER_LIST_RESPONSES_TTL)
+
+
+def get_worker_list_response(details_privilege, worker_type=None, name=None):
+    """Returns the body and ETag of the workers list response published by the quorum,
+    filtered by name or else by worker type as the endpoint does
+    Returns None if nothing was published
+    """
+    if name:
+        field = f"name:{name.lower()}"
+    elif worker_type:
+        field = f"type:{worker_type}"
+    else:
+        field = "all"
+    body, etag, published = hr.horde_r_hmget(worker_list_responses_key(details_privilege), [field, f"etag:{field}", "etag:all"])
+    if published is None:
+        return None
+    # The filter matched no worker
+    if body is None:
+        return "[]", EMPTY_LIST_ETAG
+    return body, etag if isinstance(etag, str) else etag.decode()
+
+
 def count_active_workers(worker_class="image"):
-    worker_cache = hr.horde_r_get_json(f"count_active_workers_{worker_class}")
-    if worker_cache:
-        return tuple(worker_cache)
     WorkerClass = ImageWorker
     if worker_class == "interrogation":
         WorkerClass = InterrogationWorker
     if worker_class == "text":
         WorkerClass = TextWorker
-    active_workers = db.session.query(WorkerClass).filter(WorkerClass.last_check_in > datetime.utcnow() - timedelta(seconds=300)).count()
-    active_workers_threads = (
-        db.session.query(func.sum(WorkerClass.threads).label("threads"))
-        .filter(WorkerClass.last_check_in > datetime.utcnow() - timedelta(seconds=300))
-        .first()
-    )
-    # logger.debug([worker_class,active_workers,active_workers_threads.threads])
-    if active_workers and active_workers_threads.threads:
-        hr.horde_r_setex_json(
-            f"count_active_workers_{worker_class}",
-            timedelta(seconds=300),
-            [active_workers, active_workers_threads.threads],
+
+    def count():
+        cutoff = datetime.utcnow() - timedelta(seconds=300)
+        active_workers = db.session.query(WorkerClass).filter(WorkerClass.last_check_in > cutoff).count()
+        active_workers_threads = (
+            db.session.query(func.sum(WorkerClass.threads).label("threads")).filter(WorkerClass.last_check_in > cutoff).first()
         )
-        return active_workers, active_workers_threads.threads
+        # logger.debug([worker_class,active_workers,active_workers_threads.threads])
+        if active_workers and active_workers_threads.threads:
+            return [active_workers, active_workers_threads.threads]
+        return None
+
+    worker_counts = horde_cache.get_or_load(ACTIVE_WORKER_COUNTS, worker_class, loader=count)
+    if worker_counts:
+        return tuple(worker_counts)
     return 0, 0
 
 
@@ -230,7 +325,14 @@ def find_user_by_contact(contact):
 def find_user_by_api_key(api_key):
     if api_key == 0000000000 and not ALLOW_ANONYMOUS:
         return None
-    user = db.session.query(User).filter_by(api_key=hash_api_key(api_key)).filter(User.oauth_id != "<wiped>").first()
+    hashed_api_key = hash_api_key(api_key)
+    user = (
+        db.session.query(User)
+        .options(joinedload(User.roles))
+        .filter_by(api_key=hashed_api_key)
+        .filter(User.oauth_id != "<wiped>")
+        .first()
+    )
     return user
 
 
@@ -335,6 +437,11 @@ def workers_exist(worker_ids):
 
 
 def get_available_models(filter_model_name: str = None):
+    """Returns the details of the models served or queued
+
+    The full list is summed from the incrementally refreshed ``available_models_aggregate``.
+    A filtered lookup of a single model queries its totals directly.
+    """
     models_dict = {}
     available_worker_models = None
 
@@ -360,58 +467,65 @@ def get_available_models(filter_model_name: str = None):
         # If we're doing a filter, and we've already found the model type, we don't want to look in other worker versions
         if filter_model_name and available_worker_models and len(available_worker_models) > 0:
             continue
-        available_worker_models = (
-            db.session.query(
-                WorkerModel.model,
-                func.sum(worker_class.threads).label("total_threads"),
-                # worker_class.id.label('worker_id') # TODO: make the query return a list or workers serving this model?
-            )
-            .join(
-                worker_class,
-            )
-            .filter(
-                worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
-                worker_class.maintenance == False,  # noqa E712
-            )
-        )
         if filter_model_name:
-            available_worker_models = available_worker_models.filter(WorkerModel.model == filter_model_name)
-        available_worker_models = available_worker_models.group_by(WorkerModel.model).all()
+            available_worker_models = (
+                db.session.query(
+                    WorkerModel.model,
+                    func.sum(worker_class.threads).label("total_threads"),
+                    # worker_class.id.label('worker_id') # TODO: make the query return a list or workers serving this model?
+                )
+                .join(
+                    worker_class,
+                )
+                .filter(
+                    worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
+                    worker_class.maintenance == False,  # noqa E712
+                    WorkerModel.model == filter_model_name,
+                )
+                .group_by(WorkerModel.model)
+                .all()
+            )
+        else:
+            aggregate = available_models_aggregate.refresh(model_type)
+            available_worker_models = list(aggregate.threads.items())
         # logger.debug(available_worker_models)
-        for model_row in available_worker_models:
-            model_name = model_row.model
+        for model_name, total_threads in available_worker_models:
             # We don't want to publicly display special models
             if not filter_model_name and "horde_special" in model_name:
                 continue
             models_dict[model_name] = {}
             models_dict[model_name]["name"] = model_name
-            models_dict[model_name]["count"] = model_row.total_threads
+            models_dict[model_name]["count"] = total_threads
             models_dict[model_name]["type"] = model_type
 
             models_dict[model_name]["queued"] = 0
             models_dict[model_name]["jobs"] = 0
             models_dict[model_name]["eta"] = 0
-            models_dict[model_name]["performance"] = stats.get_model_avg(model_name)
+            models_dict[model_name]["performance"] = 0
             models_dict[model_name]["workers"] = []
 
-        known_models = [filter_model_name] if filter_model_name else list(model_reference.stable_diffusion_names)
-        ophan_models = (
-            db.session.query(
-                WPModels.model,
-            )
-            .join(
-                wp_class,
-            )
-            .filter(
-                WPModels.model.not_in(list(models_dict.keys())),
-                WPModels.model.in_(known_models),
-                wp_class.n > 0,
+        if filter_model_name:
+            ophan_models = (
+                db.session.query(
+                    WPModels.model,
+                )
+                .join(
+                    wp_class,
+                )
+                .filter(
+                    WPModels.model.not_in(list(models_dict.keys())),
+                    WPModels.model == filter_model_name,
+                    wp_class.n > 0,
+                )
+                .group_by(WPModels.model)
+                .all()
             )
-            .group_by(WPModels.model)
-            .all()
-        )
-        for model_row in ophan_models:
-            model_name = model_row.model
+            ophan_models = [model_row.model for model_row in ophan_models]
+        else:
+            # Only the models of active requests are orphaned, as only those are still waiting for a worker
+            known_models = model_reference.stable_diffusion_names
+            ophan_models = [model_name for model_name in aggregate.things if model_name not in models_dict and model_name in known_models]
+        for model_name in ophan_models:
             models_dict[model_name] = {}
             models_dict[model_name]["name"] = model_name
             models_dict[model_name]["count"] = 0
@@ -419,7 +533,7 @@ def get_available_models(filter_model_name: str = None):
             models_dict[model_name]["jobs"] = 0
             models_dict[model_name]["type"] = model_type
             models_dict[model_name]["eta"] = 0
-            models_dict[model_name]["performance"] = stats.get_model_avg(model_name)
+            models_dict[model_name]["performance"] = 0
             models_dict[model_name]["workers"] = []
         if filter_model_name:
             things_per_model, jobs_per_model = count_things_for_specific_model(
@@ -428,7 +542,10 @@ def get_available_models(filter_model_name: str = None):
                 filter_model_name,
             )
         else:
-            things_per_model, jobs_per_model = count_things_per_model(wp_class)
+            things_per_model, jobs_per_model = aggregate.things, aggregate.jobs
+        model_avgs = stats.get_model_avgs([model_name for model_name in models_dict if models_dict[model_name]["type"] == model_type])
+        for model_name, performance in model_avgs.items():
+            models_dict[model_name]["performance"] = performance
         # If we request a lite_dict, we only want worker count per model and a dict format
         for model_name in things_per_model:
             # This shouldn't happen, but I'm checking anyway
@@ -448,14 +565,7 @@ def get_available_models(filter_model_name: str = None):
 
 def retrieve_available_models(model_type=None, min_count=None, max_count=None, model_state="known"):
     """Retrieves model details from Redis cache, or from DB if cache is unavailable"""
-    if hr.horde_r is None:
-        return get_available_models()
-    model_cache = hr.horde_r_get("models_cache")
-    try:
-        models_ret = json.loads(model_cache)
-    except TypeError:
-        logger.error(f"Model cache could not be loaded: {model_cache}")
-        return []
+    models_ret = horde_cache.get(AVAILABLE_MODELS)
     if models_ret is None:
         models_ret = get_available_models()
     if model_type is not None:
@@ -819,7 +929,7 @@ def retrieve_totals(ignore_cache=False):
     """Retrieves horde totals from Redis cache"""
     if ignore_cache or hr.horde_r is None:
         return count_totals()
-    totals_ret = hr.horde_r_get("totals_cache")
+    totals_ret = horde_cache.get(TOTALS)
     if totals_ret is None:
         return {
             "queued_requests": 0,
@@ -828,7 +938,8 @@ def retrieve_totals(ignore_cache=False):
             f"queued_{hv.thing_names['text']}": 0,
             "queued_forms": 0,
         }
-    return json.loads(totals_ret)
+    # The cached dict is shared by every reader of this process, and callers such as HordeLoad add their own keys to it
+    return dict(totals_ret)
 
 
 def get_organized_wps_by_model(wp_class):
@@ -836,13 +947,14 @@ def get_organized_wps_by_model(wp_class):
     # TODO: Offload the sorting to the DB through join() + SELECT statements
     all_wps = (
         db.session.query(wp_class)
+        .options(selectinload(wp_class.models))
         .filter(
             wp_class.active == True,  # noqa E712
             wp_class.faulted == False,  # noqa E712
             wp_class.n >= 1,
         )
         .all()
-    )  # TODO this can likely be improved
+    )
     for wp in all_wps:
         # Each wp we have will be placed on the list for each of it allowed models (in case it's selected multiple)
         # This will inflate the overall expected times, but it shouldn't be by much.
@@ -860,9 +972,11 @@ def count_things_per_model(wp_class):
     things_per_model = {}
     jobs_per_model = {}
     org = get_organized_wps_by_model(wp_class)
+    wp_ids = list({wp.id for wps in org.values() for wp in wps})
+    procgen_counts = count_procgens_per_wp(wp_class.__mapper__.polymorphic_identity, wp_ids)
     for model in org:
         for wp in org[model]:
-            current_wp_queue = wp.n + wp.count_processing_gens()["processing"]
+            current_wp_queue = wp.n + procgen_counts.get(wp.id, EMPTY_PROCGEN_COUNTS)["processing"]
             if current_wp_queue > 0:
                 things_per_model[model] = things_per_model.get(model, 0) + wp.things
                 jobs_per_model[model] = jobs_per_model.get(model, 0) + current_wp_queue
@@ -916,15 +1030,49 @@ def count_things_for_specific_model(wp_class, procgen_class, model_name):
     return things, jobs
 
 
-@logger.catch(reraise=True)
-def get_sorted_wp_filtered_to_worker(worker, models_list=None, blacklist=None, priority_user_ids=None, page=0):
-    import time as _time
+# How many index candidates past the requested page are handed to the locking
+# query, so rows it drops (locked by another pop, or finished since the index last
+# refreshed) do not leave the page short.
+WP_INDEX_CANDIDATE_SLACK = 50
 
-    t0 = _time.monotonic()
-    # This is just the top 3 - Adjusted method to send ImageWorker object. Filters to add.
-    # TODO: Filter by ImageWorker not in WP.tricked_worker
-    # TODO: If any word in the prompt is in the WP.blacklist rows, then exclude it (L293 in base.worker.ImageWorker.gan_generate())
-    PER_PAGE = 10  # how many requests we're picking up to filter further
+
+def get_sorted_wp_from_candidate_index(worker, models_list=None, priority_user_ids=None, page=0, per_page=10):
+    """Resolve one page of the image pop candidates through the in-memory index.
+
+    The index performs the routing filters; the database is only asked to lock the
+    chosen rows, re-checking the volatile columns the index may hold stale values for.
+    """
+    image_wp_index.refresh()
+    candidate_ids = image_wp_index.candidate_ids(
+        worker,
+        models_list or [],
+        priority_user_ids=priority_user_ids,
+        require_matched_targeting=os.getenv("HORDE_REQUIRE_MATCHED_TARGETING", "0") == "1",
+    )
+    candidate_ids = candidate_ids[: per_page * (page + 1) + WP_INDEX_CANDIDATE_SLACK]
+    if not candidate_ids:
+        return []
+    return (
+        db.session.query(ImageWaitingPrompt)
+        .options(noload(ImageWaitingPrompt.processing_gens))
+        .filter(
+            ImageWaitingPrompt.id.in_(candidate_ids),
+            ImageWaitingPrompt.n > 0,
+            ImageWaitingPrompt.active == True,  # noqa E712
+            ImageWaitingPrompt.faulted == False,  # noqa E712
+            ImageWaitingPrompt.expiry > datetime.utcnow(),
+        )
+        .order_by(ImageWaitingPrompt.queue_priority.desc(), ImageWaitingPrompt.created.asc())
+        .offset(per_page * page)
+        .limit(per_page)
+        .populate_existing()
+        .with_for_update(skip_locked=True, of=ImageWaitingPrompt)
+        .all()
+    )
+
+
+def query_image_wps_for_worker(worker, models_list, priority_user_ids=None):
+    """Returns an unordered query of the queued image requests this worker may serve"""
     # The model constraint is a semi-join: joining wp_models returns one row per
     # matching model, and the page LIMIT below counts joined rows, so a WP
     # naming several of the worker's models would consume several page slots as
@@ -1087,10 +1235,106 @@ def get_sorted_wp_filtered_to_worker(worker, models_list=None, blacklist=None, p
                     ),
                 ),
             )
+    return final_wp_list
+
+
+# How many times the requested page the redis priority queue path reads from the
+# top of the worker's model sets, before falling back to the full query when too
+# few of them are admissible.
+WP_PRIORITY_QUEUE_WINDOW_FACTOR = 5
 
+
+def get_sorted_wp_from_priority_queue(worker, models_list=None, priority_user_ids=None, page=0, per_page=10):
+    """Resolve one page of the image pop candidates through the redis priority queue
+
+    Reads the top of the sorted sets of the worker's models, and asks the database which of
+    those the worker may serve. Returns None if that window holds too few of them to fill
+    the page while the sets hold more, or if redis can't be read, in which case the caller
+    runs the full query.
+    """
+    models_list = models_list or []
+    needed = per_page * (page + 1)
+    include_modelless = (
+        not any("horde_special" in mname for mname in models_list) and "SDXL_beta::stability.ai#6901" not in models_list
+    )
+    top_candidates = wp_priority_queue.top_candidates(
+        "image",
+        models_list,
+        include_modelless,
+        needed * WP_PRIORITY_QUEUE_WINDOW_FACTOR,
+    )
+    if top_candidates is None:
+        return None
+    candidate_ids, exhausted = top_candidates
+    if not candidate_ids:
+        return []
+    # The sorted sets pick the window, which is then ordered exactly as the full query orders it
+    admissible = [
+        row.id
+        for row in query_image_wps_for_worker(worker, models_list, priority_user_ids)
+        .filter(ImageWaitingPrompt.id.in_(candidate_ids))
+        .with_entities(ImageWaitingPrompt.id)
+        .order_by(ImageWaitingPrompt.queue_priority.desc(), ImageWaitingPrompt.created.asc())
+    ]
+    if len(admissible) < needed and not exhausted:
+        return None
+    page_ids = admissible[per_page * page : needed]
+    if not page_ids:
+        return []
+    results = (
+        db.session.query(ImageWaitingPrompt)
+        .options(noload(ImageWaitingPrompt.processing_gens))
+        .filter(
+            ImageWaitingPrompt.id.in_(page_ids),
+            ImageWaitingPrompt.n > 0,
+            ImageWaitingPrompt.active == True,  # noqa E712
+            ImageWaitingPrompt.faulted == False,  # noqa E712
+            ImageWaitingPrompt.expiry > datetime.utcnow(),
+        )
+        .populate_existing()
+        .with_for_update(skip_locked=True, of=ImageWaitingPrompt)
+        .all()
+    )
+    queue_order = {wp_id: position for position, wp_id in enumerate(page_ids)}
+    return sorted(results, key=lambda wp: queue_order[wp.id])
+
+
+@logger.catch(reraise=True)
+def get_sorted_wp_filtered_to_worker(worker, models_list=None, blacklist=None, priority_user_ids=None, page=0):
+    import time as _time
+
+    t0 = _time.monotonic()
+    if wp_candidate_index_enabled():
+        with logfire.span(
+            "horde.db.get_sorted_wp",
+            worker_id=str(worker.id),
+            page=page,
+            has_priority=priority_user_ids is not None,
+            candidate_index=True,
+        ):
+            results = get_sorted_wp_from_candidate_index(worker, models_list, priority_user_ids, page)
+        pop_query_duration.record(_time.monotonic() - t0, {"horde.page": page, "horde.candidate_index": True})
+        return results
+    if redis_priority_queue_enabled():
+        with logfire.span(
+            "horde.db.get_sorted_wp",
+            worker_id=str(worker.id),
+            page=page,
+            has_priority=priority_user_ids is not None,
+            redis_queue=True,
+        ):
+            results = get_sorted_wp_from_priority_queue(worker, models_list, priority_user_ids, page)
+        if results is not None:
+            pop_query_duration.record(_time.monotonic() - t0, {"horde.page": page, "horde.redis_queue": True})
+            return results
+    # This is just the top 3 - Adjusted method to send ImageWorker object. Filters to add.
+    # TODO: Filter by ImageWorker not in WP.tricked_worker
+    # TODO: If any word in the prompt is in the WP.blacklist rows, then exclude it (L293 in base.worker.ImageWorker.gan_generate())
+    PER_PAGE = 10  # how many requests we're picking up to filter further
+    final_wp_list = query_image_wps_for_worker(worker, models_list, priority_user_ids)
     # logger.debug(final_wp_list)
     final_wp_list = (
-        final_wp_list.order_by(ImageWaitingPrompt.extra_priority.desc(), ImageWaitingPrompt.created.asc())
+        final_wp_list.order_by(ImageWaitingPrompt.queue_priority.desc(), ImageWaitingPrompt.created.asc())
         .offset(PER_PAGE * page)
         .limit(PER_PAGE)
     )
@@ -1417,43 +1661,21 @@ def get_sorted_forms_filtered_to_worker(worker, forms_list=None, priority_user_i
 # Returns the queue position of the provided WP based on kudos
 # Also returns the amount of things until the wp is generated
 # Also returns the amount of different gens queued
-# In-process cache for pre-computed queue positions (refreshed at most once per second)
-_wp_queue_positions_cache = {"image": {}, "text": {}}
-_wp_queue_positions_time = {"image": 0.0, "text": 0.0}
-
-
 def get_wp_queue_stats(wp):
     if not wp.needs_gen():
         return (-1, 0, 0)
-    wp_type = wp.wp_type
-    now = time.time()
-    # Refresh in-process cache at most once per second per wp_type
-    if now - _wp_queue_positions_time.get(wp_type, 0) > 1:
-        cached_positions = hr.horde_r_get(f"{wp_type}_wp_queue_positions")
-        if cached_positions is not None:
-            try:
-                parsed = json.loads(cached_positions)
-                _wp_queue_positions_cache[wp_type] = parsed
-                _wp_queue_positions_time[wp_type] = now
-            except (TypeError, ValueError):
-                pass
-    positions = _wp_queue_positions_cache.get(wp_type, {})
-    wp_stats = positions.get(str(wp.id))
+    wp_stats = get_published_queue_stats(wp.wp_type, wp.id)
     if wp_stats is not None:
-        return tuple(wp_stats)
-    # Check if we have positions data at all; if so, WP is not in the queue
-    if positions:
-        return (-1, 0, 0)
-    # Fall back to legacy computation if pre-computed positions unavailable
+        return wp_stats
+    # Fall back to computing the position if the quorum did not publish them
     with logfire.span("horde.db.get_wp_queue_stats", wp_id=str(wp.id), wp_type=wp.wp_type):
         things_ahead_in_queue = 0
         n_ahead_in_queue = 0
-        priority_sorted_list = retrieve_prioritized_wp_queue(wp.wp_type)
-        if priority_sorted_list is None:
+        if hr.horde_r is not None:
             logger.warning(
-                "Cached WP priority query does not exist. Falling back to direct DB query. Please check thread on primary!",
+                "Published WP queue positions do not exist. Falling back to direct DB query. Please check thread on primary!",
             )
-            priority_sorted_list = query_prioritized_wps(wp.wp_type)
+        priority_sorted_list = query_prioritized_wps(wp.wp_type)
         for riter in range(len(priority_sorted_list)):
             iter_wp = priority_sorted_list[riter]
             queued_things = round(iter_wp.things * iter_wp.n / hv.thing_divisors["image"], 2)
@@ -1465,6 +1687,131 @@ def get_wp_queue_stats(wp):
         return (-1, 0, 0)
 
 
+# The quorum republishes the snapshot every second; this only expires it if it stops.
+WP_LITE_STATUS_TTL = timedelta(seconds=5)
+
+
+def wp_lite_status_key(wp_type):
+    return f"{wp_type}_wp_lite_status"
+
+
+def get_unfinished_procgens_per_wp(wp_type, wp_ids):
+    """Returns the generations of these requests which have not delivered a result yet, keyed by request ID,
+    with their workers, in one query instead of one per request
+    get_lite_status only reads their expected time left. The counts of the generations are passed from count_procgens_per_wp()
+    """
+    unfinished = {wp_id: [] for wp_id in wp_ids}
+    if not wp_ids:
+        return unfinished
+    procgen_class = PROCGEN_CLASS_MAP[wp_type]
+    procgens = (
+        db.session.query(procgen_class)
+        .options(joinedload(procgen_class.worker))
+        .filter(
+            procgen_class.wp_id.in_(wp_ids),
+            procgen_class.generation.is_(None),
+        )
+        .all()
+    )
+    for procgen in procgens:
+        unfinished[procgen.wp_id].append(procgen)
+    return unfinished
+
+
+def store_wp_lite_statuses(wp_type, queue_positions):
+    """Publishes the lite status of every active request of this type as one redis hash keyed by request ID
+    Status checks answer from it with a single HGET and only compute the status themselves on a miss
+    queue_positions are the queue stats the caller just computed, keyed by request ID
+    """
+    wp_class = WP_CLASS_MAP[wp_type]
+    wps = (
+        db.session.query(wp_class)
+        .filter(
+            wp_class.active == True,  # noqa E712
+            wp_class.expiry > datetime.utcnow(),
+        )
+        .all()
+    )
+    request_avg = get_request_avg(wp_type)
+    active_worker_count = count_active_workers(wp_type)
+    cached_validities = horde_cache.get_many(WP_VALIDITY, [wp.id for wp in wps])
+    procgen_counts = count_procgens_per_wp(wp_type, [wp.id for wp in wps])
+    unfinished_procgens = get_unfinished_procgens_per_wp(wp_type, [wp.id for wp in wps])
+    snapshot = {}
+    for wp, cached_validity in zip(wps, cached_validities, strict=True):
+        if cached_validity is not None:
+            has_valid_workers = cached_validity
+        else:
+            has_valid_workers = wp_has_valid_workers(wp)
+        lite_status = wp.get_lite_status(
+            request_avg=request_avg,
+            has_valid_workers=has_valid_workers,
+            wp_queue_stats=tuple(queue_positions.get(str(wp.id), (-1, 0, 0))),
+            active_worker_count=active_worker_count,
+            procgen_counts=procgen_counts.get(wp.id, EMPTY_PROCGEN_COUNTS),
+            unfinished_procgens=unfinished_procgens[wp.id],
+        )
+        snapshot[str(wp.id)] = json.dumps(lite_status)
+    hr.horde_r_replace_hash(wp_lite_status_key(wp_type), snapshot, WP_LITE_STATUS_TTL)
+
+
+def get_cached_wp_lite_status(wp_type, wp_id):
+    """Returns the lite status of a request from the snapshot published by the quorum
+    Returns None if the request is not in it, such as when it was created after the last snapshot
+    """
+    try:
+        wp_uuid = uuid.UUID(wp_id)
+    except ValueError:
+        return None
+    cached_status = hr.horde_r_hget(wp_lite_status_key(wp_type), str(wp_uuid))
+    if cached_status is None:
+        return None
+    return json.loads(cached_status)
+
+
+def get_wp_lite_statuses(wp_type, wp_ids):
+    """Returns the lite status of many requests of this type, keyed by request ID
+    Requests in the quorum's snapshot are read with one HMGET and the rest are loaded with one IN query,
+    sharing a single computation of the request average and the active worker count
+    IDs which are not UUIDs or do not match a request are left out
+    """
+    wp_uuids = {}
+    for wp_id in wp_ids:
+        try:
+            wp_uuids[wp_id] = uuid.UUID(wp_id)
+        except ValueError:
+            logger.debug(f"Non-UUID wp_id sent: '{wp_id}'.")
+    statuses = {}
+    missing = {}
+    cached_statuses = hr.horde_r_hmget(wp_lite_status_key(wp_type), [str(wp_uuid) for wp_uuid in wp_uuids.values()])
+    for (wp_id, wp_uuid), cached_status in zip(wp_uuids.items(), cached_statuses, strict=True):
+        if cached_status is not None:
+            statuses[wp_id] = json.loads(cached_status)
+        else:
+            missing[str(wp_uuid)] = wp_id
+    if not missing:
+        return statuses
+    wp_class = WP_CLASS_MAP[wp_type]
+    query_ids = list(missing) if SQLITE_MODE else [uuid.UUID(wp_uuid) for wp_uuid in missing]
+    wps = db.session.query(wp_class).filter(wp_class.id.in_(query_ids)).all()
+    if not wps:
+        return statuses
+    request_avg = get_request_avg(wp_type)
+    active_worker_count = count_active_workers(wp_type)
+    procgen_counts = count_procgens_per_wp(wp_type, [wp.id for wp in wps])
+    unfinished_procgens = get_unfinished_procgens_per_wp(wp_type, [wp.id for wp in wps])
+    for wp in wps:
+        statuses[missing[str(wp.id)]] = wp.get_lite_status(
+            request_avg=request_avg,
+            has_valid_workers=wp_has_valid_workers(wp),
+            wp_queue_stats=get_wp_queue_stats(wp),
+            active_worker_count=active_worker_count,
+            procgen_counts=procgen_counts.get(wp.id, EMPTY_PROCGEN_COUNTS),
+            unfinished_procgens=unfinished_procgens[wp.id],
+        )
+    return statuses
+
+
 def get_wp_by_id(wp_id, lite=False):
     try:
         wp_uuid = uuid.UUID(wp_id)
@@ -1481,6 +1828,30 @@ def get_wp_by_id(wp_id, lite=False):
     return query.filter_by(id=wp_uuid).first()
 
 
+def lock_wp_for_claim(wp):
+    """Re-lock a pop candidate before claiming further jobs from it in the same pop.
+
+    Claiming a job commits, which releases the row locks the candidate query took on
+    the rest of its page. A batched pop therefore re-takes the lock on each further
+    candidate before claiming it, skipping any row another pop holds or has drained
+    in the meantime. Returns the refreshed WP, or None when it is no longer claimable.
+    """
+    wp_class = type(wp)
+    return (
+        db.session.query(wp_class)
+        .options(noload(wp_class.processing_gens))
+        .filter(
+            wp_class.id == wp.id,
+            wp_class.n > 0,
+            wp_class.active == True,  # noqa E712
+            wp_class.faulted == False,  # noqa E712
+        )
+        .populate_existing()
+        .with_for_update(skip_locked=True, of=wp_class)
+        .first()
+    )
+
+
 def get_progen_by_id(procgen_id):
     try:
         procgen_uuid = uuid.UUID(procgen_id)
@@ -1587,6 +1958,14 @@ def get_request_avg(request_type="image"):
     return float(perf_cache)
 
 
+# How long a wp_has_valid_workers verdict is trusted. The quorum node republishes
+# the verdict of every active request well within this (see refresh_wp_validity),
+# so on a healthy horde the request path only scans workers for brand new requests.
+WP_VALIDITY_TTL = timedelta(seconds=60)
+WP_VALIDITY = CacheSpec("wp_validity", "wp_validity_{}", WP_VALIDITY_TTL, BOOL_SERIALIZER)
+WP_VALIDITY_CLASS = CacheSpec("wp_validity_class", "wp_validity_class_{}", WP_VALIDITY_TTL)
+
+
 def wp_has_valid_workers(wp: WaitingPrompt) -> bool:
     # An in-flight generation means a worker is actively serving this request, so it
     # is possible regardless of the memoized verdict or the serving worker's current
@@ -1595,10 +1974,7 @@ def wp_has_valid_workers(wp: WaitingPrompt) -> bool:
     # Fake generations are decoys handed to paused/tricked workers and never yield a
     # real result, so they are excluded here just as count_processing_gens excludes
     # them from the processing bucket.
-    inflight_procgen_class = {
-        "image": ImageProcessingGeneration,
-        "text": TextProcessingGeneration,
-    }.get(wp.wp_type)
+    inflight_procgen_class = PROCGEN_CLASS_MAP.get(wp.wp_type)
     if inflight_procgen_class is not None:
         has_inflight_generation = (
             db.session.query(inflight_procgen_class.id)
@@ -1613,166 +1989,343 @@ def wp_has_valid_workers(wp: WaitingPrompt) -> bool:
         )
         if has_inflight_generation:
             return True
-    cached_validity = hr.horde_r_get(f"wp_validity_{wp.id}")
+    cached_validity = horde_cache.get(WP_VALIDITY, wp.id)
     if cached_validity is not None:
-        return bool(int(cached_validity))
+        return cached_validity
     with logfire.span("horde.db.wp_has_valid_workers", wp_id=str(wp.id), wp_type=wp.wp_type):
         if wp.faulted:
             return False
         if wp.expiry < datetime.utcnow():
             return False
-        worker_class = ImageWorker
-        if wp.wp_type == "text":
-            worker_class = TextWorker
-        elif wp.wp_type == "interrogation":
-            worker_class = InterrogationWorker
-        models_list = wp.get_model_names()
-        worker_ids = wp.get_worker_ids()
-        # The model constraint is a semi-join rather than an outer join: joining
-        # worker_models returns one full worker+user row per matching model, so
-        # a request allowing N models multiplies every candidate row N-fold
-        # before the DISTINCT-free scan below iterates them.
-        serves_requested_model = (
-            db.session.query(WorkerModel.id)
-            .filter(
-                WorkerModel.worker_id == worker_class.id,
-                WorkerModel.model.in_(models_list),
+        class_key = wp_validity_class_key(wp)
+        if class_key is None:
+            worker_found = False
+            for worker in query_wp_worker_candidates(wp).all():
+                if worker.can_generate(wp)[0]:
+                    worker_found = True
+                    break
+        else:
+            class_verdict = horde_cache.get_or_load(
+                WP_VALIDITY_CLASS,
+                wp_validity_class_digest(class_key),
+                loader=lambda: compute_wp_validity_class(wp, query_wp_worker_candidates(wp, any_owner=True).all()),
             )
-            .exists()
+            worker_found = resolve_wp_validity_class(wp, class_verdict)
+        horde_cache.set(WP_VALIDITY, worker_found, wp.id)
+        return worker_found
+
+
+def query_wp_worker_candidates(wp: WaitingPrompt, any_owner: bool = False):
+    """Build the query of fresh workers passing the SQL-side filters of ``wp``.
+
+    With ``any_owner`` the paused and maintenance filters, the only ones reading the
+    request's owner, are left out so that one query can serve every request sharing
+    the same requirements; ``worker_serves_owner`` then has to be applied per request.
+    """
+    worker_class = ImageWorker
+    if wp.wp_type == "text":
+        worker_class = TextWorker
+    elif wp.wp_type == "interrogation":
+        worker_class = InterrogationWorker
+    models_list = wp.get_model_names()
+    worker_ids = wp.get_worker_ids()
+    # The model constraint is a semi-join rather than an outer join: joining
+    # worker_models returns one full worker+user row per matching model, so
+    # a request allowing N models multiplies every candidate row N-fold
+    # before the DISTINCT-free scan below iterates them.
+    serves_requested_model = (
+        db.session.query(WorkerModel.id)
+        .filter(
+            WorkerModel.worker_id == worker_class.id,
+            WorkerModel.model.in_(models_list),
         )
-        final_worker_list = (
-            db.session.query(worker_class)
-            .options(
-                noload(worker_class.performance),
-                noload(worker_class.suspicions),
-                noload(worker_class.stats),
-                # Eagerly load relationships accessed by can_generate() to avoid N+1 queries
-                selectinload(worker_class.blacklist),
-                contains_eager(worker_class.user),
-            )
-            .join(
-                User,
-            )
-            .filter(
-                worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
-                or_(
-                    len(worker_ids) == 0,
-                    and_(
-                        wp.worker_blacklist is False,
-                        worker_class.id.in_(worker_ids),
-                    ),
-                    and_(
-                        wp.worker_blacklist is True,
-                        worker_class.id.not_in(worker_ids),
-                    ),
+        .exists()
+    )
+    final_worker_list = (
+        db.session.query(worker_class)
+        .options(
+            noload(worker_class.performance),
+            noload(worker_class.suspicions),
+            noload(worker_class.stats),
+            # Eagerly load relationships accessed by can_generate() to avoid N+1 queries
+            selectinload(worker_class.blacklist),
+            contains_eager(worker_class.user),
+        )
+        .join(
+            User,
+        )
+        .filter(
+            worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
+            or_(
+                len(worker_ids) == 0,
+                and_(
+                    wp.worker_blacklist is False,
+                    worker_class.id.in_(worker_ids),
                 ),
-                or_(
-                    len(models_list) == 0,
-                    serves_requested_model,
+                and_(
+                    wp.worker_blacklist is True,
+                    worker_class.id.not_in(worker_ids),
                 ),
-                or_(
-                    wp.trusted_workers == False,  # noqa E712
-                    and_(
-                        wp.trusted_workers == True,  # noqa E712
-                        User.trusted == True,  # noqa E712
-                    ),
+            ),
+            or_(
+                len(models_list) == 0,
+                serves_requested_model,
+            ),
+            or_(
+                wp.trusted_workers == False,  # noqa E712
+                and_(
+                    wp.trusted_workers == True,  # noqa E712
+                    User.trusted == True,  # noqa E712
                 ),
-                or_(
-                    wp.safe_ip == True,  # noqa E712
-                    and_(
-                        wp.safe_ip == False,  # noqa E712
-                        worker_class.allow_unsafe_ipaddr == True,  # noqa E712
-                    ),
+            ),
+            or_(
+                wp.safe_ip == True,  # noqa E712
+                and_(
+                    wp.safe_ip == False,  # noqa E712
+                    worker_class.allow_unsafe_ipaddr == True,  # noqa E712
                 ),
-                or_(
-                    wp.nsfw == False,  # noqa E712
-                    and_(
-                        wp.nsfw == True,  # noqa E712
-                        worker_class.nsfw == True,  # noqa E712
-                    ),
+            ),
+            or_(
+                wp.nsfw == False,  # noqa E712
+                and_(
+                    wp.nsfw == True,  # noqa E712
+                    worker_class.nsfw == True,  # noqa E712
                 ),
-                or_(
-                    worker_class.maintenance == False,  # noqa E712
-                    and_(
-                        worker_class.maintenance == True,  # noqa E712
-                        wp.user_id == worker_class.user_id,
-                    ),
+            ),
+        )
+    )
+    if not any_owner:
+        final_worker_list = final_worker_list.filter(
+            or_(
+                worker_class.maintenance == False,  # noqa E712
+                and_(
+                    worker_class.maintenance == True,  # noqa E712
+                    wp.user_id == worker_class.user_id,
                 ),
-                or_(
-                    worker_class.paused == False,  # noqa E712
-                    and_(
-                        worker_class.paused == True,  # noqa E712
-                        wp.user_id == worker_class.user_id,
-                    ),
+            ),
+            or_(
+                worker_class.paused == False,  # noqa E712
+                and_(
+                    worker_class.paused == True,  # noqa E712
+                    wp.user_id == worker_class.user_id,
                 ),
-            )
+            ),
         )
-        if wp.wp_type == "image":
-            final_worker_list = final_worker_list.filter(
-                wp.width * wp.height <= worker_class.max_pixels,
-                or_(
-                    wp.source_image == None,  # noqa E712
-                    and_(
-                        wp.source_image != None,  # noqa E712
-                        worker_class.allow_img2img == True,  # noqa E712
-                    ),
-                ),
-                or_(
-                    wp.slow_workers == True,  # noqa E712
-                    worker_class.speed >= 500000,
+    if wp.wp_type == "image":
+        final_worker_list = final_worker_list.filter(
+            wp.width * wp.height <= worker_class.max_pixels,
+            or_(
+                wp.source_image == None,  # noqa E712
+                and_(
+                    wp.source_image != None,  # noqa E712
+                    worker_class.allow_img2img == True,  # noqa E712
                 ),
-                or_(
-                    "loras" not in wp.params,
-                    and_(
-                        worker_class.allow_lora == True,  # noqa E712
-                        # TODO: Create an sql function I can call to check the worker bridge capabilities
-                        "loras" in wp.params,
-                    ),
+            ),
+            or_(
+                wp.slow_workers == True,  # noqa E712
+                worker_class.speed >= 500000,
+            ),
+            or_(
+                "loras" not in wp.params,
+                and_(
+                    worker_class.allow_lora == True,  # noqa E712
+                    # TODO: Create an sql function I can call to check the worker bridge capabilities
+                    "loras" in wp.params,
                 ),
-                # or_(
-                #     'tis' not in wp.params,
-                #     and_(
-                #         #TODO: Create an sql function I can call to check the worker bridge capabilities
-                #         'tis' in wp.params,
-                #     ),
-                # ),
+            ),
+            # or_(
+            #     'tis' not in wp.params,
+            #     and_(
+            #         #TODO: Create an sql function I can call to check the worker bridge capabilities
+            #         'tis' in wp.params,
+            #     ),
+            # ),
+        )
+    elif wp.wp_type == "text":
+        final_worker_list = final_worker_list.filter(
+            wp.max_length <= worker_class.max_length,
+            wp.max_context_length <= worker_class.max_context_length,
+            or_(
+                wp.slow_workers == True,  # noqa E712
+                worker_class.speed >= 2,
+            ),
+        )
+    elif wp.wp_type == "interrogation":
+        pass  # FIXME: Add interrogation filters
+    return final_worker_list
+
+
+def worker_serves_owner(worker, wp: WaitingPrompt) -> bool:
+    """Apply the owner-only access of paused and maintenance workers to ``wp``."""
+    return not (worker.paused or worker.maintenance) or worker.user_id == wp.user_id
+
+
+def wp_validity_requirement_key(wp: WaitingPrompt) -> tuple:
+    """Return the request fields the candidate query of ``query_wp_worker_candidates`` reads.
+
+    The owner is left out, as ``any_owner`` queries do not filter on it.
+    """
+    key = (
+        wp.wp_type,
+        tuple(sorted(wp.get_model_names())),
+        tuple(sorted(str(worker_id) for worker_id in wp.get_worker_ids())),
+        bool(wp.worker_blacklist),
+        bool(wp.trusted_workers),
+        bool(wp.safe_ip),
+        bool(wp.nsfw),
+    )
+    if wp.wp_type == "image":
+        return key + (wp.width * wp.height, wp.source_image is not None, bool(wp.slow_workers), "loras" in wp.params)
+    if wp.wp_type == "text":
+        return key + (wp.max_length, wp.max_context_length, bool(wp.slow_workers))
+    return key
+
+
+def wp_validity_class_key(wp: WaitingPrompt) -> tuple | None:
+    """Return the validity class of ``wp``.
+
+    Two requests of the same class get the same ``can_generate`` verdict from every
+    worker that ``worker_is_conditional`` does not single out, so the class verdict
+    computed for one of them holds for all. Returns None when the request's
+    validity cannot be shared: it has tricked workers, or its image capability
+    needs cannot be encoded.
+    """
+    if wp.tricked_workers:
+        return None
+    key = wp_validity_requirement_key(wp)
+    if wp.wp_type == "image":
+        requirements = wp.get_capability_requirements()
+        if requirements is None:
+            return None
+        return key + (requirements, len(wp.gen_payload.get("post_processing", [])) >= 1, bool(wp.user.trusted))
+    if wp.wp_type == "text":
+        return key + (bool(wp.validated_backends), wp.softprompt or "")
+    return None
+
+
+def wp_validity_class_digest(class_key: tuple) -> str:
+    return hashlib.sha256(json.dumps(class_key).encode()).hexdigest()[:32]
+
+
+def wp_validity_class_cache_key(class_key: tuple) -> str:
+    return WP_VALIDITY_CLASS.key(wp_validity_class_digest(class_key))
+
+
+def worker_is_conditional(worker) -> bool:
+    """Whether ``worker`` can accept some requests of a validity class and not others.
+
+    These are the owner-only paused and maintenance workers, and workers whose
+    checks read the prompt, the step count or the requesting user's kudos.
+    """
+    return bool(
+        worker.paused
+        or worker.maintenance
+        or worker.blacklist
+        or worker.require_upfront_kudos
+        or getattr(worker, "limit_max_steps", False),
+    )
+
+
+def compute_wp_validity_class(wp: WaitingPrompt, candidates: list):
+    """Return the verdict of the validity class of ``wp``, given its ``any_owner`` candidates.
+
+    True when an unconditional worker can serve the class. Otherwise the ids of the
+    conditional candidates, which have to be checked against each request.
+    """
+    conditional_ids = []
+    for worker in candidates:
+        if worker_is_conditional(worker):
+            conditional_ids.append(str(worker.id))
+        elif worker.can_generate(wp)[0]:
+            return True
+    return conditional_ids
+
+
+def resolve_wp_validity_class(wp: WaitingPrompt, class_verdict, conditional_workers: list | None = None) -> bool:
+    """Resolve the validity of ``wp`` from the verdict of its class.
+
+    ``conditional_workers`` may pass the already loaded conditional candidates;
+    otherwise they are loaded by id.
+    """
+    if class_verdict is True:
+        return True
+    if not class_verdict:
+        return False
+    if conditional_workers is None:
+        worker_class = WORKER_CLASS_MAP[wp.wp_type]
+        conditional_workers = (
+            db.session.query(worker_class)
+            .options(
+                noload(worker_class.performance),
+                noload(worker_class.suspicions),
+                noload(worker_class.stats),
+                selectinload(worker_class.blacklist),
+                joinedload(worker_class.user),
             )
-        elif wp.wp_type == "text":
-            final_worker_list = final_worker_list.filter(
-                wp.max_length <= worker_class.max_length,
-                wp.max_context_length <= worker_class.max_context_length,
-                or_(
-                    wp.slow_workers == True,  # noqa E712
-                    worker_class.speed >= 2,
-                ),
+            .filter(
+                worker_class.id.in_([uuid.UUID(worker_id) for worker_id in class_verdict]),
+                worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
             )
-        elif wp.wp_type == "interrogation":
-            pass  # FIXME: Add interrogation filters
-        worker_found = False
-        for worker in final_worker_list.all():
-            if worker.can_generate(wp)[0]:
-                worker_found = True
-                break
-        hr.horde_r_setex(f"wp_validity_{wp.id}", timedelta(seconds=60), int(worker_found))
-        return worker_found
+            .all()
+        )
+    return any(worker_serves_owner(worker, wp) and worker.can_generate(wp)[0] for worker in conditional_workers)
 
 
-@logger.catch(reraise=True)
-def retrieve_prioritized_wp_queue(wp_type):
-    cached_queue = hr.horde_r_get(f"{wp_type}_wp_cache")
-    if cached_queue is None:
-        return None
-    try:
-        retrieved_json_list = json.loads(cached_queue)
-    except (TypeError, OverflowError) as e:
-        logger.error(f"Failed deserializing with error: {e}")
-        return None
-    deserialized_wp_list = []
-    for json_row in retrieved_json_list:
-        fake_wp_row = FakeWPRow(json_row)
-        deserialized_wp_list.append(fake_wp_row)
-    # logger.debug(len(deserialized_wp_list))
-    return deserialized_wp_list
+def refresh_wp_validity(wp_class) -> dict:
+    """Recompute and publish the wp_has_valid_workers verdict of every active request of ``wp_class``.
+
+    Requests are grouped by validity class (see ``wp_validity_class_key``), so the
+    worker query and the scan of unconditional workers run once per class instead
+    of once per request. Requests outside any class are grouped by their candidate
+    query requirements instead. All class and request verdicts are written to redis
+    in one batch.
+    Returns the request verdicts by request id.
+    """
+    with logfire.span("horde.db.refresh_wp_validity", wp_class=wp_class.__name__):
+        active_wps = (
+            db.session.query(wp_class)
+            .options(
+                selectinload(wp_class.models),
+                selectinload(wp_class.workers),
+                selectinload(wp_class.tricked_workers),
+                joinedload(wp_class.user),
+            )
+            .filter(
+                wp_class.n > 0,
+                wp_class.active == True,  # noqa E712
+                wp_class.faulted == False,  # noqa E712
+                wp_class.expiry > datetime.utcnow(),
+            )
+            .all()
+        )
+        class_groups = defaultdict(list)
+        requirement_groups = defaultdict(list)
+        for wp in active_wps:
+            class_key = wp_validity_class_key(wp)
+            if class_key is None:
+                requirement_groups[wp_validity_requirement_key(wp)].append(wp)
+            else:
+                class_groups[class_key].append(wp)
+        verdicts = {}
+        published = {}
+        for class_key, group in class_groups.items():
+            candidates = query_wp_worker_candidates(group[0], any_owner=True).all()
+            class_verdict = compute_wp_validity_class(group[0], candidates)
+            published[wp_validity_class_cache_key(class_key)] = WP_VALIDITY_CLASS.serializer.dumps(class_verdict)
+            conditional_workers = [worker for worker in candidates if worker_is_conditional(worker)]
+            for wp in group:
+                verdicts[wp.id] = resolve_wp_validity_class(wp, class_verdict, conditional_workers)
+        for group in requirement_groups.values():
+            candidates = query_wp_worker_candidates(group[0], any_owner=True).all()
+            for wp in group:
+                verdicts[wp.id] = any(worker_serves_owner(worker, wp) and worker.can_generate(wp)[0] for worker in candidates)
+        published.update({WP_VALIDITY.key(wp_id): WP_VALIDITY.serializer.dumps(verdict) for wp_id, verdict in verdicts.items()})
+        hr.horde_r_setex_many(published, WP_VALIDITY_TTL)
+        logger.debug(
+            f"Refreshed validity of {len(verdicts)} {wp_class.__name__} across "
+            f"{len(class_groups)} validity classes and {len(requirement_groups)} unshared requirement sets",
+        )
+        return verdicts
 
 
 def query_prioritized_wps(wp_type="image"):
@@ -1782,7 +2335,7 @@ def query_prioritized_wps(wp_type="image"):
             waiting_prompt_type.id,
             waiting_prompt_type.things,
             waiting_prompt_type.n,
-            waiting_prompt_type.extra_priority,
+            waiting_prompt_type.queue_priority.label("queue_priority"),
             waiting_prompt_type.created,
             waiting_prompt_type.expiry,
         )
@@ -1791,11 +2344,19 @@ def query_prioritized_wps(wp_type="image"):
             waiting_prompt_type.faulted == False,  # noqa E712
             waiting_prompt_type.active == True,  # noqa E712
         )
-        .order_by(waiting_prompt_type.extra_priority.desc(), waiting_prompt_type.created.asc())
+        .order_by(waiting_prompt_type.queue_priority.desc(), waiting_prompt_type.created.asc())
         .all()
     )
 
 
+def get_wp_model_names(wp_ids):
+    """Returns the model names of each of the requests, keyed by request ID"""
+    model_names = {wp_id: [] for wp_id in wp_ids}
+    for wp_id, model_name in db.session.query(WPModels.wp_id, WPModels.model).filter(WPModels.wp_id.in_(wp_ids)):
+        model_names[wp_id].append(model_name)
+    return model_names
+
+
 def prune_expired_stats():
     # clear up old requests (older than 5 mins)
     db.session.query(stats.FulfillmentPerformance).filter(
@@ -1804,6 +2365,12 @@ def prune_expired_stats():
     db.session.query(stats.ModelPerformance).filter(
         stats.ModelPerformance.created < datetime.utcnow() - timedelta(hours=1),
     ).delete(synchronize_session=False)
+    db.session.query(stats.FulfillmentBucket).filter(
+        stats.FulfillmentBucket.minute < stats.current_minute() - timedelta(minutes=1),
+    ).delete(synchronize_session=False)
+    db.session.query(stats.ModelPerformanceBucket).filter(
+        stats.ModelPerformanceBucket.minute <= stats.current_minute() - stats.MODEL_PERFORMANCE_WINDOW,
+    ).delete(synchronize_session=False)
     db.session.commit()
     logger.debug("Pruned Expired Stats")
 
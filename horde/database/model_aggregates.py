@@ -0,0 +1,183 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Per-process aggregate of the models served and queued, behind ``/v2/status/models``.
+
+``store_available_models`` republishes the model list every 10 seconds. For each
+of image and text it used to group the models of every active worker, load every
+active request with its models and generations to count what is queued per model,
+and query ``model_performances`` twice per model.
+
+This module keeps what does not change between two passes in memory instead:
+
+- the models of each active worker, which only change when the worker checks in
+  with a different model list. ``Worker.set_models`` evicts the entry on every node
+  through a redis channel, the same way the long-polling pops are woken (see
+  ``horde/pop_notifier.py``);
+- the models of each active request, which are immutable once it is activated.
+
+Every refresh re-reads only the narrow volatile columns (worker threads, request
+``n`` and ``things``, the processing generation counts) and loads the models of
+the workers and requests it has not seen before. So activations, pops and
+completions are picked up by the next refresh without any hook of their own. Every
+``MODEL_AGGREGATE_RECONCILE_SECONDS`` the remembered models are dropped and loaded
+again, which reconciles any change that bypassed ``set_models``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from horde.classes.base.waiting_prompt import EMPTY_PROCGEN_COUNTS, WPModels, count_procgens_per_wp
+from horde.classes.base.worker import WorkerModel
+from horde.classes.kobold.waiting_prompt import TextWaitingPrompt
+from horde.classes.kobold.worker import TextWorker
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.flask import db
+from horde.logger import logger
+from horde.pop_notifier import NotifyKey, VersionedNotifier
+
+MODEL_AGGREGATE_CHANNEL = "horde_model_aggregate"
+# How often the remembered worker and request models are dropped and loaded again.
+MODEL_AGGREGATE_RECONCILE_SECONDS = 300
+
+AGGREGATED_CLASSES = {
+    "image": (ImageWorker, ImageWaitingPrompt),
+    "text": (TextWorker, TextWaitingPrompt),
+}
+
+
+@dataclass
+class ModelTypeAggregate:
+    """The per-model totals of one request type, and the models they were summed from."""
+
+    threads: dict[str, int] = field(default_factory=dict)
+    things: dict[str, float] = field(default_factory=dict)
+    jobs: dict[str, int] = field(default_factory=dict)
+    worker_models: dict[uuid.UUID, frozenset[str]] = field(default_factory=dict)
+    wp_models: dict[uuid.UUID, frozenset[str]] = field(default_factory=dict)
+
+
+class AvailableModelsAggregate(VersionedNotifier):
+    """Models served and queued per request type, refreshed incrementally.
+
+    Notifications carry the ids of workers whose models changed. Instead of
+    bumping versions, receiving one evicts the worker's models, so the next
+    refresh loads them again.
+    """
+
+    channel = MODEL_AGGREGATE_CHANNEL
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.aggregates = {model_type: ModelTypeAggregate() for model_type in AGGREGATED_CLASSES}
+        # Workers evicted while a refresh was loading models, whose loaded models may predate the change
+        self.evicted: set[str] = set()
+        self.reconciled_at = time.monotonic()
+        self._refresh_lock = threading.Lock()
+
+    def worker_models_changed(self, worker_id: uuid.UUID) -> None:
+        """Evict the models of a worker on every node."""
+        self.bump([("worker", str(worker_id))])
+
+    def bump_local(self, keys: list[NotifyKey]) -> None:
+        worker_ids = {worker_id for _, worker_id in keys}
+        with self.condition:
+            self.evicted |= worker_ids
+            for aggregate in self.aggregates.values():
+                for worker_id in [w for w in aggregate.worker_models if str(w) in worker_ids]:
+                    del aggregate.worker_models[worker_id]
+
+    def refresh(self, model_type: str) -> ModelTypeAggregate:
+        """Recount the threads serving and the things and jobs queued per model of ``model_type``"""
+        self.ensure_subscribed()
+        with self._refresh_lock:
+            if time.monotonic() - self.reconciled_at >= MODEL_AGGREGATE_RECONCILE_SECONDS:
+                with self.condition:
+                    for aggregate in self.aggregates.values():
+                        aggregate.worker_models.clear()
+                        aggregate.wp_models.clear()
+                self.reconciled_at = time.monotonic()
+            aggregate = self.aggregates[model_type]
+            self._refresh_threads(model_type, aggregate)
+            self._refresh_queue(model_type, aggregate)
+            return aggregate
+
+    def _refresh_threads(self, model_type: str, aggregate: ModelTypeAggregate) -> None:
+        worker_class = AGGREGATED_CLASSES[model_type][0]
+        active_workers = (
+            db.session.query(worker_class.id, worker_class.threads)
+            .filter(
+                worker_class.last_check_in > datetime.utcnow() - timedelta(seconds=300),
+                worker_class.maintenance == False,  # noqa E712
+            )
+            .all()
+        )
+        with self.condition:
+            worker_models = {w.id: aggregate.worker_models[w.id] for w in active_workers if w.id in aggregate.worker_models}
+            aggregate.worker_models = dict(worker_models)
+            self.evicted.clear()
+        new_ids = [w.id for w in active_workers if w.id not in worker_models]
+        if new_ids:
+            loaded = {worker_id: set() for worker_id in new_ids}
+            for worker_id, model_name in db.session.query(WorkerModel.worker_id, WorkerModel.model).filter(
+                WorkerModel.worker_id.in_(new_ids),
+            ):
+                loaded[worker_id].add(model_name)
+            with self.condition:
+                for worker_id, models in loaded.items():
+                    worker_models[worker_id] = frozenset(models)
+                    # Evicted during the load, so this may be the previous model list. Loaded again on the next refresh.
+                    if str(worker_id) not in self.evicted:
+                        aggregate.worker_models[worker_id] = worker_models[worker_id]
+        threads = {}
+        for worker in active_workers:
+            for model_name in worker_models[worker.id]:
+                threads[model_name] = threads.get(model_name, 0) + worker.threads
+        aggregate.threads = threads
+
+    def _refresh_queue(self, model_type: str, aggregate: ModelTypeAggregate) -> None:
+        wp_class = AGGREGATED_CLASSES[model_type][1]
+        active_wps = (
+            db.session.query(wp_class.id, wp_class.n, wp_class.things)
+            .filter(
+                wp_class.active == True,  # noqa E712
+                wp_class.faulted == False,  # noqa E712
+                wp_class.n >= 1,
+            )
+            .all()
+        )
+        aggregate.wp_models = {wp.id: aggregate.wp_models[wp.id] for wp in active_wps if wp.id in aggregate.wp_models}
+        new_ids = [wp.id for wp in active_wps if wp.id not in aggregate.wp_models]
+        if new_ids:
+            loaded = {wp_id: set() for wp_id in new_ids}
+            for wp_id, model_name in db.session.query(WPModels.wp_id, WPModels.model).filter(WPModels.wp_id.in_(new_ids)):
+                loaded[wp_id].add(model_name)
+            for wp_id, models in loaded.items():
+                aggregate.wp_models[wp_id] = frozenset(models)
+        procgen_counts = count_procgens_per_wp(model_type, [wp.id for wp in active_wps])
+        things = {}
+        jobs = {}
+        for wp in active_wps:
+            # Each request counts towards every model it allows, as in count_things_per_model()
+            current_wp_queue = wp.n + procgen_counts.get(wp.id, EMPTY_PROCGEN_COUNTS)["processing"]
+            for model_name in aggregate.wp_models[wp.id]:
+                if "horde_special" in model_name:
+                    continue
+                things[model_name] = things.get(model_name, 0) + wp.things
+                jobs[model_name] = jobs.get(model_name, 0) + current_wp_queue
+        aggregate.things = {model_name: round(model_things, 2) for model_name, model_things in things.items()}
+        aggregate.jobs = jobs
+        logger.trace(
+            f"{model_type} model aggregate refreshed: {len(aggregate.worker_models)} workers, "
+            f"{len(active_wps)} requests, {len(new_ids)} new",
+        )
+
+
+available_models_aggregate = AvailableModelsAggregate()
@@ -0,0 +1,206 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Runs the post-submit jobs queued by :mod:`horde.classes.base.post_submit`.
+
+Every process runs ``post_submit_runner``, a thread which claims the committed
+jobs of every node with ``FOR UPDATE SKIP LOCKED``, so concurrent runners never
+share a job. It is woken up as soon as this process commits a submit, and
+otherwise polls every ``POST_SUBMIT_POLL_SECONDS``. The poll takes over the jobs
+left behind by a node which went down, and the jobs due for a retry.
+
+A batch runs the jobs of each kind together with one call of their handler, so
+e.g. the fulfilments of a batch take one bucket increment per model and minute
+rather than one per submit. The handlers' writes and the deletion of their jobs
+commit together, so a job's writes land exactly once. What a handler can't roll
+back, such as handing a webhook to the webhook engine, it leaves with
+``after_post_submit_commit`` to run once the batch commits, so a retried job
+never sends it twice.
+
+A handler which fails is retried job by job, so one failing job does not hold
+back the others of its kind. A job which keeps failing is retried with a backoff
+and dropped after ``POST_SUBMIT_MAX_ATTEMPTS``.
+
+With ``HORDE_POST_SUBMIT_ASYNC=0`` a submit runs its own jobs right after its
+commit, within the worker's request, as before the queue existed.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+from horde.classes.base.post_submit import AFTER_COMMIT_KEY, QUEUED_JOBS_KEY, PostSubmitJob
+from horde.flask import db
+from horde.logger import logger
+from horde.metrics import post_submit_batch_duration, post_submit_delay, post_submit_jobs
+
+POST_SUBMIT_BATCH_SIZE = 200
+POST_SUBMIT_POLL_SECONDS = 1.0
+POST_SUBMIT_MAX_ATTEMPTS = 5
+POST_SUBMIT_RETRY_SECONDS = 5
+
+
+def post_submit_async() -> bool:
+    """Whether submits leave their jobs to the runner. Otherwise they run them inline"""
+    return os.getenv("HORDE_POST_SUBMIT_ASYNC", "1") == "1"
+
+
+def post_submit_handlers() -> dict[str, Callable[[list[dict[str, Any]]], None]]:
+    """Maps each job kind to the handler running a list of their payloads"""
+    # Imported here, as these modules queue the jobs
+    from horde.classes.base.processing_generation import send_webhooks
+    from horde.classes.base.stats import add_fulfilments
+    from horde.classes.base.worker import add_worker_performances
+    from horde.classes.kobold.genstats import add_text_statistics
+    from horde.classes.stable.genstats import add_image_statistics
+
+    return {
+        "fulfilment": add_fulfilments,
+        "worker_performance": add_worker_performances,
+        "image_statistic": add_image_statistics,
+        "text_statistic": add_text_statistics,
+        "webhook": send_webhooks,
+    }
+
+
+def run_post_submit_jobs(batch_size: int = POST_SUBMIT_BATCH_SIZE, job_ids: list[int] | None = None) -> int:
+    """Claims and runs up to batch_size due jobs, or only the given ones, in one transaction.
+    Returns how many jobs were claimed, so a caller draining the queue can stop on a short batch
+    """
+    batch_t0 = time.monotonic()
+    now = datetime.utcnow()
+    db.session.info[AFTER_COMMIT_KEY] = []
+    query = db.session.query(PostSubmitJob)
+    if job_ids is not None:
+        query = query.filter(PostSubmitJob.id.in_(job_ids))
+    else:
+        query = query.filter(PostSubmitJob.run_after <= now)
+    jobs = query.order_by(PostSubmitJob.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not jobs:
+        db.session.rollback()
+        return 0
+    jobs_by_kind: dict[str, list[PostSubmitJob]] = defaultdict(list)
+    for job in jobs:
+        jobs_by_kind[job.kind].append(job)
+    handlers = post_submit_handlers()
+    failed = []
+    for kind, kind_jobs in jobs_by_kind.items():
+        handler = handlers.get(kind)
+        if handler is None:
+            logger.error(f"No handler for post-submit jobs of kind {kind}")
+            failed.extend(kind_jobs)
+            continue
+        if _run_handler(kind, handler, kind_jobs):
+            continue
+        for job in kind_jobs:
+            if not _run_handler(kind, handler, [job]):
+                failed.append(job)
+    done_ids = []
+    for job in jobs:
+        if job in failed:
+            _retry_or_drop(job, now)
+            continue
+        done_ids.append(job.id)
+        post_submit_jobs.add(1, {"horde.post_submit.kind": job.kind, "horde.post_submit.outcome": "ok"})
+        post_submit_delay.record((now - job.created).total_seconds(), {"horde.post_submit.kind": job.kind})
+    if done_ids:
+        db.session.query(PostSubmitJob).filter(PostSubmitJob.id.in_(done_ids)).delete(synchronize_session=False)
+    after_commit = db.session.info.pop(AFTER_COMMIT_KEY, [])
+    db.session.commit()
+    for callback in after_commit:
+        try:
+            callback()
+        except Exception as err:
+            logger.error(f"Failed running the after-commit step of a post-submit job: {err}")
+    post_submit_batch_duration.record(time.monotonic() - batch_t0)
+    return len(jobs)
+
+
+def _run_handler(kind: str, handler: Callable[[list[dict[str, Any]]], None], jobs: list[PostSubmitJob]) -> bool:
+    """Runs the jobs in a savepoint, so that a failure discards only their writes and after-commit steps"""
+    after_commit = db.session.info[AFTER_COMMIT_KEY]
+    mark = len(after_commit)
+    try:
+        with db.session.begin_nested():
+            handler([job.payload for job in jobs])
+    except Exception as err:
+        del after_commit[mark:]
+        logger.warning(f"Failed running {len(jobs)} post-submit jobs of kind {kind}: {err}")
+        return False
+    return True
+
+
+def _retry_or_drop(job: PostSubmitJob, now: datetime) -> None:
+    job.attempts += 1
+    if job.attempts >= POST_SUBMIT_MAX_ATTEMPTS:
+        logger.error(f"Dropping post-submit job {job.id} of kind {job.kind} after {job.attempts} failed attempts: {job.payload}")
+        post_submit_jobs.add(1, {"horde.post_submit.kind": job.kind, "horde.post_submit.outcome": "dropped"})
+        db.session.delete(job)
+        return
+    job.run_after = now + timedelta(seconds=POST_SUBMIT_RETRY_SECONDS * 2 ** (job.attempts - 1))
+    post_submit_jobs.add(1, {"horde.post_submit.kind": job.kind, "horde.post_submit.outcome": "retry"})
+
+
+class PostSubmitRunner:
+    """Runs the queued post-submit jobs on a thread of this process."""
+
+    def __init__(self, poll_seconds: float = POST_SUBMIT_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="post-submit-runner", daemon=True)
+        self.thread.start()
+        logger.init_ok("Post-submit runner", status="Started")
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(5)
+        self.thread = None
+
+    def wake(self) -> None:
+        self.wakeup.set()
+
+    def run(self) -> None:
+        from horde.flask import get_app
+
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.poll_seconds)
+            self.wakeup.clear()
+            if self.stopped.is_set():
+                return
+            try:
+                with get_app().app_context():
+                    while run_post_submit_jobs() >= POST_SUBMIT_BATCH_SIZE:
+                        pass
+            except Exception as err:
+                logger.error(f"Exception caught in the post-submit runner: {err}")
+                self.stopped.wait(self.poll_seconds)
+
+
+post_submit_runner = PostSubmitRunner()
+
+
+def post_submit_committed() -> None:
+    """Called once a submit commits: hands its jobs to the runner, or runs them inline when the runner is disabled"""
+    jobs = db.session.info.pop(QUEUED_JOBS_KEY, [])
+    if not jobs:
+        return
+    if post_submit_async():
+        post_submit_runner.wake()
+        return
+    run_post_submit_jobs(batch_size=len(jobs), job_ids=[job.id for job in jobs])
@@ -121,7 +121,7 @@ def get_sorted_text_wp_filtered_to_worker(worker, models_list=None, priority_use
         final_wp_list = final_wp_list.filter(TextWaitingPrompt.user_id.in_(priority_user_ids))
     # logger.debug(final_wp_list)
     final_wp_list = (
-        final_wp_list.order_by(TextWaitingPrompt.extra_priority.desc(), TextWaitingPrompt.created.asc())
+        final_wp_list.order_by(TextWaitingPrompt.queue_priority.desc(), TextWaitingPrompt.created.asc())
         .offset(PER_PAGE * page)
         .limit(PER_PAGE)
     )
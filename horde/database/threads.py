@@ -37,22 +37,28 @@ from horde.database.functions import (
     compile_regex_filter,
     count_totals,
     find_user_by_contact,
-    get_active_workers,
+    get_active_workers_details,
     get_all_users_passkeys,
     get_available_models,
+    get_wp_model_names,
     prune_expired_stats,
-    query_prioritized_wps,
+    refresh_wp_validity,
     retrieve_regex_replacements,
+    store_worker_list_responses,
+    store_wp_lite_statuses,
 )
 from horde.database.kudos_reservations import release_reservations_for_business_ids
+from horde.database.wp_queue_positions import prioritized_wp_queues
 from horde.enums import State
 from horde.flask import SQLITE_MODE, db, get_app
+from horde.horde_cache import AVAILABLE_MODELS, TOTALS, horde_cache
 from horde.horde_redis import horde_redis as hr
 from horde.logger import logger
 from horde.patreon import patrons
 from horde.r2 import delete_source_image
 from horde.stripe_subs import stripe_subs
 from horde.vars import horde_instance_id
+from horde.wp_priority_queue import wp_priority_queue
 
 
 @logger.catch(reraise=True)
@@ -104,35 +110,26 @@ def assign_monthly_kudos():
 
 @logger.catch(reraise=True)
 def store_prioritized_wp_queue():
-    """Stores the retrieved WP queue as json for 1 second horde-wide"""
+    """Publishes the queue position of every queued WP horde-wide, every second
+    Also publishes the lite status snapshot of every active WP, as it reuses the queue positions computed here
+    """
     with get_app().app_context():
         for wp_type in ["image", "text"]:
-            wp_queue = query_prioritized_wps(wp_type)
-            serialized_wp_list = []
-            queue_positions = {}
-            things_ahead_in_queue = 0
-            n_ahead_in_queue = 0
-            for idx, wp in enumerate(wp_queue):
-                wp_json = {
-                    "id": str(wp.id),
-                    "things": wp.things,
-                    "n": wp.n,
-                    "extra_priority": wp.extra_priority,
-                    "created": wp.created.strftime("%Y-%m-%d %H:%M:%S"),
-                }
-                serialized_wp_list.append(wp_json)
-                queued_things = round(wp.things * wp.n / hv.thing_divisors["image"], 2)
-                things_ahead_in_queue += queued_things
-                n_ahead_in_queue += wp.n
-                queue_positions[str(wp.id)] = [idx, round(things_ahead_in_queue, 2), n_ahead_in_queue]
-            try:
-                cached_queue = json.dumps(serialized_wp_list)
-                # We set the expiry in redis to 10 seconds, in case the primary thread dies
-                # However the primary thread is set to set the cache every 1 second
-                hr.horde_r_setex(f"{wp_type}_wp_cache", timedelta(seconds=5), cached_queue)
-                hr.horde_r_setex(f"{wp_type}_wp_queue_positions", timedelta(seconds=5), json.dumps(queue_positions))
-            except (TypeError, OverflowError) as err:
-                logger.error(f"Failed serializing with error: {err}")
+            prioritized_wp_queue = prioritized_wp_queues[wp_type]
+            queue_positions = prioritized_wp_queue.refresh()
+            prioritized_wp_queue.publish(queue_positions)
+            if wp_type == "image":
+                wp_priority_queue.reconcile(wp_type, prioritized_wp_queue.queue_priorities(), get_wp_model_names)
+            store_wp_lite_statuses(wp_type, queue_positions)
+
+
+@logger.catch(reraise=True)
+def store_wp_validity():
+    """Publishes the wp_has_valid_workers verdict of every active request horde-wide"""
+    with get_app().app_context():
+        for wp_class in [ImageWaitingPrompt, TextWaitingPrompt]:
+            refresh_wp_validity(wp_class)
+            db.session.commit()
 
 
 @logger.catch(reraise=True)
@@ -146,15 +143,20 @@ def store_worker_list():
         raise TypeError(f"Type {type(obj)} not serializable")
 
     with get_app().app_context():
-        serialized_workers = []
-        serialized_workers_privileged = []
-        # This is too slow. Needs heavy caching currently
-        # TODO: Figure out a way to get only the info I need from the DB query and format it into json by hand?
-        for worker in get_active_workers():
-            serialized_workers.append(worker.get_details())
-            serialized_workers_privileged.append(worker.get_details(2))
-        json_workers = json.dumps(serialized_workers, default=json_serial)
-        json_workers_privileged = json.dumps(serialized_workers_privileged, default=json_serial)
+        # Both lists come out of the same pass over the active workers
+        worker_details = get_active_workers_details((0, 2))
+        # Imported here, as the API imports this module
+        from flask_restx import marshal
+
+        from horde.apis.v2.base import models as api_models
+
+        for details_privilege, workers in worker_details.items():
+            store_worker_list_responses(
+                details_privilege,
+                marshal(workers, api_models.response_model_worker_details, skip_none=True),
+            )
+        json_workers = json.dumps(worker_details[0], default=json_serial)
+        json_workers_privileged = json.dumps(worker_details[2], default=json_serial)
         try:
             hr.horde_r_setex("worker_cache", timedelta(seconds=300), json_workers)
             hr.horde_r_setex(
@@ -327,9 +329,8 @@ def check_interrogations():
 def store_available_models():
     """Stores the retrieved model details as json for 5 seconds horde-wide"""
     with get_app().app_context():
-        json_models = json.dumps(get_available_models())
         try:
-            hr.horde_r_setex("models_cache", timedelta(seconds=600), json_models)
+            horde_cache.set(AVAILABLE_MODELS, get_available_models())
         except (TypeError, OverflowError) as err:
             logger.error(f"Failed serializing workers with error: {err}")
 
@@ -340,9 +341,8 @@ def store_totals():
     This is never expired to avoid ending up with massive operations in case the thread dies
     """
     with get_app().app_context():
-        json_totals = json.dumps(count_totals())
         try:
-            hr.horde_r_set("totals_cache", json_totals)
+            horde_cache.set(TOTALS, count_totals())
         except (TypeError, OverflowError) as err:
             logger.error(f"Failed serializing totals with error: {err}")
 
@@ -708,47 +708,6 @@ def store_stripe_members():
     hr.horde_r_set("stripe_cache", cached_stripe)
 
 
-@logger.catch(reraise=True)
-def increment_extra_priority():
-    """Increases the priority of every WP currently in the queue by 50 kudos"""
-    # This runs every 10s. The original implementation issued one UPDATE *and
-    # one commit per waiting prompt*, so the cost scaled linearly with queue
-    # depth and turned a backlog into a per-tick storm of tiny transactions
-    # that held pool connections and drove CPU/pool pressure.
-    #
-    # We now walk the queue in id-ordered chunks and lock each chunk with
-    # SELECT ... FOR UPDATE SKIP LOCKED before updating it:
-    #   * Chunking collapses the per-WP round-trips into one UPDATE per chunk.
-    #   * Locking in a stable id order + SKIP LOCKED means we never *wait* on a
-    #     row another transaction holds, so we can't deadlock with the WP delete
-    #     thread (the reason the original used per-row commits). Rows currently
-    #     locked by the deleter are simply skipped this pass and picked up on
-    #     the next 10s tick.
-    #   * Keyset pagination (id > last_id) guarantees forward progress even when
-    #     rows are skipped, so the loop always terminates.
-    chunk_size = 250
-    with get_app().app_context():
-        for wp_class in [ImageWaitingPrompt, TextWaitingPrompt]:
-            last_id = None
-            while True:
-                id_query = db.session.query(wp_class.id).filter(
-                    wp_class.n > 0,
-                    wp_class.faulted == False,  # noqa E712
-                    wp_class.active == True,  # noqa E712
-                )
-                if last_id is not None:
-                    id_query = id_query.filter(wp_class.id > last_id)
-                locked_ids = [row.id for row in id_query.order_by(wp_class.id.asc()).limit(chunk_size).with_for_update(skip_locked=True)]
-                if not locked_ids:
-                    break
-                last_id = locked_ids[-1]
-                db.session.query(wp_class).filter(wp_class.id.in_(locked_ids)).update(
-                    {wp_class.extra_priority: wp_class.extra_priority + 50},
-                    synchronize_session=False,
-                )
-                db.session.commit()
-
-
 @logger.catch(reraise=True)
 def store_compiled_filter_regex():
     """Compiles each filter as a final regex and stores it in redit"""
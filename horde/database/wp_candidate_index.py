@@ -0,0 +1,411 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Per-process candidate index for the image job pop.
+
+Every image pop used to resolve its candidates with
+``get_sorted_wp_filtered_to_worker``: a twenty-predicate query with EXISTS probes
+into ``wp_models`` and ``wp_allowed_workers``, issued at least twice per pop and
+once more for every further page. With thousands of workers polling each second
+that query family is the dominant load on the database, while the set of active
+requests it filters changes far more slowly than it is read.
+
+This module keeps an in-memory copy of the active image queue instead. Each
+active request is reduced to an ``IndexedWP`` (its static routing attributes:
+models, pixel area, the worker capabilities it requires, its targeting) and is
+bucketed by model, by pixel band and by every capability flag it requires. A pop
+then resolves its candidates by set algebra over those buckets, orders them by
+the queue order, and only touches the database for the final
+``SELECT ... FOR UPDATE SKIP LOCKED`` on the chosen ids, which also re-checks the
+volatile columns (``n``, ``active``, ``faulted``, ``expiry``) so a stale index
+entry can never hand out a finished request.
+
+The index refreshes incrementally: every refresh re-reads only the narrow
+volatile columns of the active queue (served by ``ix_waiting_prompts_aged_queue``)
+and loads the full routing attributes only for requests it has not seen before.
+Routing attributes are immutable once a request is activated, so they never need
+re-reading. Each refresh builds a new ``ImageWPSnapshot`` and swaps it in whole,
+so pops never read buckets the refresh thread is changing. A request created since the last refresh becomes visible to the
+index path at most ``WP_INDEX_REFRESH_SECONDS`` later.
+
+The index is opt-in (``HORDE_WP_CANDIDATE_INDEX=1``); without it the pop keeps
+issuing the full candidate query.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Boolean, case
+
+from horde.bridge_reference import check_bridge_capability
+from horde.classes.base.waiting_prompt import WPAllowedWorkers, WPModels, get_queue_priority
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.flask import db
+from horde.logger import logger
+
+# How stale the index may be before the next read refreshes it. One second
+# matches the cadence of the prioritized queue cache, so a new request reaches the
+# index path no later than it reaches the queue-position readers.
+WP_INDEX_REFRESH_SECONDS = 1.0
+# Requests are bucketed by pixel area in bands of this many pixels, so a worker's
+# max_pixels ceiling selects whole bands and only the boundary band needs a
+# per-entry comparison.
+WP_INDEX_PIXEL_BAND = 256 * 256
+# The image pop's fast-worker threshold (0.5 MPS/s); requests that disallow slow
+# workers require a worker at or above it.
+WP_INDEX_FAST_WORKER_SPEED = 500000
+
+# Capability flags a request can require of the worker serving it. Each maps to
+# the worker-side predicate of the matching clause in the candidate query.
+FLAG_IMG2IMG = "img2img"
+FLAG_PAINTING = "painting"
+FLAG_EXTRA_SOURCE_IMAGES = "extra_source_images"
+FLAG_UNSAFE_IP = "unsafe_ip"
+FLAG_NSFW = "nsfw"
+FLAG_R2 = "r2"
+FLAG_LORA = "lora"
+FLAG_TI = "textual_inversion"
+FLAG_POST_PROCESSING = "post-processing"
+FLAG_CONTROLNET = "controlnet"
+FLAG_TRANSPARENT = "transparent"
+FLAG_FAST_WORKER = "fast_worker"
+FLAG_NOT_EXTRA_SLOW = "not_extra_slow"
+
+
+def wp_candidate_index_enabled() -> bool:
+    return os.getenv("HORDE_WP_CANDIDATE_INDEX", "0") == "1"
+
+
+def worker_capability_flags(worker: Any) -> frozenset[str]:
+    """Return the capability flags ``worker`` satisfies.
+
+    Each flag mirrors the worker side of one clause of
+    ``get_sorted_wp_filtered_to_worker``, so a request is admissible exactly when
+    its required flags are a subset of the returned set.
+    """
+    bridge_agent = worker.bridge_agent
+    flags = set()
+    if worker.allow_img2img:
+        flags.add(FLAG_IMG2IMG)
+    if worker.allow_painting:
+        flags.add(FLAG_PAINTING)
+    if check_bridge_capability("extra_source_images", bridge_agent):
+        flags.add(FLAG_EXTRA_SOURCE_IMAGES)
+    if worker.allow_unsafe_ipaddr:
+        flags.add(FLAG_UNSAFE_IP)
+    if worker.nsfw:
+        flags.add(FLAG_NSFW)
+    if check_bridge_capability("r2", bridge_agent):
+        flags.add(FLAG_R2)
+    if worker.allow_lora and check_bridge_capability("lora", bridge_agent):
+        flags.add(FLAG_LORA)
+    if check_bridge_capability("textual_inversion", bridge_agent):
+        flags.add(FLAG_TI)
+    if worker.allow_post_processing and check_bridge_capability("post-processing", bridge_agent):
+        flags.add(FLAG_POST_PROCESSING)
+    if worker.allow_controlnet and check_bridge_capability("controlnet", bridge_agent):
+        flags.add(FLAG_CONTROLNET)
+    if worker.allow_sdxl_controlnet and check_bridge_capability("layer_diffuse", bridge_agent):
+        flags.add(FLAG_TRANSPARENT)
+    if worker.speed >= WP_INDEX_FAST_WORKER_SPEED:
+        flags.add(FLAG_FAST_WORKER)
+    if not worker.extra_slow_worker:
+        flags.add(FLAG_NOT_EXTRA_SLOW)
+    return frozenset(flags)
+
+
+@dataclass(frozen=True)
+class IndexedWP:
+    """The routing view of one active image request held by the index."""
+
+    id: uuid.UUID
+    user_id: int
+    pixels: int
+    created: datetime
+    models: frozenset[str]
+    required_flags: frozenset[str]
+    worker_targets: frozenset[uuid.UUID]
+    worker_blacklist: bool
+    # Volatile columns, re-read on every refresh.
+    extra_priority: int = 0
+    expiry: datetime | None = None
+
+    def targets_allow(self, worker_id: uuid.UUID, require_matched_targeting: bool = False) -> bool:
+        """Mirror the per-request targeting clause of the candidate query."""
+        if not self.worker_targets:
+            return True
+        listed = worker_id in self.worker_targets
+        if self.worker_blacklist:
+            return not listed
+        return listed and not require_matched_targeting
+
+
+def pixel_band(pixels: int) -> int:
+    return max(pixels - 1, 0) // WP_INDEX_PIXEL_BAND
+
+
+@dataclass(frozen=True)
+class ImageWPSnapshot:
+    """Model, pixel-band and capability buckets over one read of the active image queue.
+
+    A snapshot is never modified once built: a refresh builds a new one and swaps
+    it in, so a pop reading it never races the refresh thread.
+    """
+
+    entries: dict[uuid.UUID, IndexedWP] = field(default_factory=dict)
+    by_model: dict[str, frozenset[uuid.UUID]] = field(default_factory=dict)
+    modelless: frozenset[uuid.UUID] = frozenset()
+    by_band: dict[int, frozenset[uuid.UUID]] = field(default_factory=dict)
+    by_flag: dict[str, frozenset[uuid.UUID]] = field(default_factory=dict)
+    # Position of each id in the queue order (queue_priority desc, created asc).
+    rank: dict[uuid.UUID, int] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, entries: list[IndexedWP]) -> ImageWPSnapshot:
+        by_model: dict[str, set[uuid.UUID]] = {}
+        modelless: set[uuid.UUID] = set()
+        by_band: dict[int, set[uuid.UUID]] = {}
+        by_flag: dict[str, set[uuid.UUID]] = {}
+        for entry in entries:
+            if entry.models:
+                for model_name in entry.models:
+                    by_model.setdefault(model_name, set()).add(entry.id)
+            else:
+                modelless.add(entry.id)
+            by_band.setdefault(pixel_band(entry.pixels), set()).add(entry.id)
+            for flag in entry.required_flags:
+                by_flag.setdefault(flag, set()).add(entry.id)
+        ordered = sorted(entries, key=lambda e: (-get_queue_priority(e.extra_priority, e.created), e.created))
+        return cls(
+            entries={entry.id: entry for entry in entries},
+            by_model={model_name: frozenset(ids) for model_name, ids in by_model.items()},
+            modelless=frozenset(modelless),
+            by_band={band: frozenset(ids) for band, ids in by_band.items()},
+            by_flag={flag: frozenset(ids) for flag, ids in by_flag.items()},
+            rank={entry.id: position for position, entry in enumerate(ordered)},
+        )
+
+    def candidate_ids(
+        self,
+        worker: Any,
+        models_list: list[str],
+        priority_user_ids: list[int] | None = None,
+        require_matched_targeting: bool = False,
+        now: datetime | None = None,
+    ) -> list[uuid.UUID]:
+        """Return the ids of the requests ``worker`` may serve, in queue order.
+
+        Set algebra narrows the queue to requests naming one of the worker's models
+        (or no model at all), fitting its pixel ceiling and requiring no capability
+        it lacks; the remaining per-request clauses (expiry, maintenance, priority
+        users, targeting) are evaluated on the survivors only.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        candidates: set[uuid.UUID] = set()
+        for model_name in models_list:
+            candidates |= self.by_model.get(model_name, frozenset())
+        if not any("horde_special" in mname for mname in models_list) and "SDXL_beta::stability.ai#6901" not in models_list:
+            candidates |= self.modelless
+        if not candidates:
+            return []
+        max_pixels = worker.max_pixels
+        boundary_band = pixel_band(max_pixels)
+        in_bands: set[uuid.UUID] = set()
+        for band, bucket in self.by_band.items():
+            if band < boundary_band:
+                in_bands |= bucket
+            elif band == boundary_band:
+                in_bands.update(wp_id for wp_id in bucket if self.entries[wp_id].pixels <= max_pixels)
+        candidates &= in_bands
+        worker_flags = worker_capability_flags(worker)
+        for flag, bucket in self.by_flag.items():
+            if flag not in worker_flags:
+                candidates -= bucket
+        priority_users = set(priority_user_ids) if priority_user_ids else None
+        survivors = []
+        for wp_id in candidates:
+            entry = self.entries[wp_id]
+            if entry.expiry is None or entry.expiry <= now:
+                continue
+            if priority_users is not None:
+                if entry.user_id not in priority_users:
+                    continue
+                if not entry.targets_allow(worker.id):
+                    continue
+            else:
+                if worker.maintenance and entry.user_id != worker.user_id:
+                    continue
+                if not entry.targets_allow(worker.id, require_matched_targeting):
+                    continue
+            survivors.append(wp_id)
+        survivors.sort(key=lambda wp_id: self.rank.get(wp_id, len(self.rank)))
+        return survivors
+
+
+@dataclass
+class ImageWPCandidateIndex:
+    """Holds the current ``ImageWPSnapshot`` of the active image queue and refreshes it."""
+
+    snapshot: ImageWPSnapshot = field(default_factory=ImageWPSnapshot)
+    refreshed_at: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def candidate_ids(
+        self,
+        worker: Any,
+        models_list: list[str],
+        priority_user_ids: list[int] | None = None,
+        require_matched_targeting: bool = False,
+        now: datetime | None = None,
+    ) -> list[uuid.UUID]:
+        """Resolve the candidates of ``worker`` against the current snapshot."""
+        return self.snapshot.candidate_ids(worker, models_list, priority_user_ids, require_matched_targeting, now)
+
+    def refresh(self, force: bool = False) -> None:
+        """Bring the index up to date with the active image queue.
+
+        Only one thread per process refreshes at a time; the others keep reading
+        the current snapshot rather than queueing behind the refresh.
+        """
+        if not force and time.monotonic() - self.refreshed_at < WP_INDEX_REFRESH_SECONDS:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            self._refresh()
+            self.refreshed_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _refresh(self) -> None:
+        active_rows = (
+            db.session.query(
+                ImageWaitingPrompt.id,
+                ImageWaitingPrompt.extra_priority,
+                ImageWaitingPrompt.expiry,
+            )
+            .filter(
+                ImageWaitingPrompt.n > 0,
+                ImageWaitingPrompt.active == True,  # noqa E712
+                ImageWaitingPrompt.faulted == False,  # noqa E712
+                ImageWaitingPrompt.expiry > datetime.utcnow(),
+            )
+            .all()
+        )
+        known = self.snapshot.entries
+        entries = []
+        new_ids = []
+        for row in active_rows:
+            entry = known.get(row.id)
+            if entry is None:
+                new_ids.append(row.id)
+            else:
+                entries.append(replace(entry, extra_priority=row.extra_priority, expiry=row.expiry))
+        if new_ids:
+            entries.extend(load_indexed_wps(new_ids))
+        self.snapshot = ImageWPSnapshot.build(entries)
+        logger.trace(f"Image WP candidate index refreshed: {len(entries)} active, {len(new_ids)} new")
+
+
+def load_indexed_wps(wp_ids: list[uuid.UUID]) -> list[IndexedWP]:
+    """Load the routing attributes of ``wp_ids`` into ``IndexedWP`` entries.
+
+    The JSONB ``params`` probes are evaluated in SQL with the same expressions as
+    the candidate query, so an indexed request requires exactly the flags the
+    query would have checked.
+    """
+    transparent = case(
+        (ImageWaitingPrompt.params.has_key("transparent"), ImageWaitingPrompt.params["transparent"].astext.cast(Boolean)),
+        else_=False,
+    )
+    rows = (
+        db.session.query(
+            ImageWaitingPrompt.id,
+            ImageWaitingPrompt.user_id,
+            ImageWaitingPrompt.width,
+            ImageWaitingPrompt.height,
+            ImageWaitingPrompt.created,
+            ImageWaitingPrompt.extra_priority,
+            ImageWaitingPrompt.expiry,
+            (ImageWaitingPrompt.source_image != None).label("has_source_image"),  # noqa E711
+            ImageWaitingPrompt.source_processing,
+            (ImageWaitingPrompt.extra_source_images != None).label("has_extra_source_images"),  # noqa E711
+            ImageWaitingPrompt.safe_ip,
+            ImageWaitingPrompt.nsfw,
+            ImageWaitingPrompt.r2,
+            ImageWaitingPrompt.params.has_key("loras").label("has_loras"),
+            ImageWaitingPrompt.params.has_key("tis").label("has_tis"),
+            ImageWaitingPrompt.params.has_key("post-processing").label("has_post_processing"),
+            ImageWaitingPrompt.params.has_key("control_type").label("has_control_type"),
+            transparent.label("transparent"),
+            ImageWaitingPrompt.slow_workers,
+            ImageWaitingPrompt.extra_slow_workers,
+            ImageWaitingPrompt.worker_blacklist,
+        )
+        .filter(ImageWaitingPrompt.id.in_(wp_ids))
+        .all()
+    )
+    models: dict[uuid.UUID, set[str]] = {}
+    for wp_id, model_name in db.session.query(WPModels.wp_id, WPModels.model).filter(WPModels.wp_id.in_(wp_ids)):
+        models.setdefault(wp_id, set()).add(model_name)
+    targets: dict[uuid.UUID, set[uuid.UUID]] = {}
+    for wp_id, worker_id in db.session.query(WPAllowedWorkers.wp_id, WPAllowedWorkers.worker_id).filter(
+        WPAllowedWorkers.wp_id.in_(wp_ids),
+    ):
+        targets.setdefault(wp_id, set()).add(worker_id)
+    entries = []
+    for row in rows:
+        required = set()
+        if row.has_source_image:
+            required.add(FLAG_IMG2IMG)
+        if row.source_processing in ["inpainting", "outpainting"]:
+            required.add(FLAG_PAINTING)
+        if row.has_extra_source_images:
+            required.add(FLAG_EXTRA_SOURCE_IMAGES)
+        if not row.safe_ip:
+            required.add(FLAG_UNSAFE_IP)
+        if row.nsfw:
+            required.add(FLAG_NSFW)
+        if row.r2:
+            required.add(FLAG_R2)
+        if row.has_loras:
+            required.add(FLAG_LORA)
+        if row.has_tis:
+            required.add(FLAG_TI)
+        if row.has_post_processing:
+            required.add(FLAG_POST_PROCESSING)
+        if row.has_control_type:
+            required.add(FLAG_CONTROLNET)
+        if row.transparent:
+            required.add(FLAG_TRANSPARENT)
+        if not row.slow_workers:
+            required.add(FLAG_FAST_WORKER)
+        if not row.extra_slow_workers:
+            required.add(FLAG_NOT_EXTRA_SLOW)
+        entries.append(
+            IndexedWP(
+                id=row.id,
+                user_id=row.user_id,
+                pixels=row.width * row.height,
+                created=row.created,
+                models=frozenset(models.get(row.id, ())),
+                required_flags=frozenset(required),
+                worker_targets=frozenset(targets.get(row.id, ())),
+                worker_blacklist=row.worker_blacklist,
+                extra_priority=row.extra_priority,
+                expiry=row.expiry,
+            ),
+        )
+    return entries
+
+
+image_wp_index = ImageWPCandidateIndex()
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Queue positions of the active requests, kept by the quorum and published to redis.
+
+``store_prioritized_wp_queue`` used to sort every active request of each type in
+SQL every second, and write the whole queue and a map of every request's position
+to every redis server as two JSON documents. Every web node then downloaded and
+parsed the whole map to answer the status check of a single request.
+
+The quorum keeps a ``PrioritizedWPQueue`` per request type instead. Each refresh
+reads only the narrow columns of the active queue (``n``, ``things``,
+``extra_priority``, ``created``) and sorts those rows in Python. The positions are
+published to one redis hash per type, keyed by request id, which each publish
+replaces whole. Readers fetch the position of a single request with one HMGET.
+
+The things and jobs ahead of a request are running totals, so a single pop changes
+the stats of every request queued behind it, and publishing only the changed
+fields would rewrite nearly the whole hash anyway.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import timedelta
+
+from horde import vars as hv
+from horde.classes.base.waiting_prompt import get_queue_priority
+from horde.classes.kobold.waiting_prompt import TextWaitingPrompt
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.flask import db
+from horde.horde_redis import horde_redis as hr
+from horde.logger import logger
+
+# The quorum republishes every second; this only expires the positions if it stops.
+WP_QUEUE_POSITIONS_TTL = timedelta(seconds=5)
+# Holds the queue length, so readers can tell a request which is not queued from positions which were not published
+QUEUE_LENGTH_FIELD = "_length"
+
+type QueueStats = tuple[int, float, int]
+
+
+def wp_queue_positions_key(wp_type: str) -> str:
+    return f"{wp_type}_wp_queue_positions"
+
+
+def serialize_queue_stats(queue_stats: QueueStats) -> str:
+    return json.dumps(queue_stats, separators=(",", ":"))
+
+
+class PrioritizedWPQueue:
+    """Queue positions of the active requests of one type (queue_priority desc, created asc)."""
+
+    def __init__(self, wp_type: str) -> None:
+        self.wp_type = wp_type
+        self.wp_class = {"image": ImageWaitingPrompt, "text": TextWaitingPrompt}[wp_type]
+        self.priorities: dict[uuid.UUID, float] = {}
+
+    def refresh(self) -> dict[str, QueueStats]:
+        """Return the queue stats of every queued request, keyed by id"""
+        rows = (
+            db.session.query(
+                self.wp_class.id,
+                self.wp_class.things,
+                self.wp_class.n,
+                self.wp_class.extra_priority,
+                self.wp_class.created,
+            )
+            .filter(
+                self.wp_class.n > 0,
+                self.wp_class.faulted == False,  # noqa E712
+                self.wp_class.active == True,  # noqa E712
+            )
+            .all()
+        )
+        self.priorities = {row.id: get_queue_priority(row.extra_priority, row.created) for row in rows}
+        rows.sort(key=lambda row: (-self.priorities[row.id], row.created, row.id))
+        queue_positions = {}
+        things_ahead_in_queue = 0
+        n_ahead_in_queue = 0
+        for idx, wp in enumerate(rows):
+            things_ahead_in_queue += round(wp.things * wp.n / hv.thing_divisors["image"], 2)
+            n_ahead_in_queue += wp.n
+            queue_positions[str(wp.id)] = (idx, round(things_ahead_in_queue, 2), n_ahead_in_queue)
+        return queue_positions
+
+    def queue_priorities(self) -> dict[uuid.UUID, float]:
+        """The queue_priority of every queued request as of the last refresh, keyed by id"""
+        return dict(self.priorities)
+
+    def publish(self, queue_positions: dict[str, QueueStats]) -> None:
+        """Replace the published queue stats with these"""
+        serialized = {wp_id: serialize_queue_stats(queue_stats) for wp_id, queue_stats in queue_positions.items()}
+        serialized[QUEUE_LENGTH_FIELD] = str(len(queue_positions))
+        hr.horde_r_replace_hash(wp_queue_positions_key(self.wp_type), serialized, WP_QUEUE_POSITIONS_TTL)
+        logger.trace(f"Published the {self.wp_type} queue positions of {len(queue_positions)} requests")
+
+
+def get_published_queue_stats(wp_type: str, wp_id: uuid.UUID) -> QueueStats | None:
+    """Returns the published queue stats of a request, (-1, 0, 0) if it is not queued,
+    or None if no positions were published
+    """
+    queue_stats, queue_length = hr.horde_r_hmget(wp_queue_positions_key(wp_type), [str(wp_id), QUEUE_LENGTH_FIELD])
+    if queue_length is None:
+        return None
+    if queue_stats is None:
+        return (-1, 0, 0)
+    return tuple(json.loads(queue_stats))
+
+
+prioritized_wp_queues = {wp_type: PrioritizedWPQueue(wp_type) for wp_type in ("image", "text")}
@@ -94,6 +94,7 @@ KNOWN_RC = [
     "AbortedGen",
     "RequestExpired",
     "TooManyPrompts",
+    "TooManyStatusStreams",
     "NoValidWorkers",
     "MaintenanceMode",
     "TargetAccountFlagged",
@@ -567,6 +568,13 @@ class TooManyPrompts(wze.TooManyRequests):
         self.rc = rc
 
 
+class TooManyStatusStreams(wze.TooManyRequests):
+    def __init__(self, ipaddr, rc="TooManyStatusStreams"):
+        self.specific = "This server cannot open more status streams right now. Please poll the request status instead."
+        self.log = f"Status stream from {ipaddr} refused as the stream limit has been reached."
+        self.rc = rc
+
+
 class NoValidWorkers(wze.BadRequest):
     retry_after = 600
 
@@ -0,0 +1,292 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Typed, tiered cache over the horde redis servers.
+
+The hot cache keys were read with ``horde_r_get`` and parsed by every caller, so
+every access paid a round trip to the local redis (or to the cluster on a local
+miss) and a JSON parse, and every caller repeated its own encoding and error
+handling.
+
+A ``CacheSpec`` declares a family of keys once: its key format, how long the
+cluster keeps it and how it is serialized. ``horde_cache`` reads a key through
+three tiers:
+
+- an in-process LRU of parsed values, bounded in size, whose entries expire after
+  at most ``local_ttl`` (5 seconds by default, like the local redis tier);
+- the local redis (``horde_local_r``), as ``horde_r_get`` does;
+- the cluster (``horde_r``), written to every server of ``all_horde_redis``.
+
+The in-process tier hands the same parsed value to every reader, so callers must
+not mutate what they read. Every write through ``horde_redis`` to a key drops this
+process's in-process copy of it, so this process always reads its own writes.
+Other processes see a change within ``local_ttl``, the same staleness the local
+redis tier already allowed.
+
+``get_or_load`` also coalesces the misses of one key: while one thread loads the
+value, the other threads missing that key wait for its result instead of running
+the same query.
+
+Without a configured redis nothing is cached, as before: ``get`` always misses
+and ``get_or_load`` always loads.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Protocol
+
+from horde.horde_redis import horde_redis as hr
+from horde.logger import logger
+from horde.metrics import cache_evictions, cache_lookups
+
+# How long an in-process copy is served at most. Matches the local redis tier.
+LOCAL_CACHE_TTL = timedelta(seconds=5)
+# How long the threads missing a key wait for another thread loading it, before loading it themselves
+SINGLE_FLIGHT_TIMEOUT_SECONDS = 30
+
+
+def memory_cache_entries() -> int:
+    """How many values the in-process tier holds at most. 0 disables it"""
+    return int(os.getenv("HORDE_MEMORY_CACHE_ENTRIES", "10000"))
+
+
+class Serializer[T](Protocol):
+    def dumps(self, value: T) -> str: ...
+
+    def loads(self, raw: bytes | str) -> T: ...
+
+
+class JSONSerializer:
+    """Python builtins as JSON. Datetimes are written as RFC 2822 strings, as horde_r_setex_json does"""
+
+    @staticmethod
+    def default_converter(o: Any) -> str:
+        if isinstance(o, datetime):
+            return o.strftime("%a, %d %b %Y %H:%M:%S +0000")
+        raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+    def dumps(self, value: Any) -> str:
+        return json.dumps(value, default=self.default_converter)
+
+    def loads(self, raw: bytes | str) -> Any:
+        return json.loads(raw)
+
+
+class BoolSerializer:
+    """Booleans as "1" or "0\""""
+
+    def dumps(self, value: bool) -> str:
+        return str(int(value))
+
+    def loads(self, raw: bytes | str) -> bool:
+        return bool(int(raw))
+
+
+JSON_SERIALIZER = JSONSerializer()
+BOOL_SERIALIZER = BoolSerializer()
+
+
+@dataclass(frozen=True)
+class CacheSpec[T]:
+    """A family of cache keys, formatted from ``key_format`` with the parts of each key"""
+
+    name: str
+    key_format: str
+    # How long the cluster keeps a value. None never expires it.
+    ttl: timedelta | None
+    serializer: Serializer[T] = field(default=JSON_SERIALIZER)
+    local_ttl: timedelta = LOCAL_CACHE_TTL
+
+    def key(self, *parts: Any) -> str:
+        return self.key_format.format(*parts)
+
+    @property
+    def local_seconds(self) -> float:
+        if self.ttl is None:
+            return self.local_ttl.total_seconds()
+        return min(self.local_ttl, self.ttl).total_seconds()
+
+
+class MemoryTier:
+    """A thread-safe LRU of parsed values, each expiring on its own deadline."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Returns whether the key is held, and its value"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                cache_evictions.add(1, {"horde.cache.reason": "expired"})
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, seconds: float) -> None:
+        if self.max_entries <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                cache_evictions.add(1, {"horde.cache.reason": "size"})
+
+    def discard(self, *keys: str) -> None:
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.failed = False
+
+
+class HordeCache:
+    """Reads and writes the keys of ``CacheSpec`` families through the in-process, local and cluster tiers."""
+
+    def __init__(self, max_entries: int | None = None) -> None:
+        self.memory = MemoryTier(memory_cache_entries() if max_entries is None else max_entries)
+        hr.memory_tier = self.memory
+        self.flights: dict[str, _Flight] = {}
+        self.flights_lock = threading.Lock()
+
+    def get[T](self, spec: CacheSpec[T], *parts: Any) -> T | None:
+        """Returns the cached value of the key, or None if no tier holds it"""
+        if hr.horde_r is None:
+            return None
+        key = spec.key(*parts)
+        held, value = self.memory.get(key)
+        if held:
+            cache_lookups.add(1, {"horde.cache.name": spec.name, "horde.cache.tier": "memory"})
+            return value
+        value = self._parse(spec, key, hr.horde_r_get(key))
+        cache_lookups.add(1, {"horde.cache.name": spec.name, "horde.cache.tier": "redis" if value is not None else "miss"})
+        if value is not None:
+            self.memory.set(key, value, spec.local_seconds)
+        return value
+
+    def get_many[T](self, spec: CacheSpec[T], parts_list: Iterable[Hashable]) -> list[T | None]:
+        """Returns the cached values of many keys, reading the ones not held in-process in one round trip
+        Each item of parts_list is the single part of a key, or a tuple of its parts
+        """
+        keys = [spec.key(*(parts if isinstance(parts, tuple) else (parts,))) for parts in parts_list]
+        if hr.horde_r is None:
+            return [None] * len(keys)
+        values = []
+        missing = []
+        for idx, key in enumerate(keys):
+            held, value = self.memory.get(key)
+            values.append(value)
+            if not held:
+                missing.append(idx)
+        cache_lookups.add(len(keys) - len(missing), {"horde.cache.name": spec.name, "horde.cache.tier": "memory"})
+        if missing:
+            for idx, raw in zip(missing, hr.horde_r_get_many([keys[idx] for idx in missing]), strict=True):
+                values[idx] = self._parse(spec, keys[idx], raw)
+                if values[idx] is not None:
+                    self.memory.set(keys[idx], values[idx], spec.local_seconds)
+            found = sum(1 for idx in missing if values[idx] is not None)
+            cache_lookups.add(found, {"horde.cache.name": spec.name, "horde.cache.tier": "redis"})
+            cache_lookups.add(len(missing) - found, {"horde.cache.name": spec.name, "horde.cache.tier": "miss"})
+        return values
+
+    def get_or_load[T](self, spec: CacheSpec[T], *parts: Any, loader: Callable[[], T | None]) -> T | None:
+        """Returns the cached value of the key, or loads it with ``loader`` and caches it
+        A None from the loader is returned but not cached
+        """
+        if hr.horde_r is None:
+            return loader()
+        value = self.get(spec, *parts)
+        if value is not None:
+            return value
+        key = spec.key(*parts)
+        with self.flights_lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            if flight.done.wait(SINGLE_FLIGHT_TIMEOUT_SECONDS) and not flight.failed:
+                cache_lookups.add(1, {"horde.cache.name": spec.name, "horde.cache.tier": "coalesced"})
+                return flight.value
+            return loader()
+        try:
+            flight.value = loader()
+            if flight.value is not None:
+                self.set(spec, flight.value, *parts)
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self.flights_lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.value
+
+    def set[T](self, spec: CacheSpec[T], value: T, *parts: Any) -> None:
+        key = spec.key(*parts)
+        raw = spec.serializer.dumps(value)
+        # Writing drops the in-process copy, which is read back parsed, as other processes would read it
+        if spec.ttl is None:
+            hr.horde_r_set(key, raw)
+        else:
+            hr.horde_r_setex(key, spec.ttl, raw)
+
+    def set_many[T](self, spec: CacheSpec[T], values: dict[Hashable, T]) -> None:
+        """Caches many values in one round trip per redis server
+        Each value is keyed by the single part of its key, or a tuple of its parts
+        """
+        hr.horde_r_setex_many(
+            {spec.key(*(parts if isinstance(parts, tuple) else (parts,))): spec.serializer.dumps(value) for parts, value in values.items()},
+            spec.ttl,
+        )
+
+    def delete(self, spec: CacheSpec, *parts: Any) -> None:
+        hr.horde_r_delete(spec.key(*parts))
+
+    def clear_local(self) -> None:
+        """Drops every in-process copy"""
+        self.memory.clear()
+
+    @staticmethod
+    def _parse(spec: CacheSpec, key: str, raw: bytes | str | None) -> Any:
+        if raw is None:
+            return None
+        try:
+            return spec.serializer.loads(raw)
+        except (TypeError, ValueError) as err:
+            logger.error(f"Cached {key} could not be loaded: {err}")
+            return None
+
+
+horde_cache = HordeCache()
+
+AVAILABLE_MODELS = CacheSpec("available_models", "models_cache", timedelta(seconds=600))
+# Never expired to avoid ending up with massive operations in case the quorum thread dies
+TOTALS = CacheSpec("totals", "totals_cache", None)
+WORKER_MODELS = CacheSpec("worker_models", "worker_{}_model_cache", timedelta(seconds=600))
+ACTIVE_WORKER_COUNTS = CacheSpec("active_worker_counts", "count_active_workers_{}", timedelta(seconds=300))
@@ -5,6 +5,7 @@
 import json
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from threading import Lock
 
@@ -17,6 +18,9 @@ from horde.redis_ctrl import (
     is_redis_up,
 )
 
+# Upper bound of the threads writing to the redis servers in parallel
+REDIS_FAN_OUT_THREADS = 8
+
 
 class HordeRedis:
     def __init__(self):
@@ -25,6 +29,9 @@ class HordeRedis:
         self.all_horde_redis = []
         self.horde_local_r = None
         self.check_redis_thread = None
+        # The in-process tier of horde.horde_cache, whose copy of a key is dropped on every write to it
+        self.memory_tier = None
+        self.fan_out_executor = None
 
     def connect(self):
         logger.init("Horde Redis", status="Connecting")
@@ -48,26 +55,107 @@ class HordeRedis:
             time.sleep(10)
             self.all_horde_redis = get_all_redis_db_servers()
 
-    def horde_r_set(self, key, value):
-        for hr in self.all_horde_redis:
+    def write_all(self, write, action="writing in"):
+        """Runs write(server) on every redis server, in parallel when there are several
+        A server failing is logged and does not stop the writes to the others
+        """
+
+        def write_one(hr):
             try:
-                hr.set(key, value)
+                write(hr)
             except Exception as err:
-                logger.warning(f"Exception when writing in redis servers {hr}: {err}")
+                logger.warning(f"Exception when {action} redis servers {hr}: {err}")
+
+        servers = list(self.all_horde_redis)
+        if len(servers) <= 1:
+            for hr in servers:
+                write_one(hr)
+            return
+        if self.fan_out_executor is None:
+            self.fan_out_executor = ThreadPoolExecutor(max_workers=REDIS_FAN_OUT_THREADS, thread_name_prefix="horde_redis_fan_out")
+        wait([self.fan_out_executor.submit(write_one, hr) for hr in servers])
+
+    def forget_local(self, *keys):
+        """Drops the in-process copies of keys which were just written"""
+        if self.memory_tier is not None:
+            self.memory_tier.discard(*keys)
+
+    def horde_r_set(self, key, value):
+        self.write_all(lambda hr: hr.set(key, value))
         if self.horde_local_r:
             self.horde_local_r.setex(key, timedelta(10), value)
+        self.forget_local(key)
 
     def horde_r_setex(self, key, expiry, value):
-        for hr in self.all_horde_redis:
-            try:
-                hr.setex(key, expiry, value)
-            except Exception as err:
-                logger.warning(f"Exception when writing in redis servers {hr}: {err}")
+        self.write_all(lambda hr: hr.setex(key, expiry, value))
         # We don't keep local cache for more than 5 seconds
         if expiry > timedelta(5):
             expiry = timedelta(5)
         if self.horde_local_r:
             self.horde_local_r.setex(key, expiry, value)
+        self.forget_local(key)
+
+    def horde_r_setex_many(self, mapping, expiry):
+        """Same as horde_r_setex() for every key/value in mapping,
+        but sent as one pipelined round-trip per redis server
+        """
+        if not mapping:
+            return
+
+        def setex_many(hr):
+            pipe = hr.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, expiry, value)
+            pipe.execute()
+
+        self.write_all(setex_many)
+        if expiry > timedelta(5):
+            expiry = timedelta(5)
+        if self.horde_local_r:
+            pipe = self.horde_local_r.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, expiry, value)
+            pipe.execute()
+        self.forget_local(*mapping)
+
+    def horde_r_replace_hash(self, key, mapping, expiry):
+        """Replaces the whole hash at key with mapping in one transaction per redis server,
+        so readers never see a mix of the old and new fields
+        """
+
+        def replace_hash(hr):
+            pipe = hr.pipeline(transaction=True)
+            pipe.delete(key)
+            if mapping:
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, expiry)
+            pipe.execute()
+
+        self.write_all(replace_hash)
+
+    def horde_r_hget(self, key, field):
+        """Retrieves one field of a hash from remote redis
+        Hashes are not mirrored to local redis
+        """
+        if self.horde_r is None:
+            return None
+        return self.horde_r.hget(key, field)
+
+    def horde_r_hmget(self, key, fields):
+        """Retrieves many fields of a hash from remote redis in one round-trip
+        Missing fields are returned as None
+        """
+        if self.horde_r is None or not fields:
+            return [None] * len(fields)
+        return self.horde_r.hmget(key, fields)
+
+    def horde_r_get_many(self, keys):
+        """Retrieves the values of keys from remote redis in one round-trip
+        Missing keys are returned as None
+        """
+        if self.horde_r is None or not keys:
+            return [None] * len(keys)
+        return self.horde_r.mget(keys)
 
     def horde_r_setex_json(self, key, expiry, value):
         """Same as horde_r_setex()
@@ -136,13 +224,10 @@ class HordeRedis:
         return json.loads(value)
 
     def horde_r_delete(self, key):
-        for hr in self.all_horde_redis:
-            try:
-                hr.delete(key)
-            except Exception as err:
-                logger.warning(f"Exception when deleting from redis servers {hr}: {err}")
+        self.write_all(lambda hr: hr.delete(key), action="deleting from")
         if self.horde_local_r:
             self.horde_local_r.delete(key)
+        self.forget_local(key)
 
 
 horde_redis = HordeRedis()
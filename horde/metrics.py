@@ -94,6 +94,7 @@ BUCKETS_SECONDS = (
 )
 BUCKETS_COUNT = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
 BUCKETS_KUDOS = (0, 1, 10, 100, 1000, 10000, 100000)
+BUCKETS_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 2097152, 4194304, 8388608, 16777216)
 
 
 _BUCKET_REGISTRY: dict[str, tuple[float, ...]] = {}
@@ -114,6 +115,11 @@ def _kudos_histogram(name: str, description: str) -> Histogram:
     return logfire.metric_histogram(name, unit="kudos", description=description)
 
 
+def _bytes_histogram(name: str, description: str) -> Histogram:
+    _BUCKET_REGISTRY[name] = BUCKETS_BYTES
+    return logfire.metric_histogram(name, unit="By", description=description)
+
+
 def histogram_views() -> list[View]:
     """Return SDK ``View`` objects mapping each registered histogram to its
     explicit bucket boundaries. Pass into
@@ -252,6 +258,10 @@ pop_skipped = logfire.metric_counter(
     unit="1",
     description="WPs skipped during pop, by reason",
 )
+pop_long_poll_wait_duration = _seconds_histogram(
+    "horde.pop.long_poll_wait.duration",
+    "Time an empty long-poll pop spent parked, by outcome (woken/timeout)",
+)
 
 # --- submit ------------------------------------------------------------------
 submit_duration = _seconds_histogram(
@@ -286,9 +296,9 @@ submit_record_duration = _seconds_histogram(
     "horde.submit.record.duration",
     "Duration of procgen.record",
 )
-submit_record_performance_duration = _seconds_histogram(
-    "horde.submit.record_performance.duration",
-    "Duration of worker.record_performance (the worker_performances sample insert) after the submit commit",
+submit_post_submit_queue_duration = _seconds_histogram(
+    "horde.submit.post_submit_queue.duration",
+    "Duration of queueing the post-submit jobs (performance sample, statistic, webhook) within set_generation",
 )
 submit_wp_completion_duration = _seconds_histogram(
     "horde.submit.wp_completion.duration",
@@ -302,21 +312,13 @@ submit_wp_record_usage_duration = _seconds_histogram(
     "horde.submit.wp_record_usage.duration",
     "Duration of wp.record_usage within procgen.record",
 )
-submit_webhook_call_duration = _seconds_histogram(
-    "horde.submit.webhook_call.duration",
-    "Duration of procgen.send_webhook in submit",
-)
 submit_record_fulfilment_stat_duration = _seconds_histogram(
     "horde.submit.record_fulfilment_stat.duration",
-    "Duration of stats.record_fulfilment (gen-stats archive insert) during submit",
+    "Duration of stats.record_fulfilment (speed calculation and queueing of the bucket increments) during submit",
 )
 submit_server_upload_duration = _seconds_histogram(
     "horde.submit.server_upload.duration",
-    "Duration of server-side object-storage uploads during submit (b64 fallback image, shared metadata)",
-)
-submit_genstats_record_duration = _seconds_histogram(
-    "horde.submit.genstats_record.duration",
-    "Duration of the inline gen-stats archive insert during procgen.set_generation",
+    "Duration of server-side object-storage uploads during submit (b64 fallback image; shared metadata, handed to the uploader pool)",
 )
 submit_commit_duration = _seconds_histogram(
     "horde.submit.commit.duration",
@@ -355,7 +357,63 @@ webhook_duration = _seconds_histogram(
 webhook_outcomes = logfire.metric_counter(
     "horde.webhook.outcomes",
     unit="1",
-    description="Terminal webhook outcomes",
+    description="Terminal webhook outcomes (ok/giveup/dropped/circuit_open), by kind",
+)
+webhook_pending = logfire.metric_up_down_counter(
+    "horde.webhook.pending",
+    unit="1",
+    description="Webhook deliveries queued, waiting on their host, or scheduled for a retry",
+)
+
+# --- post-submit jobs --------------------------------------------------------
+post_submit_jobs = logfire.metric_counter(
+    "horde.post_submit.jobs",
+    unit="1",
+    description="Post-submit jobs run, by kind and outcome (ok/retry/dropped)",
+)
+post_submit_delay = _seconds_histogram(
+    "horde.post_submit.delay",
+    "Time from a post-submit job being queued to it running, by kind",
+)
+post_submit_batch_duration = _seconds_histogram(
+    "horde.post_submit.batch.duration",
+    "Duration of a post-submit runner batch, claim to commit",
+)
+
+# --- object storage ----------------------------------------------------------
+r2_encode_duration = _seconds_histogram(
+    "horde.r2.encode.duration",
+    "Duration of encoding an object in memory before its upload, by stage (source_image/generation/metadata/prompt)",
+)
+r2_upload_duration = _seconds_histogram(
+    "horde.r2.upload.duration",
+    "Duration of streaming an object to object storage, by stage",
+)
+r2_upload_bytes = _bytes_histogram(
+    "horde.r2.upload.bytes",
+    "Size of the objects uploaded to object storage, by stage",
+)
+r2_uploads_pending = logfire.metric_up_down_counter(
+    "horde.r2.uploads.pending",
+    unit="1",
+    description="Uploads queued or running on the background uploader pool",
+)
+r2_upload_outcomes = logfire.metric_counter(
+    "horde.r2.upload.outcomes",
+    unit="1",
+    description="Uploads handed to the uploader pool, by stage, outcome (ok/error) and whether the full pool had them run inline",
+)
+
+# --- cache -------------------------------------------------------------------
+cache_lookups = logfire.metric_counter(
+    "horde.cache.lookups",
+    unit="1",
+    description="horde_cache lookups, by cache name and the tier which answered (memory/redis/coalesced/miss)",
+)
+cache_evictions = logfire.metric_counter(
+    "horde.cache.evictions",
+    unit="1",
+    description="Entries dropped from the in-process cache tier, by reason (size/expired)",
 )
 
 # --- background jobs / countermeasures / db ----------------------------------
@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Wake-ups for long-polling job pops.
+
+With ``HORDE_POP_LONG_POLL=1`` a worker may send ``wait_seconds`` with its pop.
+When the pop finds nothing, the request is parked for up to that long instead of
+returning at once, and is woken as soon as matching work is queued. This replaces
+the one-pop-per-second polling loop of idle workers, each of which costs a full
+validation, a worker check-in UPDATE and two candidate queries.
+
+Notifications are keyed by request type and model. Every activation bumps a
+per-key version counter in this process and is published on a redis channel, so
+the pops parked on other nodes are woken too. A pop snapshots the versions of the
+keys it serves *before* its candidate search and waits for any of them to move, so
+work queued between the search and the wait is never missed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterable
+
+from horde.horde_redis import horde_redis as hr
+from horde.logger import logger
+from horde.vars import horde_instance_id
+
+POP_NOTIFY_CHANNEL = "horde_pop_notify"
+# Upper bound of ``wait_seconds``. Parked pops hold a server thread, so this is
+# kept well below the 300s a worker may go without checking in before it is stale.
+POP_MAX_WAIT_SECONDS = 20
+# Bumped for requests that did not ask for a specific model, which any worker of
+# the type may serve.
+ANY_MODEL = "*"
+# Bumped for every request of the type. Watched by workers that declared no models.
+ANY_REQUEST = ""
+
+type NotifyKey = tuple[str, str]
+type WatchSnapshot = dict[NotifyKey, int]
+
+
+def long_poll_enabled() -> bool:
+    return os.getenv("HORDE_POP_LONG_POLL", "0") == "1"
+
+
+def max_parked_pops() -> int:
+    return int(os.getenv("HORDE_MAX_PARKED_POPS", "16"))
+
+
+class VersionedNotifier:
+    """Versioned wake-up keys, bumped in this process and on every node through a redis channel.
+
+    Extending classes set ``channel`` and map their own events to keys.
+    """
+
+    channel: str
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.versions: dict[NotifyKey, int] = {}
+        self.subscriber_thread: threading.Thread | None = None
+
+    def enabled(self) -> bool:
+        return True
+
+    def snapshot(self, keys: Iterable[NotifyKey]) -> WatchSnapshot:
+        with self.condition:
+            return {key: self.versions.get(key, 0) for key in keys}
+
+    def wait(self, snapshot: WatchSnapshot, timeout: float) -> bool:
+        """Block until a watched key moves past ``snapshot``, or ``timeout`` seconds pass.
+
+        Returns whether the wait was woken by a notification.
+        """
+        self.ensure_subscribed()
+        with self.condition:
+            return self.condition.wait_for(lambda: self._moved(snapshot), timeout)
+
+    def bump(self, keys: list[NotifyKey]) -> None:
+        """Bump ``keys`` in this process and publish them to the other nodes."""
+        if not self.enabled():
+            return
+        self.bump_local(keys)
+        if hr.horde_r is None:
+            return
+        payload = json.dumps({"keys": keys, "origin": horde_instance_id})
+        try:
+            hr.horde_r.publish(self.channel, payload)
+        except Exception as err:
+            logger.warning(f"Exception when publishing to {self.channel}: {err}")
+
+    def bump_local(self, keys: list[NotifyKey]) -> None:
+        with self.condition:
+            for key in keys:
+                self.versions[key] = self.versions.get(key, 0) + 1
+            self.condition.notify_all()
+
+    def ensure_subscribed(self) -> None:
+        """Start listening for the notifications of other nodes, once per process."""
+        if self.subscriber_thread is not None or hr.horde_r is None:
+            return
+        with self.condition:
+            if self.subscriber_thread is not None:
+                return
+            self.subscriber_thread = threading.Thread(target=self._listen, daemon=True)
+            self.subscriber_thread.start()
+
+    def _moved(self, snapshot: WatchSnapshot) -> bool:
+        return any(self.versions.get(key, 0) != version for key, version in snapshot.items())
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = hr.horde_r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    notification = json.loads(message["data"])
+                    # This node already bumped its own keys when it published
+                    if notification.get("origin") == horde_instance_id:
+                        continue
+                    self.bump_local([tuple(key) for key in notification["keys"]])
+            except Exception as err:
+                logger.warning(f"Listener of {self.channel} failed, resubscribing: {err}")
+                time.sleep(1)
+
+
+class PopNotifier(VersionedNotifier):
+    """Versioned wake-up keys for the pops parked in this process."""
+
+    channel = POP_NOTIFY_CHANNEL
+
+    def enabled(self) -> bool:
+        return long_poll_enabled()
+
+    def watch(self, gentype: str, models: Iterable[str]) -> WatchSnapshot:
+        """Snapshot the keys a worker serving ``models`` waits on."""
+        keys = {(gentype, model) for model in models}
+        if keys:
+            keys.add((gentype, ANY_MODEL))
+        else:
+            keys.add((gentype, ANY_REQUEST))
+        return self.snapshot(keys)
+
+    def notify(self, gentype: str, models: Iterable[str]) -> None:
+        """Announce newly queued work for ``models`` to the pops parked on every node."""
+        keys = [(gentype, model) for model in sorted(models)] or [(gentype, ANY_MODEL)]
+        keys.append((gentype, ANY_REQUEST))
+        self.bump(keys)
+
+
+pop_notifier = PopNotifier()
+
+
+class PopSlots:
+    """Counts the long-polling pops open in this process against ``HORDE_MAX_PARKED_POPS``.
+
+    A pop which cannot get a slot is answered at once, so parked pops can never take
+    every server thread.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self) -> bool:
+        with self.lock:
+            if self.open >= max_parked_pops():
+                return False
+            self.open += 1
+            return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.open = max(self.open - 1, 0)
+
+
+pop_slots = PopSlots()
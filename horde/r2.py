@@ -2,9 +2,16 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import hashlib
+import hmac
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
 from io import BytesIO
+from urllib.parse import parse_qsl, quote, urlsplit
 from uuid import uuid4
 
 import boto3
@@ -12,7 +19,9 @@ import logfire
 from botocore.exceptions import ClientError
 from PIL import Image
 
+from horde.horde_cache import CacheSpec, horde_cache
 from horde.logger import logger
+from horde.metrics import r2_encode_duration, r2_upload_bytes, r2_upload_duration, r2_upload_outcomes, r2_uploads_pending
 
 r2_transient_account = os.getenv(
     "R2_TRANSIENT_ACCOUNT",
@@ -44,6 +53,19 @@ old_r2 = boto3.client(
 # for key in s3_client_shared.list_objects(Bucket=r2_transient_bucket)['Contents']:
 #     logger.debug(key['Key'])
 
+PRESIGNED_URL_EXPIRY_SECONDS = 1800
+# A cached download URL is signed anew once it has less than this left before it expires,
+# so clients always get at least this long to download the image
+PRESIGNED_URL_REFRESH_MARGIN_SECONDS = 300
+# The download URLs of generated images, with the epoch second they expire at, keyed by whether they are shared and procgen id
+PROCGEN_DOWNLOAD_URL = CacheSpec(
+    "procgen_download_url",
+    "procgen_download_url_{}_{}",
+    timedelta(seconds=PRESIGNED_URL_EXPIRY_SECONDS - PRESIGNED_URL_REFRESH_MARGIN_SECONDS),
+    # The expiry is checked on every read, so the in-process copy can live as long as the cached one
+    local_ttl=timedelta(seconds=PRESIGNED_URL_EXPIRY_SECONDS - PRESIGNED_URL_REFRESH_MARGIN_SECONDS),
+)
+
 
 @logger.catch(reraise=True)
 def generate_presigned_url(client, client_method, method_parameters, expires_in=1800):
@@ -80,17 +102,134 @@ def generate_procgen_upload_url(procgen_id, shared=False):
 
 
 def generate_procgen_download_url(procgen_id, shared=False):
+    return generate_procgen_download_urls([procgen_id], shared)[str(procgen_id)]
+
+
+def generate_procgen_download_urls(procgen_ids, shared=False):
+    """Returns the download URLs of generated images, keyed by procgen id.
+    The cached URLs are reused until close to their expiry, and the others are signed together
+    """
+    procgen_ids = [str(procgen_id) for procgen_id in procgen_ids]
+    cached = horde_cache.get_many(PROCGEN_DOWNLOAD_URL, [(int(shared), procgen_id) for procgen_id in procgen_ids])
+    now = time.time()
+    download_urls = {}
+    unsigned = []
+    for procgen_id, entry in zip(procgen_ids, cached, strict=True):
+        if entry is not None and entry[1] - PRESIGNED_URL_REFRESH_MARGIN_SECONDS > now:
+            download_urls[procgen_id] = entry[0]
+        else:
+            unsigned.append(procgen_id)
+    if not unsigned:
+        return download_urls
     client = s3_client
     if shared:
         client = s3_client_shared
     # if not file_exists(client,  f"{procgen_id}.webp"):
     #     client = old_r2
-    return generate_presigned_url(
-        client=client,
-        client_method="get_object",
-        method_parameters={"Bucket": r2_transient_bucket, "Key": f"{procgen_id}.webp"},
-        expires_in=1800,
+    signed = get_presigner(client, r2_transient_bucket).presign_get_objects(
+        [f"{procgen_id}.webp" for procgen_id in unsigned],
+        PRESIGNED_URL_EXPIRY_SECONDS,
+    )
+    expires_at = now + PRESIGNED_URL_EXPIRY_SECONDS
+    horde_cache.set_many(
+        PROCGEN_DOWNLOAD_URL,
+        {(int(shared), procgen_id): [url, expires_at] for procgen_id, url in zip(unsigned, signed, strict=True)},
     )
+    download_urls.update(zip(unsigned, signed, strict=True))
+    return download_urls
+
+
+class SigV4Presigner:
+    """Presigns the get_object URLs of one client and bucket as botocore does,
+    but deriving the SigV4 signing key once per day instead of once per URL.
+
+    botocore runs every URL through its whole request pipeline (parameter validation,
+    endpoint resolution, event hooks), then derives the signing key anew. The first
+    time this presigner is used, it has botocore sign one URL, and only signs URLs
+    itself from then on if it reproduced that URL exactly. Otherwise, such as for a
+    client signing with SigV2, it leaves every URL to botocore.
+    """
+
+    VERIFICATION_KEY = "horde-presign-verification.webp"
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+        self.verified = None
+        self.base_url = None
+        self.region = None
+        self.service = None
+        # (secret key, credential scope, signing key) of the last key derived
+        self.signing_key = (None, None, None)
+        self.lock = threading.Lock()
+
+    def presign_get_objects(self, keys, expires_in):
+        if self.verified is None:
+            with self.lock:
+                if self.verified is None:
+                    self.verified = self.verify(expires_in)
+        if not self.verified:
+            return [generate_presigned_url(self.client, "get_object", {"Bucket": self.bucket, "Key": key}, expires_in) for key in keys]
+        credentials = self.client._request_signer._credentials.get_frozen_credentials()
+        amz_date = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+        return [self.sign(credentials, key, amz_date, expires_in) for key in keys]
+
+    def verify(self, expires_in):
+        try:
+            url = generate_presigned_url(self.client, "get_object", {"Bucket": self.bucket, "Key": self.VERIFICATION_KEY}, expires_in)
+            parts = urlsplit(url)
+            query = dict(parse_qsl(parts.query))
+            if query.get("X-Amz-Algorithm") != "AWS4-HMAC-SHA256":
+                logger.info(f"Presigned URLs of {self.bucket} are not signed with SigV4. Leaving them to botocore.")
+                return False
+            _, _, self.region, self.service, _ = query["X-Amz-Credential"].split("/")
+            self.base_url = f"{parts.scheme}://{parts.netloc}"
+            credentials = self.client._request_signer._credentials.get_frozen_credentials()
+            if self.sign(credentials, self.VERIFICATION_KEY, query["X-Amz-Date"], expires_in) == url:
+                return True
+            logger.warning(f"Could not reproduce the presigned URLs of {self.bucket}. Leaving them to botocore.")
+        except Exception as err:
+            logger.warning(f"Could not verify the presigned URLs of {self.bucket}: {err}. Leaving them to botocore.")
+        return False
+
+    def sign(self, credentials, key, amz_date, expires_in):
+        scope = f"{amz_date[:8]}/{self.region}/{self.service}/aws4_request"
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{credentials.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if credentials.token:
+            query["X-Amz-Security-Token"] = credentials.token
+        canonical_query = "&".join(f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" for name, value in sorted(query.items()))
+        path = f"/{quote(self.bucket, safe='/~')}/{quote(key, safe='/~')}"
+        canonical_request = f"GET\n{path}\n{canonical_query}\nhost:{urlsplit(self.base_url).netloc}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        signature = hmac.new(self.get_signing_key(credentials.secret_key, scope), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{self.base_url}{path}?{canonical_query}&X-Amz-Signature={signature}"
+
+    def get_signing_key(self, secret_key, scope):
+        cached_secret_key, cached_scope, signing_key = self.signing_key
+        if (cached_secret_key, cached_scope) != (secret_key, scope):
+            signing_key = f"AWS4{secret_key}".encode()
+            for part in scope.split("/"):
+                signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+            self.signing_key = (secret_key, scope, signing_key)
+        return signing_key
+
+
+_presigners = {}
+_presigners_lock = threading.Lock()
+
+
+def get_presigner(client, bucket):
+    with _presigners_lock:
+        presigner = _presigners.get((client, bucket))
+        if presigner is None:
+            presigner = _presigners[(client, bucket)] = SigV4Presigner(client, bucket)
+        return presigner
 
 
 def delete_procgen_image(procgen_id):
@@ -101,21 +240,43 @@ def delete_source_image(source_image_uuid):
     s3_client.delete_object(Bucket=r2_source_image_bucket, Key=f"{source_image_uuid}.webp")
 
 
-def upload_image(client, bucket, image, filename, quality=100):
+def upload_image(client, bucket, image, filename, quality=100, stage="source_image"):
     with logfire.span("horde.r2.upload_image", bucket=bucket, filename=filename):
-        return _upload_image(client, bucket, image, filename, quality)
+        return _upload_image(client, bucket, image, filename, quality, stage)
 
 
-def _upload_image(client, bucket, image, filename, quality=100):
+def _upload_image(client, bucket, image, filename, quality=100, stage="source_image"):
+    encode_t0 = time.monotonic()
     image_io = BytesIO()
     image.save(image_io, format="WebP", quality=quality, exact=True)
-    image_io.seek(0)
+    r2_encode_duration.record(time.monotonic() - encode_t0, {"horde.r2.stage": stage})
+    if not upload_fileobj(client, bucket, image_io, filename, stage):
+        return False
+    return generate_img_download_url(filename, r2_source_image_bucket)
+
+
+def upload_fileobj(client, bucket, fileobj, key, stage):
+    """Streams an in-memory file to the bucket. Returns False if the upload failed"""
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    upload_t0 = time.monotonic()
     try:
-        client.upload_fileobj(image_io, bucket, filename)
+        client.upload_fileobj(fileobj, bucket, key)
     except ClientError as err:
-        logger.error(f"Error encountered while uploading {filename}: {err}")
+        logger.error(f"Error encountered while uploading {key}: {err}")
         return False
-    return generate_img_download_url(filename, r2_source_image_bucket)
+    finally:
+        r2_upload_duration.record(time.monotonic() - upload_t0, {"horde.r2.stage": stage})
+    r2_upload_bytes.record(size, {"horde.r2.stage": stage})
+    return True
+
+
+def encode_json(data, stage):
+    """Returns data as an in-memory JSON file, as the metadata and prompts are stored"""
+    encode_t0 = time.monotonic()
+    json_io = BytesIO(json.dumps(data, indent=4).encode())
+    r2_encode_duration.record(time.monotonic() - encode_t0, {"horde.r2.stage": stage})
+    return json_io
 
 
 def download_image(client, bucket, key):
@@ -158,6 +319,7 @@ def upload_generated_image(image, filename):
         image,
         filename,
         quality=95,
+        stage="generation",
     )
 
 
@@ -168,15 +330,20 @@ def upload_shared_generated_image(image, filename):
         image,
         filename,
         quality=95,
+        stage="generation",
     )
 
 
-def upload_shared_metadata(filename):
-    try:
-        s3_client_shared.upload_file(filename, r2_permanent_bucket, filename)
-    except ClientError as e:
-        logger.error(f"Error encountered while uploading metadata {filename}: {e}")
+def upload_shared_metadata(filename, metadata):
+    return upload_fileobj(s3_client_shared, r2_permanent_bucket, encode_json(metadata, "metadata"), filename, "metadata")
+
+
+def upload_shared_generation_metadata(procgen_id, metadata):
+    """Uploads the shared dataset metadata of a generation, next to its image"""
+    if not check_shared_image(f"{procgen_id}.webp"):
+        logger.warning(f"Avoiding json metadata upload because {procgen_id}.webp doesn't seem to exist.")
         return False
+    return upload_shared_metadata(f"{procgen_id}.json", metadata)
 
 
 def upload_prompt(prompt_dict):
@@ -186,19 +353,71 @@ def upload_prompt(prompt_dict):
 
 def _upload_prompt(prompt_dict):
     filename = f"{uuid4()}.json"
-    json_object = json.dumps(prompt_dict, indent=4)
-    # Writing to sample.json
-    with open(filename, "w") as f:
-        f.write(json_object)
     try:
-        s3_client.upload_file(filename, "prompts", filename)
-        os.remove(filename)
+        if not upload_fileobj(s3_client, "prompts", encode_json(prompt_dict, "prompt"), filename, "prompt"):
+            return False
     except Exception as err:
         logger.error(f"Error encountered while uploading prompt {filename}: {err}")
-        os.remove(filename)
         return False
 
 
+def r2_upload_threads():
+    return int(os.getenv("HORDE_R2_UPLOAD_THREADS", "4"))
+
+
+def r2_upload_max_pending():
+    return int(os.getenv("HORDE_R2_UPLOAD_MAX_PENDING", "64"))
+
+
+class UploaderPool:
+    """Runs uploads off the request path, on a bounded pool of threads.
+
+    Once max_pending uploads are queued or running, or without threads, an upload
+    runs inline on the caller instead, so a backed up object storage slows the
+    submits down rather than piling up uploads or dropping them.
+    The threads start on the first upload, so that they survive a post-import fork.
+    """
+
+    def __init__(self, threads=None, max_pending=None):
+        self.threads = r2_upload_threads() if threads is None else threads
+        self.max_pending = r2_upload_max_pending() if max_pending is None else max_pending
+        self.slots = threading.BoundedSemaphore(max(self.max_pending, 1))
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, stage, upload, *args):
+        """Runs upload(*args) on the pool, or inline if the pool is full"""
+        if self.threads <= 0 or not self.slots.acquire(blocking=False):
+            self.run(stage, upload, args, inline=True)
+            return
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="r2_uploader")
+        r2_uploads_pending.add(1)
+        self.executor.submit(self.run_pooled, stage, upload, args)
+
+    def run_pooled(self, stage, upload, args):
+        try:
+            self.run(stage, upload, args, inline=False)
+        finally:
+            r2_uploads_pending.add(-1)
+            self.slots.release()
+
+    @staticmethod
+    def run(stage, upload, args, inline):
+        outcome = "error"
+        try:
+            if upload(*args) is not False:
+                outcome = "ok"
+        except Exception as err:
+            logger.error(f"Error encountered while uploading {stage}: {err}")
+        r2_upload_outcomes.add(1, {"horde.r2.stage": stage, "outcome": outcome, "horde.r2.inline": inline})
+
+
+r2_uploader = UploaderPool()
+
+
 def generate_img_download_url(filename, bucket=r2_transient_bucket):
     return generate_presigned_url(s3_client, "get_object", {"Bucket": bucket, "Key": filename}, 1800)
 
@@ -0,0 +1,340 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Pooled delivery of the generation and alchemy webhooks.
+
+Webhooks used to go through a queue of 256 deliveries drained by a single sender
+thread, which POSTed each one with up to three attempts back to back. One slow or
+unreachable subscriber therefore delayed every other subscriber's notifications,
+and a burst of completions overflowed the queue.
+
+``webhook_engine`` delivers them with a pool of ``HORDE_WEBHOOK_WORKERS`` threads
+instead:
+
+- each thread keeps a ``requests.Session``, so the connections to a subscriber
+  are kept alive and reused;
+- at most ``HORDE_WEBHOOK_PER_HOST`` deliveries to one host are in flight at
+  once. The deliveries over that cap wait per host, without holding a thread;
+- a host which fails ``BREAKER_FAILURES`` times in a row has its circuit opened
+  for ``BREAKER_COOLDOWN_SECONDS``. Its deliveries are dropped meanwhile, then
+  a single delivery probes it before the others follow;
+- a failed attempt is retried after a jittered exponential backoff, scheduled
+  on a timer wheel rather than by sleeping a thread, up to ``MAX_ATTEMPTS``;
+- at most ``HORDE_WEBHOOK_HOST_PENDING`` deliveries to one host are pending, so
+  a slow subscriber drops its own deliveries rather than filling the engine;
+- at most ``HORDE_WEBHOOK_MAX_PENDING`` deliveries are pending, retries and
+  waiting ones included. Past that, new deliveries are dropped.
+
+The state of a host is forgotten once it has no delivery pending, or, if its
+deliveries failed, once it has been idle for ``BREAKER_COOLDOWN_SECONDS``.
+
+Delivery stays best-effort, as before: a delivery which runs out of attempts or
+is dropped is only logged and counted.
+
+The threads start on the first delivery, so every serving process owns live
+threads; threads started at import time would not survive a post-import fork.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlsplit
+
+import logfire
+import requests
+
+from horde.logger import logger
+from horde.metrics import webhook_duration, webhook_outcomes, webhook_pending
+
+MAX_ATTEMPTS = 3
+ATTEMPT_TIMEOUT_SECONDS = 3
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN_SECONDS = 60.0
+TIMER_TICK_SECONDS = 0.1
+TIMER_SLOTS = 512
+
+
+def webhook_workers() -> int:
+    return int(os.getenv("HORDE_WEBHOOK_WORKERS", "8"))
+
+
+def webhook_per_host() -> int:
+    return int(os.getenv("HORDE_WEBHOOK_PER_HOST", "4"))
+
+
+def webhook_max_pending() -> int:
+    return int(os.getenv("HORDE_WEBHOOK_MAX_PENDING", "4096"))
+
+
+def webhook_host_pending() -> int:
+    return int(os.getenv("HORDE_WEBHOOK_HOST_PENDING", "256"))
+
+
+@dataclass
+class WebhookDelivery:
+    url: str
+    data: dict[str, Any]
+    # "generation" or "alchemy", for the logs and metrics
+    kind: str
+    # Identify the request and generation in the delivery spans
+    span_attributes: dict[str, str] = field(default_factory=dict)
+    attempt: int = 0
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc.lower()
+
+
+@dataclass
+class HostState:
+    # Every delivery to the host the engine holds: ready, in flight, waiting or due for a retry
+    pending: int = 0
+    in_flight: int = 0
+    waiting: deque[WebhookDelivery] = field(default_factory=deque)
+    failures: int = 0
+    # While in the future, the circuit is open. Once past, a single delivery probes the host.
+    open_until: float = 0.0
+    # When the last delivery to the host finished
+    last_finished: float = 0.0
+
+
+class TimerWheel:
+    """A hashed timer wheel: each slot holds what is due when the cursor reaches it, after some full turns"""
+
+    def __init__(self, tick_seconds: float, slots: int) -> None:
+        self.tick_seconds = tick_seconds
+        self.slots: list[list[list[Any]]] = [[] for _ in range(slots)]
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def schedule(self, delay_seconds: float, item: Any) -> None:
+        ticks = max(1, math.ceil(delay_seconds / self.tick_seconds))
+        with self.lock:
+            slot = (self.cursor + ticks) % len(self.slots)
+            self.slots[slot].append([(ticks - 1) // len(self.slots), item])
+
+    def advance(self) -> list[Any]:
+        """Moves the cursor one tick and returns what became due"""
+        with self.lock:
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            entries = self.slots[self.cursor]
+            self.slots[self.cursor] = [[turns - 1, item] for turns, item in entries if turns > 0]
+            return [item for turns, item in entries if turns == 0]
+
+
+class WebhookEngine:
+    """Delivers webhooks with a pool of threads, per-host caps and circuit breakers, and timed retries."""
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        per_host: int | None = None,
+        max_pending: int | None = None,
+        host_pending: int | None = None,
+        retry_base_seconds: float = RETRY_BASE_SECONDS,
+        tick_seconds: float = TIMER_TICK_SECONDS,
+    ) -> None:
+        self.workers = webhook_workers() if workers is None else workers
+        self.per_host = webhook_per_host() if per_host is None else per_host
+        self.max_pending = webhook_max_pending() if max_pending is None else max_pending
+        self.host_pending = webhook_host_pending() if host_pending is None else host_pending
+        self.retry_base_seconds = retry_base_seconds
+        self.ready: queue.Queue[WebhookDelivery | None] = queue.Queue()
+        self.wheel = TimerWheel(tick_seconds, TIMER_SLOTS)
+        self.hosts: dict[str, HostState] = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.threads: list[threading.Thread] = []
+        self.stopped = threading.Event()
+        self.sessions = threading.local()
+
+    def submit(self, delivery: WebhookDelivery) -> bool:
+        """Queues a delivery. Returns False if it was dropped, as too many deliveries are pending in all or to its host"""
+        self.ensure_started()
+        host_key = delivery.host
+        with self.lock:
+            host = self.hosts.get(host_key)
+            if self.pending >= self.max_pending:
+                dropped = "dropped"
+            elif host is not None and host.pending >= self.host_pending:
+                dropped = "host_backlog"
+            else:
+                dropped = None
+                if host is None:
+                    host = self.hosts[host_key] = HostState()
+                host.pending += 1
+                self.pending += 1
+        if dropped is not None:
+            webhook_outcomes.add(1, {"outcome": dropped, "kind": delivery.kind})
+            if dropped == "dropped":
+                logger.warning(f"Webhook deliveries backed up; dropping {delivery.kind} webhook to {host_key}")
+            else:
+                logger.debug(f"Webhook deliveries to {host_key} backed up; dropping {delivery.kind} webhook")
+            return False
+        webhook_pending.add(1)
+        self.ready.put(delivery)
+        return True
+
+    def ensure_started(self) -> None:
+        if self.threads and all(thread.is_alive() for thread in self.threads):
+            return
+        with self.lock:
+            if self.threads and all(thread.is_alive() for thread in self.threads):
+                return
+            self.stopped.clear()
+            self.threads = [threading.Thread(target=self._work, name=f"webhook-sender-{idx}", daemon=True) for idx in range(self.workers)]
+            self.threads.append(threading.Thread(target=self._tick, name="webhook-timer", daemon=True))
+            for thread in self.threads:
+                thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for _ in range(self.workers):
+            self.ready.put(None)
+        for thread in self.threads:
+            thread.join(5)
+        self.threads = []
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Waits until no delivery is pending. Returns False on timeout"""
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def _work(self) -> None:
+        while True:
+            delivery = self.ready.get()
+            if delivery is None:
+                return
+            try:
+                self._dispatch(delivery)
+            except Exception as err:
+                logger.warning(f"Unexpected error delivering {delivery.kind} webhook: {err}")
+                self._finish(delivery, "giveup")
+
+    def _tick(self) -> None:
+        next_tick = time.monotonic()
+        next_eviction = next_tick + BREAKER_COOLDOWN_SECONDS
+        while not self.stopped.is_set():
+            next_tick += self.wheel.tick_seconds
+            self.stopped.wait(max(0, next_tick - time.monotonic()))
+            for delivery in self.wheel.advance():
+                self.ready.put(delivery)
+            if next_tick >= next_eviction:
+                self.evict_idle_hosts()
+                next_eviction = next_tick + BREAKER_COOLDOWN_SECONDS
+
+    def evict_idle_hosts(self, now: float | None = None) -> None:
+        """Forgets the hosts with no pending delivery whose deliveries failed, once idle for the breaker cooldown"""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            idle = [
+                host_key
+                for host_key, host in self.hosts.items()
+                if not host.pending and host.open_until <= now and now - host.last_finished >= BREAKER_COOLDOWN_SECONDS
+            ]
+            for host_key in idle:
+                del self.hosts[host_key]
+
+    def _dispatch(self, delivery: WebhookDelivery) -> None:
+        host_key = delivery.host
+        with self.lock:
+            host = self.hosts[host_key]
+            if host.open_until > time.monotonic():
+                circuit_open = True
+            else:
+                circuit_open = False
+                # A host whose circuit was opened gets a single probing delivery at a time
+                cap = 1 if host.open_until else self.per_host
+                if host.in_flight >= cap:
+                    host.waiting.append(delivery)
+                    return
+                host.in_flight += 1
+        if circuit_open:
+            logger.debug(f"Circuit open for {host_key}; dropping {delivery.kind} webhook")
+            self._finish(delivery, "circuit_open")
+            return
+        delivered = self._attempt(delivery)
+        with self.lock:
+            host.in_flight -= 1
+            if delivered:
+                host.failures = 0
+                host.open_until = 0.0
+            else:
+                host.failures += 1
+                if host.failures >= BREAKER_FAILURES:
+                    if host.open_until <= time.monotonic():
+                        logger.warning(f"Webhooks to {host_key} failed {host.failures} times in a row; pausing them")
+                    host.open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+            released = [host.waiting.popleft() for _ in range(min(len(host.waiting), self.per_host - host.in_flight))]
+        for waiting in released:
+            self.ready.put(waiting)
+        if delivered:
+            self._finish(delivery, "ok")
+        elif delivery.attempt < MAX_ATTEMPTS:
+            self.wheel.schedule(self.retry_delay(delivery.attempt), delivery)
+        else:
+            self._finish(delivery, "giveup")
+
+    def retry_delay(self, attempts: int) -> float:
+        """Full jitter over an exponential backoff"""
+        return random.uniform(0, min(RETRY_MAX_SECONDS, self.retry_base_seconds * 2 ** (attempts - 1)))
+
+    def _attempt(self, delivery: WebhookDelivery) -> bool:
+        delivery.attempt += 1
+        session = getattr(self.sessions, "session", None)
+        if session is None:
+            session = self.sessions.session = requests.Session()
+        with logfire.span("horde.webhook.send", kind=delivery.kind, attempt=delivery.attempt, **delivery.span_attributes) as span:
+            t0 = time.monotonic()
+            try:
+                req = session.post(delivery.url, json=delivery.data, timeout=ATTEMPT_TIMEOUT_SECONDS)
+            except Exception as err:
+                webhook_duration.record(time.monotonic() - t0, {"attempt": delivery.attempt - 1, "outcome": "exception"})
+                logger.debug(
+                    f"Exception when sending {delivery.kind} webhook: {err}. Will retry {MAX_ATTEMPTS - delivery.attempt} more times...",
+                )
+                span.set_attribute("horde.webhook.outcome", "exception")
+                return False
+            attempt_outcome = "ok" if req.ok else "http_error"
+            webhook_duration.record(
+                time.monotonic() - t0,
+                {"attempt": delivery.attempt - 1, "outcome": attempt_outcome, "status_code": req.status_code},
+            )
+            span.set_attribute("horde.webhook.outcome", attempt_outcome)
+            if not req.ok:
+                logger.debug(
+                    f"Something went wrong when sending {delivery.kind} webhook: {req.status_code} - {req.text}. "
+                    f"Will retry {MAX_ATTEMPTS - delivery.attempt} more times...",
+                )
+            return req.ok
+
+    def _finish(self, delivery: WebhookDelivery, outcome: str) -> None:
+        webhook_outcomes.add(1, {"outcome": outcome, "kind": delivery.kind})
+        webhook_pending.add(-1)
+        host_key = delivery.host
+        with self.idle:
+            host = self.hosts[host_key]
+            host.pending -= 1
+            host.last_finished = time.monotonic()
+            # A host whose deliveries failed is kept until evict_idle_hosts, so that its breaker survives a lull
+            if not host.pending and not host.failures and host.open_until <= host.last_finished:
+                del self.hosts[host_key]
+            self.pending -= 1
+            if self.pending == 0:
+                self.idle.notify_all()
+
+
+webhook_engine = WebhookEngine()
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Redis sorted-set priority queue of the active image requests.
+
+The image pop finds its candidates with ``ORDER BY queue_priority DESC, created
+ASC`` over the whole active queue.
+
+With ``HORDE_WP_REDIS_QUEUE=1`` every activated image request is also added to a
+redis sorted set per model (and one for requests naming no model), scored by its
+``queue_priority``. That key already accounts for the aging of the requests (see
+``get_queue_priority``) and never changes, so the sets need no writes as the
+requests wait. The pop takes the top of the sets of the worker's models, filters
+that window against the database, and locks the rows it picks there.
+
+Requests which stop being queued are removed by the quorum, which compares the
+active queue it reads every second against the requests it saw before, and
+reconciles the whole set against the database every ``WP_PRIORITY_QUEUE_RECONCILE_SECONDS``.
+The pop re-checks the volatile columns of every row it locks, so a request still
+in the set after it finished is never handed out.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable
+
+from horde.horde_redis import horde_redis as hr
+from horde.logger import logger
+from horde.pop_notifier import ANY_MODEL
+
+WP_PRIORITY_QUEUE_RECONCILE_SECONDS = 10
+
+
+def redis_priority_queue_enabled() -> bool:
+    return os.getenv("HORDE_WP_REDIS_QUEUE", "0") == "1"
+
+
+def priority_queue_key(wp_type: str, model: str) -> str:
+    return f"wp_priority_queue:{wp_type}:{model}"
+
+
+def priority_queue_members_key(wp_type: str) -> str:
+    """The hash of the models each queued request was added under, keyed by request id"""
+    return f"wp_priority_queue:{wp_type}:members"
+
+
+class WPPriorityQueue:
+    """Adds, removes and reads the requests of the per-model sorted sets."""
+
+    def __init__(self) -> None:
+        # The requests this process saw queued on its last reconcile, by type
+        self.reconciled: dict[str, set[str]] = {}
+        self.reconciled_at: dict[str, float] = {}
+        # Members which were not queued on the last full reconcile, by type
+        self.strays: dict[str, set[str]] = {}
+
+    def enqueue(self, wp_type: str, entries: list[tuple[uuid.UUID, float, list[str]]]) -> None:
+        """Add (id, score, models) entries to the sorted sets of their models"""
+        if not entries:
+            return
+        for redis_server in hr.all_horde_redis:
+            try:
+                pipe = redis_server.pipeline(transaction=False)
+                for wp_id, score, models in entries:
+                    for model in models or [ANY_MODEL]:
+                        pipe.zadd(priority_queue_key(wp_type, model), {str(wp_id): score})
+                    pipe.hset(priority_queue_members_key(wp_type), str(wp_id), json.dumps(models))
+                pipe.execute()
+            except Exception as err:
+                logger.warning(f"Exception when writing in redis servers {redis_server}: {err}")
+
+    def dequeue(self, wp_type: str, wp_ids: list[str]) -> None:
+        if not wp_ids or hr.horde_r is None:
+            return
+        models_per_wp = dict(zip(wp_ids, hr.horde_r_hmget(priority_queue_members_key(wp_type), wp_ids), strict=True))
+        for redis_server in hr.all_horde_redis:
+            try:
+                pipe = redis_server.pipeline(transaction=False)
+                for wp_id, models in models_per_wp.items():
+                    if models is None:
+                        continue
+                    for model in json.loads(models) or [ANY_MODEL]:
+                        pipe.zrem(priority_queue_key(wp_type, model), wp_id)
+                pipe.hdel(priority_queue_members_key(wp_type), *wp_ids)
+                pipe.execute()
+            except Exception as err:
+                logger.warning(f"Exception when writing in redis servers {redis_server}: {err}")
+
+    def top_candidates(
+        self,
+        wp_type: str,
+        models: list[str],
+        include_modelless: bool,
+        limit: int,
+    ) -> tuple[list[uuid.UUID], bool] | None:
+        """Returns up to ``limit`` of the highest priority requests naming one of ``models``
+        (or no model, if ``include_modelless``), and whether that is all of them
+        Returns None if redis can't be read, so the caller can run the full query instead
+        """
+        keys = [priority_queue_key(wp_type, model) for model in models]
+        if include_modelless:
+            keys.append(priority_queue_key(wp_type, ANY_MODEL))
+        if not keys:
+            return [], True
+        if hr.horde_r is None:
+            return None
+        try:
+            pipe = hr.horde_r.pipeline(transaction=False)
+            for key in keys:
+                pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            per_key = pipe.execute()
+        except Exception as err:
+            logger.warning(f"Exception when reading the {wp_type} priority queue from redis: {err}")
+            return None
+        exhausted = all(len(members) < limit for members in per_key)
+        candidates = []
+        seen = set()
+        for member, _ in heapq.merge(*per_key, key=lambda entry: -entry[1]):
+            wp_id = member.decode() if isinstance(member, bytes) else member
+            if wp_id in seen:
+                continue
+            seen.add(wp_id)
+            candidates.append(uuid.UUID(wp_id))
+            if len(candidates) == limit:
+                break
+        return candidates, exhausted
+
+    def reconcile(
+        self,
+        wp_type: str,
+        queue_priorities: dict[uuid.UUID, float],
+        load_models: Callable[[list[uuid.UUID]], dict[uuid.UUID, list[str]]],
+    ) -> None:
+        """Remove the requests which stopped being queued since the last call
+        Every WP_PRIORITY_QUEUE_RECONCILE_SECONDS, also compare the whole set with ``queue_priorities``,
+        adding the requests missing from it and removing the strays
+        """
+        if not redis_priority_queue_enabled() or hr.horde_r is None:
+            return
+        active_ids = {str(wp_id) for wp_id in queue_priorities}
+        reconciled_at = self.reconciled_at.get(wp_type)
+        if reconciled_at is not None and time.monotonic() - reconciled_at < WP_PRIORITY_QUEUE_RECONCILE_SECONDS:
+            self.dequeue(wp_type, list(self.reconciled.get(wp_type, set()) - active_ids))
+            self.reconciled[wp_type] = active_ids
+            return
+        members = {
+            member.decode() if isinstance(member, bytes) else member for member in hr.horde_r.hkeys(priority_queue_members_key(wp_type))
+        }
+        # A request activated after queue_priorities was read is already a member,
+        # so strays are only removed once they were not queued on two full reconciles in a row
+        strays = members - active_ids
+        self.dequeue(wp_type, list(strays & self.strays.get(wp_type, set())))
+        self.strays[wp_type] = strays
+        missing = [wp_id for wp_id in queue_priorities if str(wp_id) not in members]
+        if missing:
+            models = load_models(missing)
+            self.enqueue(wp_type, [(wp_id, queue_priorities[wp_id], models.get(wp_id, [])) for wp_id in missing])
+            logger.info(f"Added {len(missing)} {wp_type} requests missing from the redis priority queue")
+        self.reconciled[wp_type] = active_ids
+        self.reconciled_at[wp_type] = time.monotonic()
+
+
+wp_priority_queue = WPPriorityQueue()
@@ -0,0 +1,153 @@
+# SPDX-FileCopyrightText: 2026 Tazlin
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Server-sent status streams of asynchronous generation requests.
+
+Clients waiting on a request poll its lite status, up to ten times per second,
+and every poll costs a request lookup, the request average, a validity check, the
+queue stats and the active worker count. A status stream replaces that loop with
+one long-lived ``text/event-stream`` response per client, which may watch a single
+request or several at once.
+
+The status of a watched request is recomputed when one of its generations starts,
+finishes, faults or is cancelled, and otherwise every
+``STATUS_STREAM_REFRESH_SECONDS`` to follow its queue position. An event is only
+sent when the status changed materially. These wake-ups use the same versioned-key
+scheme as the long-polling pops (see ``horde/pop_notifier.py``), keyed by request id.
+
+Each open stream holds a server thread, so ``HORDE_MAX_STATUS_STREAMS`` bounds how
+many a node serves at once. It defaults to 0, which disables the streams; clients
+turned away keep polling the status endpoints.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+
+from horde.flask import db
+from horde.pop_notifier import VersionedNotifier, WatchSnapshot
+
+WP_STATUS_NOTIFY_CHANNEL = "horde_wp_status_notify"
+# How often the statuses of a stream are recomputed without a notification,
+# which is what follows the queue position of requests which are still queued.
+STATUS_STREAM_REFRESH_SECONDS = 5
+# A stream is closed after this long. Clients reconnect if still waiting.
+STATUS_STREAM_MAX_SECONDS = 300
+# The most requests one multiplexed stream may watch.
+STATUS_STREAM_MAX_IDS = 20
+# Changes of the estimated wait time smaller than this are not worth an event.
+WAIT_TIME_MATERIAL_SECONDS = 10
+
+type StatusGetter = Callable[[str], dict | None]
+
+
+def max_status_streams() -> int:
+    return int(os.getenv("HORDE_MAX_STATUS_STREAMS", "0"))
+
+
+class WPStatusNotifier(VersionedNotifier):
+    """Versioned wake-up keys for the status streams open in this process."""
+
+    channel = WP_STATUS_NOTIFY_CHANNEL
+
+    def enabled(self) -> bool:
+        return max_status_streams() > 0
+
+    def watch(self, wp_ids: Iterable[str]) -> WatchSnapshot:
+        return self.snapshot(("wp", str(wp_id)) for wp_id in wp_ids)
+
+    def notify(self, wp_id: object) -> None:
+        """Announce that the generations of a request changed state."""
+        self.bump([("wp", str(wp_id))])
+
+
+wp_status_notifier = WPStatusNotifier()
+
+
+class StreamSlots:
+    """Counts the status streams open in this process against ``HORDE_MAX_STATUS_STREAMS``."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self) -> bool:
+        with self.lock:
+            if self.open >= max_status_streams():
+                return False
+            self.open += 1
+            return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.open = max(self.open - 1, 0)
+
+
+stream_slots = StreamSlots()
+
+
+def status_changed_materially(previous: dict | None, current: dict) -> bool:
+    if previous is None:
+        return True
+    for key, value in current.items():
+        if key == "wait_time":
+            if abs(value - previous.get(key, 0)) >= WAIT_TIME_MATERIAL_SECONDS:
+                return True
+        elif previous.get(key) != value:
+            return True
+    return False
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_wp_statuses(
+    wp_ids: list[str],
+    get_status: StatusGetter,
+    max_seconds: float = STATUS_STREAM_MAX_SECONDS,
+    refresh_seconds: float = STATUS_STREAM_REFRESH_SECONDS,
+) -> Iterator[str]:
+    """Yield the server-sent events of a status stream over ``wp_ids``.
+
+    ``get_status`` returns the lite status of a request, or None if it does not
+    exist. A request stops being watched once it is done or faulted, and the
+    stream ends with an ``end`` event once no request is left or ``max_seconds``
+    have passed.
+    """
+    deadline = time.monotonic() + max_seconds
+    pending = list(wp_ids)
+    sent: dict[str, dict] = {}
+    while True:
+        # Snapshotting before reading the statuses ensures a generation changing
+        # state while they are read still wakes the wait below.
+        snapshot = wp_status_notifier.watch(pending)
+        events = []
+        for wp_id in list(pending):
+            status = get_status(wp_id)
+            if status is None:
+                events.append(format_event("not_found", {"id": wp_id}))
+                pending.remove(wp_id)
+                continue
+            if status_changed_materially(sent.get(wp_id), status):
+                sent[wp_id] = status
+                events.append(format_event("status", {"id": wp_id, **status}))
+            if status["done"] or status["faulted"]:
+                pending.remove(wp_id)
+        # The statuses are plain dicts by now; do not hold a pooled connection
+        # while the stream waits.
+        db.session.remove()
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            yield from events
+            yield format_event("end", {"reason": "finished" if not pending else "timeout"})
+            return
+        # A comment line keeps proxies from timing out an idle stream, and lets
+        # the server notice a client which went away.
+        yield from events or [": keepalive\n\n"]
+        wp_status_notifier.wait(snapshot, timeout=min(refresh_seconds, remaining))
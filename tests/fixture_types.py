@@ -14,6 +14,9 @@ Public members:
     MakeUser: Call signature of the ``make_user`` fixture factory.
     MakeUserRole: Call signature of the ``make_user_role`` fixture factory.
     MakeApiUser: Call signature of the ``make_api_user`` fixture factory.
+    MakeImageWP: Call signature of the ``make_image_wp`` fixture factory.
+    MakeImageWorker: Call signature of the ``make_image_worker`` fixture factory.
+    StubModelReference: Call signature of the ``stub_model_reference`` fixture.
 """
 
 from __future__ import annotations
@@ -22,14 +25,21 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Protocol
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable
+
     from horde.classes.base.user import User, UserRole
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+    from horde.classes.stable.worker import ImageWorker
     from horde.enums import UserRoleTypes
 
 __all__ = [
     "ApiUser",
     "MakeApiUser",
+    "MakeImageWP",
+    "MakeImageWorker",
     "MakeUser",
     "MakeUserRole",
+    "StubModelReference",
 ]
 
 
@@ -70,3 +80,47 @@ class MakeApiUser(Protocol):
     def __call__(self, *, trusted: bool = False, moderator: bool = False, kudos: int = 0) -> ApiUser:
         """Create a registered user at the requested privilege and kudos level."""
         ...
+
+
+class MakeImageWP(Protocol):
+    """Call signature of the ``make_image_wp`` fixture factory."""
+
+    def __call__(
+        self,
+        user: User,
+        *,
+        models: Iterable[str] = ...,
+        n: int = 1,
+        width: int = 512,
+        height: int = 512,
+        worker_ids: list | None = None,
+        worker_blacklist: bool = False,
+        extra_params: dict | None = None,
+        **columns: Any,
+    ) -> ImageWaitingPrompt:
+        """Create an active ``ImageWaitingPrompt`` of ``user``, applying column overrides."""
+        ...
+
+
+class MakeImageWorker(Protocol):
+    """Call signature of the ``make_image_worker`` fixture factory."""
+
+    def __call__(
+        self,
+        user: User,
+        *,
+        models: Iterable[str] = ...,
+        bridge_agent: str = ...,
+        max_pixels: int = ...,
+        **columns: Any,
+    ) -> ImageWorker:
+        """Create an ``ImageWorker`` of ``user`` serving ``models``, applying column overrides."""
+        ...
+
+
+class StubModelReference(Protocol):
+    """Call signature of the ``stub_model_reference`` fixture."""
+
+    def __call__(self, reference: dict[str, dict], *, stable_diffusion_names: set[str] | None = None) -> None:
+        """Replace the model reference with ``reference``."""
+        ...
@@ -159,7 +159,9 @@ def _fake_redis_backend(app) -> Iterator[None]:
 
 def _reset_redis_state() -> None:
     from horde import horde_redis as horde_redis_module
+    from horde.horde_cache import horde_cache
 
+    horde_cache.clear_local()
     redis_conn = horde_redis_module.horde_redis
     seen_clients: set[int] = set()
     clients = [redis_conn.horde_r, redis_conn.horde_local_r, *redis_conn.all_horde_redis]
@@ -84,18 +84,19 @@ class TestCheckWaitingPrompts:
 
 class TestCacheBuilders:
     def test_store_prioritized_wp_queue_populates_cache(self, client, api_key):
+        from horde import horde_redis as horde_redis_module
         from horde.database.threads import store_prioritized_wp_queue
 
-        _queue_text_wp(client, api_key)
+        wp_id = _queue_text_wp(client, api_key)
         store_prioritized_wp_queue()  # must not raise
 
-        cached = _redis_get("text_wp_cache")
-        assert cached is not None, "text_wp_cache was not populated"
-        parsed = json.loads(cached)
-        assert isinstance(parsed, list)
-        # The queued prompt should appear in the prioritized cache.
-        assert len(parsed) >= 1
-        assert all("id" in entry and "things" in entry for entry in parsed)
+        cached, queue_length = horde_redis_module.horde_redis.horde_r.hmget("text_wp_queue_positions", [wp_id, "_length"])
+        assert queue_length is not None, "text_wp_queue_positions was not populated"
+        assert int(queue_length) >= 1
+        # The queued prompt should appear in the published positions.
+        assert cached is not None
+        queue_position, _, n_ahead = json.loads(cached)
+        assert queue_position >= 0 and n_ahead >= 1
 
     def test_store_worker_list_reflects_active_worker(self, client, make_api_user):
         from horde.database.threads import store_worker_list
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Benchmark pricing image requests with ``KudosModel``.
+
+Prices the same set of request payloads three ways and reports the latency per
+payload and the throughput of each:
+
+- ``per-request load``: loads the weights from the .npz file and computes the
+  time basis for every payload, as a ``KudosModel`` built per request did before
+  it became a process-wide singleton;
+- ``singleton``: ``calculate_kudos`` on the shared model, one payload at a time,
+  with the memo of predicted times cleared first;
+- ``batch``: ``predict_batch`` on the shared model for the whole set, in chunks
+  of ``--batch`` payloads, with the memo cleared first.
+
+A last ``memoized`` run repeats the ``batch`` run with the memo filled, as the
+horde mostly sees a handful of repeated parameter sets. Needs no database::
+
+    python -m tests.stress.bench_kudos_model --payloads 5000 --batch 256
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+
+def _random_payloads(count: int, distinct: int) -> list[dict]:
+    from horde.classes.stable.kudos import KudosModel
+
+    rng = random.Random(42)
+    variants = []
+    for _ in range(distinct):
+        source_image = rng.random() < 0.3
+        variants.append(
+            dict(
+                KudosModel.BASIS_PAYLOAD,
+                width=rng.choice((512, 640, 768, 1024)),
+                height=rng.choice((512, 640, 768, 1024)),
+                steps=rng.randint(10, 80),
+                cfg_scale=rng.choice((5.0, 7.0, 7.5, 9.0)),
+                karras=rng.random() < 0.8,
+                hires_fix=rng.random() < 0.2,
+                sampler_name=rng.choice(KudosModel.KNOWN_SAMPLERS),
+                source_image=source_image,
+                source_processing="img2img" if source_image else "txt2img",
+                denoising_strength=rng.choice((0.4, 0.6, 0.8)),
+                post_processing=rng.sample(KudosModel.KNOWN_POST_PROCESSORS, rng.randint(0, 2)),
+            ),
+        )
+    return [rng.choice(variants) for _ in range(count)]
+
+
+def _per_request_load(payloads: list[dict]) -> None:
+    from horde.classes.stable.kudos import KudosModel
+
+    for payload in payloads:
+        cold = SimpleNamespace(model=None)
+        cold.model = KudosModel.load_model(cold)
+        time_basis = KudosModel.forward(cold, KudosModel.payload_to_vector(KudosModel.BASIS_PAYLOAD)).item()
+        job_time = KudosModel.forward(cold, KudosModel.payload_to_vector(payload)).item()
+        round(job_time / time_basis * (KudosModel.KUDOS_BASIS + 1), 2)
+
+
+def _singleton(payloads: list[dict]) -> None:
+    from horde.classes.stable.kudos import kudos_model
+
+    for payload in payloads:
+        kudos_model.calculate_kudos(payload)
+
+
+def _batched(payloads: list[dict], batch: int) -> None:
+    from horde.classes.stable.kudos import kudos_model
+
+    for start in range(0, len(payloads), batch):
+        kudos_model.predict_batch(payloads[start : start + batch])
+
+
+def _measure(price, payloads: list[dict], repeats: int, keep_memo: bool = False) -> float:
+    """Returns the best wall time of pricing the payloads over ``repeats`` runs"""
+    from horde.classes.stable.kudos import kudos_model
+
+    best = float("inf")
+    for _ in range(repeats):
+        if not keep_memo:
+            kudos_model.memo.clear()
+        started = time.perf_counter()
+        price(payloads)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", type=int, default=5000, help="How many payloads to price")
+    parser.add_argument("--distinct", type=int, default=200, help="How many distinct parameter sets the payloads repeat")
+    parser.add_argument("--batch", type=int, default=256, help="Payloads per predict_batch call")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement; the best is reported")
+    parser.add_argument("--cold-payloads", type=int, default=500, help="How many payloads the per-request load run prices")
+    options = parser.parse_args()
+
+    from horde.classes.stable.kudos import kudos_model
+
+    payloads = _random_payloads(options.payloads, options.distinct)
+    runs = [
+        (
+            "per-request load",
+            lambda: _measure(_per_request_load, payloads[: options.cold_payloads], options.repeats),
+            options.cold_payloads,
+        ),
+        ("singleton", lambda: _measure(_singleton, payloads, options.repeats), len(payloads)),
+        ("batch", lambda: _measure(lambda batch: _batched(batch, options.batch), payloads, options.repeats), len(payloads)),
+    ]
+
+    print(f"{'mode':>16} {'payloads':>9} {'us/payload':>11} {'payloads/s':>11}")
+    for name, measure, count in runs:
+        seconds = measure()
+        print(f"{name:>16} {count:>9} {seconds / count * 1e6:>11.1f} {count / seconds:>11.0f}")
+    kudos_model.memo.clear()
+    _batched(payloads, options.batch)
+    seconds = _measure(lambda batch: _batched(batch, options.batch), payloads, options.repeats, keep_memo=True)
+    print(f"{'memoized':>16} {len(payloads):>9} {seconds / len(payloads) * 1e6:>11.1f} {len(payloads) / seconds:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
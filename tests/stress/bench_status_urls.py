@@ -0,0 +1,155 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Benchmark the status of a finished image request against how its R2 download URLs are made.
+
+Seeds a scratch schema with one R2 image request of ``--images`` finished
+generations, and times its full status (``get_status``, as ``/generate/status``
+builds it) three ways:
+
+- ``per-image``: no cache, every URL presigned by botocore one by one, as the
+  status did before;
+- ``batch-signed``: no cache, the URLs signed together by ``SigV4Presigner``;
+- ``cached``: the URLs read back from the download URL cache, which is what
+  every poll after the first one does.
+
+The S3 client is a real boto3 client with made-up credentials: presigning needs
+no network. Redis is a fakeredis in every mode; the uncached modes drop the
+cached URLs before every run. Runs against the Postgres the unit tests
+use (``PGUSER``, ``PGPASSWORD`` and ``POSTGRES_URL``) in a schema of its own,
+dropped afterwards::
+
+    python -m tests.stress.bench_status_urls --images 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+import uuid
+
+from tests.dependency_runtime import (
+    assert_safe_test_target,
+    create_schema,
+    drop_schema,
+    new_test_schema_name,
+    resolve_postgres_dsn,
+)
+
+
+def _seed_request(db, images: int):
+    from horde.classes.base.user import User
+    from horde.classes.base.worker import WorkerModel
+    from horde.classes.stable.processing_generation import ImageProcessingGeneration
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+    from horde.classes.stable.worker import ImageWorker
+
+    user = User(username="bench", oauth_id="bench", api_key="bench")
+    db.session.add(user)
+    db.session.commit()
+    worker = ImageWorker(name=f"bench_{uuid.uuid4().hex[:12]}", user_id=user.id)
+    db.session.add(worker)
+    db.session.commit()
+    db.session.add(WorkerModel(worker_id=worker.id, model="stable_diffusion"))
+    wp = ImageWaitingPrompt(
+        worker_ids=[],
+        models=["stable_diffusion"],
+        prompt="a benchmark prompt",
+        user_id=user.id,
+        params={"n": images, "width": 512, "height": 512, "steps": 10, "sampler_name": "k_euler_a"},
+        r2=True,
+    )
+    db.session.commit()
+    for _ in range(images):
+        procgen = ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion")
+        procgen.generation = "R2"
+    wp.n = 0
+    db.session.commit()
+    return wp.id
+
+
+def _status(db, wp_id) -> None:
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+
+    wp = db.session.get(ImageWaitingPrompt, wp_id)
+    wp.get_status(request_avg=0, active_worker_count=(0, 0), has_valid_workers=True, wp_queue_stats=(-1, 0, 0))
+    db.session.remove()
+
+
+def _measure(db, wp_id, repeats: int, before=None) -> float:
+    """Returns the best wall time of building the status over ``repeats`` runs, each after calling ``before``"""
+    best = float("inf")
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        _status(db, wp_id)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20, help="How many finished images the request has")
+    parser.add_argument("--repeats", type=int, default=50, help="Runs per measurement; the best is reported")
+    options = parser.parse_args()
+
+    import boto3
+    import fakeredis
+
+    from horde import r2
+    from horde.horde_cache import horde_cache
+    from horde.horde_redis import horde_redis
+    from horde.model_reference import model_reference
+
+    model_reference.reference = {"stable_diffusion": {"baseline": "stable diffusion 1"}}
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    r2.s3_client = boto3.client("s3", endpoint_url="https://account.r2.cloudflarestorage.com", region_name="auto")
+    presigner = r2.get_presigner(r2.s3_client, r2.r2_transient_bucket)
+    fake = fakeredis.FakeStrictRedis()
+    horde_redis.horde_r = horde_redis.horde_local_r = fake
+    horde_redis.all_horde_redis = [fake]
+
+    def drop_cached_urls() -> None:
+        fake.flushall()
+        horde_cache.clear_local()
+
+    dsn = resolve_postgres_dsn()
+    assert_safe_test_target(dsn, "benchmarks")
+    schema_name = new_test_schema_name("horde_bench")
+    create_schema(dsn, schema_name)
+    try:
+        from horde.flask import create_app, db
+
+        app = create_app(
+            config={
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": dsn,
+                "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"options": f"-c search_path={schema_name}"}},
+            },
+        )
+        with app.app_context():
+            db.create_all()
+            wp_id = _seed_request(db, options.images)
+            db.session.remove()
+
+            presigner.verified = False
+            per_image_seconds = _measure(db, wp_id, options.repeats, drop_cached_urls)
+            presigner.verified = None
+            batch_seconds = _measure(db, wp_id, options.repeats, drop_cached_urls)
+            _status(db, wp_id)
+            cached_seconds = _measure(db, wp_id, options.repeats)
+
+            print(f"{'images':>7} {'per-image ms':>13} {'batch-signed ms':>16} {'cached ms':>10}")
+            print(f"{options.images:>7} {per_image_seconds * 1e3:>13.2f} {batch_seconds * 1e3:>16.2f} {cached_seconds * 1e3:>10.2f}")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        drop_schema(dsn, schema_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Benchmark the latency of an image submit with and without the post-submit runner.
+
+Seeds a scratch schema with ``--submits`` pending generations and submits each
+of them the way ``/generate/submit`` does (``stats.record_fulfilment`` then
+``set_generation``), timing every submit. Two modes:
+
+- ``inline``: ``HORDE_POST_SUBMIT_ASYNC=0``, the submit runs its post-submit
+  jobs itself, as the fulfilment, performance, statistic and webhook writes ran
+  before they were queued;
+- ``queued``: the submit only queues them, and a ``PostSubmitRunner`` thread runs
+  them meanwhile, as in production.
+
+This times one submitter with no contention on the bucket rows, so it understates
+the difference under load; the locust ``WorkerSimulator`` run described in the
+README measures that. Runs against the Postgres the unit tests use (``PGUSER``,
+``PGPASSWORD`` and ``POSTGRES_URL``) in a schema of its own, dropped afterwards::
+
+    python -m tests.stress.bench_submit_path --submits 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+from tests.dependency_runtime import (
+    assert_safe_test_target,
+    create_schema,
+    drop_schema,
+    new_test_schema_name,
+    resolve_postgres_dsn,
+)
+
+
+def _seed_generations(db, submits: int) -> list:
+    from horde.classes.base.user import User
+    from horde.classes.stable.processing_generation import ImageProcessingGeneration
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+    from horde.classes.stable.worker import ImageWorker
+
+    user = User(username=f"bench_{uuid.uuid4().hex[:8]}", oauth_id=uuid.uuid4().hex, api_key=uuid.uuid4().hex)
+    db.session.add(user)
+    db.session.commit()
+    worker = ImageWorker(name=f"bench_{uuid.uuid4().hex[:12]}", user_id=user.id)
+    db.session.add(worker)
+    db.session.commit()
+    wp = ImageWaitingPrompt(
+        worker_ids=[],
+        models=["stable_diffusion"],
+        prompt="a benchmark prompt",
+        user_id=user.id,
+        params={"n": submits, "width": 512, "height": 512, "steps": 10, "sampler_name": "k_euler_a", "cfg_scale": 7},
+        r2=True,
+    )
+    db.session.commit()
+    procgen_ids = [ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion").id for _ in range(submits)]
+    db.session.remove()
+    return procgen_ids
+
+
+def _submit_latencies(db, procgen_ids: list) -> list[float]:
+    from horde.classes.base import stats
+    from horde.classes.stable.processing_generation import ImageProcessingGeneration
+
+    latencies = []
+    for procgen_id in procgen_ids:
+        procgen = db.session.get(ImageProcessingGeneration, procgen_id)
+        started = time.perf_counter()
+        things_per_sec = stats.record_fulfilment(procgen)
+        procgen.set_generation("R2", things_per_sec=things_per_sec, seed=1)
+        latencies.append(time.perf_counter() - started)
+        db.session.remove()
+    return latencies
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percentile) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submits", type=int, default=500, help="How many generations each mode submits")
+    options = parser.parse_args()
+
+    import fakeredis
+
+    from horde.database.post_submit import PostSubmitRunner
+    from horde.horde_redis import horde_redis
+    from horde.model_reference import model_reference
+
+    model_reference.reference = {"stable_diffusion": {"baseline": "stable diffusion 1"}}
+    fake = fakeredis.FakeStrictRedis()
+    horde_redis.horde_r = horde_redis.horde_local_r = fake
+    horde_redis.all_horde_redis = [fake]
+
+    dsn = resolve_postgres_dsn()
+    assert_safe_test_target(dsn, "benchmarks")
+    schema_name = new_test_schema_name("horde_bench")
+    create_schema(dsn, schema_name)
+    try:
+        from horde.flask import create_app, db
+
+        app = create_app(
+            config={
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": dsn,
+                "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"options": f"-c search_path={schema_name}"}},
+            },
+        )
+        with app.app_context():
+            db.create_all()
+            results = {}
+            os.environ["HORDE_POST_SUBMIT_ASYNC"] = "0"
+            results["inline"] = _submit_latencies(db, _seed_generations(db, options.submits))
+            os.environ["HORDE_POST_SUBMIT_ASYNC"] = "1"
+            runner = PostSubmitRunner()
+            runner.start()
+            try:
+                results["queued"] = _submit_latencies(db, _seed_generations(db, options.submits))
+            finally:
+                runner.stop()
+
+            print(f"{'mode':>7} {'submits':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+            for mode, latencies in results.items():
+                p50, p90, p99 = (_percentile(latencies, percentile) * 1e3 for percentile in (50, 90, 99))
+                print(f"{mode:>7} {len(latencies):>8} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f}")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        drop_schema(dsn, schema_name)
+
+
+if __name__ == "__main__":
+    main()
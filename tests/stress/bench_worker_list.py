@@ -0,0 +1,149 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Benchmark the worker list build of ``store_worker_list`` against the worker count.
+
+Seeds a scratch schema with an increasing number of active workers (an even mix of
+image, text and interrogation workers, each with kudos details, messages and
+models or forms) and, at every step, times building the public and privileged
+worker lists two ways:
+
+- ``per-worker``: ``get_details`` and ``get_details(2)`` on every lazily loaded
+  worker from ``get_active_workers``, as ``store_worker_list`` used to;
+- ``set-based``: ``get_active_workers_details((0, 2))``.
+
+It also counts the SELECTs each issues, which is what grows with the worker count
+in the per-worker build. Runs against the Postgres the unit tests use (``PGUSER``,
+``PGPASSWORD`` and ``POSTGRES_URL``) in a schema of its own, dropped afterwards::
+
+    python -m tests.stress.bench_worker_list --counts 100,500,1000,2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+
+from sqlalchemy import event
+
+from tests.dependency_runtime import (
+    assert_safe_test_target,
+    create_schema,
+    drop_schema,
+    new_test_schema_name,
+    resolve_postgres_dsn,
+)
+
+
+def _seed_workers(db, user_ids: list[int], count: int) -> None:
+    from horde.classes.base.worker import WorkerMessage, WorkerModel, WorkerStats
+    from horde.classes.kobold.worker import TextWorker
+    from horde.classes.stable.interrogation_worker import InterrogationWorker, WorkerInterrogationForm
+    from horde.classes.stable.worker import ImageWorker
+
+    for index in range(count):
+        worker_class = (ImageWorker, TextWorker, InterrogationWorker)[index % 3]
+        user_id = user_ids[index % len(user_ids)]
+        worker = worker_class(name=f"bench_{uuid.uuid4().hex[:12]}", user_id=user_id)
+        db.session.add(worker)
+        db.session.flush()
+        db.session.add(WorkerStats(worker_id=worker.id, action="uptime", value=index))
+        db.session.add(WorkerMessage(worker_id=worker.id, user_id=user_id, message="bench", origin="bench"))
+        if worker_class is InterrogationWorker:
+            db.session.add(WorkerInterrogationForm(worker_id=worker.id, form="caption"))
+        else:
+            for model_index in range(3):
+                db.session.add(WorkerModel(worker_id=worker.id, model=f"bench_model_{model_index}"))
+    db.session.commit()
+
+
+def _per_worker_build() -> None:
+    from horde.database.functions import get_active_workers
+
+    for worker in get_active_workers():
+        worker.get_details()
+        worker.get_details(2)
+
+
+def _set_based_build() -> None:
+    from horde.database.functions import get_active_workers_details
+
+    get_active_workers_details((0, 2))
+
+
+def _measure(db, build, repeats: int) -> tuple[float, int]:
+    """Returns the best wall time of ``build`` over ``repeats`` runs, and the SELECTs of one run."""
+    selects = 0
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        nonlocal selects
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects += 1
+
+    best = float("inf")
+    for repeat in range(repeats):
+        db.session.remove()
+        if repeat == 0:
+            event.listen(db.engine, "before_cursor_execute", count_selects)
+        started = time.perf_counter()
+        build()
+        best = min(best, time.perf_counter() - started)
+        if repeat == 0:
+            event.remove(db.engine, "before_cursor_execute", count_selects)
+    db.session.remove()
+    return best, selects
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", default="100,500,1000,2000", help="Comma-separated cumulative worker counts to measure at")
+    parser.add_argument("--owners", type=int, default=50, help="How many users the workers are spread over")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement; the best is reported")
+    options = parser.parse_args()
+    counts = sorted(int(count) for count in options.counts.split(","))
+
+    dsn = resolve_postgres_dsn()
+    assert_safe_test_target(dsn, "benchmarks")
+    schema_name = new_test_schema_name("horde_bench")
+    create_schema(dsn, schema_name)
+    try:
+        from horde.classes.base.user import User
+        from horde.flask import create_app, db
+
+        app = create_app(
+            config={
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": dsn,
+                "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"options": f"-c search_path={schema_name}"}},
+            },
+        )
+        with app.app_context():
+            db.create_all()
+            users = [
+                User(username=f"bench_{index}", oauth_id=f"bench_{index}", api_key=f"bench_{index}") for index in range(options.owners)
+            ]
+            db.session.add_all(users)
+            db.session.commit()
+            user_ids = [user.id for user in users]
+
+            print(f"{'workers':>8} {'per-worker s':>13} {'SELECTs':>8} {'set-based s':>12} {'SELECTs':>8} {'speedup':>8}")
+            seeded = 0
+            for count in counts:
+                _seed_workers(db, user_ids, count - seeded)
+                seeded = count
+                per_worker_seconds, per_worker_selects = _measure(db, _per_worker_build, options.repeats)
+                set_based_seconds, set_based_selects = _measure(db, _set_based_build, options.repeats)
+                print(
+                    f"{count:>8} {per_worker_seconds:>13.3f} {per_worker_selects:>8} {set_based_seconds:>12.3f} {set_based_selects:>8}"
+                    f" {per_worker_seconds / set_based_seconds:>7.1f}x",
+                )
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        drop_schema(dsn, schema_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -60,7 +60,7 @@ import psycopg2
 
 _APPLICATION_NAME = "qp_prober"
 
-# Backlog predicate mirroring increment_extra_priority / the pop candidate scan
+# Backlog predicate mirroring the pop candidate scan
 # (waiting_prompts is single-table-inheritance keyed by wp_type).
 _BACKLOG_SQL = """
 SELECT wp_type, count(*)
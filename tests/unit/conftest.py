@@ -13,7 +13,8 @@ from __future__ import annotations
 
 import contextlib
 import uuid
-from collections.abc import Callable, Iterator
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime, timedelta
 from typing import TYPE_CHECKING, Any
 
 import pytest
@@ -21,7 +22,7 @@ import sqlalchemy
 from sqlalchemy import event
 
 from tests.dependency_runtime import create_schema, drop_schema, new_test_schema_name
-from tests.fixture_types import MakeUser, MakeUserRole
+from tests.fixture_types import MakeImageWorker, MakeImageWP, MakeUser, MakeUserRole, StubModelReference
 
 if TYPE_CHECKING:
     from flask import Flask
@@ -30,9 +31,16 @@ if TYPE_CHECKING:
     from sqlalchemy.orm import scoped_session
 
     from horde.classes.base.user import User, UserRole
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+    from horde.classes.stable.worker import ImageWorker
     from horde.enums import UserRoleTypes
 
 
+# The model the image factories request and serve unless told otherwise
+TEST_IMAGE_MODEL = "stable_diffusion"
+TEST_BRIDGE_AGENT = "AI Horde Worker reGen:9.0.0:https://github.com/Haidra-Org/horde-worker-reGen"
+
+
 @pytest.fixture(scope="session")
 def _pg_dsn(pg_dsn: str) -> str:
     return pg_dsn
@@ -148,12 +156,16 @@ def fake_redis(monkeypatch):
     """
     fakeredis = pytest.importorskip("fakeredis")
     from horde import horde_redis as horde_redis_module
+    from horde.horde_cache import horde_cache
 
     fake = fakeredis.FakeStrictRedis()
     monkeypatch.setattr(horde_redis_module.horde_redis, "horde_r", fake)
     monkeypatch.setattr(horde_redis_module.horde_redis, "horde_local_r", fake)
     monkeypatch.setattr(horde_redis_module.horde_redis, "all_horde_redis", [fake])
+    # The in-process tier outlives the fake servers it cached from
+    horde_cache.clear_local()
     yield horde_redis_module.horde_redis
+    horde_cache.clear_local()
 
 
 @pytest.fixture
@@ -264,3 +276,97 @@ def make_user_role(db_session: scoped_session[Session]) -> MakeUserRole:
         return role
 
     return _make
+
+
+@pytest.fixture
+def stub_model_reference(monkeypatch: pytest.MonkeyPatch) -> StubModelReference:
+    """Replace the model reference with one holding only ``TEST_IMAGE_MODEL``.
+
+    Returns a callable which swaps in another reference, for tests which need
+    more models or their requirements.
+    """
+    from horde import model_reference as model_reference_module
+
+    def _stub(reference: dict[str, dict], *, stable_diffusion_names: set[str] | None = None) -> None:
+        monkeypatch.setattr(model_reference_module.model_reference, "reference", dict(reference))
+        if stable_diffusion_names is not None:
+            monkeypatch.setattr(model_reference_module.model_reference, "stable_diffusion_names", stable_diffusion_names)
+
+    _stub({TEST_IMAGE_MODEL: {"baseline": "stable diffusion 1"}})
+    return _stub
+
+
+@pytest.fixture
+def make_image_wp(db_session: scoped_session[Session]) -> MakeImageWP:
+    """Factory: build and commit an active ``ImageWaitingPrompt``.
+
+    Activation state, the capability requirement mask included, is written
+    directly instead of going through ``activate()``, so no kudos is charged and
+    no worker needs to exist. Any extra kwarg is set as a column before the mask
+    is computed.
+    """
+    from horde.capability_fingerprint import compute_image_requirements
+    from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+
+    def _make(
+        user: User,
+        *,
+        models: Iterable[str] = (TEST_IMAGE_MODEL,),
+        n: int = 1,
+        width: int = 512,
+        height: int = 512,
+        worker_ids: list | None = None,
+        worker_blacklist: bool = False,
+        extra_params: dict | None = None,
+        **columns: Any,
+    ) -> ImageWaitingPrompt:
+        params = {"n": n, "width": width, "height": height, "steps": 10, "sampler_name": "k_euler_a"}
+        params.update(extra_params or {})
+        wp = ImageWaitingPrompt(
+            worker_ids or [],
+            list(models),
+            prompt="a unit-test prompt",
+            user_id=user.id,
+            params=params,
+            worker_blacklist=worker_blacklist,
+        )
+        wp.active = True
+        wp.expiry = datetime.utcnow() + timedelta(minutes=10)
+        for column, value in columns.items():
+            setattr(wp, column, value)
+        wp.capability_requirements = compute_image_requirements(wp)
+        db_session.commit()
+        return wp
+
+    return _make
+
+
+@pytest.fixture
+def make_image_worker(db_session: scoped_session[Session]) -> MakeImageWorker:
+    """Factory: build and commit an ``ImageWorker`` serving ``models``."""
+    from horde.classes.base.worker import WorkerModel
+    from horde.classes.stable.worker import ImageWorker
+
+    def _make(
+        user: User,
+        *,
+        models: Iterable[str] = (TEST_IMAGE_MODEL,),
+        bridge_agent: str = TEST_BRIDGE_AGENT,
+        max_pixels: int = 1024 * 1024,
+        **columns: Any,
+    ) -> ImageWorker:
+        worker = ImageWorker(
+            user_id=user.id,
+            name=f"worker_{_unique_suffix()}",
+            max_pixels=max_pixels,
+            bridge_agent=bridge_agent,
+            **columns,
+        )
+        db_session.add(worker)
+        db_session.commit()
+        for model_name in models:
+            db_session.add(WorkerModel(worker_id=worker.id, model=model_name))
+        db_session.commit()
+        return worker
+
+    return _make
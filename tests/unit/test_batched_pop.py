@@ -0,0 +1,136 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the batched job pop (``JobPopTemplate.claim_extra_jobs``).
+
+A worker popping with ``max_jobs`` above 1 is handed jobs from up to that many
+separate requests in one pop: the first match is returned as the top-level job and
+the rest in ``extra_jobs``. Claiming a job commits, which releases the locks the
+candidate query took on the rest of its page, so every further candidate is
+re-locked through ``lock_wp_for_claim`` and skipped once it is no longer claimable.
+
+``start_worker`` is replaced with a minimal claim (decrement ``n`` and commit) so
+the tests exercise the batching loop without the procgen, model-reference and
+object-storage machinery ``start_generation`` carries.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from horde.apis.v2.base import POP_MAX_JOBS, JobPopTemplate
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.database import functions as f
+from horde.flask import db
+
+pytestmark = pytest.mark.unit
+
+
+class _StubPop(JobPopTemplate):
+    """A pop resource whose claims and candidate pages are in-memory."""
+
+    gentype = "image"
+
+    def __init__(self, worker: ImageWorker, max_jobs: int, candidates: list, pages: list | None = None) -> None:
+        self.worker = worker
+        self.args = {"max_jobs": max_jobs}
+        self.prioritized_wp = candidates
+        self.pages = pages or []
+        self.wp_page = 0
+        self.claimed: list = []
+
+    def start_worker(self, wp: ImageWaitingPrompt) -> dict:
+        wp.n -= 1
+        db.session.commit()
+        self.claimed.append(wp.id)
+        return {"id": str(wp.id), "ids": [str(wp.id)]}
+
+    def get_sorted_wp(self, priority_user_ids: Any = None) -> list:
+        return self.pages.pop(0) if self.pages else []
+
+
+@pytest.fixture
+def _can_generate_everything(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ImageWorker, "can_generate", lambda self, wp: [True, None])
+
+
+@pytest.mark.usefixtures("_can_generate_everything")
+class TestClaimExtraJobs:
+    def test_single_job_pop_claims_nothing_extra(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        first, second = make_image_wp(user), make_image_wp(user)
+        pop = _StubPop(worker, 1, [first, second])
+
+        assert pop.claim_extra_jobs(first) == []
+        assert pop.claimed == []
+
+    def test_claims_up_to_max_jobs_requests(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        wps = [make_image_wp(user) for _ in range(4)]
+        pop = _StubPop(worker, 3, wps)
+
+        extra_jobs = pop.claim_extra_jobs(wps[0])
+
+        assert [job["id"] for job in extra_jobs] == [str(wps[1].id), str(wps[2].id)]
+        assert pop.claimed == [wps[1].id, wps[2].id]
+
+    def test_drained_candidate_is_skipped(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        # Another pop drained the second request after this pop's page query ran;
+        # re-locking sees n == 0 and moves on to the next candidate.
+        user = make_user()
+        worker = make_image_worker(user)
+        wps = [make_image_wp(user) for _ in range(3)]
+        db.session.query(ImageWaitingPrompt).filter_by(id=wps[1].id).update({"n": 0})
+        db.session.commit()
+        pop = _StubPop(worker, 2, wps)
+
+        assert [job["id"] for job in pop.claim_extra_jobs(wps[0])] == [str(wps[2].id)]
+
+    def test_reads_further_pages_when_the_current_one_runs_out(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        first, second = make_image_wp(user), make_image_wp(user)
+        pop = _StubPop(worker, 2, [first], pages=[[second]])
+
+        assert [job["id"] for job in pop.claim_extra_jobs(first)] == [str(second.id)]
+        assert pop.wp_page == 1
+
+    def test_paused_worker_never_batches(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        worker.paused = True
+        first, second = make_image_wp(user), make_image_wp(user)
+        pop = _StubPop(worker, 2, [first, second])
+
+        assert pop.claim_extra_jobs(first) == []
+
+    def test_max_jobs_is_capped(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        wps = [make_image_wp(user) for _ in range(POP_MAX_JOBS + 2)]
+        pop = _StubPop(worker, POP_MAX_JOBS + 5, wps)
+
+        assert len(pop.claim_extra_jobs(wps[0])) == POP_MAX_JOBS - 1
+
+
+class TestLockWpForClaim:
+    def test_returns_claimable_wp(self, db_session, fake_redis, make_user, make_image_wp):
+        wp = make_image_wp(make_user())
+
+        assert f.lock_wp_for_claim(wp) is wp
+
+    def test_rejects_drained_or_inactive_wp(self, db_session, fake_redis, make_user, make_image_wp):
+        user = make_user()
+        drained, inactive = make_image_wp(user), make_image_wp(user)
+        drained.n = 0
+        inactive.active = False
+        db.session.commit()
+
+        assert f.lock_wp_for_claim(drained) is None
+        assert f.lock_wp_for_claim(inactive) is None
@@ -0,0 +1,147 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the image capability fingerprint (``horde/capability_fingerprint.py``).
+
+``ImageWorker.can_generate`` settles the bridge, sampler and model checks with one
+bitset subset test: the worker's fingerprint must cover the request's requirement
+mask. The contract is parity with the full check chain it replaces, which is kept
+as ``ImageWorker._capability_skip_reason`` for reporting skipped reasons: for
+every worker configuration and request, the subset test passes exactly when the
+chain finds nothing to skip.
+
+A stored requirement mask carries the bit layout version, so a mask written under
+another layout is recomputed instead of being misread.
+"""
+
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from horde.capability_fingerprint import (
+    CAPABILITY_LAYOUT_VERSION,
+    ImageCapabilityFingerprint,
+    decode_image_requirements,
+)
+from horde.flask import db
+from tests.fixture_types import StubModelReference
+
+pytestmark = pytest.mark.unit
+
+_REGEN_AGENT = "AI Horde Worker reGen:9.0.0:https://github.com/Haidra-Org/horde-worker-reGen"
+_OLD_AGENT = "AI Horde Worker:10:https://github.com/db0/AI-Horde-Worker"
+
+_REFERENCE = {
+    "stable_diffusion": {"baseline": "stable diffusion 1", "requirements": {"min_steps": 10, "max_steps": 30}},
+    "sd_inpainting": {"baseline": "stable diffusion 1", "inpainting": True},
+    "sdxl_model": {"baseline": "stable_diffusion_xl"},
+    "cascade_model": {"baseline": "stable_cascade"},
+    "flux_model": {"baseline": "flux_1"},
+}
+
+
+@pytest.fixture(autouse=True)
+def _model_reference(stub_model_reference: StubModelReference) -> None:
+    stub_model_reference(_REFERENCE)
+
+
+_WORKER_SHAPES = [
+    (_REGEN_AGENT, ("stable_diffusion",), {}),
+    (_REGEN_AGENT, ("stable_diffusion", "sd_inpainting"), {"allow_controlnet": True}),
+    (_REGEN_AGENT, ("sd_inpainting",), {"allow_img2img": False}),
+    (_REGEN_AGENT, ("sdxl_model",), {"allow_controlnet": True, "allow_sdxl_controlnet": False}),
+    (_REGEN_AGENT, ("cascade_model", "flux_model"), {"allow_painting": False}),
+    (_OLD_AGENT, ("stable_diffusion", "flux_model"), {}),
+    (_OLD_AGENT, ("sd_inpainting",), {"allow_controlnet": True}),
+]
+
+_REQUEST_SHAPES = [
+    ({}, {}),
+    ({"sampler_name": "k_dpmpp_sde", "karras": True}, {}),
+    ({"sampler_name": "lcm"}, {}),
+    ({"post_processing": ["RealESRGAN_x4plus", "CodeFormers"]}, {}),
+    ({"tiling": True, "clip_skip": 2}, {}),
+    ({"control_type": "canny", "return_control_map": True}, {"source_image": "img"}),
+    ({"workflow": "qr_code"}, {}),
+    ({"hires_fix": True}, {}),
+    ({"loras": [{"name": "123", "is_version": True}]}, {}),
+    ({}, {"source_image": "img"}),
+    ({}, {"source_image": "img", "source_processing": "inpainting"}),
+]
+
+
+class TestFingerprintParity:
+    """The subset test agrees with the full capability chain."""
+
+    def test_subset_test_matches_full_chain(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        workers = [make_image_worker(user, bridge_agent=agent, models=models, **flags) for agent, models, flags in _WORKER_SHAPES]
+        wps = [make_image_wp(user, models=(), extra_params=params, **columns) for params, columns in _REQUEST_SHAPES]
+        outcomes = set()
+
+        for worker, wp in itertools.product(workers, wps):
+            model_names = worker.get_model_names()
+            requirements = wp.get_capability_requirements()
+            skipped = worker._capability_skip_reason(wp, model_names)
+
+            assert requirements is not None
+            assert worker.get_capability_fingerprint(model_names).satisfies(requirements) == (skipped is None), (
+                worker.bridge_agent,
+                model_names,
+                wp.params,
+                skipped,
+            )
+            outcomes.add(skipped is None)
+
+        # The matrix has to exercise both verdicts to mean anything.
+        assert outcomes == {True, False}
+
+    def test_failing_request_reports_the_chain_reason(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user, bridge_agent=_REGEN_AGENT, models=("stable_diffusion",), allow_controlnet=False)
+        wp = make_image_wp(user, models=(), extra_params={"control_type": "canny"}, source_image="img")
+
+        assert worker.can_generate(wp) == [False, "controlnet"]
+
+    def test_step_ceiling_uses_slowest_hosted_model(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user, bridge_agent=_REGEN_AGENT, models=("stable_diffusion", "sdxl_model"), limit_max_steps=True)
+
+        # stable_diffusion averages (10 + 30) / 2 steps, sdxl_model the (20 + 40) / 2 default
+        assert worker.get_capability_fingerprint().step_ceiling == 20
+        assert worker.can_generate(make_image_wp(user, models=(), extra_params={"steps": 20}, safe_ip=True)) == [True, None]
+        assert worker.can_generate(make_image_wp(user, models=(), extra_params={"steps": 25}, safe_ip=True)) == [False, "step_count"]
+
+
+class TestRequirementMask:
+    def test_unknown_sampler_falls_back_to_the_chain(self, db_session, fake_redis, make_user, make_image_wp):
+        wp = make_image_wp(make_user(), models=(), extra_params={"sampler_name": "not_a_sampler"})
+
+        assert wp.capability_requirements is None
+        assert wp.get_capability_requirements() is None
+
+    def test_mask_from_another_layout_is_recomputed(self, db_session, fake_redis, make_user, make_image_wp):
+        wp = make_image_wp(make_user(), models=(), extra_params={"tiling": True})
+        expected = wp.get_capability_requirements()
+        wp.capability_requirements = (expected << 8) | ((CAPABILITY_LAYOUT_VERSION + 1) & 0xFF)
+        db.session.commit()
+
+        assert decode_image_requirements(wp.capability_requirements) is None
+        assert wp.get_capability_requirements() == expected
+
+    def test_mask_round_trips_through_the_column(self, db_session, fake_redis, make_user, make_image_wp):
+        wp = make_image_wp(make_user(), models=(), extra_params={"post_processing": ["GFPGAN"], "hires_fix": True})
+        stored = wp.capability_requirements
+        db.session.expire(wp)
+
+        assert int(wp.capability_requirements) == stored
+
+    def test_subset_semantics(self):
+        fingerprint = ImageCapabilityFingerprint(mask=0b1011, step_ceiling=None)
+
+        assert fingerprint.satisfies(0b0011)
+        assert fingerprint.satisfies(0)
+        assert not fingerprint.satisfies(0b0100)
@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the conditional GETs of the cacheable read endpoints (``horde/apis/conditional.py``).
+
+``etag_cached`` stores the serialized body of a response with its content hash. The
+contracts exercised here:
+
+- a cached response carries the hash as its ``ETag``, the same for every request
+  until the cache expires, and no ``Last-Modified``;
+- a request whose ``If-None-Match`` matches gets a 304 without any SQL, and one
+  only sending ``If-Modified-Since`` always gets the body;
+- responses vary by query string only where the endpoint asked for it;
+- field masks and failed requests bypass the cache.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from horde.flask import cache
+
+pytestmark = pytest.mark.unit
+
+TOTALS_PATH = "/api/v2/stats/img/totals"
+IMAGE_STYLES_PATH = "/api/v2/styles/image"
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(app):
+    with app.app_context():
+        cache.clear()
+    yield
+    with app.app_context():
+        cache.clear()
+
+
+class TestEtagCached:
+    def test_response_carries_its_etag(self, db_session, client):
+        first = client.get(TOTALS_PATH)
+        second = client.get(TOTALS_PATH)
+
+        assert first.status_code == 200
+        assert first.headers["ETag"]
+        assert "Last-Modified" not in first.headers
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert (
+            second.get_json()
+            == first.get_json()
+            == {period: {"images": 0, "ps": 0} for period in ("minute", "hour", "day", "month", "total")}
+        )
+
+    def test_matching_etag_gets_a_304_without_sql(self, db_session, client, assert_query_count):
+        etag = client.get(TOTALS_PATH).headers["ETag"]
+
+        with assert_query_count() as queries:
+            response = client.get(TOTALS_PATH, headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.get_data() == b""
+        assert queries.of_kind("SELECT") == []
+
+    def test_if_modified_since_alone_gets_the_body(self, db_session, client):
+        client.get(TOTALS_PATH)
+
+        response = client.get(TOTALS_PATH, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+
+        assert response.status_code == 200
+
+    def test_stale_etag_gets_the_body(self, db_session, client):
+        response = client.get(TOTALS_PATH, headers={"If-None-Match": '"not-the-current-etag"'})
+
+        assert response.status_code == 200
+        assert response.get_json()["total"] == {"images": 0, "ps": 0}
+
+    def test_query_strings_are_cached_apart(self, db_session, client, assert_query_count):
+        client.get(f"{IMAGE_STYLES_PATH}?sort=age")
+
+        with assert_query_count() as queries:
+            assert client.get(f"{IMAGE_STYLES_PATH}?sort=popular").status_code == 200
+        assert queries.of_kind("SELECT") != []
+
+    def test_field_mask_bypasses_the_cache(self, db_session, client):
+        response = client.get(TOTALS_PATH, headers={"X-Fields": "total"})
+
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+        assert list(response.get_json()) == ["total"]
+
+    def test_failed_requests_are_not_cached(self, app, db_session, client):
+        response = client.get("/api/v2/status/models?model_state=bogus")
+
+        assert response.status_code == 400
+        assert "ETag" not in response.headers
+        with app.app_context():
+            assert cache.get("etag_view//api/v2/status/models?model_state=bogus") is None
@@ -12,6 +12,7 @@ against an N+1 regression sneaking onto the auth path.
 from __future__ import annotations
 
 from horde.database import functions as f
+from horde.enums import UserRoleTypes
 from horde.utils import hash_api_key
 
 
@@ -38,6 +39,21 @@ class TestFindUserByApiKey:
         # The auth hot path must stay a single SELECT. No per-attribute fan-out.
         assert len(queries.of_kind("SELECT")) == 1
 
+    def test_roles_are_loaded_with_the_user(self, db_session, make_user, make_user_role, assert_query_count):
+        raw_key = "trusted-user-key"
+        user = make_user(api_key=hash_api_key(raw_key))
+        make_user_role(user, UserRoleTypes.TRUSTED, value=True)
+        make_user_role(user, UserRoleTypes.FLAGGED, value=False)
+        db_session.flush()
+        db_session.expunge_all()
+        with assert_query_count() as queries:
+            found = f.find_user_by_api_key(raw_key)
+            assert found.trusted is True
+            assert found.flagged is False
+            assert found.moderator is False
+        # The role checks of every authenticated request are answered by the same SELECT
+        assert len(queries.of_kind("SELECT")) == 1
+
 
 class TestFindUserById:
     def test_found(self, db_session, make_user):
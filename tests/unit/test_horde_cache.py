@@ -0,0 +1,193 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the tiered cache (``horde/horde_cache.py``).
+
+The contracts exercised here:
+
+- a value read once is served from the in-process tier, without a redis round
+  trip or a parse, until it expires or is written again through ``horde_redis``;
+- the in-process tier is bounded, evicting the least recently used value;
+- concurrent misses of one key run its loader once;
+- without a configured redis nothing is cached;
+- writes fan out to every redis server, and one failing server does not stop
+  the writes to the others.
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from horde import horde_cache as horde_cache_module
+from horde.horde_cache import BOOL_SERIALIZER, CacheSpec, HordeCache, MemoryTier
+
+pytestmark = pytest.mark.unit
+
+SPEC = CacheSpec("test", "test_cache_{}", timedelta(seconds=60))
+FLAGS = CacheSpec("test_flags", "test_flag_{}", timedelta(seconds=60), BOOL_SERIALIZER)
+
+
+@pytest.fixture
+def cache(fake_redis, monkeypatch: pytest.MonkeyPatch) -> HordeCache:
+    # Restored once the test is done, as the fresh cache takes over the writes' invalidations
+    monkeypatch.setattr(fake_redis, "memory_tier", fake_redis.memory_tier)
+    return HordeCache(max_entries=100)
+
+
+def _count_redis_reads(fake_redis, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    reads = []
+    horde_r_get = fake_redis.horde_r_get
+    monkeypatch.setattr(fake_redis, "horde_r_get", lambda key: reads.append(key) or horde_r_get(key))
+    return reads
+
+
+class TestTiers:
+    def test_reads_are_served_in_process_until_written(self, cache, fake_redis, monkeypatch):
+        cache.set(SPEC, {"when": datetime(2026, 1, 1)}, "a")
+        fake_redis.horde_r_setex(SPEC.key("b"), timedelta(seconds=60), '{"b": 1}')
+        reads = _count_redis_reads(fake_redis, monkeypatch)
+
+        for _ in range(2):
+            assert cache.get(SPEC, "a") == {"when": "Thu, 01 Jan 2026 00:00:00 +0000"}
+            assert cache.get(SPEC, "b") == {"b": 1}
+        assert reads == [SPEC.key("a"), SPEC.key("b")]
+
+        fake_redis.horde_r_setex(SPEC.key("b"), timedelta(seconds=60), '{"b": 2}')
+
+        assert cache.get(SPEC, "b") == {"b": 2}
+
+    def test_serializers_round_trip(self, cache, fake_redis):
+        cache.set(FLAGS, False, "x")
+        cache.clear_local()
+
+        assert fake_redis.horde_r_get(FLAGS.key("x")) == b"0"
+        assert cache.get(FLAGS, "x") is False
+        assert cache.get_many(FLAGS, ["x", "missing"]) == [False, None]
+
+    def test_unparseable_values_are_misses(self, cache, fake_redis):
+        fake_redis.horde_r_setex(SPEC.key("bad"), timedelta(seconds=60), "{not json")
+
+        assert cache.get(SPEC, "bad") is None
+        assert cache.get_or_load(SPEC, "bad", loader=lambda: ["loaded"]) == ["loaded"]
+        assert cache.get(SPEC, "bad") == ["loaded"]
+
+    def test_get_many_reads_only_what_is_not_held(self, cache, fake_redis, monkeypatch):
+        cache.set(SPEC, 1, "held")
+        cache.get(SPEC, "held")
+        fake_redis.horde_r_setex(SPEC.key("remote"), timedelta(seconds=60), "2")
+        mgets = []
+        horde_r_get_many = fake_redis.horde_r_get_many
+        monkeypatch.setattr(fake_redis, "horde_r_get_many", lambda keys: mgets.append(keys) or horde_r_get_many(keys))
+
+        assert cache.get_many(SPEC, ["held", "remote", "missing"]) == [1, 2, None]
+        assert mgets == [[SPEC.key("remote"), SPEC.key("missing")]]
+
+    def test_retrieved_totals_are_a_copy(self, fake_redis, monkeypatch):
+        from horde.database import functions
+        from horde.horde_cache import TOTALS
+
+        monkeypatch.setattr(fake_redis, "memory_tier", fake_redis.memory_tier)
+        monkeypatch.setattr(functions, "horde_cache", HordeCache(max_entries=100))
+        functions.horde_cache.set(TOTALS, {"queued_requests": 3})
+
+        functions.retrieve_totals()["worker_count"] = 12
+
+        assert functions.retrieve_totals() == {"queued_requests": 3}
+
+    def test_nothing_is_cached_without_redis(self, monkeypatch):
+        from horde.horde_redis import horde_redis
+
+        monkeypatch.setattr(horde_redis, "horde_r", None)
+        monkeypatch.setattr(horde_redis, "horde_local_r", None)
+        monkeypatch.setattr(horde_redis, "all_horde_redis", [])
+        monkeypatch.setattr(horde_redis, "memory_tier", horde_redis.memory_tier)
+        cache = HordeCache(max_entries=100)
+        loads = []
+
+        cache.set(SPEC, 1, "a")
+        assert cache.get(SPEC, "a") is None
+        assert cache.get_or_load(SPEC, "a", loader=lambda: loads.append(1) or 2) == 2
+        assert cache.get_or_load(SPEC, "a", loader=lambda: loads.append(1) or 2) == 2
+        assert len(loads) == 2
+
+
+class TestMemoryTier:
+    def test_evicts_the_least_recently_used(self):
+        tier = MemoryTier(max_entries=2)
+        tier.set("a", 1, 60)
+        tier.set("b", 2, 60)
+        tier.get("a")
+        tier.set("c", 3, 60)
+
+        assert tier.get("a") == (True, 1)
+        assert tier.get("b") == (False, None)
+        assert tier.get("c") == (True, 3)
+
+    def test_entries_expire(self, monkeypatch):
+        tier = MemoryTier(max_entries=2)
+        now = [1000.0]
+        monkeypatch.setattr(horde_cache_module.time, "monotonic", lambda: now[0])
+        tier.set("a", 1, 5)
+
+        now[0] += 4.9
+        assert tier.get("a") == (True, 1)
+        now[0] += 0.2
+        assert tier.get("a") == (False, None)
+        assert tier.entries == {}
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_load_once(self, cache, fake_redis):
+        loading = threading.Event()
+        release = threading.Event()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            loading.set()
+            release.wait(5)
+            return ["value"]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load(SPEC, "k", loader=loader))) for _ in range(5)]
+        threads[0].start()
+        assert loading.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert results == [["value"]] * 5
+        assert len(loads) == 1
+        assert cache.flights == {}
+
+    def test_a_failed_load_is_not_cached(self, cache, fake_redis):
+        def failing():
+            raise RuntimeError("database went away")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_load(SPEC, "k", loader=failing)
+
+        assert cache.flights == {}
+        assert cache.get_or_load(SPEC, "k", loader=lambda: 3) == 3
+
+
+class TestFanOut:
+    def test_writes_reach_every_server_despite_a_failure(self, fake_redis, monkeypatch):
+        fakeredis = pytest.importorskip("fakeredis")
+
+        class BrokenRedis:
+            def setex(self, *args):
+                raise ConnectionError("unreachable")
+
+        servers = [fakeredis.FakeStrictRedis(), BrokenRedis(), fakeredis.FakeStrictRedis()]
+        monkeypatch.setattr(fake_redis, "all_horde_redis", servers)
+
+        fake_redis.horde_r_setex("fan_out", timedelta(seconds=60), "1")
+
+        assert [server.get("fan_out") for server in (servers[0], servers[2])] == [b"1", b"1"]
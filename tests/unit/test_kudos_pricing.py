@@ -211,3 +211,37 @@ class TestUnknownInputsHandled:
         img2img = dict(basis_payload, source_processing="img2img", source_image=True)
         # Same arithmetic path → same kudos.
         assert kudos_model.calculate_kudos(remix) == kudos_model.calculate_kudos(img2img)
+
+
+class TestBatchPrediction:
+    """``predict_batch`` prices many payloads at once, exactly as one at a time."""
+
+    def test_batch_matches_single_predictions(self, kudos_model: KudosModel, basis_payload: dict[str, Any]) -> None:
+        """Each payload of a batch gets the time it gets on its own, in order."""
+        payloads = [dict(basis_payload, steps=steps, width=width) for steps in (10, 30, 50, 80) for width in (512, 768, 1024)]
+        kudos_model.memo.clear()
+
+        batch_times = kudos_model.predict_batch(payloads)
+        kudos_model.memo.clear()
+
+        assert batch_times == [kudos_model.payload_to_time(payload) for payload in payloads]
+        assert kudos_model.predict_batch([]) == []
+
+    def test_repeated_payloads_are_memoized(
+        self,
+        kudos_model: KudosModel,
+        basis_payload: dict[str, Any],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Payloads with an already seen feature vector skip the model; the memo stays bounded."""
+        kudos_model.memo.clear()
+        forwarded_rows = []
+        forward = kudos_model.forward
+        monkeypatch.setattr(kudos_model, "forward", lambda inputs: forwarded_rows.append(len(inputs)) or forward(inputs))
+        monkeypatch.setattr(kudos_model, "MEMO_ENTRIES", 2)
+
+        kudos_model.predict_batch([basis_payload, dict(basis_payload, steps=20)])
+        kudos_model.predict_batch([dict(basis_payload), dict(basis_payload, steps=30)])
+
+        assert forwarded_rows == [2, 1]
+        assert len(kudos_model.memo) == 2
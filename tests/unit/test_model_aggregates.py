@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the available models aggregate (``horde/database/model_aggregates.py``).
+
+``get_available_models`` sums the full model list from an aggregate which keeps the
+models of the active workers and requests in memory, and only re-reads their
+volatile columns on each refresh. The contracts exercised here:
+
+- the threads, things and jobs per model match the worker-model grouping and
+  ``count_things_per_model``;
+- a refresh with nothing new loads no models, and issues the same number of
+  queries however many requests are queued;
+- ``set_models`` evicts the worker's models, so the next refresh counts its new ones;
+- the performance of every model is averaged in one grouped query, equal to
+  ``get_model_avg``, weighting each minute by its samples.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+
+from horde.classes.base import stats
+from horde.classes.base.stats import ModelPerformanceBucket
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.database import functions as f
+from horde.database import model_aggregates as model_aggregates_module
+from horde.database.model_aggregates import AvailableModelsAggregate
+from horde.flask import db
+from tests.fixture_types import StubModelReference
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def _model_reference(stub_model_reference: StubModelReference) -> None:
+    stub_model_reference(
+        {"stable_diffusion": {"baseline": "stable diffusion 1"}, "deliberate": {"baseline": "stable diffusion 1"}},
+        stable_diffusion_names={"stable_diffusion", "deliberate"},
+    )
+
+
+@pytest.fixture
+def aggregate(monkeypatch: pytest.MonkeyPatch) -> AvailableModelsAggregate:
+    fresh = AvailableModelsAggregate()
+    monkeypatch.setattr(f, "available_models_aggregate", fresh)
+    monkeypatch.setattr(model_aggregates_module, "available_models_aggregate", fresh)
+    return fresh
+
+
+class TestAvailableModelsAggregate:
+    def test_totals_match_the_full_recount(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, aggregate):
+        user = make_user()
+        make_image_worker(user, models=["stable_diffusion", "deliberate"], threads=2)
+        make_image_worker(user, models=["stable_diffusion"])
+        make_image_wp(user, models=["stable_diffusion"], n=3)
+        make_image_wp(user, models=["stable_diffusion", "deliberate"])
+        db.session.expire_all()
+
+        totals = aggregate.refresh("image")
+
+        assert totals.threads == {"stable_diffusion": 3, "deliberate": 2}
+        assert (totals.things, totals.jobs) == f.count_things_per_model(ImageWaitingPrompt)
+
+    def test_refresh_only_loads_the_models_of_new_entries(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, aggregate, assert_query_count
+    ):
+        user = make_user()
+        make_image_worker(user, models=["stable_diffusion"])
+
+        def refresh_queries(wp_count: int) -> list[str]:
+            for _ in range(wp_count):
+                make_image_wp(user, models=["stable_diffusion"], n=2)
+            aggregate.refresh("image")
+            db.session.expire_all()
+            with assert_query_count() as queries:
+                assert aggregate.refresh("image").jobs["stable_diffusion"] == 2 * len(aggregate.aggregates["image"].wp_models)
+            return queries.of_kind("SELECT")
+
+        few, many = refresh_queries(2), refresh_queries(6)
+
+        assert len(few) == len(many)
+        assert not any("worker_models" in query or "wp_models" in query for query in many)
+
+    def test_set_models_evicts_the_worker_models(self, db_session, fake_redis, make_user, make_image_worker, aggregate):
+        worker = make_image_worker(make_user(), models=["stable_diffusion"])
+        aggregate.refresh("image")
+
+        worker.set_models(["deliberate"])
+
+        assert worker.id not in aggregate.aggregates["image"].worker_models
+        assert aggregate.refresh("image").threads == {"deliberate": 1}
+
+    def test_available_models_list(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, aggregate):
+        user = make_user()
+        make_image_worker(user, models=["stable_diffusion"], threads=2)
+        make_image_wp(user, models=["stable_diffusion"], n=2)
+        make_image_wp(user, models=["deliberate"])
+        db.session.add(ModelPerformanceBucket(model="stable_diffusion", minute=stats.current_minute(), samples=2, performance_sum=2.0))
+        db.session.commit()
+
+        models = {model["name"]: model for model in f.get_available_models()}
+
+        assert models["stable_diffusion"]["count"] == 2
+        assert models["stable_diffusion"]["jobs"] == 2
+        assert models["stable_diffusion"]["performance"] == 1.0
+        assert models["deliberate"]["count"] == 0
+        assert models["deliberate"]["jobs"] == 1
+        assert models["deliberate"]["eta"] == 10000
+
+
+class TestModelAvgs:
+    def test_grouped_avgs_match_get_model_avg(self, db_session, assert_query_count):
+        minute = stats.current_minute()
+        for model_name, minutes_ago, samples, performance_sum in [
+            ("stable_diffusion", 0, 1, 1.0),
+            ("stable_diffusion", 5, 3, 7.5),
+            ("deliberate", 0, 1, 0.5),
+            # Outside of the averaged window
+            ("deliberate", 61, 1, 100.0),
+        ]:
+            db.session.add(
+                ModelPerformanceBucket(
+                    model=model_name,
+                    minute=minute - timedelta(minutes=minutes_ago),
+                    samples=samples,
+                    performance_sum=performance_sum,
+                ),
+            )
+        db.session.commit()
+        model_names = ["stable_diffusion", "deliberate", "unknown"]
+
+        with assert_query_count() as queries:
+            model_avgs = stats.get_model_avgs(model_names)
+
+        assert len(queries.of_kind("SELECT")) == 1
+        assert model_avgs == {"stable_diffusion": 2.1, "deliberate": 0.5, "unknown": 0}
+        assert model_avgs == {model_name: stats.get_model_avg(model_name) for model_name in model_names}
+        assert stats.get_model_avgs([]) == {}
@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for long-polling job pops (``horde/pop_notifier.py``).
+
+With ``HORDE_POP_LONG_POLL=1`` a pop that finds nothing may be parked for up to its
+``wait_seconds`` and is woken when a request it could serve is activated. The
+contracts exercised here:
+
+- a pop is only woken by requests for the models it serves, by requests which
+  did not ask for a model, or by any request if it declared no models itself;
+- a request activated between the pop's candidate search and its wait is not
+  missed, because the pop snapshots its keys before searching;
+- the wait is bounded by the pop's deadline, and nothing parks unless both the
+  horde and the worker opted in;
+- no more pops park on a node than ``HORDE_MAX_PARKED_POPS``; the pops over it are
+  answered at once, and every pop gives its slot back when it returns.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from horde.apis.v2 import base as api_base
+from horde.apis.v2.base import JobPopTemplate
+from horde.pop_notifier import PopNotifier, PopSlots
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def notifier(monkeypatch: pytest.MonkeyPatch) -> PopNotifier:
+    monkeypatch.setenv("HORDE_POP_LONG_POLL", "1")
+    fresh = PopNotifier()
+    monkeypatch.setattr(api_base, "pop_notifier", fresh)
+    monkeypatch.setattr(api_base, "pop_slots", PopSlots())
+    return fresh
+
+
+class _StubWorker:
+    maintenance = False
+
+
+class _StubPop(JobPopTemplate):
+    gentype = "image"
+
+    def __init__(self, wait_seconds: int, models: list[str]) -> None:
+        self.args: dict[str, Any] = {"wait_seconds": wait_seconds}
+        self.models = models
+        self.worker = _StubWorker()
+        self.skipped = {"models": 1}
+
+
+def _notify_later(notifier: PopNotifier, gentype: str, models: list[str], delay: float = 0.05) -> threading.Thread:
+    thread = threading.Thread(target=lambda: (time.sleep(delay), notifier.notify(gentype, models)))
+    thread.start()
+    return thread
+
+
+class TestPopNotifier:
+    def test_matching_model_wakes_the_waiter(self, notifier):
+        snapshot = notifier.watch("image", ["model_a"])
+        thread = _notify_later(notifier, "image", ["model_a", "model_b"])
+
+        assert notifier.wait(snapshot, timeout=5) is True
+        thread.join()
+
+    def test_other_models_and_types_do_not_wake_the_waiter(self, notifier):
+        snapshot = notifier.watch("image", ["model_a"])
+        notifier.notify("image", ["model_b"])
+        notifier.notify("text", ["model_a"])
+
+        assert notifier.wait(snapshot, timeout=0.05) is False
+
+    def test_modelless_request_wakes_every_waiter_of_its_type(self, notifier):
+        snapshot = notifier.watch("image", ["model_a"])
+        notifier.notify("image", [])
+
+        assert notifier.wait(snapshot, timeout=0) is True
+
+    def test_worker_without_models_is_woken_by_any_request(self, notifier):
+        snapshot = notifier.watch("interrogation", [])
+        notifier.notify("interrogation", ["caption"])
+
+        assert notifier.wait(snapshot, timeout=0) is True
+
+    def test_request_queued_before_the_wait_is_not_missed(self, notifier):
+        # The pop snapshots, searches (finding nothing), and only then waits; a
+        # request activated during the search must still end the wait at once.
+        snapshot = notifier.watch("text", ["model_a"])
+        notifier.notify("text", ["model_a"])
+
+        started = time.monotonic()
+        assert notifier.wait(snapshot, timeout=5) is True
+        assert time.monotonic() - started < 1
+
+    def test_notify_is_inert_when_long_poll_is_disabled(self, notifier, monkeypatch):
+        monkeypatch.setenv("HORDE_POP_LONG_POLL", "0")
+        snapshot = notifier.watch("image", ["model_a"])
+        notifier.notify("image", ["model_a"])
+
+        assert notifier.wait(snapshot, timeout=0) is False
+
+
+class TestLongPollPop:
+    def test_pop_without_wait_seconds_does_not_park(self, notifier):
+        assert _StubPop(0, ["model_a"]).watch_for_jobs() is None
+
+    def test_pop_does_not_park_when_the_horde_disables_long_poll(self, notifier, monkeypatch):
+        monkeypatch.setenv("HORDE_POP_LONG_POLL", "0")
+
+        assert _StubPop(10, ["model_a"]).watch_for_jobs() is None
+
+    def test_parked_pop_is_woken_by_a_matching_request(self, db_session, notifier):
+        pop = _StubPop(10, ["model_a"])
+        snapshot = pop.watch_for_jobs()
+        thread = _notify_later(notifier, "image", ["model_a"])
+
+        assert pop.wait_for_jobs(snapshot) is True
+        assert pop.skipped == {}
+        thread.join()
+
+    def test_parked_pop_gives_up_at_its_deadline(self, db_session, notifier):
+        pop = _StubPop(10, ["model_a"])
+        snapshot = pop.watch_for_jobs()
+        pop.pop_deadline = time.monotonic() + 0.05
+
+        assert pop.wait_for_jobs(snapshot) is False
+        assert pop.skipped == {"models": 1}
+
+    def test_wait_seconds_is_capped(self, notifier):
+        pop = _StubPop(3600, ["model_a"])
+        pop.watch_for_jobs()
+
+        assert pop.pop_deadline - time.monotonic() <= api_base.POP_MAX_WAIT_SECONDS
+
+    def test_pop_over_the_parked_cap_returns_without_waiting(self, db_session, notifier, monkeypatch):
+        monkeypatch.setenv("HORDE_MAX_PARKED_POPS", "1")
+        parked = _StubPop(10, ["model_a"])
+        assert parked.watch_for_jobs() is not None
+
+        over_cap = _StubPop(10, ["model_a"])
+        started = time.monotonic()
+        snapshot = over_cap.watch_for_jobs()
+        assert snapshot is None
+        assert over_cap.wait_for_jobs(snapshot) is False
+        assert time.monotonic() - started < 1
+
+        parked.release_pop_slot()
+        assert over_cap.watch_for_jobs() is not None
+        over_cap.release_pop_slot()
+
+    def test_pop_keeps_one_slot_across_its_searches(self, notifier, monkeypatch):
+        monkeypatch.setenv("HORDE_MAX_PARKED_POPS", "1")
+        pop = _StubPop(10, ["model_a"])
+
+        assert pop.watch_for_jobs() is not None
+        assert pop.watch_for_jobs() is not None
+        pop.release_pop_slot()
+        pop.release_pop_slot()
+        assert api_base.pop_slots.open == 0
@@ -0,0 +1,214 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the post-submit jobs (``horde/classes/base/post_submit.py``
+and ``horde/database/post_submit.py``).
+
+A submit claims its generation and records its kudos postings in the worker's
+request, and queues its other side effects in the same transaction. The
+contracts exercised here:
+
+- a submit records no performance sample, statistic or webhook itself: it
+  queues them, and running the jobs records them;
+- a duplicate submit queues nothing;
+- a job which fails is retried later without holding back the others, and is
+  dropped after ``POST_SUBMIT_MAX_ATTEMPTS``;
+- the webhook job hands the generation's webhook to the webhook engine once its
+  batch commits, so a batch retried job by job never sends it twice;
+- with ``HORDE_POST_SUBMIT_ASYNC=0`` the submit runs its jobs inline, and the
+  runner thread otherwise runs them once woken up.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import Session
+
+import horde.classes.base.processing_generation as procgen_module
+from horde.classes.base.post_submit import PostSubmitJob, queue_post_submit_job
+from horde.classes.base.user import User
+from horde.classes.base.worker import WorkerPerformance
+from horde.classes.stable.genstats import ImageGenerationStatistic
+from horde.classes.stable.processing_generation import ImageProcessingGeneration
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.database import post_submit
+from horde.database.post_submit import POST_SUBMIT_MAX_ATTEMPTS, PostSubmitRunner, run_post_submit_jobs
+from horde.flask import db
+from horde.webhook_delivery import WebhookEngine
+from tests.fixture_types import MakeUser
+
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("stub_model_reference")]
+
+WEBHOOK_URL = "http://subscriber.example/hook"
+
+
+@pytest.fixture
+def isolated_engine(monkeypatch: pytest.MonkeyPatch) -> WebhookEngine:
+    fresh = WebhookEngine(workers=1, max_pending=4)
+    monkeypatch.setattr(fresh, "ensure_started", lambda: None)
+    monkeypatch.setattr(procgen_module, "webhook_engine", fresh)
+    return fresh
+
+
+def _pending_generation(db_session: Session, requester: User, *, webhook: str | None = None) -> ImageProcessingGeneration:
+    worker = ImageWorker(name=f"post_submit_worker_{uuid.uuid4().hex[:8]}", user_id=requester.id)
+    db_session.add(worker)
+    db_session.flush()
+    wp = ImageWaitingPrompt(
+        worker_ids=[],
+        models=["stable_diffusion"],
+        prompt="a test robot",
+        user_id=requester.id,
+        params={"width": 512, "height": 512, "steps": 8, "sampler_name": "k_euler_a", "cfg_scale": 7, "post_processing": ["GFPGAN"]},
+        webhook=webhook,
+        r2=False,
+    )
+    db_session.flush()
+    return ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion")
+
+
+def _queued_kinds() -> list[str]:
+    return sorted(kind for (kind,) in db.session.query(PostSubmitJob.kind))
+
+
+class TestSubmitQueuesItsSideEffects:
+    def test_side_effects_are_recorded_when_the_jobs_run(self, db_session, make_user: MakeUser):
+        procgen = _pending_generation(db_session, make_user())
+
+        procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+
+        assert _queued_kinds() == ["image_statistic", "worker_performance"]
+        assert db.session.query(WorkerPerformance).count() == 0
+        assert db.session.query(ImageGenerationStatistic).count() == 0
+
+        assert run_post_submit_jobs() == 2
+
+        assert [sample.performance for sample in db.session.query(WorkerPerformance)] == [2.0]
+        [statistic] = db.session.query(ImageGenerationStatistic).all()
+        assert (statistic.model, statistic.steps, [pp.pp for pp in statistic.post_processors]) == ("stable_diffusion", 8, ["GFPGAN"])
+        assert _queued_kinds() == []
+
+    def test_duplicate_submit_queues_nothing(self, db_session, make_user: MakeUser):
+        procgen = _pending_generation(db_session, make_user())
+        procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+        run_post_submit_jobs()
+
+        assert procgen.set_generation("R2", things_per_sec=2.0, seed=7) == 0
+        db.session.commit()
+
+        assert _queued_kinds() == []
+
+    def test_webhook_job_hands_the_webhook_to_the_engine(self, db_session, make_user: MakeUser, isolated_engine: WebhookEngine):
+        procgen = _pending_generation(db_session, make_user(), webhook=WEBHOOK_URL)
+        kudos = procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+        # Reading the image back would need object storage
+        db.session.query(ImageProcessingGeneration).filter_by(id=procgen.id).update({"generation": "base64imagedata"})
+        db.session.commit()
+        assert isolated_engine.ready.empty()
+
+        run_post_submit_jobs()
+
+        delivery = isolated_engine.ready.get_nowait()
+        assert (delivery.url, delivery.data["id"], delivery.data["kudos"]) == (WEBHOOK_URL, str(procgen.id), kudos)
+
+    def test_webhook_is_sent_once_when_its_batch_is_retried_job_by_job(
+        self,
+        db_session,
+        make_user: MakeUser,
+        isolated_engine: WebhookEngine,
+        monkeypatch,
+    ):
+        requester = make_user()
+        sent = _pending_generation(db_session, requester, webhook=WEBHOOK_URL)
+        failing = _pending_generation(db_session, requester, webhook=WEBHOOK_URL)
+        for procgen in (sent, failing):
+            procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+        db.session.query(ImageProcessingGeneration).filter(ImageProcessingGeneration.id.in_([sent.id, failing.id])).update(
+            {"generation": "base64imagedata"},
+        )
+        db.session.commit()
+        webhook_delivery = ImageProcessingGeneration.webhook_delivery
+
+        def fail_the_second(procgen, kudos):
+            if procgen.id == failing.id:
+                raise ValueError("boom")
+            return webhook_delivery(procgen, kudos)
+
+        monkeypatch.setattr(ImageProcessingGeneration, "webhook_delivery", fail_the_second)
+
+        run_post_submit_jobs()
+
+        assert isolated_engine.ready.get_nowait().data["id"] == str(sent.id)
+        assert isolated_engine.ready.empty()
+
+
+class TestFailures:
+    def test_failing_job_is_retried_later_without_holding_back_the_others(self, db_session, monkeypatch):
+        ran = []
+
+        def handler(payloads):
+            if any(payload["fail"] for payload in payloads):
+                raise ValueError("boom")
+            ran.extend(payloads)
+
+        monkeypatch.setattr(post_submit, "post_submit_handlers", lambda: {"test": handler})
+        queue_post_submit_job("test", {"fail": False})
+        failing = queue_post_submit_job("test", {"fail": True})
+        db.session.commit()
+
+        assert run_post_submit_jobs() == 2
+
+        assert ran == [{"fail": False}]
+        [job] = db.session.query(PostSubmitJob).all()
+        assert (job.id, job.attempts) == (failing.id, 1)
+        assert job.run_after > datetime.utcnow()
+        assert run_post_submit_jobs() == 0
+
+    def test_job_is_dropped_after_its_last_attempt(self, db_session, monkeypatch):
+        def handler(payloads):
+            raise ValueError("boom")
+
+        monkeypatch.setattr(post_submit, "post_submit_handlers", lambda: {"test": handler})
+        job = queue_post_submit_job("test", {})
+        db.session.commit()
+
+        for _ in range(POST_SUBMIT_MAX_ATTEMPTS):
+            db.session.query(PostSubmitJob).update({"run_after": datetime.utcnow()})
+            db.session.commit()
+            run_post_submit_jobs()
+
+        assert db.session.get(PostSubmitJob, job.id) is None
+
+
+class TestRunning:
+    def test_synchronous_mode_runs_the_jobs_of_the_submit(self, db_session, make_user: MakeUser, monkeypatch):
+        monkeypatch.setenv("HORDE_POST_SUBMIT_ASYNC", "0")
+        procgen = _pending_generation(db_session, make_user())
+
+        procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+
+        assert _queued_kinds() == []
+        assert db.session.query(WorkerPerformance).count() == 1
+
+    def test_runner_runs_the_jobs_once_woken_up(self, db_session, make_user: MakeUser):
+        procgen = _pending_generation(db_session, make_user())
+        procgen.set_generation("R2", things_per_sec=2.0, seed=7)
+        runner = PostSubmitRunner(poll_seconds=60)
+        runner.start()
+        try:
+            runner.wake()
+            deadline = time.monotonic() + 10
+            while _queued_kinds() and time.monotonic() < deadline:
+                db.session.rollback()
+                time.sleep(0.05)
+        finally:
+            runner.stop()
+
+        assert _queued_kinds() == []
+        assert db.session.query(WorkerPerformance).count() == 1
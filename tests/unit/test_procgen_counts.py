@@ -0,0 +1,104 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the aggregated generation counts (``count_procgens_per_wp``).
+
+The finished, processing and restarted generations of requests are counted with
+one grouped query instead of loading every generation of every request. The
+contracts exercised here:
+
+- the counts classify generations exactly as the per-generation checks do: a
+  delivered generation is finished even if it was faulted afterwards, an
+  undelivered faulted one is restarted, and fake generations are not counted;
+- ``get_status`` reaches the same ``done`` verdict from the counts as from the
+  ``count_finished_jobs``/``count_processing_jobs`` queries;
+- ``count_things_per_model`` issues the same number of queries however many
+  requests are queued.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from horde.classes.base.waiting_prompt import count_procgens_per_wp
+from horde.classes.stable.processing_generation import ImageProcessingGeneration
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.database import functions as f
+from horde.flask import db
+
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("stub_model_reference")]
+
+
+def _add_procgen(wp: ImageWaitingPrompt, worker: ImageWorker, **columns: Any) -> ImageProcessingGeneration:
+    procgen = ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion")
+    for column, value in columns.items():
+        setattr(procgen, column, value)
+    db.session.commit()
+    return procgen
+
+
+class TestCountProcgensPerWp:
+    def test_counts_match_the_per_generation_checks(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        wp, other, idle = make_image_wp(user, n=6), make_image_wp(user), make_image_wp(user)
+        _add_procgen(wp, worker, generation="done")
+        _add_procgen(wp, worker, generation="done", faulted=True)
+        _add_procgen(wp, worker, faulted=True)
+        _add_procgen(wp, worker)
+        _add_procgen(wp, worker, fake=True)
+        _add_procgen(other, worker)
+
+        counts = count_procgens_per_wp("image", [wp.id, other.id, idle.id])
+
+        assert counts == {
+            wp.id: {"finished": 2, "processing": 1, "restarted": 1},
+            other.id: {"finished": 0, "processing": 1, "restarted": 0},
+        }
+        assert wp.count_processing_gens() == counts[wp.id]
+        assert idle.count_processing_gens() == {"finished": 0, "processing": 0, "restarted": 0}
+        assert count_procgens_per_wp("image", []) == {}
+
+    @pytest.mark.parametrize("delivered", [0, 1, 2])
+    def test_done_verdict_matches_the_job_queries(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, delivered):
+        user = make_user()
+        worker = make_image_worker(user)
+        wp = make_image_wp(user, n=2)
+        wp.n = 0
+        for _ in range(delivered):
+            _add_procgen(wp, worker, generation="done")
+        for _ in range(2 - delivered):
+            _add_procgen(wp, worker)
+
+        status = wp.get_lite_status(
+            request_avg=0,
+            has_valid_workers=True,
+            wp_queue_stats=(-1, 0, 0),
+            active_worker_count=(0, 0),
+        )
+
+        assert status["done"] == wp.is_completed()
+        assert status["done"] == (delivered == 2)
+
+
+class TestCountThingsPerModel:
+    def test_query_count_does_not_grow_with_the_queue(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, assert_query_count
+    ):
+        user = make_user()
+        worker = make_image_worker(user)
+
+        def count_queries(wp_count: int) -> int:
+            for _ in range(wp_count):
+                _add_procgen(make_image_wp(user, n=2), worker)
+            db.session.expire_all()
+            with assert_query_count() as queries:
+                things, jobs = f.count_things_per_model(ImageWaitingPrompt)
+            assert jobs["stable_diffusion"] > 0
+            return len(queries)
+
+        assert count_queries(2) == count_queries(6)
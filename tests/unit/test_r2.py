@@ -9,13 +9,26 @@ These functions decide *which* S3 account/bucket a request lands in and *what*
 object key it targets. Getting either wrong silently misroutes user images.
 Live bucket I/O stays in the ``object_storage``-marked integration tests; here we
 substitute a recording fake client and assert the request shape.
+
+The download URLs of generated images are also cached until close to their expiry,
+and signed in batches by ``SigV4Presigner``, which must reproduce botocore's URLs
+exactly.
+
+Uploads are streamed from memory, without temporary files, and the shared dataset
+metadata is uploaded by a bounded background pool, which runs uploads inline once
+it is full.
 """
 
 from __future__ import annotations
 
+import json
+import threading
+import time
+
 import pytest
 
 from horde import r2
+from horde.horde_cache import horde_cache
 
 
 class _FakeS3:
@@ -24,11 +37,18 @@ class _FakeS3:
     def __init__(self, name: str) -> None:
         self.name = name
         self.calls: list[dict] = []
+        self.uploads: list[tuple[str, str, bytes]] = []
 
     def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):  # noqa: N803 (boto3 kwarg names)
         self.calls.append({"method": ClientMethod, "params": Params, "expires": ExpiresIn})
         return f"https://{self.name}/{Params['Bucket']}/{Params['Key']}?method={ClientMethod}"
 
+    def upload_fileobj(self, Fileobj, Bucket, Key):  # noqa: N803
+        self.uploads.append((Bucket, Key, Fileobj.read()))
+
+    def head_object(self, Bucket, Key):  # noqa: N803
+        return {"ContentLength": 1}
+
 
 @pytest.fixture
 def fake_clients(monkeypatch):
@@ -60,8 +80,9 @@ class TestProcgenUrls:
     def test_download_url_uses_get_object(self, fake_clients):
         transient, _ = fake_clients
         r2.generate_procgen_download_url("def456")
-        assert transient.calls[0]["method"] == "get_object"
-        assert transient.calls[0]["params"]["Key"] == "def456.webp"
+        # Preceded by the presigner's verification URL, which the fake does not sign with SigV4
+        assert transient.calls[-1]["method"] == "get_object"
+        assert transient.calls[-1]["params"]["Key"] == "def456.webp"
 
 
 class TestUuidImgUrls:
@@ -104,3 +125,158 @@ class TestFileExistence:
         assert r2.check_file(_Missing(), "bucket", "missing.webp") is False
         # file_exists treats any non-dict (here a bool) as "absent".
         assert r2.file_exists(_Missing(), "bucket", "missing.webp") is False
+
+
+def _boto_client(monkeypatch, **kwargs):
+    boto3 = pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY")
+    return boto3.client("s3", endpoint_url="https://account.r2.cloudflarestorage.com", **kwargs)
+
+
+class TestSigV4Presigner:
+    KEYS = ["abc123.webp", "with space+plus~.webp", "nested/ümlaut.webp"]
+
+    @pytest.mark.parametrize("session_token", [None, "session/token+="])
+    def test_reproduces_botocore(self, monkeypatch, frozen_time, session_token):
+        client = _boto_client(monkeypatch, region_name="auto", aws_session_token=session_token)
+        presigner = r2.SigV4Presigner(client, "bucket")
+
+        with frozen_time("2026-03-01 23:59:59"):
+            signed = presigner.presign_get_objects(self.KEYS, 1800)
+            expected = [
+                client.generate_presigned_url(ClientMethod="get_object", Params={"Bucket": "bucket", "Key": key}, ExpiresIn=1800)
+                for key in self.KEYS
+            ]
+
+        assert presigner.verified is True
+        assert signed == expected
+
+    def test_derives_the_signing_key_once_per_day(self, monkeypatch, frozen_time):
+        presigner = r2.SigV4Presigner(_boto_client(monkeypatch, region_name="auto"), "bucket")
+
+        with frozen_time("2026-03-01 10:00:00"):
+            presigner.presign_get_objects(self.KEYS, 1800)
+            first_key = presigner.signing_key
+            presigner.presign_get_objects(self.KEYS, 1800)
+            assert presigner.signing_key is first_key
+        with frozen_time("2026-03-02 00:00:01"):
+            presigner.presign_get_objects(self.KEYS, 1800)
+
+        assert presigner.signing_key[1].startswith("20260302/auto/s3/")
+
+    def test_leaves_other_signatures_to_botocore(self, fake_clients):
+        transient, _ = fake_clients
+        presigner = r2.SigV4Presigner(transient, "bucket")
+
+        assert presigner.presign_get_objects(["a.webp", "b.webp"], 1800) == [
+            "https://transient/bucket/a.webp?method=get_object",
+            "https://transient/bucket/b.webp?method=get_object",
+        ]
+        assert presigner.verified is False
+
+
+class TestDownloadUrlCache:
+    def test_urls_are_signed_once_until_close_to_expiry(self, fake_clients, fake_redis):
+        transient, _ = fake_clients
+        r2.generate_procgen_download_urls(["a", "b"])
+        signed_calls = len(transient.calls)
+
+        assert r2.generate_procgen_download_urls(["a", "b"]) == {
+            "a": f"https://transient/{r2.r2_transient_bucket}/a.webp?method=get_object",
+            "b": f"https://transient/{r2.r2_transient_bucket}/b.webp?method=get_object",
+        }
+        assert r2.generate_procgen_download_url("a") == f"https://transient/{r2.r2_transient_bucket}/a.webp?method=get_object"
+        assert len(transient.calls) == signed_calls
+
+        almost_expired = time.time() + r2.PRESIGNED_URL_REFRESH_MARGIN_SECONDS - 1
+        horde_cache.set(r2.PROCGEN_DOWNLOAD_URL, ["https://stale", almost_expired], 0, "a")
+        r2.generate_procgen_download_urls(["a", "b"])
+
+        assert [call["params"]["Key"] for call in transient.calls[signed_calls:]] == ["a.webp"]
+
+    def test_shared_urls_are_cached_apart(self, fake_clients, fake_redis):
+        transient, shared = fake_clients
+        r2.generate_procgen_download_url("a")
+        r2.generate_procgen_download_url("a", shared=True)
+
+        assert r2.generate_procgen_download_url("a", shared=True).startswith("https://shared/")
+        assert [call["params"]["Key"] for call in shared.calls if call["params"]["Key"] == "a.webp"] == ["a.webp"]
+
+
+class TestInMemoryUploads:
+    def test_shared_metadata_is_streamed_without_files(self, fake_clients, tmp_path, monkeypatch):
+        _, shared = fake_clients
+        monkeypatch.chdir(tmp_path)
+
+        r2.upload_shared_generation_metadata("abc", {"seed": 1, "prompt": "a robot"})
+
+        assert shared.uploads == [(r2.r2_permanent_bucket, "abc.json", json.dumps({"seed": 1, "prompt": "a robot"}, indent=4).encode())]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_metadata_of_a_missing_image_is_not_uploaded(self, fake_clients, monkeypatch):
+        from botocore.exceptions import ClientError
+
+        _, shared = fake_clients
+
+        def missing(Bucket, Key):  # noqa: N803
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+        monkeypatch.setattr(shared, "head_object", missing)
+
+        assert r2.upload_shared_generation_metadata("abc", {"seed": 1}) is False
+        assert shared.uploads == []
+
+    def test_prompts_are_streamed_without_files(self, fake_clients, tmp_path, monkeypatch):
+        transient, _ = fake_clients
+        monkeypatch.chdir(tmp_path)
+
+        r2.upload_prompt({"prompt": "a robot"})
+
+        [(bucket, key, body)] = transient.uploads
+        assert (bucket, json.loads(body)) == ("prompts", {"prompt": "a robot"})
+        assert key.endswith(".json")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_generated_images_are_encoded_to_webp(self, fake_clients):
+        from PIL import Image
+
+        transient, _ = fake_clients
+
+        r2.upload_generated_image(Image.new("RGB", (8, 8)), "gen.webp")
+
+        [(bucket, key, body)] = transient.uploads
+        assert (bucket, key) == (r2.r2_transient_bucket, "gen.webp")
+        assert body[:4] == b"RIFF"
+        assert body[8:12] == b"WEBP"
+
+
+class TestUploaderPool:
+    def test_uploads_run_in_the_background(self):
+        pool = r2.UploaderPool(threads=1, max_pending=2)
+        done = threading.Event()
+        ran_on = []
+
+        pool.submit("metadata", lambda: ran_on.append(threading.current_thread().name) or done.set())
+
+        assert done.wait(5)
+        assert ran_on[0].startswith("r2_uploader")
+
+    def test_a_full_pool_runs_uploads_inline(self):
+        pool = r2.UploaderPool(threads=1, max_pending=1)
+        release = threading.Event()
+        ran_on = []
+        pool.submit("metadata", release.wait, 5)
+
+        pool.submit("metadata", lambda: ran_on.append(threading.current_thread().name))
+        release.set()
+
+        assert ran_on == [threading.current_thread().name]
+
+    def test_failed_uploads_do_not_raise(self):
+        pool = r2.UploaderPool(threads=0)
+
+        def failing():
+            raise ConnectionError("object storage unreachable")
+
+        pool.submit("metadata", failing)
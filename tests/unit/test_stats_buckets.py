@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the per-minute fulfilment buckets (``horde/classes/base/stats.py``).
+
+``record_fulfilment`` adds each fulfilment to the bucket of its model and of its
+type for the current minute, instead of inserting a row per fulfilment. It does
+so through a post-submit job, which the tests run right after committing. The
+contracts exercised here:
+
+- fulfilments of the same minute share one bucket row, whose averages match the
+  per-fulfilment ones;
+- the model averages span the current minute and the 59 before it;
+- ``get_things_per_min`` counts the current minute and the part of the previous
+  one still within the past 60 seconds;
+- ``prune_expired_stats`` drops the buckets outside of the averaged windows.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from horde import vars as hv
+from horde.classes.base import stats
+from horde.classes.base.stats import FulfillmentBucket, ModelPerformanceBucket
+from horde.database import functions as f
+from horde.database.post_submit import run_post_submit_jobs
+from horde.flask import db
+
+pytestmark = pytest.mark.unit
+
+
+def _fulfil(things: float, seconds_taken: float, model: str = "stable_diffusion") -> float:
+    procgen = SimpleNamespace(
+        start_time=stats.datetime.utcnow() - timedelta(seconds=seconds_taken),
+        model=model,
+        procgen_type="image",
+        wp=SimpleNamespace(things=things),
+    )
+    things_per_sec = stats.record_fulfilment(procgen)
+    db.session.commit()
+    run_post_submit_jobs()
+    return things_per_sec
+
+
+@pytest.fixture
+def frozen_now(monkeypatch: pytest.MonkeyPatch) -> datetime:
+    """Freezes the clock of the stats module 15 seconds into a minute"""
+    now = datetime.utcnow().replace(second=15, microsecond=0)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls) -> datetime:
+            return now
+
+    monkeypatch.setattr(stats, "datetime", FrozenDatetime)
+    return now
+
+
+class TestRecordFulfilment:
+    def test_fulfilments_of_a_minute_share_a_bucket(self, db_session, frozen_now):
+        speeds = [_fulfil(10, 10), _fulfil(30, 10), _fulfil(20, 5, model="deliberate")]
+        assert speeds == [1.0, 3.0, 4.0]
+
+        buckets = {bucket.model: bucket for bucket in db.session.query(ModelPerformanceBucket)}
+        assert buckets["stable_diffusion"].samples == 2
+        assert stats.get_model_avg("stable_diffusion") == round((speeds[0] + speeds[1]) / 2, 1)
+        assert stats.get_model_avg("deliberate") == speeds[2]
+        fulfillments = db.session.query(FulfillmentBucket).one()
+        assert (fulfillments.thing_type, fulfillments.minute, fulfillments.things) == ("image", stats.current_minute(frozen_now), 60)
+
+    def test_model_average_spans_sixty_buckets(self, db_session, frozen_now):
+        this_minute = stats.current_minute(frozen_now)
+        for minutes_ago, performance in [(59, 10), (60, 1000)]:
+            minute = this_minute - timedelta(minutes=minutes_ago)
+            db.session.add(ModelPerformanceBucket(model="stable_diffusion", minute=minute, samples=1, performance_sum=performance))
+        db.session.commit()
+
+        assert stats.get_model_avg("stable_diffusion") == 10
+
+
+class TestThingsPerMin:
+    def test_previous_minute_is_weighted_by_its_overlap(self, db_session, frozen_now):
+        this_minute = stats.current_minute(frozen_now)
+        for minutes_ago, things in [(0, 1_000_000), (1, 4_000_000), (2, 9_000_000)]:
+            db.session.add(FulfillmentBucket(thing_type="image", minute=this_minute - timedelta(minutes=minutes_ago), things=things))
+        db.session.commit()
+
+        # 15 seconds into the minute, 45 seconds of the previous one are still counted
+        expected = round((1_000_000 + 4_000_000 * 0.75) / hv.thing_divisors["image"], 2)
+        assert stats.get_things_per_min("image") == expected
+        assert stats.get_things_per_min("text") == 0
+
+
+class TestPruneExpiredStats:
+    def test_buckets_outside_of_the_windows_are_dropped(self, db_session, fake_redis):
+        this_minute = stats.current_minute()
+        for minutes_ago in (0, 1, 2, 59, 60):
+            minute = this_minute - timedelta(minutes=minutes_ago)
+            db.session.add(FulfillmentBucket(thing_type="image", minute=minute, things=1))
+            db.session.add(ModelPerformanceBucket(model="stable_diffusion", minute=minute, samples=1, performance_sum=1))
+        db.session.commit()
+
+        f.prune_expired_stats()
+
+        assert sorted(this_minute - bucket.minute for bucket in db.session.query(FulfillmentBucket)) == [
+            timedelta(0),
+            timedelta(minutes=1),
+        ]
+        assert len(db.session.query(ModelPerformanceBucket).all()) == 4
@@ -0,0 +1,222 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the webhook delivery engine (``horde/webhook_delivery.py``).
+
+The deliveries are POSTed to local stub HTTP servers which can be told to answer
+slowly or with errors. The contracts exercised here:
+
+- the payload reaches the subscriber, over a kept-alive connection;
+- failed attempts are retried on the timer wheel, a bounded number of times;
+- a slow host holds no more than its cap of deliveries in flight, and does not
+  delay the deliveries to other hosts;
+- a host which keeps failing has its circuit opened, and its deliveries are
+  dropped without being attempted;
+- a host with too many deliveries pending drops its own new deliveries only;
+- the state of an idle host is forgotten, once past its breaker cooldown if its
+  deliveries failed;
+- the timer wheel releases what it holds on the tick it is due, even past a full
+  turn.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from horde import webhook_delivery
+from horde.webhook_delivery import MAX_ATTEMPTS, TimerWheel, WebhookDelivery, WebhookEngine
+
+pytestmark = pytest.mark.unit
+
+
+class StubSubscriber(ThreadingHTTPServer):
+    """Answers each POST with the next scripted (status, delay), then with the last one"""
+
+    daemon_threads = True
+
+    def __init__(self, script: list[tuple[int, float]]) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = script
+        self.lock = threading.Lock()
+        self.received: list[dict] = []
+        self.client_ports: set[int] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+    def next_answer(self) -> tuple[int, float]:
+        with self.lock:
+            return self.script[min(len(self.received) - 1, len(self.script) - 1)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubSubscriber
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.received.append(body)
+            self.server.client_ports.add(self.client_address[1])
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        status, delay = self.server.next_answer()
+        time.sleep(delay)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def subscribers() -> Iterator[list[StubSubscriber]]:
+    servers: list[StubSubscriber] = []
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _subscriber(subscribers: list[StubSubscriber], *script: tuple[int, float]) -> StubSubscriber:
+    server = StubSubscriber(list(script) or [(200, 0)])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    subscribers.append(server)
+    return server
+
+
+@pytest.fixture
+def engine() -> Iterator[WebhookEngine]:
+    engine = WebhookEngine(workers=2, per_host=2, max_pending=100, retry_base_seconds=0.01, tick_seconds=0.01)
+    yield engine
+    engine.stop()
+
+
+def _deliver(engine: WebhookEngine, server: StubSubscriber, count: int = 1) -> None:
+    for idx in range(count):
+        assert engine.submit(WebhookDelivery(server.url, {"id": idx}, "generation"))
+
+
+class TestDelivery:
+    def test_payloads_reach_the_subscriber_over_one_connection(self, engine, subscribers):
+        engine.workers = 1
+        server = _subscriber(subscribers)
+
+        _deliver(engine, server, 3)
+
+        assert engine.wait_idle(5)
+        assert server.received == [{"id": 0}, {"id": 1}, {"id": 2}]
+        assert len(server.client_ports) == 1
+        assert engine.hosts == {}
+
+    def test_failed_attempts_are_retried(self, engine, subscribers):
+        server = _subscriber(subscribers, (500, 0), (500, 0), (200, 0))
+
+        _deliver(engine, server)
+
+        assert engine.wait_idle(5)
+        assert len(server.received) == 3
+
+    def test_retries_are_bounded(self, engine, subscribers):
+        server = _subscriber(subscribers, (503, 0))
+
+        _deliver(engine, server)
+
+        assert engine.wait_idle(5)
+        assert len(server.received) == MAX_ATTEMPTS
+
+    def test_too_many_pending_deliveries_are_dropped(self, engine, subscribers):
+        engine.max_pending = 1
+        server = _subscriber(subscribers, (200, 0.2))
+
+        _deliver(engine, server)
+
+        assert not engine.submit(WebhookDelivery(server.url, {"id": 1}, "generation"))
+        assert engine.wait_idle(5)
+        assert server.received == [{"id": 0}]
+
+
+class TestHostIsolation:
+    def test_slow_host_is_capped_and_does_not_stall_others(self, engine, subscribers):
+        engine.workers = 3
+        slow = _subscriber(subscribers, (200, 0.5))
+        fast = _subscriber(subscribers)
+
+        _deliver(engine, slow, 6)
+        time.sleep(0.1)
+        started = time.monotonic()
+        _deliver(engine, fast)
+        while not fast.received and time.monotonic() - started < 5:
+            time.sleep(0.01)
+
+        assert time.monotonic() - started < 0.4
+        assert engine.wait_idle(5)
+        assert len(slow.received) == 6
+        assert slow.max_in_flight == engine.per_host
+
+    def test_failing_host_has_its_circuit_opened(self, engine, subscribers, monkeypatch):
+        monkeypatch.setattr(webhook_delivery, "BREAKER_FAILURES", 2)
+        engine.per_host = 1
+        failing = _subscriber(subscribers, (500, 0))
+        healthy = _subscriber(subscribers)
+
+        _deliver(engine, failing)
+        assert engine.wait_idle(5)
+        _deliver(engine, failing)
+        _deliver(engine, healthy)
+        assert engine.wait_idle(5)
+
+        # The third attempt of the first delivery and the second delivery found the circuit open
+        assert len(failing.received) == 2
+        assert len(healthy.received) == 1
+
+    def test_backed_up_host_drops_only_its_own_deliveries(self, engine, subscribers):
+        engine.host_pending = 3
+        slow = _subscriber(subscribers, (200, 0.3))
+        fast = _subscriber(subscribers)
+
+        _deliver(engine, slow, 3)
+
+        assert not engine.submit(WebhookDelivery(slow.url, {"id": 3}, "generation"))
+        _deliver(engine, fast)
+        assert engine.wait_idle(5)
+        assert len(slow.received) == 3
+        assert len(fast.received) == 1
+
+    def test_idle_failing_host_is_forgotten_after_the_cooldown(self, engine, subscribers):
+        failing = _subscriber(subscribers, (500, 0))
+
+        _deliver(engine, failing)
+        assert engine.wait_idle(5)
+        [host] = engine.hosts.values()
+        assert host.failures == MAX_ATTEMPTS
+
+        engine.evict_idle_hosts()
+        assert len(engine.hosts) == 1
+        engine.evict_idle_hosts(now=host.last_finished + webhook_delivery.BREAKER_COOLDOWN_SECONDS)
+        assert engine.hosts == {}
+
+
+class TestTimerWheel:
+    def test_releases_items_on_their_tick(self):
+        wheel = TimerWheel(tick_seconds=1, slots=4)
+        wheel.schedule(1, "first")
+        wheel.schedule(2.5, "third")
+        wheel.schedule(6, "after a turn")
+
+        released = [wheel.advance() for _ in range(7)]
+
+        assert released == [["first"], [], ["third"], [], [], ["after a turn"], []]
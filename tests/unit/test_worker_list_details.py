@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the set-based worker list builder (``get_active_workers_details``).
+
+``store_worker_list`` publishes the public and privileged details of every active
+worker. It used to call ``get_details`` twice per worker on lazily loaded workers,
+each call querying the owner, roles, team, kudos details, suspicions, messages and
+models one worker at a time. The contracts exercised here:
+
+- the details match what ``get_details`` returns for each worker on its own, at
+  every privilege level and for every worker type;
+- the number of queries does not grow with the number of workers;
+- the quorum publishes the marshalled list responses per worker type and per
+  name, which the endpoint sends as stored, honouring ``If-None-Match``.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from flask_restx import marshal
+
+from horde.apis.v2.base import models as api_models
+from horde.classes.base.team import Team
+from horde.classes.base.worker import WorkerMessage, WorkerModel, WorkerStats
+from horde.classes.kobold.worker import TextWorker
+from horde.classes.stable.interrogation_worker import InterrogationWorker, WorkerInterrogationForm
+from horde.classes.stable.worker import ImageWorker
+from horde.database import functions as f
+from horde.enums import UserRoleTypes
+
+pytestmark = pytest.mark.unit
+
+
+def _make_workers(db_session: Any, user: Any, count: int, team: Team | None = None) -> list:
+    workers = []
+    for index in range(count):
+        worker_class = (ImageWorker, TextWorker, InterrogationWorker)[index % 3]
+        worker = worker_class(name=f"worker_{uuid.uuid4().hex[:8]}", user_id=user.id, team_id=team.id if team else None)
+        db_session.add(worker)
+        db_session.flush()
+        db_session.add(WorkerStats(worker_id=worker.id, action="uptime", value=index))
+        db_session.add(WorkerMessage(worker_id=worker.id, user_id=user.id, message="hello", origin="unit"))
+        db_session.add(
+            WorkerMessage(
+                worker_id=worker.id, user_id=user.id, message="gone", origin="unit", expiry=datetime.utcnow() - timedelta(hours=1)
+            ),
+        )
+        if worker_class is InterrogationWorker:
+            db_session.add(WorkerInterrogationForm(worker_id=worker.id, form="caption"))
+        else:
+            db_session.add(WorkerModel(worker_id=worker.id, model=f"model_{index}"))
+        workers.append(worker)
+    db_session.commit()
+    return workers
+
+
+def _individual_details(db_session: Any, privilege: int) -> list[dict]:
+    db_session.expunge_all()
+    return [worker.get_details(privilege) for worker in f.get_active_workers()]
+
+
+class TestActiveWorkersDetails:
+    def test_details_match_get_details(self, db_session, make_user, make_user_role):
+        user = make_user(public_workers=True)
+        make_user_role(user, UserRoleTypes.TRUSTED, value=True)
+        team = Team(name=f"team_{uuid.uuid4().hex[:8]}", owner_id=user.id)
+        db_session.add(team)
+        db_session.flush()
+        _make_workers(db_session, user, 3, team=team)
+        _make_workers(db_session, make_user(), 3)
+        expected = {privilege: _individual_details(db_session, privilege) for privilege in (0, 1, 2)}
+        db_session.expunge_all()
+
+        details = f.get_active_workers_details((0, 1, 2))
+
+        for privilege in (0, 1, 2):
+            assert details[privilege] == expected[privilege]
+        assert {w["type"] for w in details[0]} == {"image", "text", "interrogation"}
+        assert all(len(w["messages"]) == 1 for w in details[0] if w["team"] != "None")
+
+    def test_query_count_does_not_grow_with_workers(self, db_session, make_user, assert_query_count):
+        _make_workers(db_session, make_user(), 3)
+        db_session.expunge_all()
+        with assert_query_count() as few:
+            f.get_active_workers_details((0, 2))
+
+        _make_workers(db_session, make_user(), 9)
+        db_session.expunge_all()
+        with assert_query_count() as many:
+            details = f.get_active_workers_details((0, 2))
+
+        assert len(details[2]) == 12
+        assert len(many.of_kind("SELECT")) == len(few.of_kind("SELECT"))
+
+
+def _publish_worker_list_responses(db_session: Any) -> list[dict]:
+    db_session.expunge_all()
+    marshalled = marshal(f.get_active_workers_details((0,))[0], api_models.response_model_worker_details, skip_none=True)
+    f.store_worker_list_responses(0, marshalled)
+    return json.loads(json.dumps(marshalled))
+
+
+class TestWorkerListResponses:
+    def test_responses_per_type_and_name(self, db_session, fake_redis, make_user):
+        workers = _make_workers(db_session, make_user(), 3)
+        marshalled = _publish_worker_list_responses(db_session)
+
+        body, _ = f.get_worker_list_response(0)
+        assert json.loads(body) == marshalled
+        body, _ = f.get_worker_list_response(0, worker_type="text")
+        assert [w["name"] for w in json.loads(body)] == [workers[1].name]
+        # The name takes precedence over the type, and is matched case insensitively
+        body, _ = f.get_worker_list_response(0, worker_type="text", name=workers[0].name.upper())
+        assert [w["name"] for w in json.loads(body)] == [workers[0].name]
+        assert f.get_worker_list_response(0, name="no such worker")[0] == "[]"
+
+    def test_nothing_published_is_a_miss(self, db_session, fake_redis):
+        assert f.get_worker_list_response(0) is None
+
+    def test_endpoint_sends_the_stored_body_with_its_etag(self, db_session, fake_redis, make_user, client):
+        _make_workers(db_session, make_user(), 3)
+        _publish_worker_list_responses(db_session)
+        body, etag = f.get_worker_list_response(0, worker_type="image")
+
+        response = client.get("/api/v2/workers?type=image")
+        assert response.status_code == 200
+        assert json.loads(response.get_data()) == json.loads(body)
+        assert response.headers["ETag"] == f'"{etag}"'
+
+        response = client.get("/api/v2/workers?type=image", headers={"If-None-Match": f'"{etag}"'})
+        assert response.status_code == 304
+
+    def test_endpoint_marshals_when_nothing_was_published(self, db_session, make_user, client):
+        workers = _make_workers(db_session, make_user(), 3)
+
+        response = client.get(f"/api/v2/workers?name={workers[2].name}", headers={"X-Fields": "name,type"})
+
+        assert response.status_code == 200
+        assert response.get_json() == [{"name": workers[2].name, "type": "interrogation"}]
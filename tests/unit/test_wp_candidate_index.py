@@ -0,0 +1,191 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the image pop candidate index (``horde/database/wp_candidate_index.py``).
+
+With ``HORDE_WP_CANDIDATE_INDEX=1`` the image pop resolves its candidates from an
+in-memory index of the active queue and only asks the database to lock the chosen
+rows. The contract is parity: for any worker the index path must return the same
+requests, in the same order, as the full candidate query in
+``get_sorted_wp_filtered_to_worker``. The tests build small queues that exercise
+each bucket (model, pixel band, capability flag, targeting) and compare both paths.
+
+The index also refreshes incrementally: a request leaving the active queue must
+drop out of every bucket, and a request whose volatile columns change after it was
+indexed must never be handed out on stale values.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from horde.classes.stable.worker import ImageWorker
+from horde.database import functions as f
+from horde.database.wp_candidate_index import ImageWPCandidateIndex
+from horde.flask import db
+
+pytestmark = pytest.mark.unit
+
+_HOSTED_MODEL = "stable_diffusion"
+
+
+@pytest.fixture
+def fresh_index(monkeypatch: pytest.MonkeyPatch) -> ImageWPCandidateIndex:
+    """Give each test its own index so entries never leak between tests."""
+    index = ImageWPCandidateIndex()
+    monkeypatch.setattr(f, "image_wp_index", index)
+    return index
+
+
+def _sql_ids(worker: ImageWorker, models: list[str], priority_user_ids: list | None = None) -> list:
+    ids = [wp.id for wp in f.get_sorted_wp_filtered_to_worker(worker, models, priority_user_ids=priority_user_ids)]
+    db.session.commit()
+    return ids
+
+
+def _index_ids(
+    monkeypatch: pytest.MonkeyPatch,
+    index: ImageWPCandidateIndex,
+    worker: ImageWorker,
+    models: list[str],
+    priority_user_ids: list | None = None,
+) -> list:
+    monkeypatch.setenv("HORDE_WP_CANDIDATE_INDEX", "1")
+    index.refresh(force=True)
+    ids = [wp.id for wp in f.get_sorted_wp_filtered_to_worker(worker, models, priority_user_ids=priority_user_ids)]
+    db.session.commit()
+    monkeypatch.delenv("HORDE_WP_CANDIDATE_INDEX")
+    return ids
+
+
+class TestIndexMatchesCandidateQuery:
+    """The index path admits and orders exactly what the full query does."""
+
+    def test_model_pixels_and_capabilities(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, monkeypatch, fresh_index
+    ):
+        user = make_user()
+        worker = make_image_worker(user, max_pixels=768 * 768, nsfw=False, allow_lora=False)
+        served = make_image_wp(user)
+        modelless = make_image_wp(user, models=())
+        make_image_wp(user, models=("other_model",))
+        make_image_wp(user, width=1024, height=1024)
+        make_image_wp(user, nsfw=True)
+        make_image_wp(user, extra_params={"loras": [{"name": "x"}]})
+        boosted = make_image_wp(user, extra_priority=500)
+
+        sql_ids = _sql_ids(worker, [_HOSTED_MODEL])
+
+        assert sql_ids == [boosted.id, served.id, modelless.id]
+        assert _index_ids(monkeypatch, fresh_index, worker, [_HOSTED_MODEL]) == sql_ids
+
+    def test_pixel_band_boundary(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, monkeypatch, fresh_index):
+        # The worker ceiling falls inside a band holding one request that fits and
+        # one that does not, so the boundary band needs its per-entry comparison.
+        user = make_user()
+        worker = make_image_worker(user, max_pixels=512 * 520)
+        fits = make_image_wp(user, width=512, height=512)
+        make_image_wp(user, width=512, height=576)
+
+        sql_ids = _sql_ids(worker, [_HOSTED_MODEL])
+
+        assert sql_ids == [fits.id]
+        assert _index_ids(monkeypatch, fresh_index, worker, [_HOSTED_MODEL]) == sql_ids
+
+    def test_targeting_and_priority_users(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, monkeypatch, fresh_index
+    ):
+        user = make_user()
+        other_user = make_user()
+        worker = make_image_worker(user)
+        other_worker = make_image_worker(user)
+        make_image_wp(user, worker_ids=[worker.id], worker_blacklist=True)
+        allowed = make_image_wp(user, worker_ids=[worker.id])
+        make_image_wp(user, worker_ids=[other_worker.id])
+        foreign = make_image_wp(other_user)
+
+        for priority_user_ids in (None, [user.id]):
+            sql_ids = _sql_ids(worker, [_HOSTED_MODEL], priority_user_ids)
+            assert _index_ids(monkeypatch, fresh_index, worker, [_HOSTED_MODEL], priority_user_ids) == sql_ids
+        assert set(_sql_ids(worker, [_HOSTED_MODEL])) == {allowed.id, foreign.id}
+        assert _sql_ids(worker, [_HOSTED_MODEL], [user.id]) == [allowed.id]
+
+    def test_special_models_skip_modelless_requests(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, monkeypatch, fresh_index
+    ):
+        user = make_user()
+        worker = make_image_worker(user, models=("horde_special_model",))
+        make_image_wp(user, models=())
+
+        assert _sql_ids(worker, ["horde_special_model"]) == []
+        assert _index_ids(monkeypatch, fresh_index, worker, ["horde_special_model"]) == []
+
+
+class TestIncrementalRefresh:
+    """Refreshes track the active queue without re-reading routing attributes."""
+
+    def test_finished_request_drops_out_of_every_bucket(self, db_session, fake_redis, make_user, make_image_wp, fresh_index):
+        user = make_user()
+        wp = make_image_wp(user, nsfw=True)
+        fresh_index.refresh(force=True)
+        assert wp.id in fresh_index.snapshot.by_model[_HOSTED_MODEL]
+
+        wp.n = 0
+        db.session.commit()
+        fresh_index.refresh(force=True)
+
+        assert wp.id not in fresh_index.snapshot.entries
+        assert wp.id not in fresh_index.snapshot.by_model.get(_HOSTED_MODEL, ())
+        assert all(wp.id not in bucket for bucket in fresh_index.snapshot.by_flag.values())
+        assert all(wp.id not in bucket for bucket in fresh_index.snapshot.by_band.values())
+
+    def test_refresh_swaps_in_a_new_snapshot(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, fresh_index):
+        # Pops may still be reading the previous snapshot while the refresh runs,
+        # so a refresh must never modify it in place.
+        user = make_user()
+        worker = make_image_worker(user)
+        wp = make_image_wp(user)
+        fresh_index.refresh(force=True)
+        previous = fresh_index.snapshot
+
+        wp.n = 0
+        db.session.commit()
+        fresh_index.refresh(force=True)
+
+        assert fresh_index.snapshot is not previous
+        assert previous.candidate_ids(worker, [_HOSTED_MODEL]) == [wp.id]
+        assert fresh_index.candidate_ids(worker, [_HOSTED_MODEL]) == []
+
+    def test_stale_entry_is_not_handed_out(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, monkeypatch, fresh_index
+    ):
+        # The request finishes after the index last refreshed; the locking query
+        # re-checks the volatile columns so the stale entry is never returned.
+        user = make_user()
+        worker = make_image_worker(user)
+        wp = make_image_wp(user)
+        fresh_index.refresh(force=True)
+        wp.n = 0
+        db.session.commit()
+
+        monkeypatch.setenv("HORDE_WP_CANDIDATE_INDEX", "1")
+        fresh_index.refreshed_at = float("inf")
+
+        assert f.get_sorted_wp_filtered_to_worker(worker, [_HOSTED_MODEL]) == []
+
+    def test_priority_changes_reorder_existing_entries(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp, fresh_index
+    ):
+        user = make_user()
+        worker = make_image_worker(user)
+        first = make_image_wp(user)
+        second = make_image_wp(user)
+        fresh_index.refresh(force=True)
+        assert fresh_index.candidate_ids(worker, [_HOSTED_MODEL]) == [first.id, second.id]
+
+        second.extra_priority = 100
+        db.session.commit()
+        fresh_index.refresh(force=True)
+
+        assert fresh_index.candidate_ids(worker, [_HOSTED_MODEL]) == [second.id, first.id]
@@ -16,6 +16,13 @@ on two distinct sources of truth about a request:
   which counts finished, restarted, and in-flight (processing) procgens.
 
 The verdict is memoized in Redis under ``wp_validity_{wp.id}`` with a 60s TTL.
+The quorum node republishes the verdict of every active request in bulk
+(``refresh_wp_validity``), grouping requests by their candidate-query
+requirements so each distinct requirement set queries the workers once.
+Requests of the same validity class (``wp_validity_class_key``) also share one
+memoized class verdict on the request path: either "some unconditional worker
+serves the class" or the short list of conditional workers (owner-only, prompt
+blacklist, step limit) still to be checked against each request.
 
 The behavioral contracts exercised here: a request that is actively being
 generated is possible even once its serving worker goes stale, and a memoized
@@ -38,7 +45,8 @@ from typing import Any
 
 import pytest
 
-from horde.classes.base.worker import WorkerModel
+from horde.classes.base.waiting_prompt import WPTrickedWorkers
+from horde.classes.base.worker import WorkerBlackList, WorkerModel
 from horde.classes.stable.processing_generation import ImageProcessingGeneration
 from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
 from horde.classes.stable.worker import ImageWorker
@@ -286,3 +294,132 @@ class TestCountProcessingGensBucketing:
         assert counts["finished"] == 1
         assert counts["restarted"] == 1
         assert counts["processing"] == 1
+
+
+def _activate(wp: ImageWaitingPrompt) -> ImageWaitingPrompt:
+    wp.active = True
+    wp.expiry = datetime.utcnow() + timedelta(minutes=10)
+    db.session.commit()
+    return wp
+
+
+class TestQuorumValidityRefresh:
+    """refresh_wp_validity publishes the same verdicts the request path computes."""
+
+    def test_refresh_matches_inline_verdicts(self, db_session, fake_redis, make_user, make_user_role):
+        user = _make_trusted_user(make_user, make_user_role)
+        _make_image_worker(user, max_pixels=512 * 512)
+        servable = _activate(_make_image_wp(user))
+        too_large = _activate(_make_image_wp(user, width=1024, height=1024))
+        unserved_model = _activate(_make_image_wp(user, models=("some_other_model",)))
+
+        verdicts = f.refresh_wp_validity(ImageWaitingPrompt)
+
+        assert verdicts == {servable.id: True, too_large.id: False, unserved_model.id: False}
+        for wp in (servable, too_large, unserved_model):
+            assert fake_redis.horde_r_get(_validity_cache_key(wp)) == str(int(verdicts[wp.id])).encode()
+            fake_redis.horde_r_delete(_validity_cache_key(wp))
+            assert f.wp_has_valid_workers(wp) is verdicts[wp.id]
+
+    def test_requests_sharing_requirements_share_one_worker_query(
+        self,
+        db_session,
+        fake_redis,
+        make_user,
+        make_user_role,
+        monkeypatch,
+    ):
+        user = _make_trusted_user(make_user, make_user_role)
+        _make_image_worker(user)
+        for _ in range(3):
+            _activate(_make_image_wp(user))
+        _activate(_make_image_wp(user, width=768, height=768))
+        queried = []
+        query_candidates = f.query_wp_worker_candidates
+        monkeypatch.setattr(f, "query_wp_worker_candidates", lambda wp, **kw: queried.append(wp.id) or query_candidates(wp, **kw))
+
+        verdicts = f.refresh_wp_validity(ImageWaitingPrompt)
+
+        assert len(verdicts) == 4
+        assert len(queried) == 2
+
+    def test_paused_worker_only_validates_its_owners_requests(self, db_session, fake_redis, make_user, make_user_role):
+        owner = _make_trusted_user(make_user, make_user_role)
+        other_user = _make_trusted_user(make_user, make_user_role)
+        worker = _make_image_worker(owner)
+        worker.paused = True
+        db.session.commit()
+        owners_wp = _activate(_make_image_wp(owner))
+        others_wp = _activate(_make_image_wp(other_user))
+
+        verdicts = f.refresh_wp_validity(ImageWaitingPrompt)
+
+        assert verdicts == {owners_wp.id: True, others_wp.id: False}
+
+    def test_inactive_requests_are_skipped(self, db_session, fake_redis, make_user, make_user_role):
+        user = _make_trusted_user(make_user, make_user_role)
+        _make_image_worker(user)
+        _make_image_wp(user)
+
+        assert f.refresh_wp_validity(ImageWaitingPrompt) == {}
+
+
+class TestValidityClassMemo:
+    """Requests sharing a validity class share one worker scan."""
+
+    def test_second_request_of_a_class_skips_the_worker_query(
+        self,
+        db_session,
+        fake_redis,
+        make_user,
+        make_user_role,
+        monkeypatch,
+    ):
+        user = _make_trusted_user(make_user, make_user_role)
+        _make_image_worker(user)
+        first, second = _make_image_wp(user), _make_image_wp(user)
+        assert f.wp_validity_class_key(first) == f.wp_validity_class_key(second)
+        assert f.wp_has_valid_workers(first) is True
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("the class verdict should have been reused")
+
+        monkeypatch.setattr(f, "query_wp_worker_candidates", _fail)
+
+        assert f.wp_has_valid_workers(second) is True
+
+    def test_paused_worker_is_resolved_per_owner(self, db_session, fake_redis, make_user, make_user_role):
+        owner = _make_trusted_user(make_user, make_user_role)
+        other_user = _make_trusted_user(make_user, make_user_role)
+        worker = _make_image_worker(owner)
+        worker.paused = True
+        db.session.commit()
+        others_wp, owners_wp = _make_image_wp(other_user), _make_image_wp(owner)
+
+        assert f.wp_has_valid_workers(others_wp) is False
+        class_verdict = fake_redis.horde_r_get_json(f.wp_validity_class_cache_key(f.wp_validity_class_key(others_wp)))
+        assert class_verdict == [str(worker.id)]
+        assert f.wp_has_valid_workers(owners_wp) is True
+
+    def test_blacklisting_worker_is_checked_against_each_prompt(self, db_session, fake_redis, make_user, make_user_role):
+        user = _make_trusted_user(make_user, make_user_role)
+        worker = _make_image_worker(user)
+        db.session.add(WorkerBlackList(worker_id=worker.id, word="castle"))
+        db.session.commit()
+        blocked = _make_image_wp(user)
+        blocked.prompt = "a castle on a hill"
+        db.session.commit()
+        allowed = _make_image_wp(user)
+
+        assert f.wp_has_valid_workers(blocked) is False
+        assert f.wp_has_valid_workers(allowed) is True
+
+    def test_request_with_tricked_workers_is_not_shared(self, db_session, fake_redis, make_user, make_user_role):
+        user = _make_trusted_user(make_user, make_user_role)
+        worker = _make_image_worker(user)
+        wp = _make_image_wp(user)
+        db.session.add(WPTrickedWorkers(worker_id=worker.id, wp_id=wp.id))
+        db.session.commit()
+
+        assert f.wp_validity_class_key(wp) is None
+        assert f.wp_has_valid_workers(wp) is False
@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the quorum's lite status snapshot (``store_wp_lite_statuses``) and batched checks.
+
+Alongside the queue positions it publishes every second, the quorum publishes the
+lite status of every active request as one redis hash keyed by request id. The
+status checks answer from a single HGET and only compute the status themselves on
+a miss. The contracts exercised here:
+
+- a snapshot entry is exactly the status the check would have computed;
+- reading the snapshot issues no SQL;
+- each publish replaces the whole hash, so requests which stopped being active
+  drop out and fall back to the computed path;
+- ids missing from the snapshot, or which are not UUIDs, are misses;
+- a batched check reads all its snapshot hits in one HMGET and loads the misses
+  with a single ``IN`` query.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from horde.classes.stable.processing_generation import ImageProcessingGeneration
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.database import functions as f
+from horde.flask import db
+
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("stub_model_reference")]
+
+
+def _computed_status(wp: ImageWaitingPrompt, queue_positions: dict | None = None) -> dict:
+    """The status the check endpoint computes, from the given queue positions or from get_wp_queue_stats."""
+    if queue_positions is None:
+        wp_queue_stats = f.get_wp_queue_stats(wp)
+    else:
+        wp_queue_stats = tuple(queue_positions.get(str(wp.id), (-1, 0, 0)))
+    return wp.get_lite_status(
+        request_avg=f.get_request_avg("image"),
+        has_valid_workers=f.wp_has_valid_workers(wp),
+        wp_queue_stats=wp_queue_stats,
+        active_worker_count=f.count_active_workers("image"),
+    )
+
+
+class TestLiteStatusSnapshot:
+    def test_snapshot_matches_the_computed_status(self, db_session, fake_redis, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        queued, processing = make_image_wp(user, n=2), make_image_wp(user)
+        worker = make_image_worker(user)
+        # What start_generation records, without presigning the upload URLs
+        processing.n = 0
+        ImageProcessingGeneration(wp_id=processing.id, worker_id=worker.id, model="stable_diffusion")
+        queue_positions = {str(queued.id): [0, 0.5, 2]}
+
+        f.store_wp_lite_statuses("image", queue_positions)
+
+        for wp in (queued, processing):
+            db.session.refresh(wp)
+            assert f.get_cached_wp_lite_status("image", str(wp.id)) == _computed_status(wp, queue_positions)
+        assert f.get_cached_wp_lite_status("image", str(processing.id))["processing"] == 1
+        assert f.get_cached_wp_lite_status("image", str(queued.id))["queue_position"] == 1
+
+    def test_publishing_leaves_the_generations_of_the_requests_whole(
+        self, db_session, fake_redis, make_user, make_image_worker, make_image_wp
+    ):
+        # The session keeps the requests the publish loaded, so anything reading
+        # their generations afterwards must see all of them, not only the unfinished ones
+        user = make_user()
+        wp = make_image_wp(user, n=2)
+        worker = make_image_worker(user)
+        wp.n = 0
+        ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion").generation = "done"
+        ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion")
+        db.session.commit()
+        db.session.expire_all()
+
+        f.store_wp_lite_statuses("image", {})
+
+        assert len(wp.processing_gens) == 2
+        assert f.get_cached_wp_lite_status("image", str(wp.id))["processing"] == 1
+
+    def test_reading_the_snapshot_issues_no_sql(self, db_session, fake_redis, make_user, make_image_wp, assert_query_count):
+        wp = make_image_wp(make_user())
+        f.store_wp_lite_statuses("image", {})
+
+        with assert_query_count() as queries:
+            assert f.get_cached_wp_lite_status("image", str(wp.id).upper()) is not None
+        assert len(queries) == 0
+
+    def test_inactive_requests_drop_out_of_the_snapshot(self, db_session, fake_redis, make_user, make_image_wp):
+        user = make_user()
+        kept, dropped = make_image_wp(user), make_image_wp(user)
+        f.store_wp_lite_statuses("image", {})
+        dropped.active = False
+        db.session.commit()
+
+        f.store_wp_lite_statuses("image", {})
+
+        assert f.get_cached_wp_lite_status("image", str(kept.id)) is not None
+        assert f.get_cached_wp_lite_status("image", str(dropped.id)) is None
+
+    def test_unknown_or_malformed_ids_are_misses(self, db_session, fake_redis, make_user, make_image_wp):
+        make_image_wp(make_user())
+        f.store_wp_lite_statuses("image", {})
+
+        assert f.get_cached_wp_lite_status("image", str(uuid.uuid4())) is None
+        assert f.get_cached_wp_lite_status("image", "not-a-uuid") is None
+        assert f.get_cached_wp_lite_status("text", str(uuid.uuid4())) is None
+
+
+class TestBatchedLiteStatuses:
+    def test_snapshot_hits_issue_no_sql(self, db_session, fake_redis, make_user, make_image_wp, assert_query_count):
+        user = make_user()
+        wps = [make_image_wp(user) for _ in range(3)]
+        f.store_wp_lite_statuses("image", {})
+
+        with assert_query_count() as queries:
+            statuses = f.get_wp_lite_statuses("image", [str(wp.id) for wp in wps])
+        assert len(queries) == 0
+        assert set(statuses) == {str(wp.id) for wp in wps}
+
+    def test_misses_are_loaded_with_one_query(self, db_session, fake_redis, make_user, make_image_wp, assert_query_count):
+        user = make_user()
+        snapshotted = make_image_wp(user)
+        f.store_wp_lite_statuses("image", {})
+        # Created after the last snapshot, so both have to be read from the DB
+        late = [make_image_wp(user), make_image_wp(user)]
+        unknown = str(uuid.uuid4())
+        wp_ids = [str(snapshotted.id), str(late[0].id), "not-a-uuid", unknown, str(late[1].id)]
+
+        with assert_query_count() as queries:
+            statuses = f.get_wp_lite_statuses("image", wp_ids)
+
+        assert set(statuses) == {str(snapshotted.id), str(late[0].id), str(late[1].id)}
+        wp_selects = [q for q in queries.of_kind("SELECT") if "FROM waiting_prompts" in q and "waiting_prompts.id IN" in q]
+        assert len(wp_selects) == 1
+        for wp in late:
+            assert statuses[str(wp.id)] == _computed_status(wp)
@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the time-derived aging of queued requests.
+
+Queued requests gain ``WP_PRIORITY_AGING_PER_SECOND`` of priority for every second
+since they were created, computed when the queue is read instead of written into
+``extra_priority`` by the quorum. The contracts exercised here:
+
+- ``queue_priority`` evaluates the same in SQL and in Python;
+- an older request overtakes a newer one of higher ``extra_priority`` once its
+  age makes up the difference, alike in the pop query, the full queue ordering
+  and the quorum's queue positions;
+- ``get_priority`` reports the effective priority, aging included;
+- the partial index serving the queue order exists on the aged priority.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.consts import WP_PRIORITY_AGING_PER_SECOND
+from horde.database import functions as f
+from horde.database.wp_queue_positions import PrioritizedWPQueue
+from horde.flask import db
+
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("stub_model_reference")]
+
+
+def _seconds_ago(seconds: int) -> datetime:
+    return datetime.utcnow() - timedelta(seconds=seconds)
+
+
+class TestQueuePriority:
+    def test_sql_matches_python(self, db_session, make_user, make_image_wp):
+        wp = make_image_wp(make_user(), extra_priority=1234, created=_seconds_ago(42))
+
+        sql_value = db.session.query(ImageWaitingPrompt.queue_priority).filter(ImageWaitingPrompt.id == wp.id).scalar()
+
+        assert float(sql_value) == pytest.approx(wp.queue_priority, abs=1e-3)
+
+    def test_get_priority_includes_the_aging(self, db_session, make_user, make_image_wp):
+        wp = make_image_wp(make_user(), extra_priority=10, created=_seconds_ago(20))
+
+        assert wp.get_priority() == pytest.approx(10 + 20 * WP_PRIORITY_AGING_PER_SECOND, abs=WP_PRIORITY_AGING_PER_SECOND)
+
+
+class TestAgedOrdering:
+    def test_older_requests_overtake_by_age(self, db_session, make_user, make_image_worker, make_image_wp):
+        user = make_user()
+        worker = make_image_worker(user)
+        # 100 + 30 seconds of aging outranks 200 created now, which outranks 100 created now
+        new_low = make_image_wp(user, extra_priority=100)
+        new_high = make_image_wp(user, extra_priority=200)
+        old_low = make_image_wp(user, extra_priority=100, created=_seconds_ago(30))
+        expected = [old_low.id, new_high.id, new_low.id]
+
+        popped = [wp.id for wp in f.get_sorted_wp_filtered_to_worker(worker, ["stable_diffusion"])]
+        db.session.commit()
+        queue_positions = PrioritizedWPQueue("image").refresh()
+
+        assert popped == expected
+        assert [wp.id for wp in f.query_prioritized_wps("image")] == expected
+        assert sorted(expected, key=lambda wp_id: queue_positions[str(wp_id)][0]) == expected
+
+    def test_aged_queue_index(self, db_session):
+        indexdef = db.session.execute(
+            db.text("SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_waiting_prompts_aged_queue'"),
+        ).scalar()
+
+        assert "EXTRACT(epoch FROM created)" in indexdef
+        assert "WHERE (active AND (NOT faulted) AND (n > 0))" in indexdef
@@ -0,0 +1,168 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the redis priority queue of image requests (``horde/wp_priority_queue.py``).
+
+With ``HORDE_WP_REDIS_QUEUE=1`` the queued image requests are kept in redis sorted
+sets per model, and the image pop takes its candidates from the top of the sets of
+the worker's models. The contracts exercised here:
+
+- the sets return the requests of the asked models by descending priority, once
+  each;
+- the quorum's reconcile adds the queued requests missing from the sets and
+  removes the ones which are no longer queued;
+- the pop returns the same requests, in the same order, as the full candidate
+  query, and falls back to it when the window holds too few admissible requests
+  or redis is unavailable.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from horde.classes.base.waiting_prompt import get_queue_priority
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.database import functions as f
+from horde.flask import db
+from horde.horde_redis import horde_redis
+from horde.pop_notifier import ANY_MODEL
+from horde.wp_priority_queue import WPPriorityQueue, priority_queue_key
+from tests.fixture_types import StubModelReference
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def _model_reference(stub_model_reference: StubModelReference) -> None:
+    stub_model_reference({"stable_diffusion": {"baseline": "stable diffusion 1"}, "deliberate": {"baseline": "stable diffusion 1"}})
+
+
+@pytest.fixture
+def queue(monkeypatch: pytest.MonkeyPatch, fake_redis) -> WPPriorityQueue:
+    """Give each test its own queue so the reconcile state never leaks between tests."""
+    fresh = WPPriorityQueue()
+    monkeypatch.setattr(f, "wp_priority_queue", fresh)
+    monkeypatch.setenv("HORDE_WP_REDIS_QUEUE", "1")
+    return fresh
+
+
+def _reconcile(queue: WPPriorityQueue) -> None:
+    """Reconcile the whole set against the queued image requests, as the quorum does"""
+    active = {
+        row.id: get_queue_priority(row.extra_priority, row.created)
+        for row in db.session.query(ImageWaitingPrompt.id, ImageWaitingPrompt.extra_priority, ImageWaitingPrompt.created).filter(
+            ImageWaitingPrompt.n > 0,
+            ImageWaitingPrompt.active == True,  # noqa E712
+            ImageWaitingPrompt.faulted == False,  # noqa E712
+        )
+    }
+    queue.reconciled_at.pop("image", None)
+    queue.reconcile("image", active, f.get_wp_model_names)
+
+
+def _pop_ids(worker: ImageWorker, models: list[str], page: int = 0) -> list:
+    ids = [wp.id for wp in f.get_sorted_wp_filtered_to_worker(worker, models, page=page)]
+    db.session.commit()
+    return ids
+
+
+class TestWPPriorityQueue:
+    def test_top_candidates_merge_the_model_sets_by_priority(self, queue):
+        low, high, shared, modelless = (uuid.uuid4() for _ in range(4))
+        queue.enqueue(
+            "image",
+            [
+                (low, 1.0, ["deliberate"]),
+                (high, 5.0, ["stable_diffusion"]),
+                (shared, 3.0, ["stable_diffusion", "deliberate"]),
+                (modelless, 4.0, []),
+            ],
+        )
+
+        assert queue.top_candidates("image", ["stable_diffusion", "deliberate"], False, 10) == ([high, shared, low], True)
+        assert queue.top_candidates("image", ["deliberate"], True, 10) == ([modelless, shared, low], True)
+        assert queue.top_candidates("image", ["stable_diffusion", "deliberate"], True, 2) == ([high, modelless], False)
+
+    def test_dequeue_removes_every_model_entry(self, queue, fake_redis):
+        wp_id = uuid.uuid4()
+        queue.enqueue("image", [(wp_id, 1.0, ["stable_diffusion", "deliberate"])])
+
+        queue.dequeue("image", [str(wp_id), str(uuid.uuid4())])
+
+        assert queue.top_candidates("image", ["stable_diffusion", "deliberate"], True, 10) == ([], True)
+        assert fake_redis.horde_r.zcard(priority_queue_key("image", "deliberate")) == 0
+
+    def test_reconcile_adds_missing_and_removes_strays(self, db_session, make_user, make_image_wp, queue, fake_redis):
+        user = make_user()
+        queued = make_image_wp(user, models=("stable_diffusion", "deliberate"))
+        modelless = make_image_wp(user, models=())
+        stray = uuid.uuid4()
+        queue.enqueue("image", [(stray, 0.0, ["stable_diffusion"])])
+
+        _reconcile(queue)
+
+        assert fake_redis.horde_r.zscore(priority_queue_key("image", "deliberate"), str(queued.id)) is not None
+        assert fake_redis.horde_r.zscore(priority_queue_key("image", ANY_MODEL), str(modelless.id)) is not None
+        # It may have been queued after the active requests were read
+        assert stray in queue.top_candidates("image", ["stable_diffusion"], False, 10)[0]
+
+        _reconcile(queue)
+
+        assert set(queue.top_candidates("image", ["stable_diffusion"], True, 10)[0]) == {queued.id, modelless.id}
+
+        queued.n = 0
+        db.session.commit()
+        queue.reconcile("image", {modelless.id: 0}, f.get_wp_model_names)
+
+        assert queue.top_candidates("image", ["stable_diffusion", "deliberate"], True, 10) == ([modelless.id], True)
+
+
+class TestPop:
+    def test_matches_the_candidate_query(self, db_session, make_user, make_image_worker, make_image_wp, queue, monkeypatch):
+        user = make_user()
+        worker = make_image_worker(user, models=("stable_diffusion", "deliberate"))
+        for extra_priority, models, width in [
+            (0, ("stable_diffusion",), 512),
+            (50, ("deliberate",), 512),
+            (50, ("stable_diffusion", "deliberate"), 512),
+            (100, ("unserved",), 512),
+            (20, (), 512),
+            # Too large for the worker
+            (200, ("stable_diffusion",), 4096),
+        ]:
+            make_image_wp(user, models=models, width=width, extra_priority=extra_priority)
+        _reconcile(queue)
+
+        redis_ids = _pop_ids(worker, ["stable_diffusion", "deliberate"])
+        monkeypatch.delenv("HORDE_WP_REDIS_QUEUE")
+        sql_ids = _pop_ids(worker, ["stable_diffusion", "deliberate"])
+
+        assert len(redis_ids) == 4
+        assert redis_ids == sql_ids
+
+    def test_falls_back_when_the_window_is_short(self, db_session, make_user, make_image_worker, make_image_wp, queue, monkeypatch):
+        user = make_user()
+        worker = make_image_worker(user)
+        # The whole window is too large for the worker
+        for _ in range(10):
+            make_image_wp(user, width=4096, extra_priority=100)
+        servable = make_image_wp(user)
+        _reconcile(queue)
+        monkeypatch.setattr(f, "WP_PRIORITY_QUEUE_WINDOW_FACTOR", 1)
+
+        assert f.get_sorted_wp_from_priority_queue(worker, ["stable_diffusion"]) is None
+        assert _pop_ids(worker, ["stable_diffusion"]) == [servable.id]
+
+    def test_falls_back_without_redis(self, db_session, make_user, make_image_worker, make_image_wp, queue, monkeypatch):
+        user = make_user()
+        worker = make_image_worker(user)
+        servable = make_image_wp(user)
+        _reconcile(queue)
+        monkeypatch.setattr(horde_redis, "horde_r", None)
+
+        assert f.get_sorted_wp_from_priority_queue(worker, ["stable_diffusion"]) is None
+        assert _pop_ids(worker, ["stable_diffusion"]) == [servable.id]
@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the quorum's queue positions (``horde/database/wp_queue_positions.py``).
+
+The quorum sorts the narrow columns of each request type's active queue and
+publishes each request's queue stats as a field of one redis hash. The contracts exercised
+here:
+
+- the queue stats match the ones computed from the full ``query_prioritized_wps``
+  ordering, also after priorities change and requests leave the queue;
+- each publish replaces the hash, dropping the requests which left the queue;
+- ``get_wp_queue_stats`` reads one request's stats with a single HMGET and no SQL,
+  tells unqueued requests from unpublished positions, and computes the stats
+  itself when nothing was published.
+"""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from horde import vars as hv
+from horde.database import functions as f
+from horde.database.wp_queue_positions import PrioritizedWPQueue, wp_queue_positions_key
+from horde.flask import db
+
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("stub_model_reference")]
+
+
+def _full_recount() -> dict[str, tuple]:
+    """The queue stats the quorum used to compute by sorting the whole queue in SQL"""
+    queue_positions = {}
+    things_ahead_in_queue = 0
+    n_ahead_in_queue = 0
+    for idx, wp in enumerate(f.query_prioritized_wps("image")):
+        things_ahead_in_queue += round(wp.things * wp.n / hv.thing_divisors["image"], 2)
+        n_ahead_in_queue += wp.n
+        queue_positions[str(wp.id)] = (idx, round(things_ahead_in_queue, 2), n_ahead_in_queue)
+    return queue_positions
+
+
+class TestPrioritizedWPQueue:
+    def test_positions_follow_the_full_ordering(self, db_session, make_user, make_image_wp):
+        user = make_user()
+        wps = [make_image_wp(user, n=n, extra_priority=priority) for n, priority in [(1, 0), (2, 50), (3, 0), (1, 100)]]
+        queue = PrioritizedWPQueue("image")
+
+        assert queue.refresh() == _full_recount()
+        assert queue.refresh()[str(wps[3].id)][0] == 0
+
+        wps[2].extra_priority = 200
+        wps[1].n = 0
+        db.session.commit()
+
+        queue_positions = queue.refresh()
+        assert queue_positions == _full_recount()
+        assert queue_positions[str(wps[2].id)][0] == 0
+        assert str(wps[1].id) not in queue_positions
+        assert len(queue.queue_priorities()) == 3
+
+
+class TestPublish:
+    def test_publish_replaces_the_positions(self, db_session, fake_redis, make_user, make_image_wp):
+        user = make_user()
+        first, second, third = (make_image_wp(user, extra_priority=priority) for priority in (20, 10, 0))
+        queue = PrioritizedWPQueue("image")
+        queue.publish(queue.refresh())
+        third.extra_priority = 15
+        first.n = 0
+        db.session.commit()
+
+        queue.publish(queue.refresh())
+
+        published = {field.decode(): value.decode() for field, value in fake_redis.horde_r.hgetall(wp_queue_positions_key("image")).items()}
+        assert set(published) == {str(second.id), str(third.id), "_length"}
+        assert published["_length"] == "2"
+        assert json.loads(published[str(third.id)])[0] == 0
+
+
+class TestGetWpQueueStats:
+    def test_reads_one_request_without_sql(self, db_session, fake_redis, make_user, make_image_wp, assert_query_count):
+        user = make_user()
+        ahead, behind = make_image_wp(user, n=2, extra_priority=10), make_image_wp(user)
+        queue = PrioritizedWPQueue("image")
+        queue.publish(queue.refresh())
+        expected = _full_recount()[str(behind.id)]
+
+        with assert_query_count() as queries:
+            assert f.get_wp_queue_stats(behind) == expected
+        assert queries.of_kind("SELECT") == []
+
+        ahead.n = 0
+        db.session.commit()
+        queue.publish(queue.refresh())
+        # No longer queued, but still generating
+        ahead.n = 1
+        assert f.get_wp_queue_stats(ahead) == (-1, 0, 0)
+
+    def test_computes_the_stats_when_nothing_was_published(self, db_session, fake_redis, make_user, make_image_wp):
+        user = make_user()
+        make_image_wp(user, extra_priority=10)
+        wp = make_image_wp(user, n=3)
+
+        assert f.get_wp_queue_stats(wp) == _full_recount()[str(wp.id)]
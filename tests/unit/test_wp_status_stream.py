@@ -0,0 +1,177 @@
+# SPDX-FileCopyrightText: 2026 Tazlin <tazlin.on.github@gmail.com>
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Unit coverage for the server-sent status streams (``horde/wp_status_stream.py``).
+
+A status stream watches one or several requests and sends their lite status as
+events, instead of the client polling each of them. The contracts exercised here:
+
+- the first status of every request is sent, and later ones only when they changed
+  materially (any field, or the wait time by ``WAIT_TIME_MATERIAL_SECONDS``);
+- a request stops being watched once it is done, faulted or missing, and the
+  stream ends once none is left or its time is up;
+- a generation changing state wakes the streams watching its request at once,
+  rather than at their next periodic refresh;
+- ``HORDE_MAX_STATUS_STREAMS`` bounds the streams open at once, 0 disabling them.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import uuid
+from typing import Any
+
+import pytest
+
+from horde import wp_status_stream
+from horde.classes.stable.processing_generation import ImageProcessingGeneration
+from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
+from horde.classes.stable.worker import ImageWorker
+from horde.flask import db
+from horde.wp_status_stream import StreamSlots, WPStatusNotifier, status_changed_materially, stream_wp_statuses
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def notifier(monkeypatch: pytest.MonkeyPatch) -> WPStatusNotifier:
+    monkeypatch.setenv("HORDE_MAX_STATUS_STREAMS", "2")
+    fresh = WPStatusNotifier()
+    monkeypatch.setattr(wp_status_stream, "wp_status_notifier", fresh)
+    return fresh
+
+
+def _status(**changes: Any) -> dict:
+    status = {
+        "finished": 0,
+        "processing": 0,
+        "restarted": 0,
+        "waiting": 1,
+        "done": False,
+        "faulted": False,
+        "queue_position": 3,
+        "wait_time": 60,
+        "kudos": 0,
+        "is_possible": True,
+    }
+    status.update(changes)
+    return status
+
+
+def _parse(events: list[str]) -> list[tuple[str, Any]]:
+    parsed = []
+    for event in events:
+        if event.startswith(":"):
+            parsed.append(("keepalive", None))
+            continue
+        name, data = event.strip().split("\n")
+        parsed.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return parsed
+
+
+class TestMaterialChange:
+    def test_first_status_is_always_sent(self):
+        assert status_changed_materially(None, _status())
+
+    def test_small_wait_time_drift_is_not_material(self):
+        assert not status_changed_materially(_status(), _status(wait_time=55))
+        assert status_changed_materially(_status(), _status(wait_time=45))
+
+    def test_progress_and_queue_position_are_material(self):
+        assert status_changed_materially(_status(), _status(processing=1, waiting=0))
+        assert status_changed_materially(_status(), _status(queue_position=2))
+
+
+class TestStreamWpStatuses:
+    def test_unchanged_status_is_not_resent(self, db_session, notifier):
+        statuses = iter([_status(), _status(wait_time=58), _status(done=True, finished=1)])
+        events = _parse(list(stream_wp_statuses(["a"], lambda wp_id: next(statuses), refresh_seconds=0)))
+
+        assert events == [
+            ("status", {"id": "a", **_status()}),
+            ("keepalive", None),
+            ("status", {"id": "a", **_status(done=True, finished=1)}),
+            ("end", {"reason": "finished"}),
+        ]
+
+    def test_multiplexed_stream_drops_finished_and_missing_requests(self, db_session, notifier):
+        looked_up = []
+
+        def get_status(wp_id: str) -> dict | None:
+            looked_up.append(wp_id)
+            return {"done": _status(done=True), "faulted": _status(faulted=True)}.get(wp_id)
+
+        events = _parse(list(stream_wp_statuses(["done", "missing", "faulted"], get_status)))
+
+        assert [name for name, _ in events] == ["status", "not_found", "status", "end"]
+        assert events[1][1] == {"id": "missing"}
+        assert looked_up == ["done", "missing", "faulted"]
+
+    def test_stream_ends_at_its_deadline(self, db_session, notifier):
+        events = _parse(list(stream_wp_statuses(["a"], lambda wp_id: _status(), max_seconds=0.05, refresh_seconds=0.01)))
+
+        assert events[0][0] == "status"
+        assert events[-1] == ("end", {"reason": "timeout"})
+
+    def test_notification_wakes_the_stream(self, db_session, notifier):
+        statuses = iter([_status(), _status(processing=1, waiting=0)])
+        stream = stream_wp_statuses(["a"], lambda wp_id: next(statuses), refresh_seconds=30)
+        assert _parse([next(stream)])[0][0] == "status"
+        thread = threading.Thread(target=lambda: (time.sleep(0.05), notifier.notify("a")))
+        thread.start()
+
+        started = time.monotonic()
+        # Wakes from the wait started after the first batch of events
+        assert _parse([next(stream)]) == [("status", {"id": "a", **_status(processing=1, waiting=0)})]
+        assert time.monotonic() - started < 5
+        thread.join()
+        stream.close()
+
+
+class TestStreamSlots:
+    def test_slots_are_bounded(self, monkeypatch):
+        monkeypatch.setenv("HORDE_MAX_STATUS_STREAMS", "1")
+        slots = StreamSlots()
+
+        assert slots.acquire()
+        assert not slots.acquire()
+        slots.release()
+        assert slots.acquire()
+
+    def test_zero_disables_streams(self, monkeypatch):
+        monkeypatch.setenv("HORDE_MAX_STATUS_STREAMS", "0")
+
+        assert not StreamSlots().acquire()
+        assert not WPStatusNotifier().enabled()
+
+
+class TestGenerationNotifications:
+    def test_aborted_generation_wakes_its_streams(self, db_session, fake_redis, make_user, notifier, monkeypatch):
+        from horde import model_reference as model_reference_module
+        from horde.classes.base.settings import HordeSettings
+
+        monkeypatch.setattr(model_reference_module.model_reference, "reference", {"stable_diffusion": {"baseline": "stable diffusion 1"}})
+        monkeypatch.setattr("horde.classes.base.processing_generation.wp_status_notifier", notifier)
+        # ``log_aborted_job`` reads raid mode from the settings row
+        db.session.add(HordeSettings())
+        user = make_user()
+        worker = ImageWorker(name=f"worker_{uuid.uuid4().hex[:8]}", user_id=user.id)
+        db.session.add(worker)
+        db.session.flush()
+        wp = ImageWaitingPrompt(
+            worker_ids=[],
+            models=["stable_diffusion"],
+            prompt="a test robot",
+            user_id=user.id,
+            params={"width": 512, "height": 512, "steps": 8, "sampler_name": "k_euler_a"},
+        )
+        db.session.flush()
+        procgen = ImageProcessingGeneration(wp_id=wp.id, worker_id=worker.id, model="stable_diffusion")
+        snapshot = notifier.watch([wp.id])
+
+        procgen.abort()
+
+        assert notifier.wait(snapshot, timeout=0) is True